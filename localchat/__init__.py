@@ -1,7 +1,15 @@
-from . import client
+from importlib import import_module
+
 from . import config
 from . import net
-from . import server
-from . import settings
 from . import util
 
+_LAZY_SUBMODULES = ("client", "server", "settings")
+
+
+def __getattr__(name: str):
+    # Loaded on first access, so `localchat serve` never imports client or UI code
+    # and the client only loads the server package when it hosts.
+    if name in _LAZY_SUBMODULES:
+        return import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
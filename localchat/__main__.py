@@ -1,10 +1,25 @@
 import argparse
 import sys
 
-from localchat.client.UIImpl.CLI import CLIMenuUI
-from localchat.client.logicImpl import TcpClientLogic
-from localchat.client.logicImpl.testing import TestLogic
-from localchat.settings import SettingsStore
+from localchat.config.defaults import (
+    DEFAULT_HOST,
+    DEFAULT_MAX_CLIENTS,
+    DEFAULT_PORT,
+    DEFAULT_SERVER_NAME,
+    DEFAULT_SLOW_CONSUMER_POLICY,
+)
+from localchat.config.limits import (
+    ADMISSION_ADDRESS_CONNECT_PER_SEC,
+    ADMISSION_ADDRESS_MSG_PER_SEC,
+    ADMISSION_CONNECT_PER_SEC,
+    MAX_ROOMS,
+    MAX_SERVER_WORKERS,
+    RATE_LIMIT_BURST,
+    RATE_LIMIT_MSG_PER_SEC,
+)
+
+# Every command imports what it needs when it runs: `serve` must not load client or UI code,
+# `start` only loads the server package when the user hosts.
 
 
 def _build_parser() -> argparse.ArgumentParser:
@@ -19,10 +34,142 @@ def _build_parser() -> argparse.ArgumentParser:
         help="runtime mode (default: tcp)",
     )
 
+    serve = sub.add_parser(
+        "serve",
+        help="run a headless server until SIGINT/SIGTERM",
+        description="Runs a chat server without any UI. Errors are written to stderr.",
+    )
+    serve.add_argument("--host", default=DEFAULT_HOST, help=f"address to bind (default: {DEFAULT_HOST})")
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"tcp port, 0 picks a free one (default: {DEFAULT_PORT})")
+    serve.add_argument("--name", default=None, help="server name shown to clients and in discovery")
+    serve.add_argument("--password", default=None, help="server password")
+    serve.add_argument(
+        "--max-clients",
+        type=int,
+        default=DEFAULT_MAX_CLIENTS,
+        help=f"maximum number of sessions (default: {DEFAULT_MAX_CLIENTS})",
+    )
+    serve.add_argument("--server", choices=["threaded", "async"], default="async", help="server core (default: async)")
+    serve.add_argument(
+        "--slow-consumer-policy",
+        choices=["drop", "coalesce", "disconnect"],
+        default=DEFAULT_SLOW_CONSUMER_POLICY,
+        help=f"what happens to clients that cannot keep up (default: {DEFAULT_SLOW_CONSUMER_POLICY})",
+    )
+    serve.add_argument(
+        "--journal",
+        default=None,
+        metavar="DIR",
+        help="persist the chat history and bans in DIR (rooms in DIR/rooms/<room>)",
+    )
+    serve.add_argument(
+        "--max-rooms",
+        type=int,
+        default=MAX_ROOMS,
+        help=f"rooms clients may open besides the default room (default: {MAX_ROOMS})",
+    )
+    serve.add_argument("--no-compression", action="store_true", help="do not offer zlib compression to clients")
+    serve.add_argument(
+        "--rate-limit",
+        type=float,
+        default=RATE_LIMIT_MSG_PER_SEC,
+        help=f"messages per second per member, 0 disables the limit (default: {RATE_LIMIT_MSG_PER_SEC})",
+    )
+    serve.add_argument(
+        "--rate-limit-burst",
+        type=float,
+        default=RATE_LIMIT_BURST,
+        help=f"messages a member may send at once (default: {RATE_LIMIT_BURST})",
+    )
+    serve.add_argument(
+        "--address-rate-limit",
+        type=float,
+        default=ADMISSION_ADDRESS_MSG_PER_SEC,
+        help="messages per second of all members from one address, on top of --rate-limit, "
+        f"0 disables the limit (default: {ADMISSION_ADDRESS_MSG_PER_SEC})",
+    )
+    serve.add_argument(
+        "--address-connect-rate",
+        type=float,
+        default=ADMISSION_ADDRESS_CONNECT_PER_SEC,
+        help=f"connections per second from one address, 0 disables the limit (default: {ADMISSION_ADDRESS_CONNECT_PER_SEC})",
+    )
+    serve.add_argument(
+        "--connect-rate",
+        type=float,
+        default=ADMISSION_CONNECT_PER_SEC,
+        help=f"connections per second from all addresses, 0 disables the limit (default: {ADMISSION_CONNECT_PER_SEC})",
+    )
+    serve.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="serve Prometheus metrics on 127.0.0.1:PORT (0 picks a free port)",
+    )
+    serve.add_argument("--lock-profile", action="store_true", help="record wait and hold times of the server locks")
+    serve.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help=f"server processes sharing the port, 1..{MAX_SERVER_WORKERS}; --max-clients, the connect and address limits "
+        "and --metrics-port apply per worker (worker i: PORT+i), journals are not supported (default: 1)",
+    )
+
+    bench = sub.add_parser(
+        "bench",
+        help="load-test a loopback server and print the results as JSON",
+        description="Starts a server on 127.0.0.1, drives it with real tcp clients from worker "
+        "processes and prints one JSON line (messages/s, fan-out latency, server CPU and RSS).",
+    )
+    bench.add_argument("--clients", type=int, default=50, help="number of clients (default: 50)")
+    bench.add_argument("--duration", type=float, default=10.0, help="measured seconds (default: 10)")
+    bench.add_argument("--warmup", type=float, default=1.0, help="unmeasured seconds before (default: 1)")
+    bench.add_argument("--rate", type=float, default=1.0, help="messages per second per client (default: 1)")
+    bench.add_argument("--size", type=int, default=64, help="characters per message (default: 64)")
+    bench.add_argument(
+        "--private",
+        type=float,
+        default=0.0,
+        help="share of private messages to a random other client, 0..1 (default: 0)",
+    )
+    bench.add_argument("--server", choices=["threaded", "async"], default="async", help="server core (default: async)")
+    bench.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="server worker processes (default: 1, the server runs in the bench process)",
+    )
+    bench.add_argument("--protocol", type=int, choices=[1, 2], default=2, help="client protocol version (default: 2)")
+    bench.add_argument("--compression", action="store_true", help="let clients negotiate zlib compression")
+    bench.add_argument("--processes", type=int, default=2, help="client worker processes (default: 2)")
+    bench.add_argument(
+        "--server-rate-limit",
+        type=float,
+        default=0.0,
+        help="server rate limit in messages/s per client, 0 disables it (default: 0)",
+    )
+    bench.add_argument("--no-metrics", action="store_true", help="disable server metrics, to measure their overhead")
+    bench.add_argument(
+        "--lock-profile",
+        action="store_true",
+        help="instrument the server locks and report acquisitions, wait and hold times per lock",
+    )
+    bench.add_argument(
+        "--rooms",
+        type=int,
+        default=1,
+        help="spread the clients evenly over this many rooms (default: 1, everyone in one room)",
+    )
+    bench.add_argument("--seed", type=int, default=1, help="random seed for send times and recipients")
+    bench.add_argument("--label", default=None, help="copied into the output, e.g. a commit id")
+
     return parser
 
 
 def _wire_and_run(logic) -> int:
+    from localchat.client.UIImpl.CLI import CLIMenuUI
+    from localchat.settings import SettingsStore
+
     settings_store = SettingsStore()
     settings = settings_store.load()
     ui = CLIMenuUI(settings=settings, settings_store=settings_store)
@@ -32,20 +179,191 @@ def _wire_and_run(logic) -> int:
     return 0
 
 
+def _run_serve(parser: argparse.ArgumentParser, args) -> int:
+    import os
+
+    from localchat.server.logicImpl import AsyncTcpServerLogic, MessageJournal, TcpServerLogic
+    from localchat.util.event import Event, EventListener
+
+    class _PrintError(EventListener[IOError]):
+        def on_event(self, event: Event[IOError]):
+            error = event.value()
+            cause = error.__cause__
+            print(f"error: {error}" + (f" ({cause})" if cause is not None else ""), file=sys.stderr, flush=True)
+
+    if args.workers != 1:
+        return _run_serve_workers(parser, args, _PrintError())
+
+    server_type = AsyncTcpServerLogic if args.server == "async" else TcpServerLogic
+
+    def room_journal(room_id: str) -> MessageJournal:
+        return MessageJournal(os.path.join(args.journal, "rooms", room_id))
+
+    try:
+        server = server_type(
+            host=args.host,
+            port=args.port,
+            max_clients=args.max_clients,
+            slow_consumer_policy=args.slow_consumer_policy,
+            journal=MessageJournal(args.journal) if args.journal is not None else None,
+            compression=not args.no_compression,
+            rate_limit_msg_per_sec=args.rate_limit,
+            rate_limit_burst=args.rate_limit_burst,
+            address_rate_limit_msg_per_sec=args.address_rate_limit,
+            address_connect_rate=args.address_connect_rate,
+            connect_rate=args.connect_rate,
+            metrics_port=args.metrics_port,
+            lock_profiling=args.lock_profile,
+            max_rooms=args.max_rooms,
+            room_journal_factory=room_journal if args.journal is not None else None,
+        )
+        if args.name is not None:
+            server.set_server_name(args.name)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.password is not None:
+        server.set_server_password(args.password)
+    server.on_error().add_listener(_PrintError())
+
+    stop_requested = _stop_on_signals()
+    try:
+        server.start()
+    except (IOError, OSError) as e:
+        print(f"could not start server: {e}", file=sys.stderr)
+        return 1
+    info = server.get_server_info()
+    ready = f"serving '{info.get_name()}' on {args.host}:{info.get_port()}"
+    if server.get_metrics_port() is not None:
+        ready += f", metrics on http://127.0.0.1:{server.get_metrics_port()}/metrics"
+    print(ready, flush=True)
+    try:
+        _wait_until(stop_requested)
+    finally:
+        server.stop()
+    return 0
+
+
+def _run_serve_workers(parser: argparse.ArgumentParser, args, error_listener) -> int:
+    from localchat.server.cluster import ServerCluster
+
+    if args.journal is not None:
+        parser.error("--journal cannot be combined with --workers: a journal has a single writer")
+    try:
+        cluster = ServerCluster(
+            args.workers,
+            server=args.server,
+            host=args.host,
+            port=args.port,
+            name=args.name,
+            password=args.password,
+            max_rooms=args.max_rooms,
+            metrics_port=args.metrics_port,
+            server_options={
+                "max_clients": args.max_clients,
+                "slow_consumer_policy": args.slow_consumer_policy,
+                "compression": not args.no_compression,
+                "rate_limit_msg_per_sec": args.rate_limit,
+                "rate_limit_burst": args.rate_limit_burst,
+                "address_rate_limit_msg_per_sec": args.address_rate_limit,
+                "address_connect_rate": args.address_connect_rate,
+                "connect_rate": args.connect_rate,
+                "lock_profiling": args.lock_profile,
+            },
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    cluster.on_error().add_listener(error_listener)
+
+    stop_requested = _stop_on_signals()
+    try:
+        cluster.start()
+    except IOError as e:
+        print(f"could not start server: {e}", file=sys.stderr)
+        return 1
+    name = args.name if args.name is not None else DEFAULT_SERVER_NAME
+    ready = f"serving '{name}' on {args.host}:{cluster.get_port()} with {args.workers} workers"
+    metrics_ports = cluster.get_metrics_ports()
+    if len(metrics_ports) > 0:
+        ready += ", metrics on " + ", ".join(f"http://127.0.0.1:{port}/metrics" for port in metrics_ports)
+    print(ready, flush=True)
+    try:
+        _wait_until(stop_requested)
+    finally:
+        cluster.stop()
+    return 0
+
+
+def _stop_on_signals():
+    import signal
+    from threading import Event as ThreadEvent
+
+    stop_requested = ThreadEvent()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signal_number, lambda _signum, _frame: stop_requested.set())
+    return stop_requested
+
+
+def _wait_until(stop_requested):
+    # wait() with a timeout keeps the main thread responsive to signals on every platform.
+    while not stop_requested.wait(1.0):
+        pass
+
+
+def _run_bench(parser: argparse.ArgumentParser, args) -> int:
+    import json
+    from localchat.bench import LoadProfile, run_load
+
+    profile = LoadProfile(
+        clients=args.clients,
+        duration_s=args.duration,
+        warmup_s=args.warmup,
+        rate=args.rate,
+        size=args.size,
+        private_ratio=args.private,
+        server=args.server,
+        server_workers=args.workers,
+        protocol_version=args.protocol,
+        compression=args.compression,
+        processes=args.processes,
+        server_rate_limit=args.server_rate_limit,
+        metrics=not args.no_metrics,
+        lock_profiling=args.lock_profile,
+        rooms=args.rooms,
+        seed=args.seed,
+    )
+    try:
+        profile.validate()
+    except ValueError as e:
+        parser.error(str(e))
+    try:
+        result = run_load(profile)
+    except IOError as e:
+        print(f"bench failed: {e}", file=sys.stderr)
+        return 1
+    if args.label is not None:
+        result["label"] = args.label
+    print(json.dumps(result, sort_keys=True))
+    return 0
+
+
 def main(argv: list[str] | None = None) -> int:
     parser = _build_parser()
     args = parser.parse_args(argv if argv is not None else sys.argv[1:])
 
     command = args.command or "start"
+    if command == "bench":
+        return _run_bench(parser, args)
+    if command == "serve":
+        return _run_serve(parser, args)
     if command != "start":
         parser.error("unsupported command")
 
-    if args.mode == "test":
-        logic = TestLogic()
-        return _wire_and_run(logic)
+    if getattr(args, "mode", "tcp") == "test":
+        from localchat.client.logicImpl.testing import TestLogic
+        return _wire_and_run(TestLogic())
 
-    logic = TcpClientLogic()
-    return _wire_and_run(logic)
+    from localchat.client.logicImpl import TcpClientLogic
+    return _wire_and_run(TcpClientLogic())
 
 
 if __name__ == "__main__":
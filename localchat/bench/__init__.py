@@ -0,0 +1,2 @@
+from .measure import cpu_seconds, peak_rss_bytes, percentile, process_cpu_seconds, process_rss_bytes, rss_bytes
+from .loadgen import LoadProfile, SERVER_KINDS, run_load
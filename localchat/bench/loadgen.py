@@ -0,0 +1,502 @@
+from __future__ import annotations
+
+import heapq
+import multiprocessing
+import platform
+import random
+from array import array
+from dataclasses import asdict, dataclass
+from selectors import DefaultSelector, EVENT_READ, EVENT_WRITE
+from socket import AF_INET, SOCK_STREAM, socket
+from time import monotonic, monotonic_ns, sleep
+from uuid import UUID, uuid4
+
+from localchat.config.defaults import ASYNC_HARD_MAX_CLIENTS, HARD_MAX_CLIENTS
+from localchat.config.limits import MAX_MESSAGE_LENGTH, MAX_ROOMS, MAX_SERVER_WORKERS
+from localchat.net import SerializableUser, SerializableUserMessage, UserInterner, tcp_protocol
+from .measure import cpu_seconds, peak_rss_bytes, percentile, process_cpu_seconds, process_rss_bytes, rss_bytes
+
+
+SERVER_KINDS = ("threaded", "async")
+# Send time (monotonic_ns, hex) at the start of every message text, followed by padding.
+_STAMP_LENGTH = 16
+_START_DELAY_S = 0.2
+_JOIN_TIMEOUT_S = 60.0
+
+
+@dataclass(frozen=True)
+class LoadProfile:
+    """
+    What `localchat bench` runs: `clients` tcp_protocol clients in `processes` worker processes,
+    each sending `rate` messages per second of `size` characters, `private_ratio` of them
+    as private messages to a random other client. With `rooms` > 1 the clients are spread
+    evenly over that many rooms, so every message only reaches the clients of one room.
+    With `server_workers` > 1 the server is a ServerCluster of that many processes.
+    """
+    clients: int = 50
+    duration_s: float = 10.0
+    warmup_s: float = 1.0
+    drain_s: float = 1.0
+    rate: float = 1.0
+    size: int = 64
+    private_ratio: float = 0.0
+    server: str = "async"
+    server_workers: int = 1
+    protocol_version: int = tcp_protocol.PROTOCOL_VERSION
+    compression: bool = False
+    processes: int = 2
+    server_rate_limit: float = 0.0
+    metrics: bool = True
+    lock_profiling: bool = False
+    rooms: int = 1
+    seed: int = 1
+
+    def validate(self):
+        """
+        :raises ValueError: if the profile cannot be run
+        """
+        if self.server not in SERVER_KINDS:
+            raise ValueError(f"server must be one of {', '.join(SERVER_KINDS)}")
+        hard_limit = HARD_MAX_CLIENTS if self.server == "threaded" else ASYNC_HARD_MAX_CLIENTS
+        if self.clients <= 0 or self.clients > hard_limit:
+            raise ValueError(f"clients must be in range 1..{hard_limit} for the {self.server} server")
+        if self.duration_s <= 0 or self.warmup_s < 0 or self.drain_s < 0:
+            raise ValueError("duration must be positive, warmup and drain must not be negative")
+        if self.rate <= 0:
+            raise ValueError("rate must be positive")
+        if self.size <= _STAMP_LENGTH or self.size > MAX_MESSAGE_LENGTH:
+            raise ValueError(f"size must be in range {_STAMP_LENGTH + 1}..{MAX_MESSAGE_LENGTH}")
+        if not 0.0 <= self.private_ratio <= 1.0:
+            raise ValueError("private ratio must be in range 0..1")
+        if self.protocol_version not in (tcp_protocol.PROTOCOL_V1, tcp_protocol.PROTOCOL_V2):
+            raise ValueError("protocol version must be 1 or 2")
+        if self.processes <= 0:
+            raise ValueError("processes must be positive")
+        if self.server_rate_limit < 0:
+            raise ValueError("server rate limit must not be negative")
+        if self.rooms <= 0 or self.rooms > min(self.clients, MAX_ROOMS):
+            raise ValueError(f"rooms must be in range 1..{min(self.clients, MAX_ROOMS)}")
+        if self.server_workers <= 0 or self.server_workers > MAX_SERVER_WORKERS:
+            raise ValueError(f"server workers must be in range 1..{MAX_SERVER_WORKERS}")
+        if self.server_workers > 1 and self.lock_profiling:
+            raise ValueError("lock profiling needs the server in the bench process (one server worker)")
+
+    def room_of(self, client_index: int) -> str | None:
+        """
+        :return: room of the client_index-th client (None: the default room)
+        """
+        return None if self.rooms == 1 else f"bench-{client_index % self.rooms}"
+
+    def room_size(self, client_index: int) -> int:
+        """
+        :return: clients in the room of the client_index-th client, itself included
+        """
+        room_index = client_index % self.rooms
+        return self.clients // self.rooms + (1 if room_index < self.clients % self.rooms else 0)
+
+
+class _ServerUnderTest:
+    """
+    The server a run measures: a server in this process, or a ServerCluster whose worker
+    processes are measured together with the coordinator in this process.
+    """
+
+    def __init__(self, profile: LoadProfile):
+        options = {
+            "max_clients": profile.clients,
+            "compression": profile.compression,
+            "rate_limit_msg_per_sec": profile.server_rate_limit,
+            # Every client connects from 127.0.0.1, so per-address and accept-rate limits would only measure themselves.
+            "address_connect_rate": 0,
+            "connect_rate": 0,
+            "address_rate_limit_msg_per_sec": 0,
+        }
+        self._cluster = None
+        self._server = None
+        if profile.server_workers > 1:
+            from localchat.server.cluster import ServerCluster
+            self._cluster = ServerCluster(
+                profile.server_workers,
+                server=profile.server,
+                host="127.0.0.1",
+                port=0,
+                metrics=profile.metrics,
+                server_options=options,
+            )
+            return
+        from localchat.server.logicImpl import AsyncTcpServerLogic, TcpServerLogic
+        from localchat.util.metrics import MetricsRegistry
+
+        server_type = AsyncTcpServerLogic if profile.server == "async" else TcpServerLogic
+        self._server = server_type(
+            host="127.0.0.1",
+            port=0,
+            metrics=MetricsRegistry(enabled=profile.metrics),
+            lock_profiling=profile.lock_profiling,
+            **options,
+        )
+
+    def start(self) -> int:
+        """
+        :return: the port
+        """
+        if self._cluster is not None:
+            self._cluster.start()
+            return self._cluster.get_port()
+        self._server.start()
+        return self._server.get_server_info().get_port()
+
+    def stop(self):
+        if self._cluster is not None:
+            self._cluster.stop()
+        else:
+            self._server.stop()
+
+    def _worker_pids(self) -> list[int]:
+        return self._cluster.get_worker_pids() if self._cluster is not None else []
+
+    def cpu_seconds(self) -> float:
+        return cpu_seconds() + sum(process_cpu_seconds(pid) for pid in self._worker_pids())
+
+    def rss_bytes(self) -> int:
+        return rss_bytes() + sum(process_rss_bytes(pid) for pid in self._worker_pids())
+
+    def peak_rss_bytes(self) -> int:
+        return peak_rss_bytes() + sum(process_rss_bytes(pid, peak=True) for pid in self._worker_pids())
+
+    def lock_report(self) -> list[dict]:
+        if self._server is None:
+            return []
+        from localchat.util.metrics import lock_report
+        return lock_report(self._server.get_metrics())
+
+
+def run_load(profile: LoadProfile) -> dict:
+    """
+    Starts a server on loopback, drives it with the profile's clients from worker processes
+    and returns the results as one flat, JSON-serializable dict.
+    Only the server (or with server_workers > 1 its coordinator) runs in this process during
+    the measurement, so its CPU time and RSS are the server's; a cluster's worker processes
+    are added to them.
+    :raises ValueError: if the profile is invalid
+    :raises IOError: if the server or a worker cannot start, or a worker cannot join its clients or fails
+    """
+    profile.validate()
+    server = _ServerUnderTest(profile)
+    rss_idle = rss_bytes()
+    port = server.start()
+    if profile.server_workers > 1:
+        # The workers' own idle size, not just this process before they existed.
+        rss_idle = server.rss_bytes()
+    context = multiprocessing.get_context("spawn")
+    processes = min(profile.processes, profile.clients)
+    workers = []
+    try:
+        first_index = 0
+        for worker_index in range(processes):
+            client_count = profile.clients // processes + (1 if worker_index < profile.clients % processes else 0)
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(
+                target=_run_worker,
+                args=(child_conn, "127.0.0.1", port, first_index, client_count, profile, profile.seed + worker_index),
+                name=f"localchat-bench-{worker_index}",
+                daemon=True,
+            )
+            process.start()
+            child_conn.close()
+            workers.append((process, parent_conn))
+            first_index += client_count
+
+        user_ids: list[UUID] = []
+        for _, conn in workers:
+            user_ids.extend(_expect(conn, "joined", _JOIN_TIMEOUT_S))
+        rss_joined = server.rss_bytes()
+
+        start_at = monotonic() + _START_DELAY_S
+        measure_from = start_at + profile.warmup_s
+        stop_at = measure_from + profile.duration_s
+        for _, conn in workers:
+            conn.send(("start", user_ids, start_at, measure_from, stop_at))
+
+        _sleep_until(measure_from)
+        cpu_before = server.cpu_seconds()
+        _sleep_until(stop_at)
+        cpu_used = server.cpu_seconds() - cpu_before
+        rss_loaded = server.rss_bytes()
+        peak_rss = server.peak_rss_bytes()
+
+        reports = [_expect(conn, "done", profile.drain_s + profile.duration_s + _JOIN_TIMEOUT_S) for _, conn in workers]
+    finally:
+        for process, conn in workers:
+            process.join(5.0)
+            if process.is_alive():
+                process.terminate()
+            conn.close()
+        server.stop()
+
+    latencies_ms: list[float] = []
+    totals = {
+        "sent_public": 0,
+        "sent_private": 0,
+        "expected_deliveries": 0,
+        "received_public": 0,
+        "received_private": 0,
+        "errors": 0,
+        "disconnected": 0,
+    }
+    for report in reports:
+        latencies_ms.extend(value / 1e6 for value in report.pop("latencies_ns"))
+        for key in totals:
+            totals[key] += report[key]
+    sent = totals["sent_public"] + totals["sent_private"]
+    received = totals["received_public"] + totals["received_private"]
+    expected = totals["expected_deliveries"]
+    result = asdict(profile)
+    result.update(totals)
+    result.update({
+        "sent_msgs_per_s": round(sent / profile.duration_s, 1),
+        "delivered_msgs_per_s": round(received / profile.duration_s, 1),
+        "delivery_ratio": round(received / expected, 4) if expected > 0 else 0.0,
+        "latency_p50_ms": round(percentile(latencies_ms, 0.50), 3),
+        "latency_p99_ms": round(percentile(latencies_ms, 0.99), 3),
+        "latency_p999_ms": round(percentile(latencies_ms, 0.999), 3),
+        "latency_max_ms": round(max(latencies_ms, default=0.0), 3),
+        "server_cpu_s": round(cpu_used, 3),
+        "server_cpu_percent": round(cpu_used / profile.duration_s * 100.0, 1),
+        "server_rss_bytes": rss_loaded,
+        "server_rss_per_client_bytes": (rss_joined - rss_idle) // profile.clients,
+        "server_peak_rss_bytes": peak_rss,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+    })
+    # Whole run (joins and warmup included): lock_<name>_* per profiled lock.
+    for entry in server.lock_report():
+        prefix = f"lock_{entry['lock']}_"
+        result[prefix + "acquisitions"] = entry["acquisitions"]
+        result[prefix + "contended"] = entry["contended"]
+        result[prefix + "wait_total_ms"] = round(entry["wait_total_s"] * 1000, 3)
+        result[prefix + "wait_p99_us"] = round(entry["wait_p99_s"] * 1e6, 2)
+        result[prefix + "hold_total_ms"] = round(entry["hold_total_s"] * 1000, 3)
+        result[prefix + "hold_p99_us"] = round(entry["hold_p99_s"] * 1e6, 2)
+    return result
+
+
+def _expect(conn, kind: str, timeout_s: float):
+    if not conn.poll(timeout_s):
+        raise IOError(f"benchmark worker did not report '{kind}' in time")
+    message = conn.recv()
+    if message[0] == "failed":
+        raise IOError(f"benchmark worker failed: {message[1]}")
+    if message[0] != kind:
+        raise IOError(f"unexpected benchmark worker report: {message[0]}")
+    return message[1]
+
+
+def _sleep_until(deadline: float):
+    remaining = deadline - monotonic()
+    if remaining > 0:
+        sleep(remaining)
+
+
+class _Client:
+    __slots__ = ("sock", "receiver", "user_id", "index", "outbox", "next_send", "writing", "closed")
+
+    def __init__(self, sock: socket, receiver: tcp_protocol.PacketReceiver, user_id: UUID, index: int):
+        self.sock = sock
+        self.receiver = receiver
+        self.user_id = user_id
+        # Position among all clients of the run (decides the room)
+        self.index = index
+        self.outbox = bytearray()
+        self.next_send = 0.0
+        self.writing = False
+        self.closed = False
+
+
+def _run_worker(conn, host: str, port: int, first_index: int, client_count: int, profile: LoadProfile, seed: int):
+    try:
+        clients = [
+            _join(host, port, f"bench-{seed}-{idx}", profile, first_index + idx)
+            for idx in range(client_count)
+        ]
+        conn.send(("joined", [client.user_id for client in clients]))
+        _, user_ids, start_at, measure_from, stop_at = conn.recv()
+        report = _drive(clients, user_ids, profile, random.Random(seed), start_at, measure_from, stop_at)
+        conn.send(("done", report))
+    except Exception as e:
+        conn.send(("failed", repr(e)))
+    finally:
+        conn.close()
+
+
+def _join(host: str, port: int, name: str, profile: LoadProfile, index: int) -> _Client:
+    capabilities = tcp_protocol.CAP_ZLIB if profile.compression else 0
+    sock = socket(AF_INET, SOCK_STREAM)
+    sock.settimeout(_JOIN_TIMEOUT_S)
+    sock.connect((host, port))
+    tcp_protocol.set_no_delay(sock)
+    receiver = tcp_protocol.PacketReceiver(sock)
+    if capabilities != 0:
+        receiver.set_decompressor(tcp_protocol.PayloadDecompressor())
+    tcp_protocol.send_packet(
+        sock,
+        tcp_protocol.encode_join(SerializableUser(uuid4(), name), profile.protocol_version, capabilities, profile.room_of(index)),
+    )
+    while True:
+        packet_type, body = tcp_protocol.decode_client_packet(receiver.recv_packet())
+        if packet_type == tcp_protocol.PT_S_JOIN_NACK:
+            code, message = tcp_protocol.decode_server_join_nack(body)
+            raise IOError(f"join rejected: {code} {message}")
+        if packet_type == tcp_protocol.PT_S_JOIN_ACK:
+            user, _, accepted = tcp_protocol.decode_server_join_ack_negotiation(body)
+            if not accepted & tcp_protocol.CAP_ZLIB:
+                receiver.set_decompressor(None)
+            sock.setblocking(False)
+            return _Client(sock, receiver, user.get_id(), index)
+
+
+def _drive(
+    clients: list[_Client],
+    user_ids: list[UUID],
+    profile: LoadProfile,
+    rng: random.Random,
+    start_at: float,
+    measure_from: float,
+    stop_at: float,
+) -> dict:
+    v2 = profile.protocol_version >= tcp_protocol.PROTOCOL_V2
+    encode_public = tcp_protocol.encode_public_message_v2 if v2 else tcp_protocol.encode_public_message
+    encode_private = tcp_protocol.encode_private_message_v2 if v2 else tcp_protocol.encode_private_message
+    users = UserInterner()
+    padding = "x" * (profile.size - _STAMP_LENGTH)
+    interval = 1.0 / profile.rate
+    measure_from_ns = int(measure_from * 1e9)
+    stop_at_ns = int(stop_at * 1e9)
+    report = {
+        "sent_public": 0,
+        "sent_private": 0,
+        "expected_deliveries": 0,
+        "received_public": 0,
+        "received_private": 0,
+        "errors": 0,
+        "disconnected": 0,
+    }
+    latencies_ns = array("q")
+
+    selector = DefaultSelector()
+    schedule: list[tuple[float, int]] = []
+    for idx, client in enumerate(clients):
+        selector.register(client.sock, EVENT_READ, client)
+        # Spread the first sends over one interval so the clients do not fire in lockstep.
+        client.next_send = start_at + rng.random() * interval
+        schedule.append((client.next_send, idx))
+    heapq.heapify(schedule)
+
+    def close(client: _Client):
+        if not client.closed:
+            client.closed = True
+            report["disconnected"] += 1
+            selector.unregister(client.sock)
+            client.sock.close()
+
+    def flush(client: _Client):
+        try:
+            sent = client.sock.send(client.outbox)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            close(client)
+            return
+        del client.outbox[:sent]
+        writing = len(client.outbox) > 0
+        if writing != client.writing:
+            client.writing = writing
+            selector.modify(client.sock, EVENT_READ | EVENT_WRITE if writing else EVENT_READ, client)
+
+    def receive(client: _Client):
+        try:
+            if client.receiver.fill() == 0:
+                close(client)
+                return
+            payload = client.receiver.next_packet()
+            while payload is not None:
+                packet_type, body = tcp_protocol.decode_client_packet(payload)
+                if packet_type == tcp_protocol.PT_S_PUBLIC or packet_type == tcp_protocol.PT_S_PRIVATE:
+                    if v2:
+                        tcp_protocol.decode_varint(body)
+                        text = tcp_protocol.decode_public_message_v2(body)
+                    else:
+                        text = SerializableUserMessage.deserialize(body, users).message()
+                    sent_ns = int(text[:_STAMP_LENGTH], 16)
+                    if measure_from_ns <= sent_ns < stop_at_ns:
+                        latencies_ns.append(monotonic_ns() - sent_ns)
+                        if packet_type == tcp_protocol.PT_S_PUBLIC:
+                            report["received_public"] += 1
+                        else:
+                            report["received_private"] += 1
+                elif packet_type == tcp_protocol.PT_S_ERROR:
+                    report["errors"] += 1
+                payload = client.receiver.next_packet()
+        except BlockingIOError:
+            return
+        except (OSError, ValueError):
+            close(client)
+
+    drain_until = stop_at + profile.drain_s
+    while True:
+        now = monotonic()
+        if now >= drain_until:
+            break
+        timeout = drain_until - now
+        if len(schedule) > 0:
+            timeout = min(timeout, max(0.0, schedule[0][0] - now))
+        for key, events in selector.select(timeout):
+            client = key.data
+            if events & EVENT_READ:
+                receive(client)
+            if events & EVENT_WRITE and not client.closed:
+                flush(client)
+
+        now = monotonic()
+        while len(schedule) > 0 and schedule[0][0] <= now:
+            due, idx = heapq.heappop(schedule)
+            client = clients[idx]
+            if client.closed or due >= stop_at:
+                continue
+            sent_ns = monotonic_ns()
+            text = f"{sent_ns:016x}{padding}"
+            in_window = measure_from_ns <= sent_ns < stop_at_ns
+            room_size = profile.room_size(client.index)
+            if profile.private_ratio > 0 and room_size > 1 and rng.random() < profile.private_ratio:
+                # user_ids is in client order, so the room's members are every rooms-th id.
+                room_ids = user_ids[client.index % profile.rooms::profile.rooms]
+                recipient = rng.choice(room_ids)
+                while recipient == client.user_id:
+                    recipient = rng.choice(room_ids)
+                client.outbox += _frame(encode_private(recipient, text))
+                if in_window:
+                    report["sent_private"] += 1
+                    report["expected_deliveries"] += 1
+            else:
+                client.outbox += _frame(encode_public(text))
+                if in_window:
+                    report["sent_public"] += 1
+                    report["expected_deliveries"] += room_size
+            if not client.writing:
+                flush(client)
+            # Open loop: the schedule does not wait for the server. After a stall it resumes
+            # from now instead of firing the whole backlog at once.
+            heapq.heappush(schedule, (max(due + interval, now - interval), idx))
+
+    for client in clients:
+        if not client.closed:
+            client.closed = True
+            selector.unregister(client.sock)
+            client.sock.close()
+    selector.close()
+    report["latencies_ns"] = latencies_ns
+    return report
+
+
+def _frame(payload: bytes) -> bytes:
+    return len(payload).to_bytes(4, "big") + payload
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import sys
+import time
+
+
+def rss_bytes() -> int:
+    """
+    Current resident set size of this process.
+    Falls back to the peak RSS where /proc is not available.
+    """
+    try:
+        with open("/proc/self/statm", "r") as statm:
+            pages = int(statm.read().split()[1])
+        from os import sysconf
+        return pages * sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, ImportError):
+        return peak_rss_bytes()
+
+
+def peak_rss_bytes() -> int:
+    """
+    Highest resident set size of this process so far (0 where unknown).
+    """
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def cpu_seconds() -> float:
+    """
+    User + system CPU time of this process (all threads).
+    """
+    return time.process_time()
+
+
+def percentile(values, fraction: float) -> float:
+    if len(values) == 0:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def process_cpu_seconds(pid: int) -> float:
+    """
+    User + system CPU time of another process, from /proc (0.0 where that is not available).
+    """
+    try:
+        with open(f"/proc/{pid}/stat", "r") as stat:
+            # The command name may contain spaces; the fields after it are fixed.
+            fields = stat.read().rsplit(")", 1)[1].split()
+        from os import sysconf
+        return (int(fields[11]) + int(fields[12])) / sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, ImportError):
+        return 0.0
+
+
+def process_rss_bytes(pid: int, peak: bool = False) -> int:
+    """
+    Current (or with peak: highest) resident set size of another process, from /proc
+    (0 where that is not available).
+    """
+    key = "VmHWM:" if peak else "VmRSS:"
+    try:
+        with open(f"/proc/{pid}/status", "r") as status:
+            for line in status:
+                if line.startswith(key):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0
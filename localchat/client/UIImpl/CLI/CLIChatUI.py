@@ -20,6 +20,20 @@ class _ValueListener(EventListener[_T]):
         self._callback(event.value())
 
 
+class _PublicMessageListener(_ValueListener[UserMessage]):
+    """
+    Writes a burst of public messages (see EventHandler.handle_all) with a single output call.
+    """
+
+    def __init__(self, format_message: Callable[[UserMessage], str], output_writer: Callable[[str], None]):
+        super().__init__(lambda message: output_writer(format_message(message)))
+        self._format_message = format_message
+        self._output_writer = output_writer
+
+    def on_events(self, events: list[Event[UserMessage]]):
+        self._output_writer("\n".join(self._format_message(event.value()) for event in events))
+
+
 class CLIChatUI:
     def __init__(
         self,
@@ -37,7 +51,7 @@ class CLIChatUI:
         self._active = True
         self._command_registry = ChatCommandRegistry(chat=self._chat, output_writer=self._output_writer)
 
-        self._message_listener = _ValueListener(self._on_public_message)
+        self._message_listener = _PublicMessageListener(self._format_public_message, self._output_writer)
         self._private_message_listener = _ValueListener(self._on_private_message)
         self._user_joined_listener = _ValueListener(self._on_user_joined)
         self._user_left_listener = _ValueListener(self._on_user_left)
@@ -105,13 +119,12 @@ class CLIChatUI:
         self._chat.on_user_became_host().remove_listener(self._user_became_host_listener)
         self._chat.on_connection_failure().remove_listener(self._connection_failure_listener)
 
-    def _on_public_message(self, user_message: UserMessage):
+    def _format_public_message(self, user_message: UserMessage) -> str:
         sender = user_message.sender()
         prefix = self._timestamp_prefix(user_message.timestamp())
         if sender == self._chat.get_server_user():
-            self._output_writer(f"{prefix}[SERVER]: {user_message.message()}")
-            return
-        self._output_writer(f"{prefix}{sender.get_name()}: {user_message.message()}")
+            return f"{prefix}[SERVER]: {user_message.message()}"
+        return f"{prefix}{sender.get_name()}: {user_message.message()}"
 
     def _on_private_message(self, user_message: UserMessage):
         sender = user_message.sender()
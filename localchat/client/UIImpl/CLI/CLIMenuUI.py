@@ -10,7 +10,6 @@ from localchat.client.UIImpl.CLI.CLIChatUI import CLIChatUI
 from localchat.client.UIImpl.CLI.CLISettingsUI import CLISettingsUI
 from localchat.client.parsing.join_target import parse_join_target
 from localchat.config.defaults import DEFAULT_HOST, DEFAULT_PORT, DEFAULT_MAX_CLIENTS, HARD_MAX_CLIENTS
-from localchat.server.logicImpl import TcpServerLogic
 from localchat.settings import AppSettings, SettingsStore
 from localchat.util import Chat, ChatInformation, User
 
@@ -71,6 +70,12 @@ class _ServerControl(Protocol):
     def get_server_info(self) -> ChatInformation: ...
 
 
+def _create_tcp_server(host: str, port: int, max_clients: int = DEFAULT_MAX_CLIENTS) -> _ServerControl:
+    # Imported on first use, so a client that never hosts does not load the server package.
+    from localchat.server.logicImpl import TcpServerLogic
+    return TcpServerLogic(host, port, max_clients)
+
+
 class CLIMenuUI(AbstractUI):
     def __init__(
         self,
@@ -83,7 +88,7 @@ class CLIMenuUI(AbstractUI):
         super().__init__()
         self._input_reader = input_reader
         self._output_writer = output_writer
-        self._server_factory = server_factory if server_factory is not None else TcpServerLogic
+        self._server_factory = server_factory if server_factory is not None else _create_tcp_server
         self._settings = settings if settings is not None else AppSettings.default()
         self._settings_store = settings_store
         self._active = True
@@ -291,10 +296,6 @@ class CLIMenuUI(AbstractUI):
         room_hint: str | None = None,
         skip_trust_prompt: bool = False,
     ) -> bool:
-        if room_hint is not None:
-            self._output_writer(
-                f"Join room hint detected ('{room_hint}'). TCP CLI currently uses host/port only."
-            )
         if not skip_trust_prompt:
             trust = self._read_line(f"Trust server {host}:{port}? (y/N): ")
             if trust is None:
@@ -303,17 +304,25 @@ class CLIMenuUI(AbstractUI):
                 self._output_writer("Join cancelled.")
                 return False
         try:
-            chat = self._create_direct_chat(host, port, chat_name)
+            chat = self._create_direct_chat(host, port, chat_name, room_hint)
         except (IOError, ValueError) as e:
             self._output_writer(f"I/O error while creating chat: {e}")
             return False
         self._open_chat(chat)
         return True
 
-    def _create_direct_chat(self, host: str, port: int, chat_name: str) -> Chat:
+    def _create_direct_chat(self, host: str, port: int, chat_name: str, room: str | None = None) -> Chat:
         connect_direct = getattr(self.logic, "connect_direct", None)
         if callable(connect_direct):
-            return connect_direct(host, port, chat_name)
+            if room is None:
+                return connect_direct(host, port, chat_name)
+            self._output_writer(f"Joining room '{room}'.")
+            return connect_direct(host, port, chat_name, room)
+
+        if room is not None:
+            self._output_writer(
+                f"Join room hint detected ('{room}'). This chat backend uses host/port only."
+            )
 
         chat_info = _DirectConnectChatInformation(
             chat_id=uuid4(),
@@ -1,3 +1,12 @@
+from importlib import import_module
+
 from .AbstractUI import AbstractUI
-from . import CLI
-from . import simple
+
+_LAZY_SUBMODULES = ("CLI", "simple")
+
+
+def __getattr__(name: str):
+    # Each UI is only loaded when it is used.
+    if name in _LAZY_SUBMODULES:
+        return import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,4 +1,12 @@
+from importlib import import_module
+
 from .UI import UI
 from .logic import Logic
-from . import UIImpl
-from . import logicImpl
+
+_LAZY_SUBMODULES = ("UIImpl", "logicImpl")
+
+
+def __getattr__(name: str):
+    if name in _LAZY_SUBMODULES:
+        return import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
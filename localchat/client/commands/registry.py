@@ -34,6 +34,20 @@ class ChatCommandRegistry:
             self._show_help()
             return CommandResult(True)
 
+        if command == "/history" or command.startswith("/history "):
+            argument = command[len("/history"):].strip()
+            if len(argument) > 0 and (not argument.isdigit() or int(argument) <= 0):
+                self._output_writer("Usage: /history [count]")
+                return CommandResult(True)
+            try:
+                replayed = self._chat.replay_history(int(argument) if len(argument) > 0 else 0)
+            except NotImplementedError:
+                self._output_writer("This chat keeps no history.")
+                return CommandResult(True)
+            if replayed == 0:
+                self._output_writer("No earlier messages.")
+            return CommandResult(True)
+
         if command.startswith("/say"):
             message = command[4:].strip()
             if len(message) == 0:
@@ -53,6 +67,7 @@ class ChatCommandRegistry:
         self._output_writer("Available chat commands:")
         self._output_writer("/help   -> show help")
         self._output_writer("/leave  -> return to main menu")
+        self._output_writer("/history [count] -> show the latest public messages")
         #self._output_writer("/say <text> -> send public message")
         self._output_writer("/<command> -> forwarded to server command dispatcher")
 
@@ -1,5 +1,5 @@
 from localchat.util import Chat, User, UserMessage
-from localchat.util.event import EventHandler
+from localchat.util.event import EventDispatcher, EventHandler
 from threading import RLock
 from typing import final
 
@@ -27,6 +27,20 @@ class AbstractChat(Chat):
         self._connection_problem_handler.clear_listeners()
         self._connection_failure_handler.clear_listeners()
 
+    @final
+    def set_event_dispatcher(self, dispatcher: EventDispatcher | None):
+        """
+        Delivers the events of all handlers through dispatcher (None: synchronously on the receiving thread).
+        One dispatcher keeps the order across handlers, e.g. a join before the member's first message.
+        """
+        self._user_joined_handler.set_dispatcher(dispatcher)
+        self._user_left_handler.set_dispatcher(dispatcher)
+        self._user_became_host_handler.set_dispatcher(dispatcher)
+        self._user_posted_message_handler.set_dispatcher(dispatcher)
+        self._user_send_message_handler.set_dispatcher(dispatcher)
+        self._connection_problem_handler.set_dispatcher(dispatcher)
+        self._connection_failure_handler.set_dispatcher(dispatcher)
+
     @final
     def on_user_joined(self) -> EventHandler[User]:
         return self._user_joined_handler
@@ -2,13 +2,14 @@ from __future__ import annotations
 
 from collections import deque
 from ipaddress import IPv4Address, IPv6Address, ip_address
+from queue import Empty, Queue
 from socket import AF_INET, SOCK_STREAM, gaierror, gethostbyname, socket
 from threading import Event as ThreadEvent, Lock, Thread
 from time import time
 from uuid import UUID
 
 from localchat.client.logicImpl import AbstractChat
-from localchat.net import SerializableUser, SerializableUserMessage, tcp_protocol
+from localchat.net import SerializableUser, SerializableUserMessage, UserInterner, UserMessageListWriter, tcp_protocol
 from localchat.util import BinaryIOBase, ChatInformation, User, UserMessage
 from localchat.util.event import Event
 
@@ -67,20 +68,47 @@ class TcpChat(AbstractChat):
     _JOIN_TIMEOUT_S = 2.0
     _UNKNOWN_PACKET_WINDOW_S = 10.0
     _UNKNOWN_PACKET_THRESHOLD = 4
-
-    def __init__(self, chat_id: UUID, chat_name: str, host: str, port: int):
+    _HISTORY_TIMEOUT_S = 10.0
+
+    def __init__(
+            self,
+            chat_id: UUID,
+            chat_name: str,
+            host: str,
+            port: int,
+            compression: bool = True,
+            room: str | None = None,
+    ):
+        """
+        :param room: room of the server to join (None: its default room)
+        """
         super().__init__()
         self._chat_info = _TcpChatInformation(chat_id, chat_name, host, port)
+        self._room = room
         self._server_user = SerializableUser(chat_id, "server")
         self._members_by_id: dict[UUID, User] = {}
         self._appearance: User | None = None
 
         self._socket: socket | None = None
+        self._receiver: tcp_protocol.PacketReceiver | None = None
         self._recv_thread: Thread | None = None
         self._recv_stop = ThreadEvent()
         self._send_lock = Lock()
         self._joined = False
         self._unknown_packet_timestamps = deque()
+        self._protocol_version = tcp_protocol.PROTOCOL_V1
+        self._users_by_handle: dict[int, User] = {}
+        # Decoded senders are shared per (id, name); only the receive loop uses it.
+        self._users = UserInterner()
+        self._offered_capabilities = tcp_protocol.SUPPORTED_CAPABILITIES
+        if not compression:
+            self._offered_capabilities &= ~tcp_protocol.CAP_ZLIB
+        self._capabilities = 0
+        # Guarded by _send_lock: compressed payloads must be sent in compression order.
+        self._compressor: tcp_protocol.PayloadCompressor | None = None
+        # One history request at a time; the receive loop hands its page over (None: connection lost).
+        self._history_lock = Lock()
+        self._history_pages: Queue | None = None
 
     def get_chat_info(self) -> ChatInformation:
         return _TcpChatInformation(
@@ -103,10 +131,29 @@ class TcpChat(AbstractChat):
             port = self._chat_info.get_port()
 
         sock = socket(AF_INET, SOCK_STREAM)
+        # Shared by the join handshake and the receive loop: it may already hold packets after the ACK.
+        receiver = tcp_protocol.PacketReceiver(sock)
+        if self._offered_capabilities & tcp_protocol.CAP_ZLIB:
+            # The server may compress packets it queues before the ACK.
+            receiver.set_decompressor(tcp_protocol.PayloadDecompressor())
+        with self._send_lock:
+            self._compressor = None
         try:
             sock.connect((host, port))
-            self._send_packet(sock, tcp_protocol.encode_join(appearance))
-            acknowledged_user, pending_packets = self._wait_for_join_ack(sock)
+            tcp_protocol.set_no_delay(sock)
+            self._send_packet(
+                sock,
+                tcp_protocol.encode_join(
+                    appearance,
+                    tcp_protocol.PROTOCOL_VERSION,
+                    self._offered_capabilities,
+                    self._room,
+                ),
+            )
+            acknowledged_user, protocol_version, capabilities, pending_packets = self._wait_for_join_ack(
+                sock,
+                receiver,
+            )
         except OSError as e:
             sock.close()
             raise IOError("failed to connect/join chat") from e
@@ -116,11 +163,22 @@ class TcpChat(AbstractChat):
 
         with self._lock:
             self._update_local_appearance_after_join(appearance, acknowledged_user)
+            self._protocol_version = protocol_version
+            self._capabilities = capabilities
+            self._users_by_handle = {}
+            if capabilities & tcp_protocol.CAP_ZLIB:
+                with self._send_lock:
+                    self._compressor = tcp_protocol.PayloadCompressor()
+            else:
+                receiver.set_decompressor(None)
             self._socket = sock
+            self._receiver = receiver
             self._joined = True
             self._recv_stop.clear()
+            burst: list[Event] = []
             for packet_type, body in pending_packets:
-                self._handle_packet(packet_type, body)
+                self._handle_packet(packet_type, body, burst)
+            self._deliver_public_burst(burst)
             self._recv_thread = Thread(target=self._recv_loop, name=f"tcp chat recv {host}:{port}", daemon=True)
             self._recv_thread.start()
 
@@ -133,7 +191,9 @@ class TcpChat(AbstractChat):
             self._recv_stop.set()
             recv_thread = self._recv_thread
             self._socket = None
+            self._receiver = None
             self._recv_thread = None
+            self._abort_history_wait()
 
         if sock is not None:
             try:
@@ -159,17 +219,96 @@ class TcpChat(AbstractChat):
             if not self._joined or self._socket is None:
                 raise RuntimeError("user is not a member of the chat")
             sock = self._socket
-        self._send_packet(sock, tcp_protocol.encode_public_message(message))
+            protocol_version = self._protocol_version
+        if protocol_version >= tcp_protocol.PROTOCOL_V2:
+            payload = tcp_protocol.encode_public_message_v2(message)
+        else:
+            payload = tcp_protocol.encode_public_message(message)
+        self._send_packet(sock, payload)
 
     def send_private_message(self, recipient: User, message: str):
         with self._lock:
             if not self._joined or self._socket is None:
                 raise RuntimeError("user is not a member of the chat")
             sock = self._socket
-        self._send_packet(sock, tcp_protocol.encode_private_message(recipient.get_id(), message))
+            protocol_version = self._protocol_version
+        if protocol_version >= tcp_protocol.PROTOCOL_V2:
+            payload = tcp_protocol.encode_private_message_v2(recipient.get_id(), message)
+        else:
+            payload = tcp_protocol.encode_private_message(recipient.get_id(), message)
+        self._send_packet(sock, payload)
 
     def download_chat(self, output_stream: BinaryIOBase):
-        raise NotImplementedError()
+        """
+        Downloads the server's public chat log page by page and writes it in the
+        SerializableUserMessageList format. Pages are staged in a temporary file, not in memory.
+        Messages posted while the download runs are not included.
+        """
+        with UserMessageListWriter() as writer:
+            # The server starts at its oldest message if that has a higher sequence number.
+            first_seq, end_seq, messages = self.fetch_history(tcp_protocol.HISTORY_FROM_SEQ, 0)
+            next_seq = first_seq
+            while True:
+                if first_seq != next_seq or (len(messages) == 0 and next_seq < end_seq):
+                    raise IOError("chat log changed during the download")
+                messages = messages[:end_seq - next_seq]
+                writer.extend(messages)
+                next_seq += len(messages)
+                if next_seq >= end_seq:
+                    break
+                first_seq, _, messages = self.fetch_history(tcp_protocol.HISTORY_FROM_SEQ, next_seq)
+            writer.write_to(output_stream)
+
+    def fetch_history(
+            self,
+            selector: int,
+            anchor: int | float = 0,
+            limit: int = 0,
+    ) -> tuple[int, int, list[SerializableUserMessage]]:
+        """
+        Requests one page of the server's public chat log.
+        :param selector: one of tcp_protocol.HISTORY_*
+        :param anchor: sequence number or timestamp the selector refers to
+        :param limit: maximum number of messages; 0 or more than the server allows means the server maximum
+        :return: sequence number of the first message, end sequence number of the server log and the messages
+        :raises IOError: if the server does not support history pages or does not answer
+        :raises RuntimeError: if the user is not a member of the chat
+        """
+        with self._history_lock:
+            with self._lock:
+                if not self._joined or self._socket is None:
+                    raise RuntimeError("user is not a member of the chat")
+                if not self._capabilities & tcp_protocol.CAP_HISTORY:
+                    raise IOError("server does not support chat history")
+                sock = self._socket
+                pages = Queue()
+                self._history_pages = pages
+            try:
+                self._send_packet(sock, tcp_protocol.encode_history_request(selector, anchor, limit))
+                try:
+                    page = pages.get(timeout=self._HISTORY_TIMEOUT_S)
+                except Empty as e:
+                    raise IOError("timed out waiting for a history page") from e
+                if page is None:
+                    raise IOError("connection lost while waiting for a history page")
+                return page
+            finally:
+                with self._lock:
+                    self._history_pages = None
+
+    def replay_history(self, limit: int = 0) -> int:
+        """
+        Fetches the newest messages of the server's public chat log and hands them to the
+        on_user_posted_message listeners as one burst (see EventHandler.handle_all).
+        :param limit: maximum number of messages; 0 means one full page
+        :return: the number of replayed messages
+        :raises IOError: like fetch_history
+        :raises RuntimeError: if the user is not a member of the chat
+        """
+        _, _, messages = self.fetch_history(tcp_protocol.HISTORY_LAST, 0, limit)
+        chat_id = self._chat_info.get_id()
+        self.on_user_posted_message().handle_all([Event(chat_id, message) for message in messages])
+        return len(messages)
 
     def get_server_user(self) -> User:
         return self._server_user
@@ -177,14 +316,20 @@ class TcpChat(AbstractChat):
     def _recv_loop(self):
         while not self._recv_stop.is_set():
             with self._lock:
-                sock = self._socket
-            if sock is None:
+                receiver = self._receiver
+            if receiver is None:
                 return
+            burst: list[Event] = []
             try:
-                payload = tcp_protocol.recv_packet(sock)
-                packet_type, body = tcp_protocol.decode_client_packet(payload)
-                self._handle_packet(packet_type, body)
+                # Everything that arrived with one read is a burst: its public messages go to the listeners at once.
+                payload = receiver.recv_packet()
+                while payload is not None:
+                    packet_type, body = tcp_protocol.decode_client_packet(payload)
+                    self._handle_packet(packet_type, body, burst)
+                    payload = receiver.next_packet()
+                self._deliver_public_burst(burst)
             except IOError as e:
+                self._deliver_public_burst(burst)
                 if self._recv_stop.is_set():
                     return
                 self.on_connection_failure().handle(Event(self._chat_info.get_id(), e))
@@ -197,40 +342,64 @@ class TcpChat(AbstractChat):
                     except OSError:
                         pass
                     self._socket = None
+                    self._receiver = None
+                    self._abort_history_wait()
                 return
 
-    def _handle_packet(self, packet_type: int, body):
+    def _handle_packet(self, packet_type: int, body, burst: list[Event] | None = None):
+        """
+        :param burst: collects public message events for _deliver_public_burst instead of handling them one by one
+        """
         chat_id = self._chat_info.get_id()
+        if packet_type == tcp_protocol.PT_S_PUBLIC:
+            message = self._decode_user_message(body)
+            self._remember_member(message.sender())
+            if burst is not None:
+                burst.append(Event(chat_id, message))
+            else:
+                self.on_user_posted_message().handle(Event(chat_id, message))
+            return
+        if burst is not None:
+            # Keep the order: collected messages go out before any other event.
+            self._deliver_public_burst(burst)
+
+        if packet_type == tcp_protocol.PT_S_USER_DEFINED and self._protocol_version >= tcp_protocol.PROTOCOL_V2:
+            self._decode_user(body)
+            return
+
         if packet_type == tcp_protocol.PT_S_USER_JOINED:
-            user = SerializableUser.deserialize(body)
-            self._members_by_id[user.get_id()] = user
+            user = self._decode_user(body)
+            self._remember_member(user)
             self.on_user_joined().handle(Event(chat_id, user))
             return
 
         if packet_type == tcp_protocol.PT_S_USER_LEFT:
-            user = SerializableUser.deserialize(body)
+            user = self._decode_user(body)
             self._members_by_id.pop(user.get_id(), None)
             self.on_user_left().handle(Event(chat_id, user))
             return
 
         if packet_type == tcp_protocol.PT_S_USER_BECAME_HOST:
-            user = SerializableUser.deserialize(body)
-            self._members_by_id[user.get_id()] = user
+            user = self._decode_user(body)
+            self._remember_member(user)
             self.on_user_became_host().handle(Event(chat_id, user))
             return
 
-        if packet_type == tcp_protocol.PT_S_PUBLIC:
-            message = SerializableUserMessage.deserialize(body)
-            self._members_by_id[message.sender().get_id()] = message.sender()
-            self.on_user_posted_message().handle(Event(chat_id, message))
-            return
-
         if packet_type == tcp_protocol.PT_S_PRIVATE:
-            message = SerializableUserMessage.deserialize(body)
-            self._members_by_id[message.sender().get_id()] = message.sender()
+            message = self._decode_user_message(body)
+            self._remember_member(message.sender())
             self.on_user_send_private_message().handle(Event(chat_id, message))
             return
 
+        if packet_type == tcp_protocol.PT_S_HISTORY_PAGE:
+            # Decoded right away: body points into the receive buffer.
+            page = tcp_protocol.decode_server_history_page(body, self._users)
+            with self._lock:
+                pages = self._history_pages
+            if pages is not None:
+                pages.put(page)
+            return
+
         if packet_type == tcp_protocol.PT_S_ERROR:
             code, msg = tcp_protocol.decode_server_error(body)
             if code != tcp_protocol.ERR_GENERIC:
@@ -256,29 +425,69 @@ class TcpChat(AbstractChat):
             raise IOError("too many unknown packet types")
         return
 
+    def _decode_user(self, body) -> SerializableUser:
+        if self._protocol_version < tcp_protocol.PROTOCOL_V2:
+            return self._users.decode(body)
+        handle, user = tcp_protocol.decode_user_record_v2(body, self._users)
+        self._users_by_handle[handle] = user
+        return user
+
+    def _decode_user_message(self, body) -> SerializableUserMessage:
+        if self._protocol_version < tcp_protocol.PROTOCOL_V2:
+            return SerializableUserMessage.deserialize(body, self._users)
+        return tcp_protocol.decode_user_message_v2(body, self._users_by_handle)
+
+    def _deliver_public_burst(self, burst: list[Event]):
+        if len(burst) > 0:
+            events = list(burst)
+            burst.clear()
+            self.on_user_posted_message().handle_all(events)
+
+    def _remember_member(self, user: User):
+        # Senders are interned, so an unchanged member is the very same object.
+        if self._members_by_id.get(user.get_id()) is not user:
+            self._members_by_id[user.get_id()] = user
+
+    def _abort_history_wait(self):
+        if self._history_pages is not None:
+            self._history_pages.put(None)
+
     def _send_packet(self, sock: socket, payload: bytes):
         try:
             with self._send_lock:
+                if self._compressor is not None:
+                    payload = self._compressor.compress(payload)
                 tcp_protocol.send_packet(sock, payload)
         except OSError as e:
             raise IOError("failed to send packet") from e
 
-    def _wait_for_join_ack(self, sock: socket) -> tuple[SerializableUser, list[tuple[int, object]]]:
+    def _wait_for_join_ack(
+        self,
+        sock: socket,
+        receiver: tcp_protocol.PacketReceiver,
+    ) -> tuple[SerializableUser, int, int, list[tuple[int, object]]]:
         pending_packets: list[tuple[int, object]] = []
         try:
             sock.settimeout(self._JOIN_TIMEOUT_S)
             while True:
-                payload = tcp_protocol.recv_packet(sock)
+                payload = receiver.recv_packet()
                 packet_type, body = tcp_protocol.decode_client_packet(payload)
                 if packet_type == tcp_protocol.PT_S_JOIN_ACK:
-                    return tcp_protocol.decode_server_join_ack(body), pending_packets
+                    user, protocol_version, capabilities = tcp_protocol.decode_server_join_ack_negotiation(body)
+                    return (
+                        user,
+                        min(protocol_version, tcp_protocol.PROTOCOL_VERSION),
+                        capabilities & self._offered_capabilities,
+                        pending_packets,
+                    )
                 if packet_type == tcp_protocol.PT_S_JOIN_NACK:
                     code, message = tcp_protocol.decode_server_join_nack(body)
                     raise IOError(f"join rejected [{code}]: {message}")
                 if packet_type == tcp_protocol.PT_S_ERROR:
                     code, message = tcp_protocol.decode_server_error(body)
                     raise IOError(f"join failed [{code}]: {message}")
-                pending_packets.append((packet_type, body))
+                # The receive buffer is reused for the next packet, so early packets keep a copy.
+                pending_packets.append(tcp_protocol.decode_client_packet(bytes(payload)))
         except TimeoutError as e:
             raise IOError("join timed out waiting for server acknowledgement") from e
         finally:
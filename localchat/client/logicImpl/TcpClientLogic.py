@@ -2,11 +2,12 @@ from __future__ import annotations
 
 from ipaddress import IPv4Address, IPv6Address, ip_address
 from threading import RLock
-from uuid import UUID, uuid4
+from uuid import UUID, uuid4, uuid5
 
 from localchat.client.logicImpl import AbstractChat, AbstractLogic, TcpChat
 from localchat.net.discovery import DiscoveryScanner, UdpBroadcastDiscoveryScanner
 from localchat.util import BinaryIOBase, Chat, ChatInformation, User
+from localchat.util.event import Event, EventDispatcher, EventHandler
 
 
 class TcpChatInformation(ChatInformation):
@@ -79,6 +80,9 @@ class _SystemChat(AbstractChat):
     def download_chat(self, output_stream: BinaryIOBase):
         raise NotImplementedError()
 
+    def replay_history(self, limit: int = 0) -> int:
+        raise NotImplementedError()
+
     def get_server_user(self) -> User:
         return self._server_user
 
@@ -89,12 +93,30 @@ class TcpClientLogic(AbstractLogic):
     Keeps UI decoupled from transport details and manages TcpChat instances.
     """
 
-    def __init__(self, discovery_scanner: DiscoveryScanner | None = None):
+    def __init__(self, discovery_scanner: DiscoveryScanner | None = None, async_events: bool = True):
+        """
+        :param async_events: deliver chat events (and thereby UI output) on one shared worker thread,
+            so a slow UI never stalls a chat's receive loop
+        """
         super().__init__()
         self._lock = RLock()
         self._system_chat = _SystemChat()
         self._known_chats: list[Chat] = []
         self._discovery_scanner = discovery_scanner if discovery_scanner is not None else UdpBroadcastDiscoveryScanner()
+        self._error_handler: EventHandler[Exception] = EventHandler()
+        self._event_dispatcher = (
+            EventDispatcher("localchat-chat-events", on_error=self._on_event_failed) if async_events else None
+        )
+
+    def on_error(self) -> EventHandler[Exception]:
+        """
+        Exceptions raised by listeners of chat events on the shared event worker (async_events only).
+        Delivered synchronously on that worker, so a failing error listener cannot feed itself.
+        """
+        return self._error_handler
+
+    def _on_event_failed(self, error: Exception):
+        self._error_handler.handle(Event(self._system_chat.get_chat_info().get_id(), error))
 
     def start_impl(self):
         # v0 does not require a long-running background loop in client logic.
@@ -109,6 +131,8 @@ class TcpClientLogic(AbstractLogic):
                 chat.leave()
             except Exception:
                 pass
+        if self._event_dispatcher is not None:
+            self._event_dispatcher.close()
 
     def create_chat(self, info: ChatInformation, online: bool, port: int) -> Chat:
         if not online:
@@ -119,12 +143,15 @@ class TcpClientLogic(AbstractLogic):
         if target_port <= 0 or target_port > 65535:
             raise ValueError("invalid port")
 
-        chat = TcpChat(info.get_id(), info.get_name(), host, target_port)
+        chat = self._new_chat(info.get_id(), info.get_name(), host, target_port)
         with self._lock:
             self._known_chats.append(chat)
         return chat
 
-    def connect_direct(self, host: str, port: int, chat_name: str | None = None) -> Chat:
+    def connect_direct(self, host: str, port: int, chat_name: str | None = None, room: str | None = None) -> Chat:
+        """
+        :param room: room of the server to join, e.g. from a join URL (None: its default room)
+        """
         host = host.strip()
         if len(host) == 0:
             raise ValueError("invalid host")
@@ -132,7 +159,7 @@ class TcpClientLogic(AbstractLogic):
             raise ValueError("invalid port")
 
         name = chat_name if chat_name is not None and len(chat_name) > 0 else f"direct-{host}:{port}"
-        chat = TcpChat(uuid4(), name, host, port)
+        chat = self._new_chat(uuid4(), name, host, port, room)
         with self._lock:
             self._known_chats.append(chat)
         return chat
@@ -148,22 +175,29 @@ class TcpClientLogic(AbstractLogic):
                 for chat in self._known_chats
             }
             for server in discovered:
-                if server.server_id in by_chat_id:
-                    continue
-                info = TcpChatInformation(
-                    server.server_id,
-                    server.server_name,
-                    server.host,
-                    server.port,
-                )
-                by_chat_id[server.server_id] = TcpChat(
-                    info.get_id(),
-                    info.get_name(),
-                    str(info.get_ip_address()),
-                    info.get_port(),
-                )
+                # One chat per room; room chats get stable ids derived from the server id.
+                entries = [(server.server_id, server.server_name, None)] + [
+                    (uuid5(server.server_id, room), f"{server.server_name}/{room}", room)
+                    for room in server.rooms
+                ]
+                for chat_id, name, room in entries:
+                    if chat_id in by_chat_id:
+                        continue
+                    info = TcpChatInformation(chat_id, name, server.host, server.port)
+                    by_chat_id[chat_id] = self._new_chat(
+                        info.get_id(),
+                        info.get_name(),
+                        str(info.get_ip_address()),
+                        info.get_port(),
+                        room,
+                    )
             self._known_chats = list(by_chat_id.values())
             return list(self._known_chats)
 
+    def _new_chat(self, chat_id: UUID, name: str, host: str, port: int, room: str | None = None) -> TcpChat:
+        chat = TcpChat(chat_id, name, host, port, room=room)
+        chat.set_event_dispatcher(self._event_dispatcher)
+        return chat
+
     def get_system_chat(self) -> Chat:
         return self._system_chat
@@ -1,5 +1,13 @@
+from importlib import import_module
+
 from .AbstractLogic import AbstractLogic
 from .AbstractChat import AbstractChat
 from .TcpChat import TcpChat
 from .TcpClientLogic import TcpClientLogic, TcpChatInformation
-from . import testing
\ No newline at end of file
+
+
+def __getattr__(name: str):
+    # The offline test mode (`localchat start --mode test`) is loaded only when used.
+    if name == "testing":
+        return import_module(".testing", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
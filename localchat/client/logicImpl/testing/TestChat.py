@@ -101,6 +101,12 @@ class TestChat(AbstractChat):
                 raise RuntimeError("user is not a member of the chat")
         raise NotImplementedError()
 
+    def replay_history(self, limit: int = 0) -> int:
+        with self._lock:
+            if self.real_user is None:
+                raise RuntimeError("user is not a member of the chat")
+        raise NotImplementedError()
+
     def get_server_user(self) -> User:
         with self._lock:
             if self.real_user is None:
@@ -7,8 +7,15 @@ DISCOVERY_PORT = 51111
 UDP_BROADCAST_PORT = 51122
 BUFFER_SIZE = 4096
 ENCODING = "utf-8"
+DEFAULT_SERVER_NAME = "localchat-server"
 DEFAULT_MAX_CLIENTS = 16
 HARD_MAX_CLIENTS = 128
+# event-loop server: sessions cost a socket and a buffer, not a thread
+ASYNC_HARD_MAX_CLIENTS = 8192
+# one of: drop, coalesce, disconnect
+DEFAULT_SLOW_CONSUMER_POLICY = "coalesce"
+# instrumented server locks (acquisitions, wait and hold time); off: plain threading locks
+DEFAULT_LOCK_PROFILING = False
 
 # default Settings
 DEFAULT_HOST_SERVER_PORT = DEFAULT_PORT
@@ -9,4 +9,60 @@ MAX_TCP_PACKET_SIZE = 48 * 1024
 JOIN_TIMEOUT_S = 5.0
 RATE_LIMIT_MSG_PER_SEC = 0.5
 RATE_LIMIT_BURST = 5.0
-RATE_LIMIT_MAX_VIOLATIONS = 5
\ No newline at end of file
+RATE_LIMIT_MAX_VIOLATIONS = 5
+# per-session outbound queue budget (slow consumers beyond this are dropped/coalesced/disconnected)
+OUTBOUND_QUEUE_MAX_MESSAGES = 2048
+OUTBOUND_QUEUE_MAX_BYTES = 4 * 1024 * 1024
+# history pages (PT_S_HISTORY_PAGE): messages per page and encoded bytes per page (room left for the page header)
+HISTORY_PAGE_MAX_MESSAGES = 256
+HISTORY_PAGE_MAX_BYTES = MAX_TCP_PACKET_SIZE - 64
+# in-memory window of the server chat log; the text of older messages is spilled to a temporary file
+CHAT_LOG_MEMORY_MAX_MESSAGES = 100_000
+CHAT_LOG_MEMORY_MAX_BYTES = 8 * 1024 * 1024
+# /search: messages kept in the inverted index (older ones are not searchable), token length cap, results per page
+SEARCH_INDEX_MAX_MESSAGES = 1_000_000
+SEARCH_MAX_TOKEN_LENGTH = 64
+SEARCH_RESULTS_PER_PAGE = 10
+# server journal: group-commit window (one fsync per window) and segment roll-over size
+JOURNAL_FLUSH_INTERVAL_MS = 5.0
+JOURNAL_SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+# server writers: how long a session writer waits for more frames to send them with one syscall (0 = send at once)
+SEND_CORK_WINDOW_MS = 0.0
+# negotiated zlib compression: payloads below this size are sent raw; level trades CPU for bytes
+# (compression runs per session, so a broadcast pays it once per compressing member)
+COMPRESSION_MIN_BYTES = 512
+COMPRESSION_LEVEL = 1
+# client decode path: distinct (id, name) users kept for reuse (the oldest is forgotten beyond this)
+USER_INTERN_MAX_USERS = 4096
+# server metrics: upper bounds (seconds) of the latency histogram buckets (+Inf is implicit)
+METRICS_LATENCY_BUCKETS_S = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+# lock profiling: wait/hold histogram bounds (seconds); uncontended acquisitions land in the first bucket
+LOCK_LATENCY_BUCKETS_S = (
+    0.000001, 0.0000025, 0.000005, 0.00001, 0.000025, 0.00005, 0.0001,
+    0.00025, 0.0005, 0.001, 0.0025, 0.01, 0.1, 1.0,
+)
+# rooms of one server: room ids (join URL path segment) and rooms besides the default room;
+# discovery lists at most DISCOVERY_MAX_ROOMS of them so a response stays one small datagram
+MAX_ROOM_ID_LENGTH = 64
+MAX_ROOMS = 256
+DISCOVERY_MAX_ROOMS = 32
+# multi-process server (`serve --workers`): worker processes, how long a worker waits for the coordinator
+# to answer a join or host change, how long all workers may take to come up, and how much bus output
+# may wait for a worker before the coordinator gives up on it
+MAX_SERVER_WORKERS = 64
+CLUSTER_RPC_TIMEOUT_S = 5.0
+CLUSTER_START_TIMEOUT_S = 30.0
+CLUSTER_BUS_MAX_PENDING_BYTES = 64 * 1024 * 1024
+# admission control in front of session creation: connection attempts per source address and of all sources
+# (per second after a burst), messages per source address over all of its sessions, and how many source
+# addresses are remembered (least recently seen ones are forgotten beyond that)
+ADMISSION_ADDRESS_CONNECT_PER_SEC = 4.0
+ADMISSION_ADDRESS_CONNECT_BURST = 32.0
+ADMISSION_CONNECT_PER_SEC = 64.0
+ADMISSION_CONNECT_BURST = 256.0
+ADMISSION_ADDRESS_MSG_PER_SEC = RATE_LIMIT_MSG_PER_SEC * 4
+ADMISSION_ADDRESS_MSG_BURST = RATE_LIMIT_BURST * 4
+ADMISSION_MAX_TRACKED_ADDRESSES = 4096
@@ -0,0 +1,63 @@
+class BufferReader:
+    """
+    Read-only binary stream over a bytes-like object that never copies on its own.
+    read_view() hands out slices of the underlying buffer, so decoders can parse
+    fields in place; read() and readinto() behave like BytesIO for other code.
+    The views are only valid as long as the underlying buffer is not reused
+    (see tcp_protocol.PacketReceiver).
+    """
+    __slots__ = ("_view", "_pos")
+
+    def __init__(self, data: bytes | bytearray | memoryview):
+        self._view = data if isinstance(data, memoryview) else memoryview(data)
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def read_view(self, n: int) -> memoryview:
+        """
+        Returns the next n bytes as a view without copying.
+        :raises IOError: if less than n bytes are remaining
+        """
+        start = self._pos
+        end = start + n
+        if n < 0 or end > len(self._view):
+            ex = EOFError(
+                f"unexpected EOF (attempted to read exactly {n} bytes,"
+                f" but there where only {len(self._view) - start} bytes remaining)"
+            )
+            raise IOError() from ex
+        self._pos = end
+        return self._view[start:end]
+
+    def read_byte(self) -> int:
+        """
+        :return: the next byte, or -1 at the end of the buffer
+        """
+        pos = self._pos
+        if pos >= len(self._view):
+            return -1
+        self._pos = pos + 1
+        return self._view[pos]
+
+    def read(self, n: int = -1) -> bytes:
+        start = self._pos
+        end = len(self._view) if n is None or n < 0 else min(len(self._view), start + n)
+        self._pos = end
+        return self._view[start:end].tobytes()
+
+    def readinto(self, buffer: bytearray | memoryview) -> int:
+        n = min(len(buffer), len(self._view) - self._pos)
+        buffer[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def tell(self) -> int:
+        return self._pos
+
+    def remaining(self) -> int:
+        return len(self._view) - self._pos
+
+    def getbuffer(self) -> memoryview:
+        return self._view
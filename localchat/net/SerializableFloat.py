@@ -1,4 +1,4 @@
-from localchat.net import Serializable, MagicNumber, read_exact
+from localchat.net import Serializable, MagicNumber, read_exact_view
 from localchat.util import BinaryIOBase
 import math
 
@@ -25,8 +25,8 @@ class SerializableFloat(Serializable):
 
     @staticmethod
     def deserialize(input_stream: BinaryIOBase) -> 'SerializableFloat':
-        left_bytes = read_exact(input_stream, 8)
-        right_bytes = read_exact(input_stream, 8)
+        left_bytes = read_exact_view(input_stream, 8)
+        right_bytes = read_exact_view(input_stream, 8)
         left = int.from_bytes(left_bytes,"big",signed=True)
         right = int.from_bytes(right_bytes,"big",signed=False)
         if right == 0:
@@ -1,4 +1,4 @@
-from localchat.net import Serializable, MagicNumber, read_exact
+from localchat.net import Serializable, MagicNumber, read_exact_view
 from localchat.util import BinaryIOBase
 
 
@@ -16,14 +16,14 @@ class SerializableString(Serializable):
 
     @staticmethod
     def deserialize(input_stream: BinaryIOBase, max_size : int) -> 'SerializableString':
-        b_len_bytes = read_exact(input_stream, 8)
+        b_len_bytes = read_exact_view(input_stream, 8)
         b_len = int.from_bytes(b_len_bytes, "big")
         MAX_BYTES = max_size * 4
         if b_len > MAX_BYTES or b_len < 0: # utf-8 encoded characters can take up 4 bytes each at most
             raise IOError("Invalid string size")
-        b = read_exact(input_stream, b_len)
+        b = read_exact_view(input_stream, b_len)
         try:
-            value = b.decode("utf-8","strict")
+            value = str(b, "utf-8", "strict")
         except UnicodeDecodeError:
             raise IOError("Invalid string encoding")
         if len(value) > max_size:
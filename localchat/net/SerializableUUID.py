@@ -1,4 +1,4 @@
-from localchat.net import Serializable, MagicNumber, read_exact
+from localchat.net import Serializable, MagicNumber, read_exact_view
 from localchat.util import BinaryIOBase
 from uuid import UUID
 
@@ -14,8 +14,8 @@ class SerializableUUID(Serializable):
 
     @staticmethod
     def deserialize(input_stream: BinaryIOBase) -> 'SerializableUUID':
-        b = read_exact(input_stream, 16)
-        value = UUID(bytes=b)
+        b = read_exact_view(input_stream, 16)
+        value = UUID(int=int.from_bytes(b, "big"))
         return SerializableUUID(value)
 
     def __repr__(self) -> str:
@@ -1,5 +1,9 @@
+from io import BytesIO
+
 from localchat.util import UserMessage, User, BinaryIOBase
-from localchat.net import Serializable, MagicNumber, SerializableUser, SerializableFloat, SerializableString
+from localchat.net import (
+    Serializable, MagicNumber, SerializableUser, SerializableFloat, SerializableString, BufferReader, UserInterner
+)
 from localchat.config.limits import MAX_MESSAGE_LENGTH
 
 
@@ -10,6 +14,9 @@ class SerializableUserMessage(UserMessage,Serializable):
         self._sender = sender
         self._message = message
         self._timestamp = timestamp
+        # Messages are immutable, so the serialized form is computed at most once.
+        self._encoded: bytes | None = None
+        self._sender_size = 0
 
     @staticmethod
     def create_copy(user_message: UserMessage) -> 'SerializableUserMessage':
@@ -22,18 +29,66 @@ class SerializableUserMessage(UserMessage,Serializable):
     def timestamp(self) -> float:
         return self._timestamp
 
+    def encoded(self) -> bytes:
+        """
+        The serialized message (sender, text, timestamp); cached after the first call.
+        """
+        if self._encoded is None:
+            buffer = BytesIO()
+            SerializableUser.create_copy(self._sender).serialize(buffer)
+            self._sender_size = buffer.tell()
+            SerializableString(self._message).serialize(buffer)
+            SerializableFloat(self._timestamp).serialize(buffer)
+            self._encoded = buffer.getvalue()
+        return self._encoded
+
+    def encoded_content(self) -> memoryview:
+        """
+        The cached text and timestamp part of encoded(), without the sender.
+        """
+        encoded = self.encoded()
+        return memoryview(encoded)[self._sender_size:]
+
+    @staticmethod
+    def encode(user_message: UserMessage) -> bytes:
+        """
+        Serialized form of any UserMessage; reuses the cache if the message is a SerializableUserMessage.
+        """
+        if isinstance(user_message, SerializableUserMessage):
+            return user_message.encoded()
+        return SerializableUserMessage.create_copy(user_message).encoded()
+
     def serialize_impl(self, output_stream: BinaryIOBase):
-        serial_sender = SerializableUser.create_copy(self._sender)
-        serial_message = SerializableString(self._message)
-        serial_timestamp = SerializableFloat(self._timestamp)
-        serial_sender.serialize(output_stream)
-        serial_message.serialize(output_stream)
-        serial_timestamp.serialize(output_stream)
+        output_stream.write(self.encoded())
 
     @staticmethod
-    def deserialize(input_stream: BinaryIOBase) -> 'SerializableUserMessage':
-        serial_sender = SerializableUser.deserialize(input_stream)
+    def deserialize(input_stream: BinaryIOBase, users: UserInterner | None = None) -> 'SerializableUserMessage':
+        """
+        :param users: if given, the sender is shared with earlier messages from the same (id, name)
+        """
+        if users is not None:
+            serial_sender = users.decode(input_stream)
+        else:
+            serial_sender = SerializableUser.deserialize(input_stream)
         serial_message = SerializableString.deserialize(input_stream, MAX_MESSAGE_LENGTH)
         serial_timestamp = SerializableFloat.deserialize(input_stream)
         return SerializableUserMessage(serial_sender, serial_message.value, serial_timestamp.value)
 
+    @staticmethod
+    def from_encoded(data: bytes) -> 'SerializableUserMessage':
+        """
+        Decodes exactly one serialized message and keeps data as its cached encoding.
+        :raises IOError: if data is not exactly one valid message
+        """
+        stream = BufferReader(data)
+        serial_sender = SerializableUser.deserialize(stream)
+        sender_size = stream.tell()
+        serial_message = SerializableString.deserialize(stream, MAX_MESSAGE_LENGTH)
+        serial_timestamp = SerializableFloat.deserialize(stream)
+        if stream.tell() != len(data):
+            raise IOError("unexpected data after user message")
+        message = SerializableUserMessage(serial_sender, serial_message.value, serial_timestamp.value)
+        message._encoded = bytes(data)
+        message._sender_size = sender_size
+        return message
+
@@ -1,6 +1,6 @@
 from localchat.net import (
     Serializable, MagicNumber, SerializableUser, SerializableList,
-    SerializableString, SerializableFloat, read_exact
+    SerializableString, SerializableFloat, SerializableUserMessage, read_exact
 )
 from localchat.util import User, UserMessage, BinaryIOBase
 from localchat.config.limits import MAX_MESSAGE_LENGTH
@@ -26,6 +26,7 @@ class SerializableUserMessageList(Serializable):
     MAGIC: MagicNumber = MagicNumber(0x2025_12_29_4708_002e)
 
     _MAX_VERSION_NAME_LENGTH = 64
+    FORMAT_VERSION = 0x0001_0000_0000_0000
 
     def __init__(self):
         self.items: list[UserMessage] = []
@@ -43,8 +44,7 @@ class SerializableUserMessageList(Serializable):
             known_users.add(sender)
             users.append(sender)
 
-        version = 0x0001_0000_0000_0000
-        version_bytes = version.to_bytes(8, 'big')
+        version_bytes = SerializableUserMessageList.FORMAT_VERSION.to_bytes(8, 'big')
         output_stream.write(version_bytes)
 
         serializable_user_list = [SerializableUser.create_copy(user) for user in users]
@@ -64,6 +64,9 @@ class SerializableUserMessageList(Serializable):
             user_index = user_to_index[message.sender()]
             user_index_bytes = user_index.to_bytes(8, 'big')
             output_stream.write(user_index_bytes)
+            if isinstance(message, SerializableUserMessage):
+                output_stream.write(message.encoded_content())
+                continue
             serial_message_message = SerializableString(message.message())
             serial_message_timestamp = SerializableFloat(message.timestamp())
             serial_message_message.serialize(output_stream)
@@ -0,0 +1,65 @@
+from uuid import UUID
+
+from localchat.config.limits import MAX_USER_NAME_LENGTH, USER_INTERN_MAX_USERS
+from localchat.net import BufferReader, SerializableUser, read_exact_view
+from localchat.util import BinaryIOBase
+
+
+class UserInterner:
+    """
+    Hands out one shared SerializableUser per (id, name), so decoding the sender of
+    every incoming message does not allocate a new user (UUID, name string, object).
+    decode() looks the serialized user up by its raw bytes and only parses it on a miss.
+    Not thread-safe: meant for a single receive loop.
+    """
+
+    def __init__(self, max_users: int = USER_INTERN_MAX_USERS):
+        if max_users <= 0:
+            raise ValueError("max_users must be positive")
+        self._max_users = max_users
+        # Keyed by the SerializableUser encoding (16 id bytes, 8 length bytes, UTF-8 name); oldest first.
+        self._users: dict[bytes, SerializableUser] = {}
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def intern(self, user_id: UUID, name: str) -> SerializableUser:
+        encoded_name = name.encode("utf-8")
+        key = user_id.bytes + len(encoded_name).to_bytes(8, "big") + encoded_name
+        user = self._users.get(key)
+        if user is None:
+            user = self._remember(key, SerializableUser(user_id, name))
+        return user
+
+    def decode(self, input_stream: BinaryIOBase | BufferReader) -> SerializableUser:
+        """
+        Reads a user in the SerializableUser format.
+        :raises IOError: like SerializableUser.deserialize
+        """
+        id_bytes = read_exact_view(input_stream, 16)
+        size_bytes = read_exact_view(input_stream, 8)
+        size = int.from_bytes(size_bytes, "big")
+        # utf-8 encoded characters can take up 4 bytes each at most
+        if size > MAX_USER_NAME_LENGTH * 4:
+            raise IOError("Invalid string size")
+        name_bytes = read_exact_view(input_stream, size)
+        key = b"".join((id_bytes, size_bytes, name_bytes))
+        user = self._users.get(key)
+        if user is not None:
+            return user
+        try:
+            name = str(name_bytes, "utf-8", "strict")
+        except UnicodeDecodeError:
+            raise IOError("Invalid string encoding")
+        if len(name) > MAX_USER_NAME_LENGTH:
+            raise IOError("Invalid string size")
+        return self._remember(key, SerializableUser(UUID(bytes=bytes(id_bytes)), name))
+
+    def clear(self):
+        self._users.clear()
+
+    def _remember(self, key: bytes, user: SerializableUser) -> SerializableUser:
+        if len(self._users) >= self._max_users:
+            del self._users[next(iter(self._users))]
+        self._users[key] = user
+        return user
@@ -0,0 +1,66 @@
+from shutil import copyfileobj
+from tempfile import TemporaryFile
+from typing import BinaryIO
+
+from localchat.net import SerializableList, SerializableUser, SerializableUserMessage, SerializableUserMessageList
+from localchat.util import BinaryIOBase, User, UserMessage
+
+
+class UserMessageListWriter:
+    """
+    Writes the SerializableUserMessageList format for messages that arrive piece by piece.
+    The format lists every sender before the first message, so message records are staged
+    in an anonymous temporary file; only the sender table is kept in memory.
+    """
+
+    _COPY_CHUNK = 64 * 1024
+
+    def __init__(self, spill_dir: str | None = None):
+        self._spill: BinaryIO = TemporaryFile(dir=spill_dir)
+        self._users: list[User] = []
+        self._user_to_index: dict[User, int] = {}
+        self._count = 0
+
+    def __enter__(self) -> 'UserMessageListWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, message: UserMessage):
+        sender = message.sender()
+        index = self._user_to_index.get(sender)
+        if index is None:
+            index = len(self._users)
+            self._users.append(sender)
+            self._user_to_index[sender] = index
+        if not isinstance(message, SerializableUserMessage):
+            message = SerializableUserMessage.create_copy(message)
+        self._spill.write(index.to_bytes(8, "big"))
+        self._spill.write(message.encoded_content())
+        self._count += 1
+
+    def extend(self, messages: list[UserMessage]):
+        for message in messages:
+            self.append(message)
+
+    def write_to(self, output_stream: BinaryIOBase):
+        """
+        Writes the complete list; readable with SerializableUserMessageList.deserialize.
+        :raises IOError:
+        """
+        output_stream.write(SerializableUserMessageList.FORMAT_VERSION.to_bytes(8, "big"))
+        serial_user_list = SerializableList()
+        serial_user_list.items = [SerializableUser.create_copy(user) for user in self._users]
+        serial_user_list.serialize(output_stream)
+        output_stream.write(self._count.to_bytes(8, "big"))
+        self._spill.flush()
+        self._spill.seek(0)
+        copyfileobj(self._spill, output_stream, self._COPY_CHUNK)
+        self._spill.seek(0, 2)
+
+    def close(self):
+        self._spill.close()
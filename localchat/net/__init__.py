@@ -1,14 +1,24 @@
-from .exact import readinto_exact, read_exact
+from .BufferReader import BufferReader
+from .exact import readinto_exact, read_exact, read_exact_view
 from .MagicNumber import MagicNumber
 from .Serializable import Serializable
-from .TestSerializable import TestSerializable
 from .SerializableString import SerializableString
 from .SerializableFloat import SerializableFloat
 from .SerializableUUID import SerializableUUID
 from .SerializableUser import SerializableUser
+from .UserInterner import UserInterner
 from .SerializableUserMessage import SerializableUserMessage
 from .SerializableList import SerializableList
 from .SerializableChatInformation import SerializableChatInformation
 from .SerializableUserMessageList import SerializableUserMessageList
+from .UserMessageListWriter import UserMessageListWriter
 from . import tcp_protocol
-from . import discovery
\ No newline at end of file
+from . import discovery
+
+
+def __getattr__(name: str):
+    # Example type for tests only; not loaded by the client or server.
+    if name == "TestSerializable":
+        from .TestSerializable import TestSerializable
+        return TestSerializable
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
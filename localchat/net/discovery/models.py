@@ -9,3 +9,5 @@ class DiscoveredServer:
     host: str
     port: int
     requires_password: bool = False
+    # Ids of rooms besides the default room (at most DISCOVERY_MAX_ROOMS)
+    rooms: tuple[str, ...] = ()
@@ -2,7 +2,7 @@ import json
 from dataclasses import dataclass
 from uuid import UUID
 
-from localchat.config.limits import MAX_CHAT_NAME_LENGTH
+from localchat.config.limits import DISCOVERY_MAX_ROOMS, MAX_CHAT_NAME_LENGTH, MAX_ROOM_ID_LENGTH
 from localchat.net.discovery.models import DiscoveredServer
 
 
@@ -54,6 +54,7 @@ def encode_discovery_response(response: DiscoveryResponse) -> bytes:
         "host": response.server.host,
         "port": response.server.port,
         "requires_password": bool(response.server.requires_password),
+        "rooms": list(response.server.rooms),
     }
     return json.dumps(payload, separators=(",", ":"), ensure_ascii=True).encode("utf-8")
 
@@ -72,6 +73,7 @@ def decode_discovery_response(payload: bytes) -> DiscoveryResponse:
     port = _parse_int(obj.get("port"), "port")
     _validate_port(port)
     requires_password = bool(obj.get("requires_password", False))
+    rooms = _parse_rooms(obj.get("rooms", []))
     return DiscoveryResponse(
         nonce=nonce,
         server=DiscoveredServer(
@@ -80,6 +82,7 @@ def decode_discovery_response(payload: bytes) -> DiscoveryResponse:
             host=host,
             port=port,
             requires_password=requires_password,
+            rooms=rooms,
         ),
     )
 
@@ -113,6 +116,8 @@ def _validate_server(server: DiscoveredServer):
     if len(server.host) == 0:
         raise ValueError("invalid host")
     _validate_port(server.port)
+    if len(server.rooms) > DISCOVERY_MAX_ROOMS:
+        raise ValueError("too many rooms")
 
 
 def _parse_uuid(value, field: str) -> UUID:
@@ -136,6 +141,16 @@ def _parse_str(value, field: str) -> str:
     return value
 
 
+def _parse_rooms(value) -> tuple[str, ...]:
+    # Optional: responses of servers without rooms have no "rooms".
+    if not isinstance(value, list) or len(value) > DISCOVERY_MAX_ROOMS:
+        raise IOError("invalid rooms")
+    rooms = tuple(_parse_str(room, "rooms") for room in value)
+    if any(len(room) == 0 or len(room) > MAX_ROOM_ID_LENGTH for room in rooms):
+        raise IOError("invalid rooms")
+    return rooms
+
+
 def _validate_port(port: int):
     if port <= 0 or port > 65535:
         raise IOError("invalid port")
@@ -162,6 +162,7 @@ class UdpBroadcastDiscoveryResponder(DiscoveryResponder):
                         host=advertised_host,
                         port=snapshot.port,
                         requires_password=snapshot.requires_password,
+                        rooms=snapshot.rooms,
                     ),
                 )
                 payload = encode_discovery_response(response)
@@ -1,4 +1,5 @@
 from localchat.util import BinaryIOBase
+from .BufferReader import BufferReader
 
 
 def readinto_exact(input_stream: BinaryIOBase, buffer : bytearray|memoryview):
@@ -30,3 +31,12 @@ def read_exact(input_stream: BinaryIOBase, n : int) -> bytes:
     buffer = bytearray(n)
     readinto_exact(input_stream, buffer)
     return bytes(buffer)
+
+
+def read_exact_view(input_stream: BinaryIOBase | BufferReader, n: int) -> bytes | memoryview:
+    """
+    Like read_exact, but returns a view into the buffer (without copying) if the stream is a BufferReader.
+    """
+    if isinstance(input_stream, BufferReader):
+        return input_stream.read_view(n)
+    return read_exact(input_stream, n)
@@ -1,45 +1,102 @@
-from io import BytesIO
-from socket import socket
+from __future__ import annotations
 
-from localchat.config.limits import MAX_MESSAGE_LENGTH, MAX_TCP_PACKET_SIZE
-from localchat.net import SerializableString, SerializableUser, SerializableUserMessage, SerializableUUID
+from collections import deque
+from io import BytesIO
+from itertools import islice
+from socket import IPPROTO_TCP, TCP_NODELAY, socket
+from struct import Struct
+from uuid import UUID
+import zlib
+
+from localchat.config.limits import (
+    COMPRESSION_LEVEL,
+    COMPRESSION_MIN_BYTES,
+    MAX_MESSAGE_LENGTH,
+    MAX_ROOM_ID_LENGTH,
+    MAX_TCP_PACKET_SIZE,
+    MAX_USER_NAME_LENGTH,
+)
+from localchat.net import (
+    BufferReader,
+    SerializableString,
+    SerializableUser,
+    SerializableUserMessage,
+    SerializableUUID,
+    UserInterner,
+    read_exact_view,
+)
 from localchat.util import User, UserMessage
 
 
+# Wire protocol versions. v1 clients send no version in PT_C_JOIN; the server answers
+# with the highest common version in PT_S_JOIN_ACK (see docs/PROTOKOLL.md).
+PROTOCOL_V1 = 1
+PROTOCOL_V2 = 2
+PROTOCOL_VERSION = PROTOCOL_V2
+
+# Optional capabilities, negotiated like the version (bit set, varint after the version).
+CAP_ZLIB = 0x01
+# The server answers PT_C_HISTORY with PT_S_HISTORY_PAGE.
+CAP_HISTORY = 0x02
+SUPPORTED_CAPABILITIES = CAP_ZLIB | CAP_HISTORY
+
+# Set on the packet type of a payload whose body is zlib-compressed.
+# Only interpreted once CAP_ZLIB was negotiated; before that 0x80.. are ordinary (unknown) types.
+PT_FLAG_COMPRESSED = 0x80
+
 # Client -> server packet types
 PT_C_JOIN = 1
 PT_C_PUBLIC = 2
 PT_C_PRIVATE = 3
 PT_C_LEAVE = 4
+PT_C_HISTORY = 5
+
+# PT_C_HISTORY selectors; sequence numbers are positions in the public chat log (oldest = 0)
+HISTORY_LAST = 0
+HISTORY_BEFORE_SEQ = 1
+HISTORY_FROM_SEQ = 2
+HISTORY_BEFORE_TIME = 3
+HISTORY_FROM_TIME = 4
 
 # Server -> client packet types
 PT_S_USER_JOINED = 100
 PT_S_USER_LEFT = 101
 PT_S_USER_BECAME_HOST = 102
+# v2 only: binds a sender handle to a user for the rest of the connection
+PT_S_USER_DEFINED = 103
 PT_S_JOIN_ACK = 105
 PT_S_JOIN_NACK = 106
 PT_S_PUBLIC = 110
 PT_S_PRIVATE = 111
+PT_S_HISTORY_PAGE = 112
 PT_S_ERROR = 120
 
 # Structured server error codes
 ERR_GENERIC = "generic"
 ERR_ALREADY_JOINED = "already_joined"
 ERR_DISCONNECTED = "disconnected"
+ERR_INVALID_ROOM = "invalid_room"
 ERR_INVALID_USER_NAME = "invalid_user_name"
 ERR_JOIN_FIRST = "join_first"
 ERR_JOIN_FAILED = "join_failed"
 ERR_JOIN_REJECTED = "join_rejected"
 ERR_JOIN_TIMEOUT = "join_timeout"
+ERR_MESSAGES_DROPPED = "messages_dropped"
 ERR_RATE_LIMITED = "rate_limited"
 ERR_SERVER_FULL = "server_full"
+ERR_TOO_MANY_CONNECTIONS = "too_many_connections"
+ERR_TOO_MANY_ROOMS = "too_many_rooms"
 ERR_USER_NAME_IN_USE = "user_name_in_use"
 ERR_USER_ID_IN_USE = "user_id_in_use"
 ERR_UNKNOWN_COMMAND = "unknown_command"
 ERR_UNKNOWN_PACKET_TYPE = "unknown_packet_type"
 ERR_UNKNOWN_RECIPIENT = "unknown_recipient"
 
-def recv_packet(sock: socket, max_payload_size: int = MAX_TCP_PACKET_SIZE) -> bytes:
+def recv_packet(sock: socket, max_payload_size: int = MAX_TCP_PACKET_SIZE) -> bytearray:
+    """
+    Receives exactly one packet without reading ahead.
+    Connections that receive more than one packet should use a PacketReceiver.
+    """
     length_bytes = _recv_exact_socket(sock, 4)
     payload_len = int.from_bytes(length_bytes, "big")
     if payload_len <= 0 or payload_len > max_payload_size:
@@ -52,20 +109,275 @@ def send_packet(sock: socket, payload: bytes):
     payload_len = len(payload)
     if payload_len <= 0:
         raise ValueError("payload must not be empty")
-    sock.sendall(payload_len.to_bytes(4, "big") + payload)
+    header = payload_len.to_bytes(4, "big")
+    if not _HAS_SENDMSG:
+        sock.sendall(header + payload)
+        return
+    sent = sock.sendmsg((header, payload))
+    if sent < 4 + payload_len:
+        sock.sendall(memoryview(header + payload)[sent:])
 
 
-def _recv_exact_socket(sock: socket, n: int) -> bytes:
-    chunks: list[bytes] = []
-    bytes_left = n
-    while bytes_left > 0:
-        chunk = sock.recv(bytes_left)
-        if chunk == b"":
+def set_no_delay(sock: socket):
+    """
+    Disables Nagle's algorithm: frames are coalesced by the application (PacketSender), not by the kernel.
+    """
+    try:
+        sock.setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
+    except OSError:
+        pass
+
+
+def _recv_exact_socket(sock: socket, n: int) -> bytearray:
+    buffer = bytearray(n)
+    view = memoryview(buffer)
+    bytes_read = 0
+    while bytes_read < n:
+        new_bytes_read = sock.recv_into(view[bytes_read:])
+        if new_bytes_read == 0:
             ex = EOFError("unexpected EOF while reading packet")
             raise IOError() from ex
-        chunks.append(chunk)
-        bytes_left -= len(chunk)
-    return b"".join(chunks)
+        bytes_read += new_bytes_read
+    return buffer
+
+
+class PacketReceiver:
+    """
+    Receive side of one connection.
+    Reads with recv_into into a single reusable buffer and parses frames in place;
+    the returned payloads are memoryviews into that buffer and stay valid only
+    until the next fill()/recv_packet() call. Copy them (bytes(payload)) to keep them.
+    recv_packet() is for blocking sockets; non-blocking loops call fill() once
+    per readable event and then next_packet() until it returns None.
+    """
+
+    def __init__(self, sock: socket, max_payload_size: int = MAX_TCP_PACKET_SIZE, buffer_size: int = 16 * 1024):
+        if buffer_size < 4:
+            raise ValueError("buffer too small")
+        self._sock = sock
+        self._max_payload_size = max_payload_size
+        self._buffer_size = buffer_size
+        self._buffer = bytearray(buffer_size)
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._end = 0
+        # Bytes (from _start) that the next frame occupies, as far as known.
+        self._needed = 4
+        self._decompressor: PayloadDecompressor | None = None
+
+    def set_decompressor(self, decompressor: PayloadDecompressor | None):
+        """
+        Accepts compressed payloads from now on; next_packet() returns them inflated (as bytes).
+        """
+        self._decompressor = decompressor
+
+    def recv_packet(self) -> memoryview:
+        """
+        :raises IOError: on EOF or an invalid frame
+        :raises TimeoutError: if the socket timeout expires
+        """
+        while True:
+            payload = self.next_packet()
+            if payload is not None:
+                return payload
+            if self.fill() == 0:
+                ex = EOFError("unexpected EOF while reading packet")
+                raise IOError() from ex
+
+    def next_packet(self) -> memoryview | None:
+        """
+        Returns the next complete payload that is already buffered, or None.
+        :raises IOError: if the frame header announces an invalid payload size
+        """
+        start = self._start
+        if self._end - start < 4:
+            self._needed = 4
+            return None
+        payload_len = int.from_bytes(self._view[start:start + 4], "big")
+        if payload_len <= 0 or payload_len > self._max_payload_size:
+            raise IOError("invalid payload size")
+        frame_end = start + 4 + payload_len
+        if frame_end > self._end:
+            self._needed = 4 + payload_len
+            return None
+        self._start = frame_end
+        payload = self._view[start + 4:frame_end]
+        if self._decompressor is not None and payload[0] & PT_FLAG_COMPRESSED:
+            return self._decompressor.decompress(payload)
+        return payload
+
+    def fill(self) -> int:
+        """
+        Reads once from the socket into the free part of the buffer.
+        Invalidates all payloads returned so far.
+        :return: the number of bytes read, 0 on EOF
+        :raises OSError: as raised by the socket (e.g. BlockingIOError, TimeoutError)
+        """
+        self._make_room()
+        bytes_read = self._sock.recv_into(self._view[self._end:])
+        self._end += bytes_read
+        return bytes_read
+
+    def buffered_bytes(self) -> int:
+        return self._end - self._start
+
+    def _make_room(self):
+        pending = self._end - self._start
+        if pending == 0:
+            self._start = self._end = 0
+            if len(self._buffer) > self._buffer_size:
+                # A large frame is done: fall back to the regular buffer size.
+                self._replace_buffer(self._buffer_size)
+            return
+        capacity = max(self._needed, pending + 1)
+        if self._start + capacity <= len(self._buffer):
+            return
+        if capacity > len(self._buffer):
+            self._replace_buffer(capacity)
+            return
+        self._view[:pending] = self._view[self._start:self._end]
+        self._start = 0
+        self._end = pending
+
+    def _replace_buffer(self, size: int):
+        # A new buffer instead of resizing: payload views handed out earlier must not dangle.
+        pending = self._end - self._start
+        buffer = bytearray(size)
+        buffer[:pending] = self._view[self._start:self._end]
+        self._buffer = buffer
+        self._view = memoryview(buffer)
+        self._start = 0
+        self._end = pending
+
+
+class PayloadCompressor:
+    """
+    Compresses the payloads one side of a connection sends, after CAP_ZLIB was negotiated.
+    All compressed payloads share one deflate stream (flushed per payload), so
+    repetitive chat text compresses against everything sent before. Payloads
+    must therefore be compressed in exactly the order they are written.
+    Payloads below min_bytes are passed through unchanged and do not touch the stream,
+    as are payloads so close to the size limit that deflate overhead could exceed it.
+    """
+
+    # deflate adds 5 bytes per stored 16 KiB block plus the sync marker for incompressible data
+    _MAX_OVERHEAD = 64
+
+    def __init__(
+        self,
+        min_bytes: int = COMPRESSION_MIN_BYTES,
+        level: int = COMPRESSION_LEVEL,
+        max_payload_size: int = MAX_TCP_PACKET_SIZE,
+    ):
+        self._min_bytes = min_bytes
+        self._max_input = max_payload_size - self._MAX_OVERHEAD
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+
+    def compress(self, payload: bytes) -> bytes:
+        size = len(payload)
+        if size < self._min_bytes or size > self._max_input or payload[0] & PT_FLAG_COMPRESSED:
+            return payload
+        view = memoryview(payload)
+        body = self._compressor.compress(view[1:]) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        return bytes((payload[0] | PT_FLAG_COMPRESSED,)) + body
+
+
+class PayloadDecompressor:
+    """
+    Counterpart of PayloadCompressor for the receiving side of a connection.
+    """
+
+    def __init__(self, max_payload_size: int = MAX_TCP_PACKET_SIZE):
+        self._max_payload_size = max_payload_size
+        self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+
+    def decompress(self, payload: bytes | memoryview) -> bytes:
+        """
+        :raises IOError: if the body is not valid or inflates beyond the payload limit
+        """
+        try:
+            body = self._decompressor.decompress(payload[1:], self._max_payload_size)
+        except zlib.error as e:
+            raise IOError("invalid compressed payload") from e
+        if len(self._decompressor.unconsumed_tail) > 0:
+            raise IOError("invalid payload size")
+        return bytes((payload[0] & ~PT_FLAG_COMPRESSED,)) + body
+
+
+_HAS_SENDMSG = hasattr(socket, "sendmsg")
+# Buffers per sendmsg call; IOV_MAX is 1024 on Linux and macOS.
+_MAX_SEND_BUFFERS = 512
+
+
+class PacketSender:
+    """
+    Send side of one connection.
+    Queued frames go out with sendmsg scatter/gather, so length headers and
+    payloads are never concatenated and many frames share one syscall.
+    flush() is for blocking sockets; non-blocking loops call send_some()
+    whenever the socket is writable.
+    """
+
+    def __init__(self, sock: socket):
+        self._sock = sock
+        self._buffers: deque[bytes | memoryview] = deque()
+        self._pending_bytes = 0
+        self._compressor: PayloadCompressor | None = None
+
+    def set_compressor(self, compressor: PayloadCompressor | None):
+        """
+        Compresses every payload queued from now on (see PayloadCompressor).
+        """
+        self._compressor = compressor
+
+    def queue(self, payload: bytes):
+        payload_len = len(payload)
+        if payload_len <= 0:
+            raise ValueError("payload must not be empty")
+        compressor = self._compressor
+        if compressor is not None:
+            payload = compressor.compress(payload)
+            payload_len = len(payload)
+        self._buffers.append(payload_len.to_bytes(4, "big"))
+        self._buffers.append(payload)
+        self._pending_bytes += 4 + payload_len
+
+    def pending_bytes(self) -> int:
+        return self._pending_bytes
+
+    def send_some(self) -> int:
+        """
+        Hands as many queued bytes as possible to the kernel with one syscall.
+        :return: the number of bytes sent
+        :raises OSError: as raised by the socket (e.g. BlockingIOError)
+        """
+        if len(self._buffers) == 0:
+            return 0
+        chunk = list(islice(self._buffers, _MAX_SEND_BUFFERS))
+        if _HAS_SENDMSG:
+            sent = self._sock.sendmsg(chunk)
+        else:
+            sent = self._sock.send(b"".join(chunk))
+        self._advance(sent)
+        return sent
+
+    def flush(self):
+        """
+        Sends everything queued, blocking as needed.
+        """
+        while len(self._buffers) > 0:
+            self.send_some()
+
+    def _advance(self, sent: int):
+        self._pending_bytes -= sent
+        buffers = self._buffers
+        while sent > 0:
+            size = len(buffers[0])
+            if sent < size:
+                buffers[0] = memoryview(buffers[0])[sent:]
+                return
+            buffers.popleft()
+            sent -= size
 
 
 def _build_payload(packet_type: int, body: bytes = b"") -> bytes:
@@ -74,12 +386,35 @@ def _build_payload(packet_type: int, body: bytes = b"") -> bytes:
     return bytes([packet_type]) + body
 
 
-def encode_join(user: User) -> bytes:
+def encode_join(
+        user: User,
+        protocol_version: int = PROTOCOL_V1,
+        capabilities: int = 0,
+        room: str | None = None,
+) -> bytes:
+    """
+    :param room: room to join; None or "" joins the server's default room
+    """
     buffer = BytesIO()
     SerializableUser.create_copy(user).serialize(buffer)
+    # Offered version and capabilities; v1 servers ignore trailing bytes.
+    if room is None or len(room) == 0:
+        _encode_negotiation(buffer, protocol_version, capabilities)
+    else:
+        # The room follows both varints, so they are always sent with it.
+        buffer.write(encode_varint(protocol_version))
+        buffer.write(encode_varint(capabilities))
+        SerializableString(room).serialize(buffer)
     return _build_payload(PT_C_JOIN, buffer.getvalue())
 
 
+def _encode_negotiation(buffer: BytesIO, protocol_version: int, capabilities: int):
+    if protocol_version > PROTOCOL_V1 or capabilities != 0:
+        buffer.write(encode_varint(protocol_version))
+    if capabilities != 0:
+        buffer.write(encode_varint(capabilities))
+
+
 def encode_public_message(message: str) -> bytes:
     buffer = BytesIO()
     SerializableString(message).serialize(buffer)
@@ -98,14 +433,13 @@ def encode_leave() -> bytes:
 
 
 def encode_server_public_message(user_message: UserMessage) -> bytes:
-    buffer = BytesIO()
-    SerializableUserMessage.create_copy(user_message).serialize(buffer)
-    return _build_payload(PT_S_PUBLIC, buffer.getvalue())
+    return _build_payload(PT_S_PUBLIC, SerializableUserMessage.encode(user_message))
 
 
-def encode_server_join_ack(user: User) -> bytes:
+def encode_server_join_ack(user: User, protocol_version: int = PROTOCOL_V1, capabilities: int = 0) -> bytes:
     buffer = BytesIO()
     SerializableUser.create_copy(user).serialize(buffer)
+    _encode_negotiation(buffer, protocol_version, capabilities)
     return _build_payload(PT_S_JOIN_ACK, buffer.getvalue())
 
 
@@ -120,9 +454,7 @@ def encode_server_join_nack(code: str, message: str | None = None) -> bytes:
 
 
 def encode_server_private_message(user_message: UserMessage) -> bytes:
-    buffer = BytesIO()
-    SerializableUserMessage.create_copy(user_message).serialize(buffer)
-    return _build_payload(PT_S_PRIVATE, buffer.getvalue())
+    return _build_payload(PT_S_PRIVATE, SerializableUserMessage.encode(user_message))
 
 
 def encode_server_user_joined(user: User) -> bytes:
@@ -179,16 +511,65 @@ def decode_server_join_ack(body_stream: BytesIO) -> SerializableUser:
     return SerializableUser.deserialize(body_stream)
 
 
-def decode_client_packet(payload: bytes) -> tuple[int, BytesIO]:
+def decode_server_join_ack_negotiation(body_stream: BytesIO) -> tuple[SerializableUser, int, int]:
+    """
+    :return: the session identity, the chosen protocol version and the accepted capabilities
+    """
+    user = SerializableUser.deserialize(body_stream)
+    version = _decode_optional_version(body_stream)
+    return user, version, _decode_optional_capabilities(body_stream)
+
+
+def decode_client_packet(payload: bytes | memoryview) -> tuple[int, BufferReader]:
+    """
+    Splits a payload into packet type and body without copying the body.
+    The body reads from payload, so it is only valid as long as payload is.
+    """
     if len(payload) < 1:
         raise IOError("empty packet")
-    return payload[0], BytesIO(payload[1:])
+    view = payload if isinstance(payload, memoryview) else memoryview(payload)
+    return view[0], BufferReader(view[1:])
 
 
 def decode_join(body_stream: BytesIO) -> SerializableUser:
     return SerializableUser.deserialize(body_stream)
 
 
+def decode_join_negotiation(body_stream: BytesIO) -> tuple[SerializableUser, int, int]:
+    """
+    :return: the requested user, the highest protocol version and the capabilities the client offers
+    """
+    user = SerializableUser.deserialize(body_stream)
+    version = _decode_optional_version(body_stream)
+    return user, version, _decode_optional_capabilities(body_stream)
+
+
+def decode_join_request(body_stream: BytesIO) -> tuple[SerializableUser, int, int, str]:
+    """
+    :return: the requested user, the highest protocol version and the capabilities the client offers,
+        and the requested room ("" for the default room)
+    """
+    user, version, capabilities = decode_join_negotiation(body_stream)
+    if body_stream.tell() >= len(body_stream.getbuffer()):
+        return user, version, capabilities, ""
+    return user, version, capabilities, SerializableString.deserialize(body_stream, MAX_ROOM_ID_LENGTH).value
+
+
+def _decode_optional_capabilities(body_stream: BytesIO) -> int:
+    if body_stream.tell() >= len(body_stream.getbuffer()):
+        return 0
+    return decode_varint(body_stream)
+
+
+def _decode_optional_version(body_stream: BytesIO) -> int:
+    if body_stream.tell() >= len(body_stream.getbuffer()):
+        return PROTOCOL_V1
+    version = decode_varint(body_stream)
+    if version < PROTOCOL_V1:
+        raise IOError("invalid protocol version")
+    return version
+
+
 def decode_public_message(body_stream: BytesIO) -> str:
     return SerializableString.deserialize(body_stream, MAX_MESSAGE_LENGTH).value
 
@@ -197,3 +578,205 @@ def decode_private_message(body_stream: BytesIO) -> tuple[SerializableUUID, str]
     recipient = SerializableUUID.deserialize(body_stream)
     message = SerializableString.deserialize(body_stream, MAX_MESSAGE_LENGTH).value
     return recipient, message
+
+
+# Protocol v2 bodies
+# - integers are unsigned LEB128 varints, strings are varint length + utf-8
+# - timestamps are IEEE-754 doubles (8 bytes, big endian)
+# - users are referenced by a per-server handle; a connection learns a handle from
+#   PT_S_USER_DEFINED/JOINED/LEFT/BECAME_HOST before any message uses it
+_DOUBLE = Struct(">d")
+_MAX_VARINT_BYTES = 10
+
+
+def encode_varint(value: int) -> bytes:
+    if value < 0:
+        raise ValueError("varint must not be negative")
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def decode_varint(body_stream: BytesIO | BufferReader) -> int:
+    read_byte = body_stream.read_byte if isinstance(body_stream, BufferReader) else _stream_read_byte(body_stream)
+    result = 0
+    for index in range(_MAX_VARINT_BYTES):
+        byte = read_byte()
+        if byte < 0:
+            raise IOError("unexpected end of varint")
+        result |= (byte & 0x7F) << (7 * index)
+        if byte & 0x80 == 0:
+            return result
+    raise IOError("varint too long")
+
+
+def _stream_read_byte(body_stream: BytesIO):
+    def read_byte() -> int:
+        byte = body_stream.read(1)
+        return byte[0] if len(byte) > 0 else -1
+    return read_byte
+
+
+def _encode_varstring(value: str) -> bytes:
+    encoded = value.encode("utf-8", "strict")
+    return encode_varint(len(encoded)) + encoded
+
+
+def _decode_varstring(body_stream: BytesIO, max_size: int) -> str:
+    size = decode_varint(body_stream)
+    # utf-8 encoded characters can take up 4 bytes each at most
+    if size > max_size * 4:
+        raise IOError("invalid string size")
+    try:
+        value = str(read_exact_view(body_stream, size), "utf-8", "strict")
+    except UnicodeDecodeError:
+        raise IOError("invalid string encoding")
+    if len(value) > max_size:
+        raise IOError("invalid string size")
+    return value
+
+
+def _encode_user_record_v2(handle: int, user: User) -> bytes:
+    return encode_varint(handle) + user.get_id().bytes + _encode_varstring(user.get_name())
+
+
+def decode_user_record_v2(body_stream: BytesIO, users: UserInterner | None = None) -> tuple[int, SerializableUser]:
+    handle = decode_varint(body_stream)
+    user_id = UUID(int=int.from_bytes(read_exact_view(body_stream, 16), "big"))
+    name = _decode_varstring(body_stream, MAX_USER_NAME_LENGTH)
+    if users is not None:
+        return handle, users.intern(user_id, name)
+    return handle, SerializableUser(user_id, name)
+
+
+def encode_server_user_defined_v2(handle: int, user: User) -> bytes:
+    return _build_payload(PT_S_USER_DEFINED, _encode_user_record_v2(handle, user))
+
+
+def encode_server_user_joined_v2(handle: int, user: User) -> bytes:
+    return _build_payload(PT_S_USER_JOINED, _encode_user_record_v2(handle, user))
+
+
+def encode_server_user_left_v2(handle: int, user: User) -> bytes:
+    return _build_payload(PT_S_USER_LEFT, _encode_user_record_v2(handle, user))
+
+
+def encode_server_user_became_host_v2(handle: int, user: User) -> bytes:
+    return _build_payload(PT_S_USER_BECAME_HOST, _encode_user_record_v2(handle, user))
+
+
+def _encode_user_message_v2(sender_handle: int, user_message: UserMessage) -> bytes:
+    return (
+        encode_varint(sender_handle)
+        + _encode_varstring(user_message.message())
+        + _DOUBLE.pack(user_message.timestamp())
+    )
+
+
+def encode_server_public_message_v2(sender_handle: int, user_message: UserMessage) -> bytes:
+    return _build_payload(PT_S_PUBLIC, _encode_user_message_v2(sender_handle, user_message))
+
+
+def encode_server_private_message_v2(sender_handle: int, user_message: UserMessage) -> bytes:
+    return _build_payload(PT_S_PRIVATE, _encode_user_message_v2(sender_handle, user_message))
+
+
+def decode_user_message_v2(body_stream: BytesIO, users_by_handle: dict[int, User]) -> SerializableUserMessage:
+    """
+    :raises IOError: if the sender handle was never defined on this connection
+    """
+    handle = decode_varint(body_stream)
+    sender = users_by_handle.get(handle)
+    if sender is None:
+        raise IOError(f"unknown sender handle: {handle}")
+    message = _decode_varstring(body_stream, MAX_MESSAGE_LENGTH)
+    (timestamp,) = _DOUBLE.unpack(read_exact_view(body_stream, _DOUBLE.size))
+    return SerializableUserMessage(sender, message, timestamp)
+
+
+def encode_public_message_v2(message: str) -> bytes:
+    return _build_payload(PT_C_PUBLIC, _encode_varstring(message))
+
+
+def encode_private_message_v2(recipient_id: UUID, message: str) -> bytes:
+    return _build_payload(PT_C_PRIVATE, recipient_id.bytes + _encode_varstring(message))
+
+
+def decode_public_message_v2(body_stream: BytesIO) -> str:
+    return _decode_varstring(body_stream, MAX_MESSAGE_LENGTH)
+
+
+def decode_private_message_v2(body_stream: BytesIO) -> tuple[SerializableUUID, str]:
+    recipient = SerializableUUID(UUID(int=int.from_bytes(read_exact_view(body_stream, 16), "big")))
+    message = _decode_varstring(body_stream, MAX_MESSAGE_LENGTH)
+    return recipient, message
+
+
+# History pages (both protocol versions)
+# - request: <selector byte><anchor><varint limit>; the anchor is a varint sequence number for
+#   the *_SEQ selectors, a double for the *_TIME selectors and absent for HISTORY_LAST
+# - page: <varint first seq><varint end seq><varint count><count v1-encoded user messages>,
+#   end seq being the sequence number the next message of the log will get
+#   Messages carry their full sender, so a page needs no handle definitions.
+_HISTORY_SELECTORS = (HISTORY_LAST, HISTORY_BEFORE_SEQ, HISTORY_FROM_SEQ, HISTORY_BEFORE_TIME, HISTORY_FROM_TIME)
+
+
+def encode_history_request(selector: int, anchor: int | float = 0, limit: int = 0) -> bytes:
+    if selector not in _HISTORY_SELECTORS:
+        raise ValueError("unknown history selector")
+    if limit < 0:
+        raise ValueError("limit must not be negative")
+    body = bytes([selector])
+    if selector in (HISTORY_BEFORE_SEQ, HISTORY_FROM_SEQ):
+        body += encode_varint(int(anchor))
+    elif selector in (HISTORY_BEFORE_TIME, HISTORY_FROM_TIME):
+        body += _DOUBLE.pack(float(anchor))
+    return _build_payload(PT_C_HISTORY, body + encode_varint(limit))
+
+
+def decode_history_request(body_stream: BytesIO | BufferReader) -> tuple[int, int | float, int]:
+    """
+    :return: selector, anchor (0 for HISTORY_LAST) and requested page size (0 = server maximum)
+    :raises IOError: if the selector is unknown
+    """
+    selector_bytes = read_exact_view(body_stream, 1)
+    selector = selector_bytes[0]
+    if selector not in _HISTORY_SELECTORS:
+        raise IOError(f"unknown history selector: {selector}")
+    anchor: int | float = 0
+    if selector in (HISTORY_BEFORE_SEQ, HISTORY_FROM_SEQ):
+        anchor = decode_varint(body_stream)
+    elif selector in (HISTORY_BEFORE_TIME, HISTORY_FROM_TIME):
+        (anchor,) = _DOUBLE.unpack(read_exact_view(body_stream, _DOUBLE.size))
+    return selector, anchor, decode_varint(body_stream)
+
+
+def encode_server_history_page(first_seq: int, end_seq: int, encoded_messages: list[bytes]) -> bytes:
+    """
+    :param encoded_messages: messages in log order, each as SerializableUserMessage.encode() returns it
+    """
+    header = encode_varint(first_seq) + encode_varint(end_seq) + encode_varint(len(encoded_messages))
+    return _build_payload(PT_S_HISTORY_PAGE, header + b"".join(encoded_messages))
+
+
+def decode_server_history_page(
+        body_stream: BytesIO | BufferReader,
+        users: UserInterner | None = None,
+) -> tuple[int, int, list[SerializableUserMessage]]:
+    """
+    :param users: shares the senders with earlier decoded messages (see SerializableUserMessage.deserialize)
+    :return: sequence number of the first message, end sequence number of the server log and the messages
+    """
+    first_seq = decode_varint(body_stream)
+    end_seq = decode_varint(body_stream)
+    count = decode_varint(body_stream)
+    if first_seq + count > end_seq:
+        raise IOError("invalid history page")
+    messages = [SerializableUserMessage.deserialize(body_stream, users) for _ in range(count)]
+    return first_seq, end_seq, messages
@@ -0,0 +1,3 @@
+from .link import ClusterLink
+from .coordinator import ClusterCoordinator
+from .supervisor import ServerCluster, reuse_port_available
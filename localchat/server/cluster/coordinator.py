@@ -0,0 +1,430 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from selectors import DefaultSelector, EVENT_READ, EVENT_WRITE
+from socket import socket, socketpair
+from threading import Condition, Thread
+from time import monotonic
+from typing import Callable
+from uuid import UUID
+
+from localchat.config.limits import CLUSTER_BUS_MAX_PENDING_BYTES, MAX_ROOMS
+from localchat.net import tcp_protocol
+from localchat.server.cluster import protocol
+from localchat.util import Role
+
+
+_WAKEUP = "wakeup"
+
+
+@dataclass(eq=False)
+class _Worker:
+    index: int
+    sock: socket
+    receiver: tcp_protocol.PacketReceiver
+    outbox: bytearray = field(default_factory=bytearray)
+    want_write: bool = False
+    ready: bool = False
+    port: int = 0
+    metrics_port: int | None = None
+    failure: str | None = None
+    closed: bool = False
+
+
+@dataclass(eq=False)
+class _Room:
+    # member id -> normalized name, and back
+    names_by_id: dict[UUID, str] = field(default_factory=dict)
+    ids_by_name: dict[str, UUID] = field(default_factory=dict)
+    host_id: UUID | None = None
+    banned_ids: set[UUID] = field(default_factory=set)
+    locked: bool = False
+
+
+def _normalize_member_name(name: str) -> str:
+    # Same rule as AbstractLogic: names are unique ignoring case and surrounding whitespace.
+    return name.strip().casefold()
+
+
+class ClusterCoordinator:
+    """
+    Hub of the bus between the worker processes of a multi-process server, and the
+    authority on membership: which names are taken in which room, who hosts a room, who is
+    banned from it, whether it is locked, and which rooms exist. Workers ask it before a member
+    joins, the host role moves or a ban or lock changes; it
+    answers in the order the requests arrive and tells every other worker about the change
+    first, so all replicas see the same members and hosts.
+    Public messages are passed on to every other worker as they are, private messages and
+    disconnects only to the worker owning the recipient's session.
+    Runs one selector thread and never blocks on a worker: output waits in a per-worker
+    buffer, and a worker that falls behind by CLUSTER_BUS_MAX_PENDING_BYTES is cut off.
+    """
+
+    def __init__(self, max_rooms: int = MAX_ROOMS, max_pending_bytes: int = CLUSTER_BUS_MAX_PENDING_BYTES):
+        if max_rooms < 0:
+            raise ValueError("max_rooms must not be negative")
+        self._max_rooms = max_rooms
+        self._max_pending_bytes = max_pending_bytes
+        self._workers: dict[int, _Worker] = {}
+        self._rooms: dict[str, _Room] = {"": _Room()}
+        # member id -> (worker index, room id)
+        self._owners: dict[UUID, tuple[int, str]] = {}
+        self._error_handler: Callable[[IOError], None] | None = None
+        # Guards the worker states that start()/wait_ready()/stop_workers() look at.
+        self._condition = Condition()
+        self._selector: DefaultSelector | None = None
+        self._wakeup_recv: socket | None = None
+        self._wakeup_send: socket | None = None
+        self._thread: Thread | None = None
+        self._running = False
+        self._stop_requested = False
+
+    def set_error_handler(self, error_handler: Callable[[IOError], None] | None):
+        self._error_handler = error_handler
+
+    def add_worker(self, index: int, bus: socket):
+        """
+        Registers the coordinator's end of a worker's bus; only before start().
+        """
+        if self._thread is not None:
+            raise RuntimeError("workers must be added before start()")
+        if index in self._workers:
+            raise ValueError("worker index already in use")
+        bus.setblocking(False)
+        self._workers[index] = _Worker(index, bus, tcp_protocol.PacketReceiver(bus))
+
+    def start(self):
+        if self._thread is not None:
+            raise RuntimeError("coordinator already started")
+        selector = DefaultSelector()
+        wakeup_recv, wakeup_send = socketpair()
+        wakeup_recv.setblocking(False)
+        wakeup_send.setblocking(False)
+        selector.register(wakeup_recv, EVENT_READ, _WAKEUP)
+        for worker in self._workers.values():
+            selector.register(worker.sock, EVENT_READ, worker)
+        self._selector = selector
+        self._wakeup_recv = wakeup_recv
+        self._wakeup_send = wakeup_send
+        self._running = True
+        self._thread = Thread(target=self._loop, name="localchat cluster coordinator", daemon=True)
+        self._thread.start()
+
+    def wait_ready(self, timeout_s: float) -> dict[int, tuple[int, int | None]]:
+        """
+        Waits until every worker reported that its server runs.
+        :return: worker index -> (port, metrics port)
+        :raises IOError: if a worker failed or exited, or not all workers were ready in time
+        """
+        deadline = monotonic() + timeout_s
+        with self._condition:
+            while True:
+                failed = [worker for worker in self._workers.values() if worker.failure is not None]
+                if len(failed) > 0:
+                    raise IOError(f"worker {failed[0].index} failed: {failed[0].failure}")
+                if all(worker.ready for worker in self._workers.values()):
+                    return {worker.index: (worker.port, worker.metrics_port) for worker in self._workers.values()}
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    raise IOError("workers did not start in time")
+                self._condition.wait(remaining)
+
+    def stop_workers(self, timeout_s: float) -> bool:
+        """
+        Asks every worker to stop and waits until all of them closed their end of the bus.
+        :return: False if some worker did not close it in time
+        """
+        with self._condition:
+            self._stop_requested = True
+        if self._thread is None:
+            return True
+        self._wakeup()
+        deadline = monotonic() + timeout_s
+        with self._condition:
+            while not all(worker.closed for worker in self._workers.values()):
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def close(self):
+        self._running = False
+        if self._thread is None:
+            for worker in self._workers.values():
+                worker.sock.close()
+            return
+        self._wakeup()
+        self._thread.join(timeout=2.0)
+
+    def list_members(self, room_id: str = "") -> dict[UUID, Role]:
+        """
+        Members of a room according to the coordinator (meant for tests and diagnostics;
+        only consistent while no worker changes the membership).
+        """
+        room = self._rooms.get(room_id)
+        if room is None:
+            return {}
+        return {
+            user_id: Role.HOST if user_id == room.host_id else Role.MEMBER
+            for user_id in list(room.names_by_id)
+        }
+
+    def _wakeup(self):
+        sock = self._wakeup_send
+        if sock is None:
+            return
+        try:
+            sock.send(b"\0")
+        except OSError:
+            pass
+
+    def _report(self, error: IOError):
+        if self._error_handler is not None:
+            self._error_handler(error)
+
+    def _loop(self):
+        selector = self._selector
+        stop_sent = False
+        try:
+            while self._running:
+                if self._stop_requested and not stop_sent:
+                    stop_sent = True
+                    self._broadcast(protocol.encode_stop())
+                for key, mask in selector.select(1.0):
+                    if key.data is _WAKEUP:
+                        self._drain_wakeup()
+                        continue
+                    worker: _Worker = key.data
+                    if mask & EVENT_READ:
+                        self._on_readable(worker)
+                # One send per worker and round, however many frames it got.
+                for worker in list(self._workers.values()):
+                    if len(worker.outbox) > 0 and not worker.closed:
+                        self._flush(worker)
+        finally:
+            for worker in self._workers.values():
+                if not worker.closed:
+                    self._close_worker(worker)
+            selector.close()
+            for sock in (self._wakeup_recv, self._wakeup_send):
+                try:
+                    sock.close()
+                except OSError:
+                    pass
+            self._wakeup_send = None
+
+    def _drain_wakeup(self):
+        try:
+            while self._wakeup_recv.recv(4096):
+                pass
+        except OSError:
+            pass
+
+    def _on_readable(self, worker: _Worker):
+        if worker.closed:
+            return
+        try:
+            if worker.receiver.fill() == 0:
+                self._worker_gone(worker, "exited")
+                return
+            payload = worker.receiver.next_packet()
+            while payload is not None:
+                self._handle(worker, payload)
+                if worker.closed:
+                    return
+                payload = worker.receiver.next_packet()
+        except (BlockingIOError, InterruptedError):
+            return
+        except (IOError, OSError) as e:
+            self._worker_gone(worker, f"bus error: {e}")
+
+    def _handle(self, worker: _Worker, payload: memoryview):
+        frame_type, body = protocol.decode_frame(payload)
+        if frame_type == protocol.BUS_PUBLIC:
+            self._broadcast(payload, exclude=worker)
+        elif frame_type == protocol.BUS_PRIVATE:
+            _, recipient_id = protocol.decode_private_recipient(body)
+            self._send_to_owner(recipient_id, payload)
+        elif frame_type == protocol.BUS_DISCONNECT:
+            user_id, _ = protocol.decode_disconnect(body)
+            self._send_to_owner(user_id, payload)
+        elif frame_type == protocol.BUS_ADMIT:
+            request_id, room_id, user = protocol.decode_admit(body)
+            self._admit(worker, request_id, room_id, user)
+        elif frame_type == protocol.BUS_LEFT:
+            room_id, user_id = protocol.decode_left(body)
+            if self._remove_member(user_id, worker.index):
+                self._broadcast(payload, exclude=worker)
+        elif frame_type == protocol.BUS_TRANSFER_HOST:
+            request_id, room_id, user_id = protocol.decode_transfer_host(body)
+            self._transfer_host(worker, request_id, room_id, user_id)
+        elif frame_type == protocol.BUS_BAN:
+            request_id, room_id, user_id, banned = protocol.decode_ban(body)
+            self._ban(worker, request_id, room_id, user_id, banned)
+        elif frame_type == protocol.BUS_LOCK:
+            request_id, room_id, locked = protocol.decode_lock(body)
+            self._lock(worker, request_id, room_id, locked)
+        elif frame_type == protocol.BUS_READY:
+            port, metrics_port = protocol.decode_ready(body)
+            with self._condition:
+                worker.ready = True
+                worker.port = port
+                worker.metrics_port = metrics_port
+                self._condition.notify_all()
+        elif frame_type == protocol.BUS_FAILED:
+            reason = protocol.decode_failed(body)
+            with self._condition:
+                worker.failure = reason
+                self._condition.notify_all()
+        else:
+            raise IOError(f"unknown bus frame type {frame_type}")
+
+    def _admit(self, worker: _Worker, request_id: int, room_id: str, user):
+        room = self._rooms.get(room_id)
+        if room is None:
+            # The default room is not counted.
+            if len(self._rooms) - 1 >= self._max_rooms:
+                self._send(worker, protocol.encode_reply(request_id, tcp_protocol.ERR_TOO_MANY_ROOMS))
+                return
+            room = _Room()
+            self._rooms[room_id] = room
+        user_id = user.get_id()
+        name_key = _normalize_member_name(user.get_name())
+        owner_id = room.ids_by_name.get(name_key)
+        if (owner_id is not None and owner_id != user_id) or user_id in self._owners:
+            self._send(worker, protocol.encode_reply(request_id, tcp_protocol.ERR_USER_NAME_IN_USE))
+            return
+        role = Role.HOST if room.host_id is None else Role.MEMBER
+        # Same rules as AbstractLogic: a banned user never joins, a locked room only admits a new host.
+        if user_id in room.banned_ids:
+            self._send(worker, protocol.encode_reply(request_id, protocol.REPLY_BANNED))
+            return
+        if room.locked and role != Role.HOST:
+            self._send(worker, protocol.encode_reply(request_id, protocol.REPLY_LOCKED))
+            return
+        room.names_by_id[user_id] = name_key
+        room.ids_by_name[name_key] = user_id
+        if role == Role.HOST:
+            room.host_id = user_id
+        self._owners[user_id] = (worker.index, room_id)
+        # The joining worker registers the member itself once it has the reply.
+        self._broadcast(protocol.encode_joined(room_id, user, role), exclude=worker)
+        self._send(worker, protocol.encode_reply(request_id, protocol.REPLY_OK, role))
+
+    def _transfer_host(self, worker: _Worker, request_id: int, room_id: str, user_id: UUID):
+        room = self._rooms.get(room_id)
+        if room is None or user_id not in room.names_by_id:
+            self._send(worker, protocol.encode_reply(request_id, protocol.REPLY_UNKNOWN_MEMBER))
+            return
+        if room.host_id != user_id:
+            room.host_id = user_id
+            # The requesting worker included: it applies the change before it reads the reply.
+            self._broadcast(protocol.encode_host(room_id, user_id))
+        self._send(worker, protocol.encode_reply(request_id, protocol.REPLY_OK))
+
+    def _ban(self, worker: _Worker, request_id: int, room_id: str, user_id: UUID, banned: bool):
+        room = self._rooms.get(room_id)
+        if room is None:
+            self._send(worker, protocol.encode_reply(request_id, protocol.REPLY_UNKNOWN_ROOM))
+            return
+        if banned:
+            room.banned_ids.add(user_id)
+        else:
+            room.banned_ids.discard(user_id)
+        # The requesting worker included: it applies the change before it reads the reply.
+        self._broadcast(protocol.encode_banned(room_id, user_id, banned))
+        self._send(worker, protocol.encode_reply(request_id, protocol.REPLY_OK))
+
+    def _lock(self, worker: _Worker, request_id: int, room_id: str, locked: bool):
+        room = self._rooms.get(room_id)
+        if room is None:
+            self._send(worker, protocol.encode_reply(request_id, protocol.REPLY_UNKNOWN_ROOM))
+            return
+        room.locked = locked
+        self._broadcast(protocol.encode_locked(room_id, locked))
+        self._send(worker, protocol.encode_reply(request_id, protocol.REPLY_OK))
+
+    def _remove_member(self, user_id: UUID, worker_index: int) -> bool:
+        """
+        :return: False if the member is unknown or belongs to another worker
+        """
+        owner = self._owners.get(user_id)
+        if owner is None or owner[0] != worker_index:
+            return False
+        del self._owners[user_id]
+        room = self._rooms[owner[1]]
+        name_key = room.names_by_id.pop(user_id)
+        if room.ids_by_name.get(name_key) == user_id:
+            del room.ids_by_name[name_key]
+        if room.host_id == user_id:
+            room.host_id = None
+        return True
+
+    def _send_to_owner(self, user_id: UUID, payload: memoryview):
+        owner = self._owners.get(user_id)
+        if owner is None:
+            # Left in the meantime.
+            return
+        worker = self._workers.get(owner[0])
+        if worker is not None:
+            self._send(worker, payload)
+
+    def _broadcast(self, payload: bytes | memoryview, exclude: _Worker | None = None):
+        frame = len(payload).to_bytes(4, "big") + payload
+        for worker in list(self._workers.values()):
+            if worker is not exclude and not worker.closed:
+                self._enqueue(worker, frame)
+
+    def _send(self, worker: _Worker, payload: bytes | memoryview):
+        if not worker.closed:
+            self._enqueue(worker, len(payload).to_bytes(4, "big") + payload)
+
+    def _enqueue(self, worker: _Worker, frame: bytes):
+        worker.outbox += frame
+        if len(worker.outbox) > self._max_pending_bytes:
+            self._worker_gone(worker, "fell too far behind on the cluster bus")
+
+    def _flush(self, worker: _Worker):
+        try:
+            sent = worker.sock.send(worker.outbox)
+        except (BlockingIOError, InterruptedError):
+            sent = 0
+        except OSError as e:
+            self._worker_gone(worker, f"bus error: {e}")
+            return
+        del worker.outbox[:sent]
+        want_write = len(worker.outbox) > 0
+        if want_write != worker.want_write:
+            worker.want_write = want_write
+            self._selector.modify(worker.sock, EVENT_READ | EVENT_WRITE if want_write else EVENT_READ, worker)
+
+    def _worker_gone(self, worker: _Worker, reason: str):
+        """
+        Drops a worker whose bus closed: its members leave every other worker's replica.
+        """
+        if worker.closed:
+            return
+        self._close_worker(worker)
+        if not self._stop_requested:
+            self._report(IOError(f"cluster worker {worker.index} {reason}"))
+        gone = [(user_id, room_id) for user_id, (index, room_id) in self._owners.items() if index == worker.index]
+        for user_id, room_id in gone:
+            self._remove_member(user_id, worker.index)
+            self._broadcast(protocol.encode_left(room_id, user_id))
+
+    def _close_worker(self, worker: _Worker):
+        with self._condition:
+            worker.closed = True
+            if not worker.ready and worker.failure is None:
+                worker.failure = "exited before it was ready"
+            self._condition.notify_all()
+        worker.outbox.clear()
+        try:
+            self._selector.unregister(worker.sock)
+        except (KeyError, OSError, ValueError):
+            pass
+        try:
+            worker.sock.close()
+        except OSError:
+            pass
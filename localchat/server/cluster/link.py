@@ -0,0 +1,321 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from socket import AF_INET, SHUT_RDWR, SO_REUSEADDR, SOCK_STREAM, SOL_SOCKET, socket
+from threading import Event as ThreadEvent, Lock, Thread
+from typing import TYPE_CHECKING, Callable
+from uuid import UUID
+
+from localchat.config.limits import CLUSTER_RPC_TIMEOUT_S
+from localchat.net import tcp_protocol
+from localchat.server.cluster import protocol
+from localchat.util import Role, User, UserMessage
+
+if TYPE_CHECKING:
+    from localchat.server.logicImpl.TcpServerLogic import TcpServerLogic
+
+
+@dataclass(eq=False)
+class _PendingReply:
+    done: ThreadEvent = field(default_factory=ThreadEvent)
+    code: str = protocol.REPLY_OK
+    role: Role = Role.MEMBER
+    error: IOError | None = None
+
+
+class ClusterLink:
+    """
+    A worker process's end of the cluster bus (see ClusterCoordinator).
+    The server asks the coordinator to admit joins, to move the host role and to change bans
+    and locks (blocking round trips), and reports leaves and messages. A reader thread applies
+    what other workers did to the server's replica of every room: members, host role, bans,
+    locks and public messages.
+    Frames from the coordinator are applied in order, so a reply is only seen after every
+    change the coordinator made before it.
+    """
+
+    def __init__(
+            self,
+            bus: socket,
+            worker_index: int,
+            server_id: UUID,
+            listener: socket | None = None,
+            reuse_port: bool = False,
+            answers_discovery: bool = True,
+            rpc_timeout_s: float = CLUSTER_RPC_TIMEOUT_S,
+    ):
+        """
+        :param bus: connected stream socket to the coordinator (e.g. one end of a socketpair)
+        :param server_id: id every worker reports in its server info and discovery
+        :param listener: listening socket shared by all workers; None: the server binds its own
+        :param reuse_port: bind the own listener with SO_REUSEPORT, so the workers share the port
+        :param answers_discovery: whether this worker's server answers discovery requests
+            (one worker per cluster should)
+        """
+        bus.setblocking(True)
+        self._bus = bus
+        self._worker_index = worker_index
+        self._server_id = server_id
+        self._listener = listener
+        self._reuse_port = reuse_port
+        self._answers_discovery = answers_discovery
+        self._rpc_timeout_s = rpc_timeout_s
+        self._receiver = tcp_protocol.PacketReceiver(bus)
+        self._send_lock = Lock()
+        self._pending_lock = Lock()
+        self._pending: dict[int, _PendingReply] = {}
+        self._next_request_id = 0
+        self._server: TcpServerLogic | None = None
+        self._error_handler: Callable[[IOError], None] | None = None
+        self._reader: Thread | None = None
+        self._stop_requested = ThreadEvent()
+        self._closed = False
+
+    def get_worker_index(self) -> int:
+        return self._worker_index
+
+    def get_server_id(self) -> UUID:
+        return self._server_id
+
+    def answers_discovery(self) -> bool:
+        return self._answers_discovery
+
+    def open_listener(self, host: str, port: int, backlog: int | None = None) -> socket:
+        """
+        :return: the shared listener, or a new one bound to host:port
+        :raises OSError: if binding fails
+        """
+        if self._listener is not None:
+            return self._listener
+        listener = socket(AF_INET, SOCK_STREAM)
+        try:
+            listener.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+            if self._reuse_port:
+                # Every worker binds the same port; the kernel spreads new connections over them.
+                from socket import SO_REUSEPORT
+                listener.setsockopt(SOL_SOCKET, SO_REUSEPORT, 1)
+            listener.bind((host, port))
+            if backlog is None:
+                listener.listen()
+            else:
+                listener.listen(backlog)
+        except OSError:
+            listener.close()
+            raise
+        return listener
+
+    def attach(self, server: TcpServerLogic, error_handler: Callable[[IOError], None]):
+        """
+        Starts applying the coordinator's frames to server.
+        """
+        if self._server is not None:
+            raise RuntimeError("link is already attached")
+        self._server = server
+        self._error_handler = error_handler
+        self._reader = Thread(target=self._read_loop, name=f"localchat cluster link {self._worker_index}", daemon=True)
+        self._reader.start()
+
+    # Requests (block until the coordinator answered)
+
+    def admit(self, room_id: str, user: User) -> Role:
+        """
+        Reserves user's name in the room for the whole cluster.
+        :return: the role of the new member (HOST if the room has no host)
+        :raises PermissionError: if another member of the room uses this name
+        :raises ConnectionRefusedError: if the user is banned from the room or the room is locked
+        :raises LookupError: if the room does not exist and the cluster may not open more rooms
+        :raises IOError: if the coordinator cannot be reached
+        """
+        reply = self._request(lambda request_id: protocol.encode_admit(request_id, room_id, user))
+        if reply.code == tcp_protocol.ERR_USER_NAME_IN_USE:
+            raise PermissionError("user name already in use")
+        if reply.code == protocol.REPLY_BANNED:
+            raise ConnectionRefusedError("user is banned")
+        if reply.code == protocol.REPLY_LOCKED:
+            raise ConnectionRefusedError("server is locked")
+        if reply.code == tcp_protocol.ERR_TOO_MANY_ROOMS:
+            raise LookupError("too many rooms")
+        if reply.code != protocol.REPLY_OK:
+            raise IOError(f"join refused by the cluster: {reply.code}")
+        return reply.role
+
+    def transfer_host(self, room_id: str, new_host_id: UUID):
+        """
+        Moves the room's host role; every worker has applied it when this returns.
+        :raises KeyError: if new_host_id is not a member of the room
+        :raises IOError: if the coordinator cannot be reached
+        """
+        reply = self._request(lambda request_id: protocol.encode_transfer_host(request_id, room_id, new_host_id))
+        if reply.code == protocol.REPLY_UNKNOWN_MEMBER:
+            raise KeyError("unknown user")
+        if reply.code != protocol.REPLY_OK:
+            raise IOError(f"host change refused by the cluster: {reply.code}")
+
+    def set_banned(self, room_id: str, user_id: UUID, banned: bool):
+        """
+        Bans (or unbans) user_id from the room on every worker. This worker has applied it when this
+        returns; the coordinator decides on joins with it from then on.
+        :raises KeyError: if the cluster does not know the room
+        :raises IOError: if the coordinator cannot be reached
+        """
+        reply = self._request(lambda request_id: protocol.encode_ban(request_id, room_id, user_id, banned))
+        if reply.code == protocol.REPLY_UNKNOWN_ROOM:
+            raise KeyError("unknown room")
+        if reply.code != protocol.REPLY_OK:
+            raise IOError(f"ban refused by the cluster: {reply.code}")
+
+    def set_locked(self, room_id: str, locked: bool):
+        """
+        Locks (or unlocks) the room on every worker. This worker has applied it when this returns;
+        the coordinator decides on joins with it from then on.
+        :raises KeyError: if the cluster does not know the room
+        :raises IOError: if the coordinator cannot be reached
+        """
+        reply = self._request(lambda request_id: protocol.encode_lock(request_id, room_id, locked))
+        if reply.code == protocol.REPLY_UNKNOWN_ROOM:
+            raise KeyError("unknown room")
+        if reply.code != protocol.REPLY_OK:
+            raise IOError(f"lock refused by the cluster: {reply.code}")
+
+    def _request(self, encode: Callable[[int], bytes]) -> _PendingReply:
+        pending = _PendingReply()
+        with self._pending_lock:
+            if self._closed:
+                raise IOError("cluster bus is closed")
+            request_id = self._next_request_id
+            self._next_request_id += 1
+            self._pending[request_id] = pending
+        try:
+            self._send(encode(request_id))
+            if not pending.done.wait(self._rpc_timeout_s):
+                raise IOError("cluster coordinator did not answer in time")
+        finally:
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+        if pending.error is not None:
+            raise pending.error
+        return pending
+
+    # Notifications (never block on the coordinator's answer)
+
+    def report_ready(self, port: int, metrics_port: int | None):
+        self._notify(protocol.encode_ready(port, metrics_port))
+
+    def report_failed(self, reason: str):
+        self._notify(protocol.encode_failed(reason))
+
+    def member_left(self, room_id: str, user_id: UUID):
+        self._notify(protocol.encode_left(room_id, user_id))
+
+    def publish_public(self, room_id: str, message: UserMessage):
+        self._notify(protocol.encode_public(room_id, message))
+
+    def send_private(self, room_id: str, recipient_id: UUID, message: UserMessage):
+        self._notify(protocol.encode_private(room_id, recipient_id, message))
+
+    def disconnect(self, user_id: UUID, reason: str):
+        self._notify(protocol.encode_disconnect(user_id, reason))
+
+    def _notify(self, payload: bytes):
+        try:
+            self._send(payload)
+        except IOError as e:
+            self._report(e)
+
+    def _send(self, payload: bytes):
+        """
+        :raises IOError: if the bus is closed or broken
+        """
+        try:
+            with self._send_lock:
+                tcp_protocol.send_packet(self._bus, payload)
+        except OSError as e:
+            raise IOError("cluster bus failed") from e
+
+    def _report(self, error: IOError):
+        if self._error_handler is not None and not self._closed:
+            self._error_handler(error)
+
+    # Lifecycle
+
+    def wait_for_stop(self, timeout: float | None = None) -> bool:
+        """
+        :return: True once the coordinator asked this worker to stop or the bus closed
+        """
+        return self._stop_requested.wait(timeout)
+
+    def request_stop(self):
+        self._stop_requested.set()
+
+    def close(self):
+        with self._pending_lock:
+            self._closed = True
+        try:
+            # Wakes the reader thread: close() alone does not interrupt its recv.
+            self._bus.shutdown(SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            self._bus.close()
+        except OSError:
+            pass
+        if self._reader is not None:
+            self._reader.join(timeout=1.0)
+
+    def _read_loop(self):
+        try:
+            while True:
+                self._apply(self._receiver.recv_packet())
+        except (IOError, OSError) as e:
+            if not self._closed and not self._stop_requested.is_set():
+                error = IOError("cluster coordinator went away")
+                error.__cause__ = e
+                self._report(error)
+        finally:
+            self._stop_requested.set()
+            with self._pending_lock:
+                self._closed = True
+                pending = list(self._pending.values())
+            for reply in pending:
+                reply.error = IOError("cluster bus is closed")
+                reply.done.set()
+
+    def _apply(self, payload: memoryview):
+        frame_type, body = protocol.decode_frame(payload)
+        server = self._server
+        if frame_type == protocol.BUS_PUBLIC:
+            room_id, message = protocol.decode_public(body)
+            server._apply_cluster_public(room_id, message)
+        elif frame_type == protocol.BUS_REPLY:
+            request_id, code, role = protocol.decode_reply(body)
+            with self._pending_lock:
+                pending = self._pending.get(request_id)
+            if pending is not None:
+                pending.code = code
+                pending.role = role
+                pending.done.set()
+        elif frame_type == protocol.BUS_JOINED:
+            room_id, user, role = protocol.decode_joined(body)
+            server._apply_cluster_member_joined(room_id, user, role)
+        elif frame_type == protocol.BUS_LEFT:
+            room_id, user_id = protocol.decode_left(body)
+            server._apply_cluster_member_left(room_id, user_id)
+        elif frame_type == protocol.BUS_HOST:
+            room_id, user_id = protocol.decode_host(body)
+            server._apply_cluster_host_changed(room_id, user_id)
+        elif frame_type == protocol.BUS_BANNED:
+            room_id, user_id, banned = protocol.decode_banned(body)
+            server._apply_cluster_banned(room_id, user_id, banned)
+        elif frame_type == protocol.BUS_LOCKED:
+            room_id, locked = protocol.decode_locked(body)
+            server._apply_cluster_locked(room_id, locked)
+        elif frame_type == protocol.BUS_PRIVATE:
+            room_id, recipient_id = protocol.decode_private_recipient(body)
+            server._apply_cluster_private(room_id, recipient_id, protocol.decode_private_message(body))
+        elif frame_type == protocol.BUS_DISCONNECT:
+            user_id, reason = protocol.decode_disconnect(body)
+            server._apply_cluster_disconnect(user_id, reason)
+        elif frame_type == protocol.BUS_STOP:
+            self._stop_requested.set()
+        else:
+            raise IOError(f"unknown bus frame type {frame_type}")
@@ -0,0 +1,260 @@
+"""
+Frames of the bus between the coordinator and the worker processes of a multi-process server.
+Every frame is one length-prefixed payload (the framing of tcp_protocol) that starts with its type.
+Chat messages travel in their SerializableUserMessage encoding, so they are not encoded again per hop.
+"""
+from __future__ import annotations
+
+from uuid import UUID
+
+from localchat.config.limits import MAX_MESSAGE_LENGTH, MAX_ROOM_ID_LENGTH, MAX_USER_NAME_LENGTH
+from localchat.net import BufferReader, SerializableUser, SerializableUserMessage, read_exact_view
+from localchat.net.tcp_protocol import decode_varint, encode_varint
+from localchat.util import Role, User, UserMessage
+
+
+# worker -> coordinator
+BUS_READY = 1
+BUS_FAILED = 2
+BUS_ADMIT = 3
+BUS_TRANSFER_HOST = 4
+BUS_BAN = 5
+BUS_LOCK = 6
+# coordinator -> worker
+BUS_REPLY = 20
+BUS_JOINED = 21
+BUS_HOST = 22
+BUS_STOP = 23
+BUS_BANNED = 24
+BUS_LOCKED = 25
+# both directions: a worker reports them, the coordinator passes them on
+BUS_LEFT = 40
+BUS_PUBLIC = 41
+BUS_PRIVATE = 42
+BUS_DISCONNECT = 43
+
+# reply codes besides the tcp_protocol join codes (user_name_in_use, too_many_rooms)
+REPLY_OK = ""
+REPLY_UNKNOWN_MEMBER = "unknown_member"
+REPLY_UNKNOWN_ROOM = "unknown_room"
+REPLY_BANNED = "banned"
+REPLY_LOCKED = "locked"
+
+_HOST_FLAG = 1
+
+
+def decode_frame(payload: bytes | memoryview) -> tuple[int, BufferReader]:
+    """
+    :raises IOError: if the payload is empty
+    """
+    if len(payload) == 0:
+        raise IOError("empty bus frame")
+    return payload[0], BufferReader(memoryview(payload)[1:])
+
+
+def _encode_string(value: str) -> bytes:
+    encoded = value.encode("utf-8", "strict")
+    return encode_varint(len(encoded)) + encoded
+
+
+def _decode_string(body: BufferReader, max_size: int) -> str:
+    size = decode_varint(body)
+    # utf-8 encoded characters can take up 4 bytes each at most
+    if size > max_size * 4:
+        raise IOError("invalid string size")
+    try:
+        value = str(read_exact_view(body, size), "utf-8", "strict")
+    except UnicodeDecodeError:
+        raise IOError("invalid string encoding")
+    if len(value) > max_size:
+        raise IOError("invalid string size")
+    return value
+
+
+def _encode_user(user: User) -> bytes:
+    return user.get_id().bytes + _encode_string(user.get_name())
+
+
+def _decode_user(body: BufferReader) -> SerializableUser:
+    user_id = _decode_uuid(body)
+    return SerializableUser(user_id, _decode_string(body, MAX_USER_NAME_LENGTH))
+
+
+def _decode_uuid(body: BufferReader) -> UUID:
+    return UUID(bytes=bytes(read_exact_view(body, 16)))
+
+
+def _decode_flag(body: BufferReader) -> bool:
+    flag = body.read_byte()
+    if flag < 0:
+        raise IOError("truncated bus frame")
+    return flag != 0
+
+
+def _decode_message(body: BufferReader) -> SerializableUserMessage:
+    return SerializableUserMessage.from_encoded(body.read())
+
+
+def encode_ready(port: int, metrics_port: int | None) -> bytes:
+    return bytes((BUS_READY,)) + encode_varint(port) + encode_varint(0 if metrics_port is None else metrics_port + 1)
+
+
+def decode_ready(body: BufferReader) -> tuple[int, int | None]:
+    port = decode_varint(body)
+    metrics_port = decode_varint(body)
+    return port, None if metrics_port == 0 else metrics_port - 1
+
+
+def encode_failed(reason: str) -> bytes:
+    return bytes((BUS_FAILED,)) + _encode_string(reason[:MAX_MESSAGE_LENGTH])
+
+
+def decode_failed(body: BufferReader) -> str:
+    return _decode_string(body, MAX_MESSAGE_LENGTH)
+
+
+def encode_admit(request_id: int, room_id: str, user: User) -> bytes:
+    return bytes((BUS_ADMIT,)) + encode_varint(request_id) + _encode_string(room_id) + _encode_user(user)
+
+
+def decode_admit(body: BufferReader) -> tuple[int, str, SerializableUser]:
+    request_id = decode_varint(body)
+    room_id = _decode_string(body, MAX_ROOM_ID_LENGTH)
+    return request_id, room_id, _decode_user(body)
+
+
+def encode_transfer_host(request_id: int, room_id: str, user_id: UUID) -> bytes:
+    return bytes((BUS_TRANSFER_HOST,)) + encode_varint(request_id) + _encode_string(room_id) + user_id.bytes
+
+
+def decode_transfer_host(body: BufferReader) -> tuple[int, str, UUID]:
+    request_id = decode_varint(body)
+    room_id = _decode_string(body, MAX_ROOM_ID_LENGTH)
+    return request_id, room_id, _decode_uuid(body)
+
+
+def encode_ban(request_id: int, room_id: str, user_id: UUID, banned: bool) -> bytes:
+    return bytes((BUS_BAN,)) + encode_varint(request_id) + _encode_string(room_id) + user_id.bytes + bytes((banned,))
+
+
+def decode_ban(body: BufferReader) -> tuple[int, str, UUID, bool]:
+    request_id = decode_varint(body)
+    room_id = _decode_string(body, MAX_ROOM_ID_LENGTH)
+    return request_id, room_id, _decode_uuid(body), _decode_flag(body)
+
+
+def encode_lock(request_id: int, room_id: str, locked: bool) -> bytes:
+    return bytes((BUS_LOCK,)) + encode_varint(request_id) + _encode_string(room_id) + bytes((locked,))
+
+
+def decode_lock(body: BufferReader) -> tuple[int, str, bool]:
+    request_id = decode_varint(body)
+    room_id = _decode_string(body, MAX_ROOM_ID_LENGTH)
+    return request_id, room_id, _decode_flag(body)
+
+
+def encode_reply(request_id: int, code: str = REPLY_OK, role: Role = Role.MEMBER) -> bytes:
+    flags = _HOST_FLAG if role == Role.HOST else 0
+    return bytes((BUS_REPLY,)) + encode_varint(request_id) + _encode_string(code) + bytes((flags,))
+
+
+def decode_reply(body: BufferReader) -> tuple[int, str, Role]:
+    request_id = decode_varint(body)
+    code = _decode_string(body, MAX_MESSAGE_LENGTH)
+    flags = body.read_byte()
+    if flags < 0:
+        raise IOError("truncated bus reply")
+    return request_id, code, Role.HOST if flags & _HOST_FLAG else Role.MEMBER
+
+
+def encode_joined(room_id: str, user: User, role: Role) -> bytes:
+    flags = _HOST_FLAG if role == Role.HOST else 0
+    return bytes((BUS_JOINED,)) + _encode_string(room_id) + _encode_user(user) + bytes((flags,))
+
+
+def decode_joined(body: BufferReader) -> tuple[str, SerializableUser, Role]:
+    room_id = _decode_string(body, MAX_ROOM_ID_LENGTH)
+    user = _decode_user(body)
+    flags = body.read_byte()
+    if flags < 0:
+        raise IOError("truncated bus frame")
+    return room_id, user, Role.HOST if flags & _HOST_FLAG else Role.MEMBER
+
+
+def encode_left(room_id: str, user_id: UUID) -> bytes:
+    return bytes((BUS_LEFT,)) + _encode_string(room_id) + user_id.bytes
+
+
+def decode_left(body: BufferReader) -> tuple[str, UUID]:
+    room_id = _decode_string(body, MAX_ROOM_ID_LENGTH)
+    return room_id, _decode_uuid(body)
+
+
+def encode_host(room_id: str, user_id: UUID) -> bytes:
+    return bytes((BUS_HOST,)) + _encode_string(room_id) + user_id.bytes
+
+
+def decode_host(body: BufferReader) -> tuple[str, UUID]:
+    room_id = _decode_string(body, MAX_ROOM_ID_LENGTH)
+    return room_id, _decode_uuid(body)
+
+
+def encode_banned(room_id: str, user_id: UUID, banned: bool) -> bytes:
+    return bytes((BUS_BANNED,)) + _encode_string(room_id) + user_id.bytes + bytes((banned,))
+
+
+def decode_banned(body: BufferReader) -> tuple[str, UUID, bool]:
+    room_id = _decode_string(body, MAX_ROOM_ID_LENGTH)
+    return room_id, _decode_uuid(body), _decode_flag(body)
+
+
+def encode_locked(room_id: str, locked: bool) -> bytes:
+    return bytes((BUS_LOCKED,)) + _encode_string(room_id) + bytes((locked,))
+
+
+def decode_locked(body: BufferReader) -> tuple[str, bool]:
+    room_id = _decode_string(body, MAX_ROOM_ID_LENGTH)
+    return room_id, _decode_flag(body)
+
+
+def encode_stop() -> bytes:
+    return bytes((BUS_STOP,))
+
+
+def encode_public(room_id: str, message: UserMessage) -> bytes:
+    return b"".join((bytes((BUS_PUBLIC,)), _encode_string(room_id), SerializableUserMessage.encode(message)))
+
+
+def decode_public(body: BufferReader) -> tuple[str, SerializableUserMessage]:
+    room_id = _decode_string(body, MAX_ROOM_ID_LENGTH)
+    return room_id, _decode_message(body)
+
+
+def encode_private(room_id: str, recipient_id: UUID, message: UserMessage) -> bytes:
+    return b"".join((
+        bytes((BUS_PRIVATE,)),
+        _encode_string(room_id),
+        recipient_id.bytes,
+        SerializableUserMessage.encode(message),
+    ))
+
+
+def decode_private_recipient(body: BufferReader) -> tuple[str, UUID]:
+    """
+    Reads only what routing needs; decode_private_message() reads the rest.
+    """
+    room_id = _decode_string(body, MAX_ROOM_ID_LENGTH)
+    return room_id, _decode_uuid(body)
+
+
+def decode_private_message(body: BufferReader) -> SerializableUserMessage:
+    return _decode_message(body)
+
+
+def encode_disconnect(user_id: UUID, reason: str) -> bytes:
+    return bytes((BUS_DISCONNECT,)) + user_id.bytes + _encode_string(reason[:MAX_MESSAGE_LENGTH])
+
+
+def decode_disconnect(body: BufferReader) -> tuple[UUID, str]:
+    user_id = _decode_uuid(body)
+    return user_id, _decode_string(body, MAX_MESSAGE_LENGTH)
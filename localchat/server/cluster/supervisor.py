@@ -0,0 +1,296 @@
+from __future__ import annotations
+
+import multiprocessing
+import sys
+from dataclasses import dataclass, field
+from socket import AF_INET, SOCK_STREAM, SOL_SOCKET, SO_REUSEADDR, SOMAXCONN, socket, socketpair
+from uuid import UUID, uuid4
+
+from localchat.config.defaults import DEFAULT_HOST, DEFAULT_PORT
+from localchat.config.limits import CLUSTER_START_TIMEOUT_S, MAX_ROOMS, MAX_SERVER_WORKERS
+from localchat.server.cluster.coordinator import ClusterCoordinator
+from localchat.server.cluster.link import ClusterLink
+from localchat.util.event import Event, EventHandler, EventListener
+
+
+_SERVER_KINDS = ("threaded", "async")
+_STOP_TIMEOUT_S = 5.0
+
+
+def reuse_port_available() -> bool:
+    """
+    Whether the workers can bind the same port themselves and let the kernel balance new
+    connections (SO_REUSEPORT on Linux); elsewhere they share one inherited listener.
+    """
+    import socket as socket_module
+    return sys.platform.startswith("linux") and hasattr(socket_module, "SO_REUSEPORT")
+
+
+@dataclass(frozen=True)
+class _WorkerSpec:
+    index: int
+    server: str
+    host: str
+    port: int
+    server_id: UUID
+    name: str | None
+    password: str | None
+    max_rooms: int
+    metrics: bool
+    metrics_port: int | None
+    reuse_port: bool
+    server_options: dict = field(default_factory=dict)
+
+
+class ServerCluster:
+    """
+    Runs one chat server as several worker processes, so it is not bound to a single core.
+    Every worker runs a complete TcpServerLogic on the same port and owns the sessions the
+    kernel hands it; a ClusterCoordinator in this process keeps members, hosts and rooms
+    consistent across the workers and passes public messages on to all of them.
+    Journals are not supported: a journal has a single writer.
+    """
+
+    def __init__(
+            self,
+            workers: int,
+            server: str = "async",
+            host: str = DEFAULT_HOST,
+            port: int = DEFAULT_PORT,
+            name: str | None = None,
+            password: str | None = None,
+            max_rooms: int = MAX_ROOMS,
+            metrics: bool = True,
+            metrics_port: int | None = None,
+            server_options: dict | None = None,
+            reuse_port: bool | None = None,
+    ):
+        """
+        :param server: server core of every worker ("threaded" or "async")
+        :param metrics_port: worker i serves its metrics on metrics_port + i (0: any free port)
+        :param server_options: further keyword arguments for every worker's server, e.g.
+            max_clients (per worker) or rate_limit_msg_per_sec; they must be picklable
+        :param reuse_port: None: bind with SO_REUSEPORT where the kernel balances it (Linux)
+        """
+        if workers <= 0 or workers > MAX_SERVER_WORKERS:
+            raise ValueError(f"workers must be in range 1..{MAX_SERVER_WORKERS}")
+        if server not in _SERVER_KINDS:
+            raise ValueError(f"server must be one of {', '.join(_SERVER_KINDS)}")
+        if max_rooms < 0:
+            raise ValueError("max_rooms must not be negative")
+        if metrics_port is not None and (metrics_port < 0 or metrics_port + workers - 1 > 65535):
+            raise ValueError("metrics ports must be in range 0..65535")
+        options = dict(server_options) if server_options is not None else {}
+        for reserved in ("host", "port", "max_rooms", "metrics", "metrics_port", "journal", "room_journal_factory"):
+            if reserved in options:
+                raise ValueError(f"{reserved} cannot be passed in server_options")
+        self._workers = workers
+        self._server = server
+        self._host = host
+        self._port = port
+        self._name = name
+        self._password = password
+        self._max_rooms = max_rooms
+        self._metrics = metrics
+        self._metrics_port = metrics_port
+        self._server_options = options
+        self._reuse_port = reuse_port_available() if reuse_port is None else reuse_port
+        self._server_id = uuid4()
+        self._coordinator: ClusterCoordinator | None = None
+        # Listening socket shared by the workers, or (with SO_REUSEPORT) a bound socket that
+        # keeps the port reserved while the workers come and go.
+        self._port_socket: socket | None = None
+        self._processes: list = []
+        self._worker_ports: dict[int, tuple[int, int | None]] = {}
+        self._error_handler: EventHandler[IOError] = EventHandler()
+
+    def start(self):
+        """
+        Starts every worker and returns once all of them accept connections.
+        :raises IOError: if the port cannot be bound or a worker fails to start
+        """
+        if self._coordinator is not None:
+            raise RuntimeError("cluster already started")
+        port_socket = self._open_port_socket()
+        port = int(port_socket.getsockname()[1])
+        self._port_socket = port_socket
+        coordinator = ClusterCoordinator(self._max_rooms)
+        coordinator.set_error_handler(self._emit_error)
+        self._coordinator = coordinator
+        context = multiprocessing.get_context("spawn")
+        try:
+            for index in range(self._workers):
+                coordinator_end, worker_end = socketpair()
+                coordinator.add_worker(index, coordinator_end)
+                spec = _WorkerSpec(
+                    index=index,
+                    server=self._server,
+                    host=self._host,
+                    port=port,
+                    server_id=self._server_id,
+                    name=self._name,
+                    password=self._password,
+                    max_rooms=self._max_rooms,
+                    metrics=self._metrics,
+                    metrics_port=None if self._metrics_port is None else self._worker_metrics_port(index),
+                    reuse_port=self._reuse_port,
+                    server_options=self._server_options,
+                )
+                process = context.Process(
+                    target=_run_worker,
+                    args=(spec, worker_end, None if self._reuse_port else port_socket),
+                    name=f"localchat-server-{index}",
+                    daemon=True,
+                )
+                try:
+                    process.start()
+                finally:
+                    worker_end.close()
+                self._processes.append(process)
+            coordinator.start()
+            self._worker_ports = coordinator.wait_ready(CLUSTER_START_TIMEOUT_S)
+        except (OSError, ValueError) as e:
+            self.stop()
+            raise IOError(f"could not start the server workers: {e}") from e
+
+    def _worker_metrics_port(self, index: int) -> int:
+        return 0 if self._metrics_port == 0 else self._metrics_port + index
+
+    def _open_port_socket(self) -> socket:
+        """
+        :raises IOError: if host:port cannot be bound
+        """
+        port_socket = socket(AF_INET, SOCK_STREAM)
+        try:
+            port_socket.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+            if self._reuse_port:
+                from socket import SO_REUSEPORT
+                port_socket.setsockopt(SOL_SOCKET, SO_REUSEPORT, 1)
+            port_socket.bind((self._host, self._port))
+            if not self._reuse_port:
+                port_socket.listen(SOMAXCONN)
+        except OSError as e:
+            port_socket.close()
+            raise IOError(f"could not bind {self._host}:{self._port}: {e}") from e
+        return port_socket
+
+    def stop(self):
+        """
+        Stops the workers (their members are disconnected like on a single server's stop).
+        """
+        coordinator = self._coordinator
+        if coordinator is None:
+            return
+        self._coordinator = None
+        coordinator.stop_workers(_STOP_TIMEOUT_S)
+        for process in self._processes:
+            process.join(_STOP_TIMEOUT_S)
+            if process.is_alive():
+                process.terminate()
+                process.join(1.0)
+        coordinator.close()
+        self._processes = []
+        self._worker_ports = {}
+        if self._port_socket is not None:
+            self._port_socket.close()
+            self._port_socket = None
+
+    def is_running(self) -> bool:
+        return self._coordinator is not None
+
+    def get_server_id(self) -> UUID:
+        return self._server_id
+
+    def get_port(self) -> int:
+        """
+        :return: the port every worker accepts on (0 before start())
+        """
+        if len(self._worker_ports) == 0:
+            return 0
+        return self._worker_ports[0][0]
+
+    def get_metrics_ports(self) -> list[int]:
+        """
+        :return: the Prometheus endpoint port of every worker that serves one, in worker order
+        """
+        return [
+            metrics_port
+            for _, (_, metrics_port) in sorted(self._worker_ports.items())
+            if metrics_port is not None
+        ]
+
+    def get_worker_pids(self) -> list[int]:
+        return [process.pid for process in self._processes if process.pid is not None]
+
+    def get_coordinator(self) -> ClusterCoordinator | None:
+        return self._coordinator
+
+    def on_error(self) -> EventHandler[IOError]:
+        """
+        Errors of the cluster itself, e.g. a worker that exited; the workers report their own
+        errors on their stderr.
+        """
+        return self._error_handler
+
+    def _emit_error(self, error: IOError):
+        self._error_handler.handle(Event(self._server_id, error))
+
+
+class _PrintWorkerError(EventListener[IOError]):
+    def __init__(self, worker_index: int):
+        self._worker_index = worker_index
+
+    def on_event(self, event: Event[IOError]):
+        error = event.value()
+        cause = error.__cause__
+        message = f"worker {self._worker_index}: error: {error}" + (f" ({cause})" if cause is not None else "")
+        print(message, file=sys.stderr, flush=True)
+
+
+def _run_worker(spec: _WorkerSpec, bus: socket, listener: socket | None):
+    import signal
+
+    link = ClusterLink(
+        bus,
+        spec.index,
+        spec.server_id,
+        listener=listener,
+        reuse_port=spec.reuse_port,
+        answers_discovery=spec.index == 0,
+    )
+    # Ctrl+C reaches the whole process group: the parent stops the workers in order.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda _signum, _frame: link.request_stop())
+
+    from localchat.server.logicImpl import AsyncTcpServerLogic, TcpServerLogic
+    from localchat.util.metrics import MetricsRegistry
+
+    server_type = AsyncTcpServerLogic if spec.server == "async" else TcpServerLogic
+    try:
+        server = server_type(
+            host=spec.host,
+            port=spec.port,
+            max_rooms=spec.max_rooms,
+            metrics=MetricsRegistry(enabled=spec.metrics),
+            metrics_port=spec.metrics_port,
+            **spec.server_options,
+        )
+        if spec.name is not None:
+            server.set_server_name(spec.name)
+        if spec.password is not None:
+            server.set_server_password(spec.password)
+        server.on_error().add_listener(_PrintWorkerError(spec.index))
+        server.set_cluster_link(link)
+        server.start()
+    except (OSError, ValueError) as e:
+        link.report_failed(str(e) if len(str(e)) > 0 else repr(e))
+        link.close()
+        return
+    link.report_ready(server.get_server_info().get_port(), server.get_metrics_port())
+    try:
+        # With a timeout, so the SIGTERM handler gets to run.
+        while not link.wait_for_stop(1.0):
+            pass
+    finally:
+        server.stop()
+        link.close()
@@ -1,11 +1,64 @@
 from __future__ import annotations
 
+import re
 from dataclasses import dataclass
+from datetime import datetime
 from shlex import split as shell_split
+from time import time
 from uuid import UUID
 
+from localchat.config.limits import SEARCH_RESULTS_PER_PAGE
 from localchat.server.logic import Logic
 from localchat.util import Role, User
+from localchat.util.metrics import MetricsRegistry, lock_report
+
+
+_DURATION_PATTERN = re.compile(r"^(\d+(?:\.\d+)?)([smhd])$")
+_DURATION_UNITS = {"s": 1.0, "m": 60.0, "h": 3600.0, "d": 86400.0}
+_SEARCH_PREVIEW_LENGTH = 120
+
+
+def _parse_since(value: str) -> float | None:
+    """
+    Accepts a relative age (30s, 15m, 2h, 1d) or an ISO date/time in local time.
+    """
+    match = _DURATION_PATTERN.match(value.strip().lower())
+    if match is not None:
+        return time() - float(match.group(1)) * _DURATION_UNITS[match.group(2)]
+    try:
+        return datetime.fromisoformat(value.strip()).timestamp()
+    except ValueError:
+        return None
+
+
+def _value(metrics: MetricsRegistry, name: str, labels: dict[str, str]) -> float:
+    try:
+        return metrics.value(name, labels)
+    except KeyError:
+        return 0
+
+
+def _count(value: float) -> str:
+    return str(int(value))
+
+
+def _format_bytes(size: float) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+def _format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes}m{seconds:02d}s"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m"
 
 
 @dataclass(frozen=True)
@@ -28,8 +81,10 @@ class ServerCommandDispatcher:
             "whoami": _CommandSpec("whoami", False, "/whoami"),
             "list": _CommandSpec("list", False, "/list"),
             "serverinfo": _CommandSpec("serverinfo", False, "/serverinfo"),
+            "search": _CommandSpec("search", False, "/search <terms> [--from user] [--since 1h] [--page n]"),
             "kick": _CommandSpec("kick", True, "/kick <user-id-prefix> [reason]"),
             "newhost": _CommandSpec("newhost", True, "/newhost <user-id-prefix>"),
+            "stats": _CommandSpec("stats", True, "/stats"),
         }
 
     def try_execute(self, actor_id: UUID, raw_message: str) -> bool:
@@ -69,20 +124,26 @@ class ServerCommandDispatcher:
         if raw_name == "serverinfo":
             self._handle_serverinfo(actor_id)
             return True
+        if raw_name == "search":
+            self._handle_search(actor_id, args)
+            return True
         if raw_name == "kick":
             self._handle_kick(actor_id, args)
             return True
         if raw_name == "newhost":
             self._handle_newhost(actor_id, args)
             return True
+        if raw_name == "stats":
+            self._handle_stats(actor_id)
+            return True
 
         self._reply(actor_id, "unknown command")
         return True
 
     def _handle_help(self, actor_id: UUID):
         role = self._logic.get_user_role(actor_id)
-        base = ["/help", "/whoami", "/list", "/serverinfo"]
-        host_only = ["/kick <user-id-prefix> [reason]", "/newhost <user-id-prefix>"]
+        base = ["/help", "/whoami", "/list", "/serverinfo", self._commands["search"].usage]
+        host_only = ["/kick <user-id-prefix> [reason]", "/newhost <user-id-prefix>", "/stats"]
         if role == Role.HOST:
             body = "available commands: " + ", ".join(base + host_only)
         else:
@@ -94,18 +155,21 @@ class ServerCommandDispatcher:
         role = self._logic.get_user_role(actor_id)
         info = self._logic.get_server_info()
         host = self._logic.get_host_user()
+        room_id = self._logic.get_room_id()
+        in_room = "" if room_id == "" else f"in room '{room_id}' "
         self._reply(
             actor_id,
             "you are "
             f"'{user.get_name()}' (id={user.get_id()}, role={role.value}) "
             f"on server '{info.get_name()}' ({info.get_ip_address()}:{info.get_port()}) "
-            f"host='{host.get_name()}'",
+            f"{in_room}host='{host.get_name()}'",
         )
 
     def _handle_list(self, actor_id: UUID):
         members = self._logic.list_members()
+        room_id = self._logic.get_room_id()
         if len(members) == 0:
-            self._reply(actor_id, "no connected members")
+            self._reply(actor_id, "no connected members" if room_id == "" else f"no connected members in room '{room_id}'")
             return
         lines: list[str] = []
         for member in members:
@@ -114,18 +178,81 @@ class ServerCommandDispatcher:
             except KeyError:
                 role = "unknown"
             lines.append(f"{member.get_name()} [id={member.get_id()} role={role}]")
-        self._reply(actor_id, "members: " + "; ".join(lines))
+        heading = "members: " if room_id == "" else f"members of room '{room_id}': "
+        self._reply(actor_id, heading + "; ".join(lines))
 
     def _handle_serverinfo(self, actor_id: UUID):
         info = self._logic.get_server_info()
         host = self._logic.get_host_user()
         members = self._logic.list_members()
-        self._reply(
-            actor_id,
+        rooms = self._logic.list_rooms()
+        body = (
             f"server '{info.get_name()}' "
             f"(id={info.get_id()}, endpoint={info.get_ip_address()}:{info.get_port()}), "
-            f"host='{host.get_name()}', members={len(members)}",
+            f"host='{host.get_name()}', members={len(members)}"
         )
+        if len(rooms) > 1:
+            room_id = self._logic.get_room_id()
+            body += f", room='{room_id}'" if room_id != "" else ", room=default"
+            body += f", rooms={len(rooms)} ({sum(rooms.values())} members in total)"
+        self._reply(actor_id, body)
+
+    def _handle_search(self, actor_id: UUID, args: list[str]):
+        usage = f"usage: {self._commands['search'].usage}"
+        terms: list[str] = []
+        sender: str | None = None
+        since: float | None = None
+        page = 1
+        index = 0
+        while index < len(args):
+            arg = args[index]
+            if arg in ("--from", "--since", "--page"):
+                if index + 1 >= len(args):
+                    self._reply(actor_id, usage)
+                    return
+                value = args[index + 1]
+                index += 2
+                if arg == "--from":
+                    sender = value
+                elif arg == "--since":
+                    since = _parse_since(value)
+                    if since is None:
+                        self._reply(actor_id, f"invalid time: {value} (use e.g. 30m, 2h, 1d or 2026-01-31T14:00)")
+                        return
+                else:
+                    if not value.isdigit() or int(value) < 1:
+                        self._reply(actor_id, f"invalid page: {value}")
+                        return
+                    page = int(value)
+                continue
+            terms.append(arg)
+            index += 1
+        if len(terms) == 0:
+            self._reply(actor_id, usage)
+            return
+
+        # One extra hit tells whether there is a next page.
+        hits = self._logic.search_messages(
+            terms,
+            sender,
+            since,
+            offset=(page - 1) * SEARCH_RESULTS_PER_PAGE,
+            limit=SEARCH_RESULTS_PER_PAGE + 1,
+        )
+        query = " ".join(terms)
+        if len(hits) == 0:
+            self._reply(actor_id, f"no messages found for '{query}'" + (f" (page {page})" if page > 1 else ""))
+            return
+        lines = [f"search '{query}', page {page}:"]
+        for seq, message in hits[:SEARCH_RESULTS_PER_PAGE]:
+            text = message.message()
+            if len(text) > _SEARCH_PREVIEW_LENGTH:
+                text = text[:_SEARCH_PREVIEW_LENGTH - 3] + "..."
+            posted = datetime.fromtimestamp(message.timestamp()).strftime("%Y-%m-%d %H:%M")
+            lines.append(f"#{seq} [{posted}] {message.sender().get_name()}: {text}")
+        if len(hits) > SEARCH_RESULTS_PER_PAGE:
+            lines.append(f"more results: add --page {page + 1}")
+        self._reply(actor_id, "\n".join(lines))
 
     def _handle_kick(self, actor_id: UUID, args: list[str]):
         if len(args) < 1:
@@ -160,6 +287,50 @@ class ServerCommandDispatcher:
             self._reply(actor_id, f"host transferred to '{target.get_name()}'")
         except KeyError:
             self._reply(actor_id, "target user not found")
+        except IOError as e:
+            self._reply(actor_id, f"host transfer failed: {e}")
+
+    def _handle_stats(self, actor_id: UUID):
+        metrics = self._logic.get_metrics()
+        if metrics is None or not metrics.is_enabled():
+            self._reply(actor_id, "metrics are not available")
+            return
+        lines = [
+            f"stats after {_format_duration(self._logic.get_uptime_seconds())}:",
+            f"sessions: {_count(_value(metrics, 'localchat_sessions', {'state': 'joined'}))} joined, "
+            f"{_count(_value(metrics, 'localchat_sessions', {'state': 'pending'}))} pending, "
+            f"{len(self._logic.list_rooms())} rooms",
+            f"messages: {_count(_value(metrics, 'localchat_messages_total', {'kind': 'public'}))} public, "
+            f"{_count(_value(metrics, 'localchat_messages_total', {'kind': 'private'}))} private",
+            f"traffic: {_count(metrics.total('localchat_packets_received_total'))} packets in "
+            f"({_format_bytes(metrics.total('localchat_received_bytes_total'))}), "
+            f"{_count(metrics.total('localchat_packets_sent_total'))} out "
+            f"({_format_bytes(metrics.total('localchat_sent_bytes_total'))})",
+            f"rate limited: {_count(metrics.total('localchat_rate_limited_total'))}, "
+            f"send failures: {_count(metrics.total('localchat_send_failures_total'))}, "
+            f"joins rejected: {_count(metrics.total('localchat_join_rejected_total'))}, "
+            f"dropped for slow clients: {_count(metrics.total('localchat_outbound_dropped_total'))}",
+        ]
+        latencies = []
+        for label, name in (("packet", "localchat_packet_handle_seconds"), ("broadcast", "localchat_broadcast_seconds")):
+            try:
+                histogram = metrics.get_histogram(name)
+            except KeyError:
+                continue
+            if histogram.count() == 0:
+                continue
+            latencies.append(
+                f"{label} p50 {histogram.quantile(0.5) * 1000:.3f} ms / p99 {histogram.quantile(0.99) * 1000:.3f} ms"
+            )
+        if len(latencies) > 0:
+            lines.append("latency: " + ", ".join(latencies))
+        for entry in lock_report(metrics):
+            lines.append(
+                f"lock {entry['lock']}: {entry['acquisitions']} acquired, {entry['contended']} contended, "
+                f"wait {entry['wait_total_s'] * 1000:.1f} ms total / p99 {entry['wait_p99_s'] * 1e6:.1f} us, "
+                f"hold p99 {entry['hold_p99_s'] * 1e6:.1f} us"
+            )
+        self._reply(actor_id, "\n".join(lines))
 
     def _is_host(self, user_id: UUID) -> bool:
         try:
@@ -174,31 +345,22 @@ class ServerCommandDispatcher:
 
         # Exact UUID first.
         try:
-            user_id = UUID(token)
-            for member in self._logic.list_members():
-                if member.get_id() == user_id:
-                    return member
-        except ValueError:
+            return self._logic.get_member(UUID(token))
+        except (ValueError, KeyError):
             pass
 
         # Unique UUID prefix.
-        prefix_matches = [m for m in self._logic.list_members() if str(m.get_id()).lower().startswith(token)]
+        prefix_matches = self._logic.find_members_by_id_prefix(token, limit=2)
         if len(prefix_matches) == 1:
             return prefix_matches[0]
         if len(prefix_matches) > 1:
             return None
 
         # Unique name (case-insensitive).
-        name_matches = [m for m in self._logic.list_members() if m.get_name().lower() == token]
-        if len(name_matches) == 1:
-            return name_matches[0]
-        return None
+        return self._logic.find_member_by_name(token)
 
     def _find_member(self, user_id: UUID) -> User:
-        for member in self._logic.list_members():
-            if member.get_id() == user_id:
-                return member
-        raise KeyError("unknown user")
+        return self._logic.get_member(user_id)
 
     def _reply(self, recipient_id: UUID, message: str):
         self._logic.send_system_private_message(recipient_id, message)
@@ -3,6 +3,7 @@ from uuid import UUID
 
 from localchat.util import BinaryIOBase, ChatInformation, Role, User, UserMessage
 from localchat.util.event import EventHandler
+from localchat.util.metrics import MetricsRegistry
 
 
 class Logic(ABC):
@@ -81,7 +82,7 @@ class Logic(ABC):
     def register_member(self, user: User, role: Role = Role.MEMBER):
         """
         Registers a connected member in server state.
-        Implementations should enforce ban/lock rules.
+        Implementations should enforce ban/lock rules and unique member names (case-insensitive).
         :raises PermissionError: if join is not permitted
         :raises IOError:
         """
@@ -89,6 +90,24 @@ class Logic(ABC):
     @abstractmethod
     def list_members(self) -> list[User]: ...
 
+    @abstractmethod
+    def get_member(self, user_id: UUID) -> User:
+        """
+        :raises KeyError: if no member with this id is connected
+        """
+
+    @abstractmethod
+    def find_member_by_name(self, name: str) -> User | None:
+        """
+        Looks up a member by name, ignoring case and surrounding whitespace.
+        """
+
+    @abstractmethod
+    def find_members_by_id_prefix(self, prefix: str, limit: int = 2) -> list[User]:
+        """
+        Returns up to limit members whose id string starts with prefix, ordered by id.
+        """
+
     @abstractmethod
     def get_host_user(self) -> User: ...
 
@@ -153,6 +172,43 @@ class Logic(ABC):
         :raises IOError:
         """
 
+    @abstractmethod
+    def search_messages(
+            self,
+            terms: list[str],
+            sender: str | None = None,
+            since: float | None = None,
+            offset: int = 0,
+            limit: int = 10,
+    ) -> list[tuple[int, UserMessage]]:
+        """
+        Full-text search over the public chat history, newest match first.
+        Every term has to occur in a message (case-insensitive, whole words).
+        :param sender: sender name (case-insensitive) or sender id prefix
+        :param since: oldest timestamp that may match
+        :param offset: number of matches to skip (pagination)
+        :return: (sequence number, message) pairs
+        """
+
+    def get_metrics(self) -> MetricsRegistry | None:
+        """
+        Counters and latency histograms of this server (/stats, Prometheus endpoint).
+        :return: None if the implementation does not collect metrics
+        """
+        return None
+
+    def get_room_id(self) -> str:
+        """
+        Room this logic hosts; "" is the default room (the only one of servers without rooms).
+        """
+        return ""
+
+    def list_rooms(self) -> dict[str, int]:
+        """
+        Every room of the server this logic belongs to, with its member count.
+        """
+        return {self.get_room_id(): len(self.list_members())}
+
     @abstractmethod
     def export_state(self, output_stream: BinaryIOBase):
         """
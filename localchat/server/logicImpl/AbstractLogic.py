@@ -1,23 +1,37 @@
 from __future__ import annotations
 
 from abc import abstractmethod
+from bisect import bisect_left, insort
 from ipaddress import IPv4Address, IPv6Address
-from threading import RLock
 from time import monotonic, time
 from uuid import UUID, uuid4
 
-from localchat.config.limits import MAX_CHAT_NAME_LENGTH
+from localchat.config.defaults import DEFAULT_LOCK_PROFILING, DEFAULT_SERVER_NAME
+from localchat.config.limits import MAX_CHAT_NAME_LENGTH, SEARCH_RESULTS_PER_PAGE
 from localchat.net import (
     SerializableChatInformation,
     SerializableList,
     SerializableString,
     SerializableUUID,
+    SerializableUserMessage,
     SerializableUserMessageList,
     read_exact,
 )
 from localchat.server.logic import Logic
+from localchat.server.logicImpl.ChatLog import ChatLog
+from localchat.server.logicImpl.MessageJournal import (
+    JR_BAN,
+    JR_PUBLIC_MESSAGE,
+    JR_RESET,
+    JR_UNBAN,
+    MessageJournal,
+    decode_public_message,
+    decode_user_id,
+)
+from localchat.server.logicImpl.MessageSearchIndex import MessageSearchIndex
 from localchat.util import BinaryIOBase, ChatInformation, Role, User, UserMessage
-from localchat.util.event import Event, EventHandler
+from localchat.util.event import Event, EventDispatcher, EventHandler
+from localchat.util.metrics import MetricsRegistry, create_lock
 
 
 _READY = 0
@@ -71,41 +85,53 @@ class _ServerUser(User):
         return IPv4Address("0.0.0.0")
 
 
-class _ConcreteUserMessage(UserMessage):
-    def __init__(self, sender: User, message: str, timestamp: float):
-        self._sender = sender
-        self._message = message
-        self._timestamp = timestamp
-
-    def sender(self) -> User:
-        return self._sender
-
-    def message(self) -> str:
-        return self._message
-
-    def timestamp(self) -> float:
-        return self._timestamp
+def _normalize_member_name(name: str) -> str:
+    return name.strip().casefold()
 
 
 class AbstractLogic(Logic):
     _STATE_VERSION = 0x0001_0000_0000_0000
-
-    def __init__(self):
+    # Label of _lock in the lock profile.
+    _LOCK_NAME = "logic"
+
+    def __init__(
+            self,
+            chat_log: ChatLog | None = None,
+            journal: MessageJournal | None = None,
+            search_index: MessageSearchIndex | None = None,
+            metrics: MetricsRegistry | None = None,
+            lock_profiling: bool = DEFAULT_LOCK_PROFILING,
+    ):
+        """
+        :param lock_profiling: use InstrumentedLocks for the shared server locks, reported in
+            the metrics as localchat_lock_* (see lock_report())
+        """
         super().__init__()
-        self._lock = RLock()
+        self._metrics = metrics if metrics is not None else MetricsRegistry()
+        self._lock_profiling = lock_profiling
+        self._lock = self._create_lock(self._LOCK_NAME, reentrant=True)
         self._state = _READY
         self._started_at: float | None = None
 
-        self._server_info = _MutableChatInformation(uuid4(), "localchat-server", 0)
+        self._server_info = _MutableChatInformation(uuid4(), DEFAULT_SERVER_NAME, 0)
         self._locked = False
         self._host_client_port: int | None = None
 
+        # Member index; every structure is updated together under _lock.
         self._members_by_id: dict[UUID, User] = {}
+        self._member_ids_by_name: dict[str, UUID] = {}
+        self._member_id_strings: list[str] = []
         self._roles_by_id: dict[UUID, Role] = {}
         self._host_user_id: UUID | None = None
         self._banned_user_ids: set[UUID] = set()
 
-        self._chat_log: list[UserMessage] = []
+        self._chat_log = chat_log if chat_log is not None else ChatLog()
+        # Kept in step with _chat_log (same sequence numbers) under _lock.
+        self._search_index = search_index if search_index is not None else MessageSearchIndex()
+        self._journal = journal
+        self._journal_replayed = False
+        if journal is not None:
+            journal.set_error_handler(self._emit_error)
         self._server_user = _ServerUser(uuid4())
 
         self._member_joined_handler: EventHandler[User] = EventHandler()
@@ -115,6 +141,21 @@ class AbstractLogic(Logic):
         self._private_message_handler: EventHandler[UserMessage] = EventHandler()
         self._error_handler: EventHandler[IOError] = EventHandler()
 
+        self._public_messages_metric = self._metrics.counter(
+            "localchat_messages_total", "Chat messages accepted by the server.", {"kind": "public"},
+        )
+        self._private_messages_metric = self._metrics.counter(
+            "localchat_messages_total", "Chat messages accepted by the server.", {"kind": "private"},
+        )
+        self._metrics.gauge("localchat_members", "Members currently joined.", self._count_members)
+        self._metrics.gauge("localchat_uptime_seconds", "Seconds since the server was started.", self.get_uptime_seconds)
+
+    def _count_members(self) -> int:
+        return len(self._members_by_id)
+
+    def _create_lock(self, name: str, reentrant: bool = False):
+        return create_lock(name, self._metrics, self._lock_profiling, reentrant)
+
     def _event_owner(self) -> UUID:
         return self._server_info.get_id()
 
@@ -128,7 +169,10 @@ class AbstractLogic(Logic):
         self._error_handler.handle(Event(self._event_owner(), error))
 
     def _make_user_message(self, sender: User, message: str) -> UserMessage:
-        return _ConcreteUserMessage(sender, message, time())
+        # Encoded once here; broadcast, private delivery, chat log and journal reuse the bytes.
+        user_message = SerializableUserMessage(sender, message, time())
+        user_message.encoded()
+        return user_message
 
     def _register_member(self, user: User, role: Role):
         with self._lock:
@@ -154,10 +198,22 @@ class AbstractLogic(Logic):
         if role == Role.HOST and self._host_user_id is not None and self._host_user_id != user_id:
             effective_role = Role.MEMBER
 
+        name_key = _normalize_member_name(user.get_name())
+        owner_id = self._member_ids_by_name.get(name_key)
+        if owner_id is not None and owner_id != user_id:
+            raise PermissionError("user name already in use")
+
+        previous = self._members_by_id.get(user_id)
+        if previous is not None:
+            self._drop_member_index_locked(previous)
         self._members_by_id[user_id] = user
+        self._member_ids_by_name[name_key] = user_id
+        insort(self._member_id_strings, str(user_id))
         self._roles_by_id[user_id] = effective_role
         if effective_role == Role.HOST:
             self._host_user_id = user_id
+        if self._journal_is_open():
+            self._journal.append_member_joined(user)
         return effective_role
 
     def register_member(self, user: User, role: Role = Role.MEMBER):
@@ -167,18 +223,84 @@ class AbstractLogic(Logic):
         removed: User | None = None
         with self._lock:
             removed = self._members_by_id.pop(user_id, None)
+            if removed is not None:
+                self._drop_member_index_locked(removed)
+                if self._journal_is_open():
+                    self._journal.append_member_left(user_id)
             self._roles_by_id.pop(user_id, None)
             if self._host_user_id == user_id:
                 self._host_user_id = None
         if removed is not None:
             self._member_left_handler.handle(Event(self._event_owner(), removed))
 
+    def _drop_member_index_locked(self, user: User):
+        user_id = user.get_id()
+        name_key = _normalize_member_name(user.get_name())
+        if self._member_ids_by_name.get(name_key) == user_id:
+            del self._member_ids_by_name[name_key]
+        id_string = str(user_id)
+        index = bisect_left(self._member_id_strings, id_string)
+        if index < len(self._member_id_strings) and self._member_id_strings[index] == id_string:
+            del self._member_id_strings[index]
+
     def _record_public_message(self, message: UserMessage):
+        self._public_messages_metric.inc()
+        with self._lock:
+            self._append_to_log_locked(message)
+            if self._journal_is_open():
+                self._journal.append_public_message(message)
+        self._public_message_handler.handle(Event(self._event_owner(), message))
+
+    def _record_replicated_public_message(self, message: UserMessage):
+        """
+        Records a public message another worker of a multi-process server accepted: it was
+        counted and journaled there.
+        """
         with self._lock:
-            self._chat_log.append(message)
+            self._append_to_log_locked(message)
         self._public_message_handler.handle(Event(self._event_owner(), message))
 
+    def _append_to_log_locked(self, message: UserMessage):
+        self._search_index.add(self._chat_log.append(message), message)
+
+    def _clear_log_locked(self):
+        self._chat_log.clear()
+        self._search_index.clear()
+
+    def _journal_is_open(self) -> bool:
+        return self._journal is not None and self._journal.is_open()
+
+    def _open_journal(self):
+        """
+        Replays the journal into the chat log and ban list (once per instance) and opens it for appending.
+        """
+        if self._journal is None:
+            return
+        with self._lock:
+            if not self._journal_replayed:
+                for record in self._journal.replay():
+                    self._apply_journal_record_locked(record.record_type, record.payload)
+                self._journal_replayed = True
+            self._journal.open()
+
+    def _apply_journal_record_locked(self, record_type: int, payload: bytes):
+        if record_type == JR_PUBLIC_MESSAGE:
+            self._append_to_log_locked(decode_public_message(payload))
+        elif record_type == JR_BAN:
+            self._banned_user_ids.add(decode_user_id(payload))
+        elif record_type == JR_UNBAN:
+            self._banned_user_ids.discard(decode_user_id(payload))
+        elif record_type == JR_RESET:
+            self._clear_log_locked()
+            self._banned_user_ids.clear()
+        # Membership records are informational: sessions do not survive a restart.
+
+    def _close_journal(self):
+        if self._journal is not None:
+            self._journal.close()
+
     def _record_private_message(self, message: UserMessage):
+        self._private_messages_metric.inc()
         self._private_message_handler.handle(Event(self._event_owner(), message))
 
     def start(self):
@@ -188,8 +310,10 @@ class AbstractLogic(Logic):
             self._state = _RUNNING
             self._started_at = monotonic()
         try:
+            self._open_journal()
             self._on_start_impl()
         except IOError as e:
+            self._close_journal()
             with self._lock:
                 self._state = _STOPPED
             self._emit_error(e)
@@ -213,6 +337,7 @@ class AbstractLogic(Logic):
         try:
             self._on_stop_impl()
         finally:
+            self._close_journal()
             with self._lock:
                 self._state = _STOPPED
 
@@ -266,6 +391,34 @@ class AbstractLogic(Logic):
         with self._lock:
             return list(self._members_by_id.values())
 
+    def get_member(self, user_id: UUID) -> User:
+        with self._lock:
+            user = self._members_by_id.get(user_id)
+        if user is None:
+            raise KeyError("unknown user")
+        return user
+
+    def find_member_by_name(self, name: str) -> User | None:
+        name_key = _normalize_member_name(name)
+        with self._lock:
+            user_id = self._member_ids_by_name.get(name_key)
+            return self._members_by_id.get(user_id) if user_id is not None else None
+
+    def find_members_by_id_prefix(self, prefix: str, limit: int = 2) -> list[User]:
+        prefix = prefix.strip().lower()
+        matches: list[User] = []
+        if len(prefix) == 0 or limit <= 0:
+            return matches
+        with self._lock:
+            index = bisect_left(self._member_id_strings, prefix)
+            while index < len(self._member_id_strings) and len(matches) < limit:
+                id_string = self._member_id_strings[index]
+                if not id_string.startswith(prefix):
+                    break
+                matches.append(self._members_by_id[UUID(id_string)])
+                index += 1
+        return matches
+
     def get_host_user(self) -> User:
         with self._lock:
             if self._host_user_id is None:
@@ -306,17 +459,38 @@ class AbstractLogic(Logic):
 
     def ban_member(self, user_id: UUID, reason: str = ""):
         with self._lock:
-            if user_id not in self._members_by_id:
-                raise KeyError("unknown user")
-            if self._host_user_id == user_id:
-                raise PermissionError("host cannot be banned")
-            self._banned_user_ids.add(user_id)
+            self._check_bannable_locked(user_id)
+            self._set_banned_locked(user_id, True)
         self._disconnect_member_impl(user_id, reason)
         self._unregister_member(user_id)
 
     def unban_member(self, user_id: UUID):
         with self._lock:
+            self._set_banned_locked(user_id, False)
+
+    def _check_bannable_locked(self, user_id: UUID):
+        """
+        :raises KeyError: if user_id is not a member
+        :raises PermissionError: if user_id is the host
+        """
+        if user_id not in self._members_by_id:
+            raise KeyError("unknown user")
+        if self._host_user_id == user_id:
+            raise PermissionError("host cannot be banned")
+
+    def _set_banned(self, user_id: UUID, banned: bool):
+        with self._lock:
+            self._set_banned_locked(user_id, banned)
+
+    def _set_banned_locked(self, user_id: UUID, banned: bool):
+        if banned:
+            self._banned_user_ids.add(user_id)
+            if self._journal_is_open():
+                self._journal.append_ban(user_id)
+        else:
             self._banned_user_ids.discard(user_id)
+            if self._journal_is_open():
+                self._journal.append_unban(user_id)
 
     def list_banned_users(self) -> set[UUID]:
         with self._lock:
@@ -336,10 +510,26 @@ class AbstractLogic(Logic):
         self._send_private_impl(recipient_id, user_message)
 
     def save_chat(self, output_stream: BinaryIOBase):
-        serial = SerializableUserMessageList()
         with self._lock:
-            serial.items = list(self._chat_log)
-        serial.serialize(output_stream)
+            chat_log = self._chat_log.snapshot()
+        chat_log.write_to(output_stream)
+
+    def search_messages(
+            self,
+            terms: list[str],
+            sender: str | None = None,
+            since: float | None = None,
+            offset: int = 0,
+            limit: int = SEARCH_RESULTS_PER_PAGE,
+    ) -> list[tuple[int, UserMessage]]:
+        since_seq = 0 if since is None else self._chat_log.seq_of_timestamp(since)
+        hits: list[tuple[int, UserMessage]] = []
+        for seq in self._search_index.search(terms, sender, since_seq, offset, limit):
+            first_seq, _, messages = self._chat_log.read_page(seq, 1, backwards=False)
+            # A clear() between search and read leaves nothing (or something else) at seq.
+            if first_seq == seq and len(messages) == 1:
+                hits.append((seq, messages[0]))
+        return hits
 
     def export_state(self, output_stream: BinaryIOBase):
         with self._lock:
@@ -348,7 +538,7 @@ class AbstractLogic(Logic):
             host_client_port = self._host_client_port
             banned = list(self._banned_user_ids)
             host_user_id = self._host_user_id
-            chat_log = list(self._chat_log)
+            chat_log = self._chat_log.snapshot()
 
         output_stream.write(self._STATE_VERSION.to_bytes(8, "big"))
         state_info.serialize(output_stream)
@@ -363,9 +553,7 @@ class AbstractLogic(Logic):
         if host_user_id is not None:
             SerializableUUID(host_user_id).serialize(output_stream)
 
-        serial_log = SerializableUserMessageList()
-        serial_log.items = chat_log
-        serial_log.serialize(output_stream)
+        chat_log.write_to(output_stream)
 
     def import_state(self, input_stream: BinaryIOBase, merge: bool = False):
         version = int.from_bytes(read_exact(input_stream, 8), "big")
@@ -393,14 +581,25 @@ class AbstractLogic(Logic):
                 if imported_host_client_port > 0:
                     self._host_client_port = imported_host_client_port
                 self._banned_user_ids.update(imported_banned)
-                self._chat_log.extend(imported_chat_log)
+                for message in imported_chat_log:
+                    self._append_to_log_locked(message)
             else:
                 self._server_info.set_id(imported_info.get_id())
                 self._server_info.set_name(imported_info.get_name())
                 self._locked = imported_locked
                 self._host_client_port = imported_host_client_port if imported_host_client_port > 0 else None
                 self._banned_user_ids = set(imported_banned)
-                self._chat_log = list(imported_chat_log)
+                self._clear_log_locked()
+                for message in imported_chat_log:
+                    self._append_to_log_locked(message)
+
+            if self._journal_is_open():
+                if not merge:
+                    self._journal.append_reset()
+                for banned_id in imported_banned:
+                    self._journal.append_ban(banned_id)
+                for message in imported_chat_log:
+                    self._journal.append_public_message(message)
 
             if imported_host_user_id is not None and imported_host_user_id in self._members_by_id:
                 old_host_id = self._host_user_id
@@ -427,6 +626,20 @@ class AbstractLogic(Logic):
     def on_error(self) -> EventHandler[IOError]:
         return self._error_handler
 
+    def get_metrics(self) -> MetricsRegistry:
+        return self._metrics
+
+    def set_event_dispatcher(self, dispatcher: EventDispatcher | None):
+        """
+        Delivers public/private message and error events through dispatcher, so the session
+        thread that records a message only enqueues (None: synchronous delivery).
+        Member events stay synchronous: transports fan them out to the clients from their
+        listeners, in order with the messages they broadcast directly.
+        """
+        self._public_message_handler.set_dispatcher(dispatcher)
+        self._private_message_handler.set_dispatcher(dispatcher)
+        self._error_handler.set_dispatcher(dispatcher)
+
     @abstractmethod
     def _on_start_impl(self): ...
 
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+
+from localchat.config.limits import (
+    ADMISSION_ADDRESS_CONNECT_BURST,
+    ADMISSION_ADDRESS_CONNECT_PER_SEC,
+    ADMISSION_ADDRESS_MSG_BURST,
+    ADMISSION_ADDRESS_MSG_PER_SEC,
+    ADMISSION_CONNECT_BURST,
+    ADMISSION_CONNECT_PER_SEC,
+    ADMISSION_MAX_TRACKED_ADDRESSES,
+)
+
+REJECT_ADDRESS_RATE = "address_rate"
+REJECT_GLOBAL_RATE = "global_rate"
+
+
+class _TokenBucket:
+    __slots__ = ("tokens", "last_refill")
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.last_refill = now
+
+    def refill(self, rate: float, burst: float, now: float):
+        elapsed = now - self.last_refill
+        if elapsed > 0:
+            self.tokens = min(burst, self.tokens + (elapsed * rate))
+            self.last_refill = now
+
+
+class _SourceState:
+    __slots__ = ("connects", "messages")
+
+    def __init__(self, connect_burst: float, message_burst: float, now: float):
+        self.connects = _TokenBucket(connect_burst, now)
+        self.messages = _TokenBucket(message_burst, now)
+
+
+class AdmissionControl:
+    """
+    Admission limits of one server that outlive its sessions: connection attempts per source
+    address, connection attempts of all sources together, and messages per source address summed
+    over all of its sessions (a reconnect does not refill them).
+    Source addresses are kept in a table of at most max_addresses entries; the least recently seen
+    address is forgotten beyond that, so it starts over with full buckets when it comes back.
+    A rate of 0 disables the respective limit.
+    """
+
+    def __init__(
+        self,
+        address_connect_per_sec: float = ADMISSION_ADDRESS_CONNECT_PER_SEC,
+        address_connect_burst: float = ADMISSION_ADDRESS_CONNECT_BURST,
+        connect_per_sec: float = ADMISSION_CONNECT_PER_SEC,
+        connect_burst: float = ADMISSION_CONNECT_BURST,
+        address_msg_per_sec: float = ADMISSION_ADDRESS_MSG_PER_SEC,
+        address_msg_burst: float = ADMISSION_ADDRESS_MSG_BURST,
+        max_addresses: int = ADMISSION_MAX_TRACKED_ADDRESSES,
+        lock=None,
+    ):
+        """
+        :param lock: lock guarding the buckets (e.g. an InstrumentedLock); None: a new Lock
+        :raises ValueError: if a rate is negative, a burst is below 1 or max_addresses is not positive
+        """
+        if address_connect_per_sec < 0 or connect_per_sec < 0 or address_msg_per_sec < 0:
+            raise ValueError("admission rates must not be negative")
+        if address_connect_burst < 1 or connect_burst < 1 or address_msg_burst < 1:
+            raise ValueError("admission bursts must be at least 1")
+        if max_addresses <= 0:
+            raise ValueError("max_addresses must be positive")
+        self._address_connect_per_sec = address_connect_per_sec
+        self._address_connect_burst = address_connect_burst
+        self._connect_per_sec = connect_per_sec
+        self._connect_burst = connect_burst
+        self._address_msg_per_sec = address_msg_per_sec
+        self._address_msg_burst = address_msg_burst
+        self._max_addresses = max_addresses
+        self._lock = lock if lock is not None else Lock()
+        self._global_connects = _TokenBucket(connect_burst, monotonic())
+        # Least recently seen first.
+        self._sources: OrderedDict[str, _SourceState] = OrderedDict()
+        self._evicted = 0
+
+    def admit_connection(self, address: str) -> str | None:
+        """
+        Takes one connection attempt of address from its bucket and the global bucket.
+        A rejected attempt takes nothing, so a flooding source is not charged for its own rejections.
+        :return: None if the connection may become a session, otherwise the reason
+            (REJECT_ADDRESS_RATE or REJECT_GLOBAL_RATE)
+        """
+        if self._address_connect_per_sec == 0 and self._connect_per_sec == 0:
+            return None
+        now = monotonic()
+        with self._lock:
+            if self._address_connect_per_sec != 0:
+                bucket = self._source(address, now).connects
+                bucket.refill(self._address_connect_per_sec, self._address_connect_burst, now)
+                if bucket.tokens < 1.0:
+                    return REJECT_ADDRESS_RATE
+            else:
+                bucket = None
+            if self._connect_per_sec != 0:
+                self._global_connects.refill(self._connect_per_sec, self._connect_burst, now)
+                if self._global_connects.tokens < 1.0:
+                    return REJECT_GLOBAL_RATE
+                self._global_connects.tokens -= 1.0
+            if bucket is not None:
+                bucket.tokens -= 1.0
+        return None
+
+    def consume_message(self, address: str) -> bool:
+        """
+        Takes one message of address from its bucket.
+        :return: False if address is sending too quickly (over all of its sessions)
+        """
+        if self._address_msg_per_sec == 0:
+            return True
+        now = monotonic()
+        with self._lock:
+            bucket = self._source(address, now).messages
+            bucket.refill(self._address_msg_per_sec, self._address_msg_burst, now)
+            if bucket.tokens < 1.0:
+                return False
+            bucket.tokens -= 1.0
+        return True
+
+    def tracked_addresses(self) -> int:
+        with self._lock:
+            return len(self._sources)
+
+    def evicted_addresses(self) -> int:
+        with self._lock:
+            return self._evicted
+
+    def _source(self, address: str, now: float) -> _SourceState:
+        # Caller holds _lock.
+        state = self._sources.get(address)
+        if state is not None:
+            self._sources.move_to_end(address)
+            return state
+        state = _SourceState(self._address_connect_burst, self._address_msg_burst, now)
+        self._sources[address] = state
+        if len(self._sources) > self._max_addresses:
+            self._sources.popitem(last=False)
+            self._evicted += 1
+        return state
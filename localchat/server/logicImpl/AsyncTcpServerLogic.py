@@ -0,0 +1,486 @@
+from __future__ import annotations
+
+from collections import deque
+from dataclasses import dataclass
+from functools import partial
+from selectors import DefaultSelector, EVENT_READ, EVENT_WRITE
+from socket import SOMAXCONN, socket, socketpair
+from threading import Condition, Lock, Thread, get_ident
+from time import monotonic
+from typing import Callable
+
+from localchat.config.defaults import (
+    ASYNC_HARD_MAX_CLIENTS,
+    DEFAULT_HOST,
+    DEFAULT_LOCK_PROFILING,
+    DEFAULT_MAX_CLIENTS,
+    DEFAULT_PORT,
+    DEFAULT_SLOW_CONSUMER_POLICY,
+)
+from localchat.config.limits import (
+    ADMISSION_ADDRESS_CONNECT_PER_SEC,
+    ADMISSION_ADDRESS_MSG_PER_SEC,
+    ADMISSION_CONNECT_PER_SEC,
+    JOIN_TIMEOUT_S,
+    MAX_ROOMS,
+    MAX_TCP_PACKET_SIZE,
+    OUTBOUND_QUEUE_MAX_BYTES,
+    OUTBOUND_QUEUE_MAX_MESSAGES,
+    RATE_LIMIT_BURST,
+    RATE_LIMIT_MSG_PER_SEC,
+)
+from localchat.net import tcp_protocol
+from localchat.server.logicImpl.ChatLog import ChatLog
+from localchat.server.logicImpl.MessageJournal import MessageJournal
+from localchat.server.logicImpl.OutboundQueue import SlowConsumerPolicy
+from localchat.server.logicImpl.TcpServerLogic import TcpServerLogic, _Session
+from localchat.util.metrics import MetricsRegistry
+
+
+_LISTENER = "listener"
+_WAKEUP = "wakeup"
+
+
+@dataclass(eq=False)
+class _AsyncSession(_Session):
+    join_deadline: float = 0.0
+    want_write: bool = False
+    scheduled: bool = False
+    close_requested: bool = False
+    close_deadline: float = 0.0
+    closed: bool = False
+    registered: bool = False
+    # Waiting for the cluster coordinator: input stays in the socket until the handling is done.
+    parked: bool = False
+
+
+class AsyncTcpServerLogic(TcpServerLogic):
+    """
+    Event-loop variant of TcpServerLogic.
+    Every session is multiplexed on one non-blocking selector loop instead of
+    running one thread per client, so a single process can hold thousands of clients.
+    Framing, join, rate-limit, command semantics and events are shared with TcpServerLogic.
+    Sends never block the caller: payloads go into the session's outbound queue
+    that the loop drains when the socket becomes writable.
+    """
+
+    _HARD_MAX_CLIENTS = ASYNC_HARD_MAX_CLIENTS
+    # Small per-session receive buffers keep thousands of idle sessions cheap; large frames grow it temporarily.
+    _RECV_BUFFER_SIZE = 2 * 1024
+    _FLUSH_CHUNK_SIZE = 256 * 1024
+    _SWEEP_INTERVAL_S = 0.1
+
+    def __init__(
+        self,
+        host: str = DEFAULT_HOST,
+        port: int = DEFAULT_PORT,
+        max_clients: int = DEFAULT_MAX_CLIENTS,
+        slow_consumer_policy: SlowConsumerPolicy | str = DEFAULT_SLOW_CONSUMER_POLICY,
+        outbound_max_messages: int = OUTBOUND_QUEUE_MAX_MESSAGES,
+        outbound_max_bytes: int = OUTBOUND_QUEUE_MAX_BYTES,
+        chat_log: ChatLog | None = None,
+        journal: MessageJournal | None = None,
+        compression: bool = True,
+        rate_limit_msg_per_sec: float = RATE_LIMIT_MSG_PER_SEC,
+        rate_limit_burst: float = RATE_LIMIT_BURST,
+        metrics: MetricsRegistry | None = None,
+        metrics_port: int | None = None,
+        lock_profiling: bool = DEFAULT_LOCK_PROFILING,
+        max_rooms: int = MAX_ROOMS,
+        room_journal_factory: Callable[[str], MessageJournal] | None = None,
+        address_connect_rate: float = ADMISSION_ADDRESS_CONNECT_PER_SEC,
+        connect_rate: float = ADMISSION_CONNECT_PER_SEC,
+        address_rate_limit_msg_per_sec: float = ADMISSION_ADDRESS_MSG_PER_SEC,
+    ):
+        super().__init__(
+            host,
+            port,
+            max_clients,
+            slow_consumer_policy,
+            outbound_max_messages,
+            outbound_max_bytes,
+            chat_log,
+            journal,
+            compression=compression,
+            rate_limit_msg_per_sec=rate_limit_msg_per_sec,
+            rate_limit_burst=rate_limit_burst,
+            metrics=metrics,
+            metrics_port=metrics_port,
+            lock_profiling=lock_profiling,
+            max_rooms=max_rooms,
+            room_journal_factory=room_journal_factory,
+            address_connect_rate=address_connect_rate,
+            connect_rate=connect_rate,
+            address_rate_limit_msg_per_sec=address_rate_limit_msg_per_sec,
+        )
+        self._selector: DefaultSelector | None = None
+        self._loop_thread_ident: int | None = None
+        self._wakeup_recv: socket | None = None
+        self._wakeup_send: socket | None = None
+        self._wakeup_lock = Lock()
+        self._wakeup_pending = False
+        self._scheduled_lock = self._create_lock("scheduled")
+        self._scheduled: deque[_AsyncSession] = deque()
+        self._closing: list[_AsyncSession] = []
+        self._next_sweep = 0.0
+        # Run on the loop thread, guarded by _scheduled_lock.
+        self._loop_calls: deque[Callable[[], None]] = deque()
+        # Packet handling that waits for the cluster coordinator runs here, off the loop.
+        self._cluster_calls_ready = Condition(Lock())
+        self._cluster_calls: deque[tuple[_AsyncSession, Callable[[], bool]]] = deque()
+        self._cluster_thread: Thread | None = None
+
+    def _on_start_impl(self):
+        listener = self._bind_listener(min(self._max_clients, SOMAXCONN))
+        listener.setblocking(False)
+        wakeup_recv, wakeup_send = socketpair()
+        wakeup_recv.setblocking(False)
+        wakeup_send.setblocking(False)
+        selector = DefaultSelector()
+        selector.register(listener, EVENT_READ, _LISTENER)
+        selector.register(wakeup_recv, EVENT_READ, _WAKEUP)
+
+        self._listener = listener
+        self._selector = selector
+        self._wakeup_recv = wakeup_recv
+        self._wakeup_send = wakeup_send
+        self._accept_running = True
+        self._accept_thread = Thread(target=self._event_loop, name="localchat async tcp loop", daemon=True)
+        self._accept_thread.start()
+        if self._cluster is not None:
+            self._cluster_thread = Thread(target=self._cluster_call_loop, name="localchat cluster calls", daemon=True)
+            self._cluster_thread.start()
+        self._start_discovery()
+        self._start_metrics_endpoint()
+
+    def _on_stop_impl(self):
+        self._discovery_responder.stop()
+        self._stop_metrics_endpoint()
+        self._accept_running = False
+        self._wakeup()
+        with self._cluster_calls_ready:
+            self._cluster_calls_ready.notify_all()
+        if self._accept_thread is not None:
+            self._accept_thread.join(timeout=2.0)
+            self._accept_thread = None
+        if self._cluster_thread is not None:
+            self._cluster_thread.join(timeout=2.0)
+            self._cluster_thread = None
+
+    def _make_session(self, client_sock: socket, addr: tuple[str, int]) -> _Session:
+        client_sock.setblocking(False)
+        return _AsyncSession(
+            client_sock,
+            addr,
+            self._new_outbound_queue(),
+            tcp_protocol.PacketReceiver(client_sock, MAX_TCP_PACKET_SIZE, self._RECV_BUFFER_SIZE),
+            tcp_protocol.PacketSender(client_sock),
+            join_deadline=monotonic() + JOIN_TIMEOUT_S,
+        )
+
+    def _event_loop(self):
+        self._loop_thread_ident = get_ident()
+        selector = self._selector
+        try:
+            while self._accept_running:
+                for key, mask in selector.select(self._SWEEP_INTERVAL_S):
+                    if key.data is _LISTENER:
+                        self._accept_pending()
+                    elif key.data is _WAKEUP:
+                        self._drain_wakeup()
+                    else:
+                        session: _AsyncSession = key.data
+                        if mask & EVENT_READ:
+                            self._on_readable(session)
+                        if mask & EVENT_WRITE and not session.closed:
+                            self._flush(session)
+                self._process_scheduled()
+                now = monotonic()
+                if now >= self._next_sweep:
+                    self._next_sweep = now + self._SWEEP_INTERVAL_S
+                    self._sweep(now)
+        finally:
+            self._shutdown_loop()
+
+    def _accept_pending(self):
+        listener = self._listener
+        while listener is not None:
+            try:
+                client_sock, addr = listener.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            session = self._open_session(client_sock, addr)
+            if session is None:
+                continue
+            try:
+                self._selector.register(client_sock, EVENT_READ, session)
+                session.registered = True
+            except (OSError, ValueError):
+                self._close_session(session)
+
+    def _on_readable(self, session: _AsyncSession):
+        if session.closed:
+            return
+        receiver = session.receiver
+        try:
+            bytes_read = receiver.fill()
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            self._close_session(session)
+            return
+        if bytes_read == 0:
+            self._close_session(session)
+            return
+        if session.close_requested:
+            # Pending output is still flushed, further input is ignored.
+            return
+        self._process_packets(session)
+
+    def _process_packets(self, session: _AsyncSession):
+        """
+        Handles the complete packets in the session's receive buffer, until it is parked.
+        """
+        receiver = session.receiver
+        while not session.close_requested and not session.parked:
+            try:
+                payload = receiver.next_packet()
+            except IOError:
+                self._close_session(session)
+                return
+            if payload is None:
+                return
+            if not self._handle_guarded(session, lambda: self._handle_client_payload(session, payload)):
+                self._close_session(session)
+                return
+
+    def _handle_guarded(self, session: _AsyncSession, handle: Callable[[], bool]) -> bool:
+        """
+        :return: what handle returned, False if it raised
+        """
+        try:
+            return handle()
+        except IOError:
+            # Malformed packet, as in the threaded _client_loop.
+            return False
+        except Exception as e:
+            # A bug must not stop the loop for every session; report it and drop this one.
+            error = IOError(f"error while handling a packet from {session.addr}")
+            error.__cause__ = e
+            self._emit_error(error)
+            return False
+
+    def _run_cluster_round_trip(self, session: _AsyncSession, work: Callable[[], bool]) -> bool:
+        """
+        Parks the session and runs work on the cluster call thread, so waiting for the coordinator
+        holds up neither the loop nor the other sessions. The session's later packets stay unread
+        until work is done.
+        """
+        if get_ident() != self._loop_thread_ident:
+            return work()
+        session.parked = True
+        self._update_interest(session)
+        with self._cluster_calls_ready:
+            self._cluster_calls.append((session, work))
+            self._cluster_calls_ready.notify()
+        return True
+
+    def _cluster_call_loop(self):
+        while True:
+            with self._cluster_calls_ready:
+                while len(self._cluster_calls) == 0 and self._accept_running:
+                    self._cluster_calls_ready.wait()
+                if not self._accept_running:
+                    return
+                session, work = self._cluster_calls.popleft()
+            keep_open = self._handle_guarded(session, work)
+            # Bound now: the loop may run the call after this thread took the next session.
+            self._call_on_loop(partial(self._unpark, session, keep_open))
+
+    def _unpark(self, session: _AsyncSession, keep_open: bool):
+        if session.closed:
+            return
+        session.parked = False
+        if not keep_open:
+            self._close_session(session)
+            return
+        self._update_interest(session)
+        if not session.closed:
+            self._process_packets(session)
+
+    def _call_on_loop(self, call: Callable[[], None]):
+        with self._scheduled_lock:
+            self._loop_calls.append(call)
+        self._wakeup()
+
+    def _send_to_session(self, session: _AsyncSession, payload: bytes, droppable: bool = False):
+        if len(payload) <= 0:
+            raise ValueError("payload must not be empty")
+        if session.closed:
+            return
+        session.outbound.push(payload, droppable)
+        self._schedule(session)
+
+    def _close_socket(self, session: _AsyncSession):
+        if session.closed or session.close_requested:
+            return
+        session.close_requested = True
+        session.close_deadline = monotonic() + self._CLOSE_LINGER_S
+        session.outbound.close()
+        self._schedule(session)
+
+    def _schedule(self, session: _AsyncSession):
+        with self._scheduled_lock:
+            if session.scheduled:
+                return
+            session.scheduled = True
+            self._scheduled.append(session)
+        if get_ident() != self._loop_thread_ident:
+            self._wakeup()
+
+    def _process_scheduled(self):
+        while True:
+            with self._scheduled_lock:
+                if len(self._loop_calls) == 0:
+                    break
+                call = self._loop_calls.popleft()
+            call()
+        while True:
+            with self._scheduled_lock:
+                if len(self._scheduled) == 0:
+                    return
+                session = self._scheduled.popleft()
+                session.scheduled = False
+            if not session.closed:
+                self._flush(session)
+
+    def _flush(self, session: _AsyncSession):
+        sender = session.sender
+        if sender.pending_bytes() < self._FLUSH_CHUNK_SIZE:
+            batch = session.outbound.pop_batch(max_bytes=self._FLUSH_CHUNK_SIZE)
+            for payload in batch:
+                sender.queue(payload)
+            self._packets_out_metric.inc(len(batch))
+        if sender.pending_bytes() > 0:
+            try:
+                self._bytes_out_metric.inc(sender.send_some())
+            except (BlockingIOError, InterruptedError):
+                pass
+            except OSError:
+                self._send_failures_metric.inc()
+                self._finish_close(session)
+                return
+        pending = sender.pending_bytes() > 0 or not session.outbound.is_drained()
+        if not pending and session.outbound.is_closed():
+            # Graceful close requested, or the queue overflowed under the disconnect policy.
+            self._finish_close(session)
+            return
+        if session.close_requested and session not in self._closing:
+            self._closing.append(session)
+        self._set_want_write(session, pending)
+
+    def _set_want_write(self, session: _AsyncSession, want_write: bool):
+        if session.want_write == want_write:
+            return
+        session.want_write = want_write
+        self._update_interest(session)
+
+    def _update_interest(self, session: _AsyncSession):
+        events = (0 if session.parked else EVENT_READ) | (EVENT_WRITE if session.want_write else 0)
+        try:
+            if events == 0:
+                if session.registered:
+                    self._selector.unregister(session.sock)
+                    session.registered = False
+            elif session.registered:
+                self._selector.modify(session.sock, events, session)
+            else:
+                self._selector.register(session.sock, events, session)
+                session.registered = True
+        except (KeyError, OSError, ValueError):
+            self._finish_close(session)
+
+    def _finish_close(self, session: _AsyncSession):
+        if session.closed:
+            return
+        session.closed = True
+        try:
+            self._selector.unregister(session.sock)
+        except (KeyError, OSError, ValueError):
+            pass
+        try:
+            session.sock.close()
+        except OSError:
+            pass
+        self._close_session(session)
+
+    def _sweep(self, now: float):
+        with self._sessions_lock:
+            waiting = [s for s in self._sessions_without_user if not s.join_requested]
+        for session in waiting:
+            if session.join_deadline <= now and not session.close_requested:
+                self._send_join_timeout(session)
+                self._close_session(session)
+
+        closing = self._closing
+        self._closing = []
+        for session in closing:
+            if session.closed:
+                continue
+            if session.close_deadline <= now:
+                self._finish_close(session)
+            else:
+                self._closing.append(session)
+
+    def _wakeup(self):
+        with self._wakeup_lock:
+            if self._wakeup_pending or self._wakeup_send is None:
+                return
+            self._wakeup_pending = True
+            try:
+                self._wakeup_send.send(b"\0")
+            except OSError:
+                pass
+
+    def _drain_wakeup(self):
+        with self._wakeup_lock:
+            self._wakeup_pending = False
+            try:
+                while self._wakeup_recv.recv(4096):
+                    pass
+            except OSError:
+                pass
+
+    def _shutdown_loop(self):
+        self._process_scheduled()
+        with self._sessions_lock:
+            sessions = list(self._sessions_by_user_id.values()) + list(self._sessions_without_user)
+        for session in sessions + self._closing:
+            if not session.closed:
+                # Best effort: whatever fits into the socket buffer is still delivered.
+                sender = session.sender
+                for payload in session.outbound.pop_batch(max_bytes=self._FLUSH_CHUNK_SIZE):
+                    sender.queue(payload)
+                try:
+                    sender.send_some()
+                except OSError:
+                    pass
+                self._finish_close(session)
+        self._closing = []
+
+        with self._wakeup_lock:
+            for sock in (self._listener, self._wakeup_recv, self._wakeup_send):
+                if sock is not None:
+                    try:
+                        sock.close()
+                    except OSError:
+                        pass
+            self._listener = None
+            self._wakeup_recv = None
+            self._wakeup_send = None
+        if self._selector is not None:
+            self._selector.close()
+            self._selector = None
+        self._loop_thread_ident = None
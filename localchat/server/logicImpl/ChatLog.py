@@ -0,0 +1,591 @@
+from __future__ import annotations
+
+import os
+from array import array
+from bisect import bisect_left
+from io import BytesIO
+from tempfile import TemporaryFile
+from threading import Lock
+from typing import BinaryIO, Iterable, Iterator
+from uuid import UUID
+
+from localchat.config.limits import CHAT_LOG_MEMORY_MAX_BYTES, CHAT_LOG_MEMORY_MAX_MESSAGES
+from localchat.net import BufferReader, SerializableFloat, SerializableUser, SerializableUserMessageList, UserInterner
+from localchat.util import BinaryIOBase, User, UserMessage
+
+
+_HAS_PREAD = hasattr(os, "pread")
+# Per message in a _Window: sender index, timestamp, key and text offset.
+_COLUMN_BYTES = array("l").itemsize + 2 * array("d").itemsize + array("q").itemsize
+# Per entry of the sparse spill index: file offset and key.
+_INDEX_ENTRY_BYTES = array("q").itemsize + array("d").itemsize
+
+
+class _StoredUserMessage(UserMessage):
+    """
+    What the chat log hands out on access; built from the columns and not kept by the log.
+    """
+    __slots__ = ("_sender", "_message", "_timestamp")
+
+    def __init__(self, sender: User, message: str, timestamp: float):
+        self._sender = sender
+        self._message = message
+        self._timestamp = timestamp
+
+    def sender(self) -> User:
+        return self._sender
+
+    def message(self) -> str:
+        return self._message
+
+    def timestamp(self) -> float:
+        return self._timestamp
+
+
+class _Window:
+    """
+    The in-memory part of a _Storage: the columns of the messages from index start on, with
+    offsets into text. The writer appends in place; once the spilled head of a window is long
+    enough it builds a shorter one and swaps it in, so a reader keeps using the window it picked up.
+    """
+    __slots__ = ("start", "users", "user_encodings", "user_index", "senders", "timestamps", "keys", "offsets", "text")
+
+    def __init__(self, start: int, users: list[SerializableUser], user_encodings: list[bytes]):
+        self.start = start
+        self.users = users
+        # Serialized form of every interned user, for encode().
+        self.user_encodings = user_encodings
+        self.user_index: dict[tuple[UUID, str], int] = {}
+        self.senders = array("l")
+        self.timestamps = array("d")
+        # Running maximum of the timestamps, the sorted key of the time bisects: relayed messages (cluster)
+        # or a clock step can append a message older than its predecessor.
+        self.keys = array("d")
+        # Offset of every message's text, followed by the end of the text; its length defines the window length.
+        self.offsets = array("q", [0])
+        self.text = bytearray()
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def read(self, start: int, stop: int) -> list[UserMessage]:
+        users, senders, timestamps, offsets, text = self.users, self.senders, self.timestamps, self.offsets, self.text
+        return [
+            _StoredUserMessage(
+                users[senders[index]],
+                str(text[offsets[index]:offsets[index + 1]], "utf-8"),
+                timestamps[index],
+            )
+            for index in range(start, stop)
+        ]
+
+    def encode(self, start: int, stop: int) -> list[bytes]:
+        user_encodings, senders, timestamps, offsets = self.user_encodings, self.senders, self.timestamps, self.offsets
+        data, begin = self.read_text(start, stop)
+        result: list[bytes] = []
+        for index in range(start, stop):
+            buffer = BytesIO()
+            buffer.write(user_encodings[senders[index]])
+            buffer.write((offsets[index + 1] - offsets[index]).to_bytes(8, "big"))
+            buffer.write(data[offsets[index] - begin:offsets[index + 1] - begin])
+            SerializableFloat(timestamps[index]).serialize(buffer)
+            result.append(buffer.getvalue())
+        return result
+
+    def read_text(self, start: int, stop: int) -> tuple[memoryview, int]:
+        """
+        A copy of the text of messages start..stop-1 and the offset it starts at.
+        Readers never hold a view on text itself: the writer could not resize it while one exists.
+        """
+        begin = self.offsets[start]
+        return memoryview(bytes(self.text[begin:self.offsets[stop]])), begin
+
+
+class _Storage:
+    """
+    One generation of a ChatLog; clear() starts a new one.
+    The newest messages are held in a _Window of columns (an index into an interned sender table,
+    the timestamp, the key and the UTF-8 text). Older messages are moved to a spill file as
+    records in the SerializableUserMessage.encode() format; only every _INDEX_STRIDE-th record's
+    file offset and key stay in memory, which is enough to find any record and to bisect by time.
+    The writer (holding ChatLog._lock) appends to the file and the index before it counts a
+    message as spilled, and only drops spilled messages from the window after that, so readers
+    need no lock: everything below window.start is in the file.
+    """
+
+    def __init__(self, first_seq: int, spill_dir: str | None):
+        self.first_seq = first_seq
+        self.spill_dir = spill_dir
+        self.window = _Window(0, [], [])
+        self.spilled = 0
+        # Sparse index of the spill file: file offset and key of every _INDEX_STRIDE-th message.
+        self.index_offsets = array("q")
+        self.index_keys = array("d")
+        self.spill_end = 0
+        self.spill: BinaryIO | None = None
+        # Only needed where os.pread is missing: seek + read must not interleave.
+        self.spill_lock = Lock()
+        self.closed = False
+
+    def __len__(self) -> int:
+        window = self.window
+        return window.start + len(window)
+
+    def memory_bytes(self) -> int:
+        window = self.window
+        unspilled = len(window) - (self.spilled - window.start)
+        text = window.offsets[-1] - window.offsets[len(window) - unspilled]
+        columns = len(window) * _COLUMN_BYTES
+        users = sum(len(encoding) for encoding in window.user_encodings)
+        return text + columns + users + len(self.index_offsets) * _INDEX_ENTRY_BYTES
+
+    def read(self, start: int, stop: int) -> list[UserMessage]:
+        """
+        Messages with index start..stop-1; both must be below the length the caller observed.
+        """
+        window = self.window
+        messages: list[UserMessage] = []
+        if start < window.start:
+            users = UserInterner()
+            messages = [_decode_record(record, users) for record in self._read_records(start, min(stop, window.start))]
+        if stop > window.start:
+            messages += window.read(max(start, window.start) - window.start, stop - window.start)
+        self._check_open()
+        return messages
+
+    def encode(self, start: int, stop: int) -> list[bytes]:
+        """
+        Messages with index start..stop-1 as SerializableUserMessage.encode() returns them.
+        """
+        window = self.window
+        result: list[bytes] = []
+        if start < window.start:
+            result = [bytes(record) for record in self._read_records(start, min(stop, window.start))]
+        if stop > window.start:
+            result += window.encode(max(start, window.start) - window.start, stop - window.start)
+        self._check_open()
+        return result
+
+    def bisect_key(self, key: float, lo: int, hi: int) -> int:
+        """
+        Index of the first message in lo..hi-1 whose key is not below key (hi if there is none).
+        """
+        window = self.window
+        if lo >= window.start:
+            return window.start + bisect_left(window.keys, key, lo - window.start, hi - window.start)
+        top = min(hi, window.start)
+        if hi > window.start and window.keys[0] < key:
+            # Every spilled key is at most the window's first one.
+            return window.start + bisect_left(window.keys, key, 0, hi - window.start)
+        stride = ChatLog._INDEX_STRIDE
+        block = bisect_left(self.index_keys, key, 0, (top - 1) // stride + 1) - 1
+        if block < lo // stride:
+            return lo
+        # The answer is in this block or is the first message after it.
+        begin, end = max(lo, block * stride), min(top, (block + 1) * stride)
+        records = self._read_records(block * stride, end)
+        running = self.index_keys[block]
+        for index, record in enumerate(records, block * stride):
+            running = max(running, _record_timestamp(record))
+            if index >= begin and running >= key:
+                return index
+        return end
+
+    def _read_records(self, start: int, stop: int) -> list[memoryview]:
+        """
+        The spill file records of the messages with index start..stop-1 (all below window.start).
+        """
+        stride = ChatLog._INDEX_STRIDE
+        offsets = self.index_offsets
+        first_block, last_block = start // stride, (stop - 1) // stride + 1
+        begin = offsets[first_block]
+        end = offsets[last_block] if last_block < len(offsets) else self.spill_end
+        data = memoryview(self._read_spill_file(begin, end - begin))
+        records: list[memoryview] = []
+        position = 0
+        for index in range(first_block * stride, stop):
+            size = _record_size(data, position)
+            if index >= start:
+                records.append(data[position:position + size])
+            position += size
+        return records
+
+    def _read_spill_file(self, offset: int, size: int) -> bytes:
+        spill = self.spill
+        try:
+            if spill is None:
+                raise ValueError("spill file closed")
+            if _HAS_PREAD:
+                data = os.pread(spill.fileno(), size, offset)
+            else:
+                with self.spill_lock:
+                    spill.seek(offset)
+                    data = spill.read(size)
+                    spill.seek(0, 2)
+        except (OSError, ValueError) as e:
+            raise IOError("chat log was cleared while it was being read") from e
+        if len(data) != size:
+            raise IOError("chat log was cleared while it was being read")
+        return data
+
+    def _check_open(self):
+        if self.closed:
+            raise IOError("chat log was cleared while it was being read")
+
+
+def _record_sender_size(record: bytes | memoryview, position: int = 0) -> int:
+    # SerializableUser: 16 id bytes, 8 length bytes, UTF-8 name.
+    return 24 + int.from_bytes(record[position + 16:position + 24], "big")
+
+
+def _record_size(data: memoryview, position: int) -> int:
+    # Sender, 8 length bytes, UTF-8 text, 16 bytes SerializableFloat.
+    sender_size = _record_sender_size(data, position)
+    text_size = int.from_bytes(data[position + sender_size:position + sender_size + 8], "big")
+    return sender_size + 8 + text_size + 16
+
+
+def _record_timestamp(record: memoryview) -> float:
+    return SerializableFloat.deserialize(BufferReader(record[-16:])).value
+
+
+def _decode_record(record: memoryview, users: UserInterner) -> _StoredUserMessage:
+    reader = BufferReader(record)
+    sender = users.decode(reader)
+    size = int.from_bytes(reader.read_view(8), "big")
+    text = str(reader.read_view(size), "utf-8")
+    return _StoredUserMessage(sender, text, SerializableFloat.deserialize(reader).value)
+
+
+class ChatLog:
+    """
+    Append-only public chat history with a bounded in-memory window.
+    Every message gets a sequence number (first_seq() + index); sequence numbers keep
+    increasing across clear(). Messages are stored column-wise (sender index, timestamp,
+    UTF-8 text), so a message costs a few bytes plus its text instead of several Python
+    objects; read() builds message objects on access. Lookups by time are a bisect on the
+    running maximum of the timestamps, so a message older than its predecessor keeps its own
+    timestamp. Messages that fall out of the window (by count or by bytes, text and columns
+    counted) are moved to an anonymous spill file and read back on demand; of those only a
+    sparse index (a few bytes per _INDEX_STRIDE messages) and none of their senders stay in
+    memory, so the complete history stays available while memory use is bounded by the window.
+    Only writers take the lock; reads and snapshot views run lock-free.
+    """
+
+    _READ_CHUNK = 256
+    # Every _INDEX_STRIDE-th spilled message keeps its file offset and key in memory.
+    _INDEX_STRIDE = 256
+    # The spilled head of the window is cut off once its text is this long (and as long as the rest),
+    # or once it holds as many messages as the rest.
+    _COMPACT_MIN_BYTES = 64 * 1024
+    # Spilling frees 1/_SPILL_HEADROOM of the window at once.
+    _SPILL_HEADROOM = 16
+
+    def __init__(
+        self,
+        max_messages: int = CHAT_LOG_MEMORY_MAX_MESSAGES,
+        max_bytes: int = CHAT_LOG_MEMORY_MAX_BYTES,
+        spill_dir: str | None = None,
+    ):
+        if max_messages <= 0 or max_bytes <= 0:
+            raise ValueError("chat log window must be positive")
+        self._max_messages = max_messages
+        self._max_bytes = max_bytes
+        self._spill_dir = spill_dir
+        self._lock = Lock()
+        self._storage = _Storage(0, spill_dir)
+
+    def __len__(self) -> int:
+        return len(self._storage)
+
+    def first_seq(self) -> int:
+        """
+        Sequence number of the oldest message.
+        """
+        return self._storage.first_seq
+
+    def next_seq(self) -> int:
+        """
+        Sequence number the next appended message gets.
+        """
+        storage = self._storage
+        return storage.first_seq + len(storage)
+
+    def append(self, message: UserMessage) -> int:
+        """
+        :return: the sequence number of the message
+        """
+        with self._lock:
+            return self._append_locked(message)
+
+    def extend(self, messages: Iterable[UserMessage]):
+        with self._lock:
+            for message in messages:
+                self._append_locked(message)
+
+    def clear(self):
+        """
+        Drops the whole history, including the spill file.
+        Sequence numbers continue where they were; snapshots taken before are invalidated.
+        """
+        with self._lock:
+            old = self._storage
+            self._storage = _Storage(old.first_seq + len(old), self._spill_dir)
+            old.closed = True
+            if old.spill is not None:
+                with old.spill_lock:
+                    old.spill.close()
+                old.spill = None
+
+    def close(self):
+        self.clear()
+
+    def spilled_count(self) -> int:
+        return self._storage.spilled
+
+    def memory_bytes(self) -> int:
+        """
+        Bytes held in memory for the window: the text of the messages not spilled yet, the columns
+        and interned senders of the window and the sparse spill index. The text of spilled messages
+        still in the window is not counted; it is dropped once the spilled head is as long as the rest (see _spill_locked).
+        """
+        return self._storage.memory_bytes()
+
+    def read(self, start: int, stop: int | None = None) -> list[UserMessage]:
+        """
+        Returns the messages with index start..stop-1 (oldest message has index 0).
+        """
+        storage = self._storage
+        total = len(storage)
+        stop = total if stop is None else min(stop, total)
+        start = max(0, start)
+        if start >= stop:
+            return []
+        return storage.read(start, stop)
+
+    def read_page(self, anchor_seq: int | None, limit: int, backwards: bool) -> tuple[int, int, list[UserMessage]]:
+        """
+        Reads up to limit consecutive messages.
+        backwards: the newest messages before anchor_seq (None = end of the log),
+        otherwise the oldest messages from anchor_seq on.
+        :return: sequence number of the first returned message, next_seq() at the time of the read and the messages
+        """
+        storage, start, stop, total = self._page_bounds(anchor_seq, limit, backwards)
+        messages = storage.read(start, stop) if start < stop else []
+        return storage.first_seq + start, storage.first_seq + total, messages
+
+    def read_encoded_page(self, anchor_seq: int | None, limit: int, backwards: bool) -> tuple[int, int, list[bytes]]:
+        """
+        Like read_page, but returns the messages serialized (see SerializableUserMessage.encode)
+        straight from the columns, without building message objects.
+        """
+        storage, start, stop, total = self._page_bounds(anchor_seq, limit, backwards)
+        encoded = storage.encode(start, stop) if start < stop else []
+        return storage.first_seq + start, storage.first_seq + total, encoded
+
+    def seq_of_timestamp(self, timestamp: float) -> int:
+        """
+        Sequence number of the first message from which on no message is older than timestamp
+        (next_seq() if there is none).
+        """
+        storage = self._storage
+        return storage.first_seq + storage.bisect_key(timestamp, 0, len(storage))
+
+    def snapshot(self) -> ChatLogView:
+        """
+        Fixed-length view of the current history; nothing is copied.
+        Later appends are not visible; iterating it reads spilled messages back in chunks.
+        """
+        storage = self._storage
+        return ChatLogView(storage, 0, len(storage))
+
+    def _page_bounds(self, anchor_seq: int | None, limit: int, backwards: bool) -> tuple[_Storage, int, int, int]:
+        storage = self._storage
+        total = len(storage)
+        anchor = total if anchor_seq is None else min(max(anchor_seq - storage.first_seq, 0), total)
+        if backwards:
+            return storage, max(0, anchor - limit), anchor, total
+        return storage, anchor, min(total, anchor + limit), total
+
+    def _append_locked(self, message: UserMessage) -> int:
+        storage = self._storage
+        window = storage.window
+        sender_index = self._intern_locked(window, message.sender())
+        encoded = message.message().encode("utf-8")
+        timestamp = message.timestamp()
+        key = max(window.keys[-1], timestamp) if len(window.keys) > 0 else timestamp
+        # Every column is in place before the offset is appended: that is what makes the message visible.
+        window.senders.append(sender_index)
+        window.timestamps.append(timestamp)
+        window.keys.append(key)
+        window.text += encoded
+        window.offsets.append(window.offsets[-1] + len(encoded))
+        seq = storage.first_seq + len(storage) - 1
+
+        total = len(window)
+        spill_to = storage.spilled - window.start
+        # Text and columns of the messages not spilled yet; the rest of the window is dropped on compaction.
+        memory_bytes = window.offsets[-1] - window.offsets[spill_to] + (total - spill_to) * _COLUMN_BYTES
+        if total - spill_to > self._max_messages or memory_bytes > self._max_bytes:
+            # Spill down to a little below the limits, so the file is written in batches rather than per message.
+            max_messages = self._max_messages - self._max_messages // self._SPILL_HEADROOM
+            max_bytes = self._max_bytes - self._max_bytes // self._SPILL_HEADROOM
+            while total - spill_to > 1 and (total - spill_to > max_messages or memory_bytes > max_bytes):
+                memory_bytes -= window.offsets[spill_to + 1] - window.offsets[spill_to] + _COLUMN_BYTES
+                spill_to += 1
+            self._spill_locked(storage, window.start + spill_to)
+        return seq
+
+    @staticmethod
+    def _intern_locked(window: _Window, sender: User) -> int:
+        key = (sender.get_id(), sender.get_name())
+        sender_index = window.user_index.get(key)
+        if sender_index is None:
+            sender_index = len(window.users)
+            user = SerializableUser(key[0], key[1])
+            buffer = BytesIO()
+            user.serialize(buffer)
+            window.user_encodings.append(buffer.getvalue())
+            window.users.append(user)
+            window.user_index[key] = sender_index
+        return sender_index
+
+    def _spill_locked(self, storage: _Storage, spill_to: int):
+        window = storage.window
+        if storage.spill is None:
+            # Unbuffered: readers use pread on the file descriptor.
+            storage.spill = TemporaryFile(buffering=0, dir=storage.spill_dir)
+        stride = self._INDEX_STRIDE
+        records = window.encode(storage.spilled - window.start, spill_to - window.start)
+        position = storage.spill_end
+        for index, record in enumerate(records, storage.spilled):
+            if index % stride == 0:
+                storage.index_offsets.append(position)
+                storage.index_keys.append(window.keys[index - window.start])
+            position += len(record)
+        data = memoryview(b"".join(records))
+        with storage.spill_lock:
+            storage.spill.seek(storage.spill_end)
+            while len(data) > 0:
+                data = data[storage.spill.write(data):]
+        # Readers only look in the spill file below window.start, which moves after the write.
+        storage.spill_end = position
+        storage.spilled = spill_to
+        cut = spill_to - window.start
+        rest = len(window) - cut
+        cut_bytes = window.offsets[cut]
+        if cut >= rest or (cut_bytes >= self._COMPACT_MIN_BYTES and cut_bytes >= window.offsets[-1] - cut_bytes):
+            storage.window = self._compact_locked(window, cut)
+
+    @staticmethod
+    def _compact_locked(window: _Window, cut: int) -> _Window:
+        """
+        A copy of window without its first cut messages.
+        """
+        compacted = _Window(window.start + cut, [], [])
+        # Only the senders of the remaining messages stay interned.
+        remap: dict[int, int] = {}
+        for sender_index in window.senders[cut:]:
+            if sender_index not in remap:
+                user = window.users[sender_index]
+                remap[sender_index] = len(compacted.users)
+                compacted.user_index[(user.get_id(), user.get_name())] = len(compacted.users)
+                compacted.users.append(user)
+                compacted.user_encodings.append(window.user_encodings[sender_index])
+        compacted.senders = array("l", (remap[sender_index] for sender_index in window.senders[cut:]))
+        compacted.timestamps = window.timestamps[cut:]
+        compacted.keys = window.keys[cut:]
+        base = window.offsets[cut]
+        compacted.offsets = array("q", (offset - base for offset in window.offsets[cut:]))
+        compacted.text = window.text[base:]
+        return compacted
+
+
+class ChatLogView:
+    """
+    Read-only, fixed-length window onto a ChatLog (see ChatLog.snapshot).
+    Can be iterated repeatedly; slicing and since() return narrower views without copying,
+    and write_to() serializes the window straight from the log's columns.
+    """
+
+    def __init__(self, storage: _Storage, start: int, stop: int):
+        self._storage = storage
+        self._start = start
+        self._stop = stop
+
+    def __len__(self) -> int:
+        return self._stop - self._start
+
+    def __iter__(self) -> Iterator[UserMessage]:
+        for start in range(self._start, self._stop, ChatLog._READ_CHUNK):
+            yield from self._storage.read(start, min(self._stop, start + ChatLog._READ_CHUNK))
+
+    def __getitem__(self, key: int | slice) -> UserMessage | ChatLogView:
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                raise ValueError("chat log views only support contiguous slices")
+            return ChatLogView(self._storage, self._start + start, self._start + max(start, stop))
+        if key < 0:
+            key += len(self)
+        if key < 0 or key >= len(self):
+            raise IndexError("chat log view index out of range")
+        return self._storage.read(self._start + key, self._start + key + 1)[0]
+
+    def first_seq(self) -> int:
+        return self._storage.first_seq + self._start
+
+    def since(self, timestamp: float) -> ChatLogView:
+        """
+        The part of this view from the first message from which on no message is older than timestamp.
+        """
+        start = self._storage.bisect_key(timestamp, self._start, self._stop)
+        return ChatLogView(self._storage, start, self._stop)
+
+    def write_to(self, output_stream: BinaryIOBase):
+        """
+        Writes the view in the SerializableUserMessageList format without building message objects.
+        :raises IOError:
+        """
+        storage = self._storage
+        window = storage.window
+        # Spilled records are copied from the file, the rest is written from the window's columns.
+        split = min(max(self._start, window.start), self._stop)
+        spilled_chunks = range(self._start, split, ChatLog._READ_CHUNK)
+        # Sender table in order of first appearance, renumbered for this view; keyed by the SerializableUser encoding.
+        remap: dict[bytes, int] = {}
+        for start in spilled_chunks:
+            for record in storage._read_records(start, min(split, start + ChatLog._READ_CHUNK)):
+                remap.setdefault(bytes(record[:_record_sender_size(record)]), len(remap))
+        senders = window.senders
+        window_senders = dict.fromkeys(senders[split - window.start:self._stop - window.start])
+        for sender_index in window_senders:
+            remap.setdefault(window.user_encodings[sender_index], len(remap))
+        window_remap = {sender_index: remap[window.user_encodings[sender_index]] for sender_index in window_senders}
+        storage._check_open()
+
+        output_stream.write(SerializableUserMessageList.FORMAT_VERSION.to_bytes(8, "big"))
+        # A SerializableList of the users: their count, then each of them.
+        output_stream.write(len(remap).to_bytes(8, "big"))
+        for encoding in remap:
+            output_stream.write(encoding)
+        output_stream.write(len(self).to_bytes(8, "big"))
+        for start in spilled_chunks:
+            chunk = BytesIO()
+            for record in storage._read_records(start, min(split, start + ChatLog._READ_CHUNK)):
+                sender_size = _record_sender_size(record)
+                chunk.write(remap[bytes(record[:sender_size])].to_bytes(8, "big"))
+                chunk.write(record[sender_size:])
+            storage._check_open()
+            output_stream.write(chunk.getvalue())
+        timestamps, offsets = window.timestamps, window.offsets
+        for start in range(split - window.start, self._stop - window.start, ChatLog._READ_CHUNK):
+            stop = min(self._stop - window.start, start + ChatLog._READ_CHUNK)
+            data, begin = window.read_text(start, stop)
+            chunk = BytesIO()
+            for index in range(start, stop):
+                chunk.write(window_remap[senders[index]].to_bytes(8, "big"))
+                chunk.write((offsets[index + 1] - offsets[index]).to_bytes(8, "big"))
+                chunk.write(data[offsets[index] - begin:offsets[index + 1] - begin])
+                SerializableFloat(timestamps[index]).serialize(chunk)
+            output_stream.write(chunk.getvalue())
@@ -1,7 +1,10 @@
 from uuid import UUID
 
 from localchat.server.logicImpl.AbstractLogic import AbstractLogic
+from localchat.server.logicImpl.ChatLog import ChatLog
+from localchat.server.logicImpl.MessageJournal import MessageJournal
 from localchat.util import UserMessage
+from localchat.util.metrics import MetricsRegistry
 
 
 class InMemoryLogic(AbstractLogic):
@@ -11,8 +14,13 @@ class InMemoryLogic(AbstractLogic):
     Broadcast/private send hooks are no-ops by design.
     """
 
-    def __init__(self):
-        super().__init__()
+    def __init__(
+            self,
+            chat_log: ChatLog | None = None,
+            journal: MessageJournal | None = None,
+            metrics: MetricsRegistry | None = None,
+    ):
+        super().__init__(chat_log, journal, metrics=metrics)
         self._password: str | None = None
 
     def _on_start_impl(self):
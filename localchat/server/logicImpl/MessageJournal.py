@@ -0,0 +1,431 @@
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from io import BytesIO
+from mmap import ACCESS_READ, mmap
+from struct import Struct
+from threading import Condition, Thread
+from time import monotonic
+from typing import BinaryIO, Callable, Iterator
+from uuid import UUID
+from zlib import crc32
+
+from localchat.config.limits import JOURNAL_FLUSH_INTERVAL_MS, JOURNAL_SEGMENT_MAX_BYTES
+from localchat.net import BufferReader, SerializableUser, SerializableUserMessage, SerializableUUID
+from localchat.util import User, UserMessage
+
+
+JR_PUBLIC_MESSAGE = 1
+JR_MEMBER_JOINED = 2
+JR_MEMBER_LEFT = 3
+JR_BAN = 4
+JR_UNBAN = 5
+# Everything before a reset is discarded on replay (import_state without merge).
+JR_RESET = 6
+
+_SEGMENT_MAGIC = b"LCJRNL01"
+_SEGMENT_PREFIX = "journal-"
+_SEGMENT_SUFFIX = ".log"
+# length of the payload, record type, crc32 of the payload
+_RECORD_HEADER = Struct(">IBI")
+
+
+@dataclass(frozen=True)
+class JournalRecord:
+    record_type: int
+    payload: bytes
+
+
+@dataclass(frozen=True)
+class JournalStats:
+    appended: int
+    committed: int
+    commits: int
+    failed_commits: int
+    bytes_written: int
+    segments: int
+
+
+def encode_public_message(message: UserMessage) -> bytes:
+    return SerializableUserMessage.encode(message)
+
+
+def decode_public_message(payload: bytes) -> SerializableUserMessage:
+    return SerializableUserMessage.from_encoded(payload)
+
+
+def encode_user(user: User) -> bytes:
+    output = BytesIO()
+    SerializableUser.create_copy(user).serialize(output)
+    return output.getvalue()
+
+
+def decode_user(payload: bytes) -> SerializableUser:
+    return SerializableUser.deserialize(BufferReader(payload))
+
+
+def encode_user_id(user_id: UUID) -> bytes:
+    output = BytesIO()
+    SerializableUUID(user_id).serialize(output)
+    return output.getvalue()
+
+
+def decode_user_id(payload: bytes) -> UUID:
+    return SerializableUUID.deserialize(BufferReader(payload)).value
+
+
+class MessageJournal:
+    """
+    Append-only, segmented write-ahead journal of server state changes.
+    append() only buffers the record; a writer thread commits everything that
+    accumulated within one flush interval with a single write + fsync (group commit).
+    A crash therefore loses at most the records of the last flush interval.
+    Records carry a crc32, so a torn tail is detected and cut off on replay.
+    A batch whose write fails is cut off again at once (or later batches go to a new segment),
+    so no committed record ever follows a torn one. An unexpected writer error fails the journal:
+    it reports the error once and stops accepting records.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        flush_interval_ms: float = JOURNAL_FLUSH_INTERVAL_MS,
+        segment_max_bytes: int = JOURNAL_SEGMENT_MAX_BYTES,
+        on_error: Callable[[IOError], None] | None = None,
+    ):
+        if flush_interval_ms < 0:
+            raise ValueError("flush interval must not be negative")
+        if segment_max_bytes <= len(_SEGMENT_MAGIC):
+            raise ValueError("segment size too small")
+        self._directory = directory
+        self._flush_interval_s = flush_interval_ms / 1000.0
+        self._segment_max_bytes = segment_max_bytes
+        self._on_error = on_error
+        self._cond = Condition()
+        self._pending = bytearray()
+        self._pending_since = 0.0
+        self._flush_requested = False
+        self._open = False
+        self._closing = False
+        self._failure: IOError | None = None
+        self._writer: Thread | None = None
+        self._segment: BinaryIO | None = None
+        self._segment_number = 0
+        self._segment_size = 0
+        self._valid_ends: dict[str, int] = {}
+        self._appended = 0
+        self._committed = 0
+        self._commits = 0
+        self._failed_commits = 0
+        self._bytes_written = 0
+
+    def set_error_handler(self, on_error: Callable[[IOError], None] | None):
+        self._on_error = on_error
+
+    def replay(self) -> Iterator[JournalRecord]:
+        """
+        Yields every intact record of every segment in order, using a memory-mapped sequential scan.
+        Must be called before open().
+        :raises IOError: if a segment is not a journal segment
+        """
+        with self._cond:
+            if self._open:
+                raise RuntimeError("journal is already open")
+        self._valid_ends = {}
+        yield from self._scan(self._segment_paths())
+
+    def open(self):
+        """
+        Opens the newest segment for appending (cutting off a torn tail) and starts the writer.
+        :raises IOError:
+        """
+        with self._cond:
+            if self._open:
+                raise RuntimeError("journal is already open")
+        os.makedirs(self._directory, exist_ok=True)
+        paths = self._segment_paths()
+        if len(paths) == 0:
+            self._open_segment(1)
+        else:
+            path = paths[-1]
+            self._segment_number = self._segment_number_of(path)
+            valid_end = self._valid_ends.get(path)
+            if valid_end is None:
+                # Not replayed: scan only the newest segment to find its intact end.
+                for _ in self._scan([path]):
+                    pass
+                valid_end = self._valid_ends[path]
+            segment = open(path, "r+b")
+            if valid_end < len(_SEGMENT_MAGIC):
+                segment.truncate(0)
+                segment.write(_SEGMENT_MAGIC)
+                valid_end = len(_SEGMENT_MAGIC)
+            else:
+                segment.truncate(valid_end)
+            segment.seek(valid_end)
+            self._segment = segment
+            self._segment_size = valid_end
+        with self._cond:
+            self._open = True
+            self._closing = False
+            self._failure = None
+        self._writer = Thread(target=self._writer_loop, name="localchat-journal", daemon=True)
+        self._writer.start()
+
+    def is_open(self) -> bool:
+        """
+        :return: whether records are accepted (open and not failed)
+        """
+        with self._cond:
+            return self._open and self._failure is None
+
+    def append(self, record_type: int, payload: bytes):
+        """
+        Buffers one record for the next group commit.
+        :raises IOError: if the journal failed
+        """
+        header = _RECORD_HEADER.pack(len(payload), record_type, crc32(payload))
+        with self._cond:
+            if not self._open:
+                raise RuntimeError("journal is not open")
+            if self._failure is not None:
+                raise IOError("journal failed") from self._failure
+            if len(self._pending) == 0:
+                self._pending_since = monotonic()
+                self._cond.notify_all()
+            self._pending += header
+            self._pending += payload
+            self._appended += 1
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """
+        Commits everything appended so far without waiting for the flush interval.
+        :return: False if the records were not durable before the timeout or a commit failed
+        """
+        with self._cond:
+            target = self._appended
+            failed_before = self._failed_commits
+            self._flush_requested = True
+            self._cond.notify_all()
+            deadline = None if timeout is None else monotonic() + timeout
+            while self._committed < target and self._open and self._failure is None:
+                remaining = None if deadline is None else deadline - monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return self._committed >= target and self._failed_commits == failed_before and self._failure is None
+
+    def close(self):
+        """
+        Commits pending records and stops the writer.
+        """
+        with self._cond:
+            if not self._open:
+                return
+            self._closing = True
+            self._cond.notify_all()
+        writer = self._writer
+        if writer is not None:
+            writer.join()
+        self._writer = None
+        with self._cond:
+            self._open = False
+            self._cond.notify_all()
+        if self._segment is not None:
+            try:
+                self._segment.close()
+            except (OSError, ValueError):
+                # Already reported by the failed commit.
+                pass
+            self._segment = None
+        self._valid_ends = {}
+
+    def stats(self) -> JournalStats:
+        segments = len(self._segment_paths())
+        with self._cond:
+            return JournalStats(
+                appended=self._appended,
+                committed=self._committed,
+                commits=self._commits,
+                failed_commits=self._failed_commits,
+                bytes_written=self._bytes_written,
+                segments=segments,
+            )
+
+    def append_public_message(self, message: UserMessage):
+        self.append(JR_PUBLIC_MESSAGE, encode_public_message(message))
+
+    def append_member_joined(self, user: User):
+        self.append(JR_MEMBER_JOINED, encode_user(user))
+
+    def append_member_left(self, user_id: UUID):
+        self.append(JR_MEMBER_LEFT, encode_user_id(user_id))
+
+    def append_ban(self, user_id: UUID):
+        self.append(JR_BAN, encode_user_id(user_id))
+
+    def append_unban(self, user_id: UUID):
+        self.append(JR_UNBAN, encode_user_id(user_id))
+
+    def append_reset(self):
+        self.append(JR_RESET, b"")
+
+    def _writer_loop(self):
+        while True:
+            with self._cond:
+                while len(self._pending) == 0 and not self._closing:
+                    self._cond.wait()
+                if len(self._pending) == 0:
+                    return
+                deadline = self._pending_since + self._flush_interval_s
+                while not self._closing and not self._flush_requested:
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                data = bytes(self._pending)
+                self._pending.clear()
+                self._flush_requested = False
+                target = self._appended
+            error: IOError | None = None
+            try:
+                self._write_and_sync(data)
+            except OSError as e:
+                error = e
+                self._discard_failed_write()
+            except Exception as e:
+                error = IOError("journal writer failed")
+                error.__cause__ = e
+                self._fail(error)
+                return
+            with self._cond:
+                # Failed batches count as committed so flush() does not wait forever; it reports them instead.
+                self._committed = target
+                self._commits += 1
+                if error is None:
+                    self._bytes_written += len(data)
+                else:
+                    self._failed_commits += 1
+                self._cond.notify_all()
+            if error is not None and self._on_error is not None:
+                self._on_error(error)
+
+    def _fail(self, error: IOError):
+        """
+        Stops accepting records after an unexpected writer error; pending records are lost.
+        """
+        with self._cond:
+            self._failure = error
+            self._pending.clear()
+            self._committed = self._appended
+            self._failed_commits += 1
+            self._cond.notify_all()
+        if self._on_error is not None:
+            self._on_error(error)
+
+    def _write_and_sync(self, data: bytes):
+        if self._segment is None:
+            # The previous segment broke (see _discard_failed_write) or could not be rolled over.
+            self._open_segment(self._segment_number + 1)
+        elif self._segment_size > len(_SEGMENT_MAGIC) and self._segment_size + len(data) > self._segment_max_bytes:
+            segment = self._segment
+            self._segment = None
+            segment.close()
+            self._open_segment(self._segment_number + 1)
+        self._segment.write(data)
+        self._segment.flush()
+        os.fsync(self._segment.fileno())
+        self._segment_size += len(data)
+
+    def _discard_failed_write(self):
+        """
+        Cuts whatever part of a failed batch reached the segment back off: replay stops at the first
+        torn record, so a later batch appended after it would be lost. If the segment cannot be
+        cut, the next batch starts a new segment instead.
+        """
+        segment = self._segment
+        if segment is None:
+            return
+        self._segment = None
+        path = segment.name
+        try:
+            segment.close()
+        except (OSError, ValueError):
+            pass
+        try:
+            segment = open(path, "r+b")
+        except OSError:
+            return
+        try:
+            segment.truncate(self._segment_size)
+            segment.seek(self._segment_size)
+        except OSError:
+            segment.close()
+            return
+        self._segment = segment
+
+    def _open_segment(self, number: int):
+        path = os.path.join(self._directory, f"{_SEGMENT_PREFIX}{number:08d}{_SEGMENT_SUFFIX}")
+        segment = open(path, "w+b")
+        segment.write(_SEGMENT_MAGIC)
+        segment.flush()
+        os.fsync(segment.fileno())
+        self._sync_directory()
+        self._segment = segment
+        self._segment_number = number
+        self._segment_size = len(_SEGMENT_MAGIC)
+
+    def _sync_directory(self):
+        try:
+            fd = os.open(self._directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def _scan(self, paths: list[str]) -> Iterator[JournalRecord]:
+        for path in paths:
+            size = os.path.getsize(path)
+            if size < len(_SEGMENT_MAGIC):
+                with open(path, "rb") as segment:
+                    head = segment.read()
+                if not _SEGMENT_MAGIC.startswith(head):
+                    raise IOError(f"not a journal segment: {path}")
+                # Torn while its magic was written: an empty segment, repaired by open().
+                self._valid_ends[path] = 0
+                continue
+            with open(path, "rb") as segment, mmap(segment.fileno(), 0, access=ACCESS_READ) as view:
+                if view[:len(_SEGMENT_MAGIC)] != _SEGMENT_MAGIC:
+                    raise IOError(f"not a journal segment: {path}")
+                offset = len(_SEGMENT_MAGIC)
+                while offset + _RECORD_HEADER.size <= size:
+                    length, record_type, checksum = _RECORD_HEADER.unpack_from(view, offset)
+                    start = offset + _RECORD_HEADER.size
+                    end = start + length
+                    if end > size:
+                        break
+                    payload = view[start:end]
+                    if crc32(payload) != checksum:
+                        break
+                    yield JournalRecord(record_type, payload)
+                    offset = end
+                self._valid_ends[path] = offset
+
+    def _segment_paths(self) -> list[str]:
+        if not os.path.isdir(self._directory):
+            return []
+        names = [
+            name for name in os.listdir(self._directory)
+            if name.startswith(_SEGMENT_PREFIX) and name.endswith(_SEGMENT_SUFFIX)
+        ]
+        return [os.path.join(self._directory, name) for name in sorted(names)]
+
+    @staticmethod
+    def _segment_number_of(path: str) -> int:
+        name = os.path.basename(path)
+        return int(name[len(_SEGMENT_PREFIX):-len(_SEGMENT_SUFFIX)])
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import re
+from array import array
+from bisect import bisect_left
+from threading import Lock
+from uuid import UUID
+
+from localchat.config.limits import SEARCH_INDEX_MAX_MESSAGES, SEARCH_MAX_TOKEN_LENGTH
+from localchat.util import UserMessage
+
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Case-folded word tokens of text, in order (duplicates kept).
+    Links split into their words, so "example.com" finds "https://example.com/a".
+    """
+    return [token[:SEARCH_MAX_TOKEN_LENGTH] for token in _TOKEN_PATTERN.findall(text.casefold())]
+
+
+def _contains(postings: array, seq: int) -> bool:
+    index = bisect_left(postings, seq)
+    return index < len(postings) and postings[index] == seq
+
+
+class MessageSearchIndex:
+    """
+    Incrementally maintained inverted index over public messages, keyed by chat log sequence numbers.
+    Each token (and each sender) maps to an ascending array of the sequence numbers
+    containing it, so adding a message only appends and a query walks the shortest
+    postings from the newest end, checking the others by bisect.
+    Only the newest max_messages messages stay searchable; stale postings are
+    trimmed in sweeps, so memory follows the retention window.
+    """
+
+    def __init__(self, max_messages: int = SEARCH_INDEX_MAX_MESSAGES):
+        if max_messages <= 0:
+            raise ValueError("search index window must be positive")
+        self._max_messages = max_messages
+        self._lock = Lock()
+        self._postings: dict[str, array] = {}
+        self._sender_postings: dict[tuple[UUID, str], array] = {}
+        self._first_seq = 0
+        self._next_seq = 0
+        # Oldest sequence number that may still be in a postings array.
+        self._swept_seq = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._next_seq - self._first_seq
+
+    def add(self, seq: int, message: UserMessage):
+        """
+        Indexes one message; sequence numbers must be increasing.
+        """
+        tokens = set(tokenize(message.message()))
+        sender = message.sender()
+        key = (sender.get_id(), sender.get_name().casefold())
+        with self._lock:
+            if seq < self._next_seq:
+                raise ValueError("sequence numbers must be increasing")
+            if self._next_seq == self._first_seq:
+                # Empty (new or cleared): the window starts here.
+                self._first_seq = seq
+                self._swept_seq = seq
+            postings = self._sender_postings.get(key)
+            if postings is None:
+                postings = array("q")
+                self._sender_postings[key] = postings
+            postings.append(seq)
+            for token in tokens:
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = array("q")
+                    self._postings[token] = postings
+                postings.append(seq)
+            self._next_seq = seq + 1
+            if self._next_seq - self._first_seq > self._max_messages:
+                self._first_seq = self._next_seq - self._max_messages
+                # Sweep once a quarter of the window is stale, so trimming stays amortized O(1) per message.
+                if self._first_seq - self._swept_seq >= max(1, self._max_messages // 4):
+                    self._sweep_locked()
+
+    def clear(self):
+        with self._lock:
+            self._postings = {}
+            self._sender_postings = {}
+            self._first_seq = self._next_seq
+            self._swept_seq = self._next_seq
+
+    def search(
+            self,
+            terms: list[str],
+            sender: str | None = None,
+            since_seq: int = 0,
+            offset: int = 0,
+            limit: int = 10,
+    ) -> list[int]:
+        """
+        Sequence numbers of the messages that contain every term, newest first.
+        :param sender: case-insensitive sender name or sender id prefix
+        :param since_seq: oldest sequence number that may match
+        """
+        tokens = {token for term in terms for token in tokenize(term)}
+        if len(tokens) == 0 or limit <= 0:
+            return []
+        with self._lock:
+            postings = [self._postings.get(token) for token in tokens]
+            if any(posting is None for posting in postings):
+                return []
+            senders: list[array] = []
+            if sender is not None:
+                senders = self._match_senders_locked(sender)
+                if len(senders) == 0:
+                    return []
+                if len(senders) == 1:
+                    # A single sender is just one more list every hit has to be in.
+                    postings.append(senders.pop())
+            postings.sort(key=len)
+            driver, others = postings[0], postings[1:]
+            lowest = max(since_seq, self._first_seq)
+            skip = offset
+            result: list[int] = []
+            for index in range(len(driver) - 1, -1, -1):
+                seq = driver[index]
+                if seq < lowest:
+                    break
+                if len(senders) > 0 and not any(_contains(posting, seq) for posting in senders):
+                    continue
+                if not all(_contains(posting, seq) for posting in others):
+                    continue
+                if skip > 0:
+                    skip -= 1
+                    continue
+                result.append(seq)
+                if len(result) >= limit:
+                    break
+            return result
+
+    def token_count(self) -> int:
+        with self._lock:
+            return len(self._postings)
+
+    def posting_count(self) -> int:
+        with self._lock:
+            return sum(len(postings) for postings in self._postings.values())
+
+    def _match_senders_locked(self, sender: str) -> list[array]:
+        key = sender.strip().casefold()
+        if len(key) == 0:
+            return []
+        return [
+            postings
+            for (user_id, name), postings in self._sender_postings.items()
+            if name == key or str(user_id).startswith(key)
+        ]
+
+    def _sweep_locked(self):
+        first = self._first_seq
+        for table in (self._postings, self._sender_postings):
+            stale_keys = []
+            for key, postings in table.items():
+                cut = bisect_left(postings, first)
+                if cut == len(postings):
+                    stale_keys.append(key)
+                elif cut > 0:
+                    del postings[:cut]
+            for key in stale_keys:
+                del table[key]
+        self._swept_seq = first
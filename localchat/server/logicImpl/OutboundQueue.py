@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+from collections import deque
+from dataclasses import dataclass
+from enum import Enum
+from threading import Condition
+from time import monotonic
+from typing import Callable
+
+from localchat.config.limits import OUTBOUND_QUEUE_MAX_BYTES, OUTBOUND_QUEUE_MAX_MESSAGES
+
+
+class SlowConsumerPolicy(Enum):
+    """
+    What happens when a session's outbound queue exceeds its budget.
+    DROP: new droppable frames are discarded (oldest droppable frames make room for essential ones).
+    COALESCE: the queued droppable backlog is replaced by a single "n messages skipped" notice.
+    DISCONNECT: the session is closed.
+    """
+    DROP = "drop"
+    COALESCE = "coalesce"
+    DISCONNECT = "disconnect"
+
+
+@dataclass(frozen=True)
+class OutboundQueueStats:
+    depth: int
+    queued_bytes: int
+    max_depth: int
+    sent: int
+    dropped: int
+    coalesced: int
+    overflowed: bool
+
+
+@dataclass
+class _Frame:
+    payload: bytes | None
+    droppable: bool
+
+
+class OutboundQueue:
+    """
+    Bounded FIFO of outgoing packet payloads for exactly one session.
+    Producers (broadcasts, replies) never block on the network; a single writer drains the queue.
+    Frames are marked droppable (e.g. public chat broadcasts) or essential
+    (handshake, membership and error packets); only droppable frames are
+    ever discarded or coalesced.
+    """
+
+    def __init__(
+        self,
+        max_messages: int = OUTBOUND_QUEUE_MAX_MESSAGES,
+        max_bytes: int = OUTBOUND_QUEUE_MAX_BYTES,
+        policy: SlowConsumerPolicy = SlowConsumerPolicy.DISCONNECT,
+        coalesce_notice: Callable[[int], bytes] | None = None,
+        lock=None,
+    ):
+        """
+        :param lock: lock of the queue's condition (e.g. an InstrumentedLock); None: a new RLock
+        """
+        if max_messages <= 0 or max_bytes <= 0:
+            raise ValueError("queue budget must be positive")
+        if policy == SlowConsumerPolicy.COALESCE and coalesce_notice is None:
+            raise ValueError("coalesce policy requires a notice encoder")
+        self._max_messages = max_messages
+        self._max_bytes = max_bytes
+        self._policy = policy
+        self._coalesce_notice = coalesce_notice
+        self._cond = Condition(lock)
+        self._frames: deque[_Frame] = deque()
+        self._queued_bytes = 0
+        self._notice_count = 0
+        self._closed = False
+        self._overflowed = False
+        self._max_depth = 0
+        self._sent = 0
+        self._dropped = 0
+        self._coalesced = 0
+
+    def push(self, payload: bytes, droppable: bool = False) -> bool:
+        """
+        Enqueues one packet payload.
+        :return: False if the queue is closed or the session has to be disconnected
+        """
+        size = len(payload)
+        with self._cond:
+            if self._closed:
+                return False
+            if self._exceeds_budget(size):
+                if self._policy == SlowConsumerPolicy.DISCONNECT:
+                    self._overflow_locked()
+                    return False
+                if self._policy == SlowConsumerPolicy.DROP:
+                    if droppable:
+                        self._dropped += 1
+                        return True
+                    self._dropped += self._evict_droppable_locked(size)
+                else:
+                    skipped = self._evict_droppable_locked(None)
+                    drop_new = droppable and self._exceeds_budget(size)
+                    if drop_new:
+                        skipped += 1
+                    if skipped > 0:
+                        self._coalesced += skipped
+                        self._queue_notice_locked(skipped)
+                    if drop_new:
+                        self._cond.notify()
+                        return True
+                if self._exceeds_budget(size):
+                    self._overflow_locked()
+                    return False
+            self._frames.append(_Frame(payload, droppable))
+            self._queued_bytes += size
+            if len(self._frames) > self._max_depth:
+                self._max_depth = len(self._frames)
+            self._cond.notify()
+            return True
+
+    def pop_batch(self, max_frames: int = 64, max_bytes: int = 256 * 1024) -> list[bytes]:
+        """
+        Removes up to max_frames payloads (at least one, if available) without blocking.
+        """
+        with self._cond:
+            return self._pop_batch_locked(max_frames, max_bytes)
+
+    def wait_pop_batch(
+        self,
+        max_frames: int = 64,
+        max_bytes: int = 256 * 1024,
+        linger_s: float = 0.0,
+    ) -> list[bytes] | None:
+        """
+        Blocks until payloads are available.
+        With linger_s the batch is held back for up to that long after the first frame
+        arrived (or until it is full), so more frames can share one send.
+        :return: None once the queue is closed and fully drained
+        """
+        with self._cond:
+            while len(self._frames) == 0 and not self._closed:
+                self._cond.wait()
+            if len(self._frames) == 0:
+                return None
+            if linger_s > 0:
+                deadline = monotonic() + linger_s
+                while (
+                    not self._closed
+                    and len(self._frames) < max_frames
+                    and self._queued_bytes < max_bytes
+                ):
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if len(self._frames) == 0:
+                    return None
+            return self._pop_batch_locked(max_frames, max_bytes)
+
+    def close(self, discard: bool = False):
+        """
+        Stops accepting frames. Already queued frames are still handed to the writer unless discard is set.
+        """
+        with self._cond:
+            self._closed = True
+            if discard:
+                self._frames.clear()
+                self._queued_bytes = 0
+                self._notice_count = 0
+            self._cond.notify_all()
+
+    def is_closed(self) -> bool:
+        with self._cond:
+            return self._closed
+
+    def is_drained(self) -> bool:
+        with self._cond:
+            return len(self._frames) == 0
+
+    def stats(self) -> OutboundQueueStats:
+        with self._cond:
+            return OutboundQueueStats(
+                depth=len(self._frames),
+                queued_bytes=self._queued_bytes,
+                max_depth=self._max_depth,
+                sent=self._sent,
+                dropped=self._dropped,
+                coalesced=self._coalesced,
+                overflowed=self._overflowed,
+            )
+
+    def _exceeds_budget(self, size: int) -> bool:
+        return (
+            len(self._frames) + 1 > self._max_messages
+            or self._queued_bytes + size > self._max_bytes
+        )
+
+    def _overflow_locked(self):
+        self._overflowed = True
+        self._closed = True
+        self._frames.clear()
+        self._queued_bytes = 0
+        self._notice_count = 0
+        self._cond.notify_all()
+
+    def _evict_droppable_locked(self, needed: int | None) -> int:
+        """
+        Removes droppable frames, oldest first.
+        With needed=None every droppable frame is removed, otherwise only until needed bytes fit.
+        """
+        evicted = 0
+        remaining = len(self._frames)
+        kept: deque[_Frame] = deque()
+        for frame in self._frames:
+            if frame.droppable and (
+                needed is None
+                or remaining + 1 > self._max_messages
+                or self._queued_bytes + needed > self._max_bytes
+            ):
+                self._queued_bytes -= len(frame.payload)
+                remaining -= 1
+                evicted += 1
+                continue
+            kept.append(frame)
+        self._frames = kept
+        return evicted
+
+    def _queue_notice_locked(self, skipped: int):
+        if self._notice_count > 0:
+            self._frames = deque(frame for frame in self._frames if frame.payload is not None)
+        self._notice_count += skipped
+        self._frames.append(_Frame(None, False))
+
+    def _pop_batch_locked(self, max_frames: int, max_bytes: int) -> list[bytes]:
+        batch: list[bytes] = []
+        batch_bytes = 0
+        while len(self._frames) > 0 and len(batch) < max_frames:
+            frame = self._frames[0]
+            is_notice = frame.payload is None
+            payload = self._coalesce_notice(self._notice_count) if is_notice else frame.payload
+            if len(batch) > 0 and batch_bytes + len(payload) > max_bytes:
+                break
+            self._frames.popleft()
+            if is_notice:
+                self._notice_count = 0
+            else:
+                self._queued_bytes -= len(payload)
+            batch.append(payload)
+            batch_bytes += len(payload)
+        self._sent += len(batch)
+        return batch
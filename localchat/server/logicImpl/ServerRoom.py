@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import re
+from typing import TYPE_CHECKING
+from uuid import UUID
+
+from localchat.config.defaults import DEFAULT_LOCK_PROFILING
+from localchat.config.limits import MAX_ROOM_ID_LENGTH, RATE_LIMIT_BURST, RATE_LIMIT_MSG_PER_SEC
+from localchat.server.commands import ServerCommandDispatcher
+from localchat.server.logicImpl.AbstractLogic import AbstractLogic
+from localchat.server.logicImpl.ChatLog import ChatLog
+from localchat.server.logicImpl.MessageJournal import MessageJournal
+from localchat.util import ChatInformation, UserMessage
+from localchat.util.metrics import MetricsRegistry
+
+if TYPE_CHECKING:
+    from localchat.server.logicImpl.TcpServerLogic import TcpServerLogic
+
+
+_ROOM_ID_PATTERN = re.compile(r"^[a-z0-9][a-z0-9._-]*$")
+
+
+def normalize_room_id(room_id: str) -> str:
+    """
+    Room ids ignore case: join URLs may spell them either way, and they name journal directories.
+    :return: the canonical (lower case) id, "" for the default room
+    :raises ValueError: if room_id is too long or has other characters than letters, digits, '.', '_' and '-'
+    """
+    room_id = room_id.strip().lower()
+    if len(room_id) == 0:
+        return ""
+    if len(room_id) > MAX_ROOM_ID_LENGTH or _ROOM_ID_PATTERN.match(room_id) is None:
+        raise ValueError("invalid room id")
+    return room_id
+
+
+class ServerRoom(AbstractLogic):
+    """
+    One room of a TcpServerLogic besides its default room (the server itself).
+    A room has its own members, host, bans, chat log with search index and journal,
+    commands and rate limit. The server owns the sessions and routes each packet to the
+    room its session joined; broadcasts and private messages of a room only reach the
+    sessions in that room.
+    Rooms share the server's identity, endpoint, password and metrics, and run while it runs.
+    """
+    _LOCK_NAME = "room"
+
+    def __init__(
+            self,
+            server: TcpServerLogic,
+            room_id: str,
+            chat_log: ChatLog | None = None,
+            journal: MessageJournal | None = None,
+            rate_limit_msg_per_sec: float = RATE_LIMIT_MSG_PER_SEC,
+            rate_limit_burst: float = RATE_LIMIT_BURST,
+            metrics: MetricsRegistry | None = None,
+            lock_profiling: bool = DEFAULT_LOCK_PROFILING,
+    ):
+        if rate_limit_msg_per_sec < 0 or rate_limit_burst < 1:
+            raise ValueError("rate limit must not be negative and its burst at least 1")
+        # Set first: AbstractLogic already hands _emit_error to the journal.
+        self._server = server
+        self._room_id = room_id
+        super().__init__(chat_log, journal, metrics=metrics, lock_profiling=lock_profiling)
+        self._rate_limit_msg_per_sec = rate_limit_msg_per_sec
+        self._rate_limit_burst = rate_limit_burst
+        self._command_dispatcher = ServerCommandDispatcher(self)
+
+    def get_room_id(self) -> str:
+        return self._room_id
+
+    def list_rooms(self) -> dict[str, int]:
+        return self._server.list_rooms()
+
+    def get_server_info(self) -> ChatInformation:
+        return self._server.get_server_info()
+
+    def set_server_name(self, new_name: str):
+        self._server.set_server_name(new_name)
+
+    def get_uptime_seconds(self) -> float:
+        return self._server.get_uptime_seconds()
+
+    def _emit_error(self, error: IOError):
+        # Reported where the server's errors go (e.g. stderr of `localchat serve`).
+        self._server._emit_error(error)
+
+    def _on_start_impl(self):
+        return
+
+    def _on_stop_impl(self):
+        return
+
+    def _disconnect_member_impl(self, user_id: UUID, reason: str):
+        self._server._disconnect_room_member(self, user_id, reason)
+
+    def transfer_host(self, new_host_id: UUID):
+        if self._server._cluster is None:
+            super().transfer_host(new_host_id)
+            return
+        self._server._transfer_host_in_cluster(self, new_host_id)
+
+    def ban_member(self, user_id: UUID, reason: str = ""):
+        if self._server._cluster is None:
+            super().ban_member(user_id, reason)
+            return
+        self._server._ban_member_in_cluster(self, user_id, reason)
+
+    def unban_member(self, user_id: UUID):
+        if self._server._cluster is None:
+            super().unban_member(user_id)
+            return
+        self._server._cluster.set_banned(self._room_id, user_id, False)
+
+    def set_locked(self, locked: bool):
+        if self._server._cluster is None:
+            super().set_locked(locked)
+            return
+        self._server._cluster.set_locked(self._room_id, locked)
+
+    def _broadcast_public_impl(self, user_message: UserMessage):
+        self._server._broadcast_public_to(self._room_id, user_message)
+
+    def _send_private_impl(self, recipient_id: UUID, user_message: UserMessage):
+        self._server._send_private_to(self._room_id, recipient_id, user_message)
+
+    def _set_server_password_impl(self, new_password: str | None):
+        self._server.set_server_password(new_password)
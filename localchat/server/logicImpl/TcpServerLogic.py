@@ -1,106 +1,572 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from socket import AF_INET, SOCK_STREAM, SOL_SOCKET, SO_REUSEADDR, socket
-from threading import Lock, Thread
-from time import monotonic
+from dataclasses import dataclass, field
+from socket import AF_INET, SHUT_RDWR, SOCK_STREAM, SOL_SOCKET, SO_REUSEADDR, socket
+from threading import Thread, current_thread
+from time import monotonic, perf_counter
+from typing import TYPE_CHECKING, Callable
 from uuid import UUID, uuid4
 
-from localchat.config.defaults import DEFAULT_HOST, DEFAULT_PORT, DEFAULT_MAX_CLIENTS, HARD_MAX_CLIENTS
+from localchat.config.defaults import (
+    DEFAULT_HOST,
+    DEFAULT_LOCK_PROFILING,
+    DEFAULT_MAX_CLIENTS,
+    DEFAULT_PORT,
+    DEFAULT_SLOW_CONSUMER_POLICY,
+    HARD_MAX_CLIENTS,
+)
 from localchat.config.limits import (
+    ADMISSION_ADDRESS_CONNECT_BURST,
+    ADMISSION_ADDRESS_CONNECT_PER_SEC,
+    ADMISSION_ADDRESS_MSG_BURST,
+    ADMISSION_ADDRESS_MSG_PER_SEC,
+    ADMISSION_CONNECT_BURST,
+    ADMISSION_CONNECT_PER_SEC,
+    HISTORY_PAGE_MAX_BYTES,
+    HISTORY_PAGE_MAX_MESSAGES,
+    DISCOVERY_MAX_ROOMS,
     JOIN_TIMEOUT_S,
+    MAX_ROOMS,
+    OUTBOUND_QUEUE_MAX_BYTES,
+    OUTBOUND_QUEUE_MAX_MESSAGES,
     RATE_LIMIT_BURST,
     RATE_LIMIT_MAX_VIOLATIONS,
     RATE_LIMIT_MSG_PER_SEC,
+    SEND_CORK_WINDOW_MS,
 )
 from localchat.net import SerializableUser
 from localchat.net.discovery import DiscoveredServer, UdpBroadcastDiscoveryResponder
 from localchat.net import tcp_protocol
 from localchat.server.commands import ServerCommandDispatcher
 from localchat.server.logicImpl.AbstractLogic import AbstractLogic
-from localchat.util import User, UserMessage
-from localchat.util.event import Event, EventListener
+from localchat.server.logicImpl.AdmissionControl import REJECT_ADDRESS_RATE, REJECT_GLOBAL_RATE, AdmissionControl
+from localchat.server.logicImpl.ChatLog import ChatLog
+from localchat.server.logicImpl.MessageJournal import MessageJournal
+from localchat.server.logicImpl.OutboundQueue import OutboundQueue, OutboundQueueStats, SlowConsumerPolicy
+from localchat.server.logicImpl.ServerRoom import ServerRoom, normalize_room_id
+from localchat.server.logic import Logic
+from localchat.util import Role, User, UserMessage
+from localchat.util.event import Event, EventDispatcher, EventListener
+from localchat.util.metrics import MetricsHttpServer, MetricsRegistry
+
+if TYPE_CHECKING:
+    from localchat.server.cluster import ClusterLink
 
 
-@dataclass
+@dataclass(eq=False)
 class _Session:
     sock: socket
     addr: tuple[str, int]
-    send_lock: Lock
+    outbound: OutboundQueue
+    receiver: tcp_protocol.PacketReceiver
+    sender: tcp_protocol.PacketSender
+    writer: Thread | None = None
     user_id: UUID | None = None
+    join_requested: bool = False
     rate_tokens: float = RATE_LIMIT_BURST
     rate_last_refill: float = 0.0
     rate_limit_violations: int = 0
+    protocol_version: int = tcp_protocol.PROTOCOL_V1
+    # v2: sender handles this connection has already been told about
+    known_handles: set[int] = field(default_factory=set)
+    capabilities: int = 0
+    # The server itself (default room) or a ServerRoom; set on join
+    room: AbstractLogic | None = None
 
 
 class _SendUserEventToClients(EventListener[User]):
-    def __init__(self, outer: "TcpServerLogic", encoder):
+    def __init__(self, outer: "TcpServerLogic", room_id: str, encoder, encoder_v2, releases_handle: bool = False):
         self._outer = outer
+        self._room_id = room_id
         self._encoder = encoder
+        self._encoder_v2 = encoder_v2
+        self._releases_handle = releases_handle
 
     def on_event(self, event: Event[User]):
         user = event.value()
-        self._outer._broadcast_payload(self._encoder(user))
+        self._outer._broadcast_versioned(
+            lambda: self._encoder(user),
+            lambda handle: self._encoder_v2(handle, user),
+            user,
+            droppable=False,
+            defines_sender=True,
+            room_id=self._room_id,
+        )
+        if self._releases_handle:
+            self._outer._release_user_handle(user.get_id())
 
 
 class TcpServerLogic(AbstractLogic):
+    _HARD_MAX_CLIENTS = HARD_MAX_CLIENTS
+    _CLOSE_LINGER_S = 1.0
+
     def __init__(
         self,
         host: str = DEFAULT_HOST,
         port: int = DEFAULT_PORT,
         max_clients: int = DEFAULT_MAX_CLIENTS,
+        slow_consumer_policy: SlowConsumerPolicy | str = DEFAULT_SLOW_CONSUMER_POLICY,
+        outbound_max_messages: int = OUTBOUND_QUEUE_MAX_MESSAGES,
+        outbound_max_bytes: int = OUTBOUND_QUEUE_MAX_BYTES,
+        chat_log: ChatLog | None = None,
+        journal: MessageJournal | None = None,
+        send_cork_ms: float = SEND_CORK_WINDOW_MS,
+        compression: bool = True,
+        rate_limit_msg_per_sec: float = RATE_LIMIT_MSG_PER_SEC,
+        rate_limit_burst: float = RATE_LIMIT_BURST,
+        metrics: MetricsRegistry | None = None,
+        metrics_port: int | None = None,
+        lock_profiling: bool = DEFAULT_LOCK_PROFILING,
+        max_rooms: int = MAX_ROOMS,
+        room_journal_factory: Callable[[str], MessageJournal] | None = None,
+        address_connect_rate: float = ADMISSION_ADDRESS_CONNECT_PER_SEC,
+        connect_rate: float = ADMISSION_CONNECT_PER_SEC,
+        address_rate_limit_msg_per_sec: float = ADMISSION_ADDRESS_MSG_PER_SEC,
     ):
-        super().__init__()
-        if max_clients <= 0 or max_clients > HARD_MAX_CLIENTS:
-            raise ValueError(f"max_clients must be in range 1..{HARD_MAX_CLIENTS}")
+        """
+        The server is the default room ("") of the rooms it hosts (see create_room()).
+        :param rate_limit_msg_per_sec: messages per second a member may post or whisper after the burst;
+            0 disables the limit (e.g. for load tests)
+        :param metrics: registry to record into (default: a new enabled one)
+        :param metrics_port: serve the metrics in Prometheus format on 127.0.0.1:metrics_port
+            while running (0: any free port); None disables the endpoint
+        :param lock_profiling: record acquisitions, wait and hold times of the shared locks
+            (logic, room, sessions, handles, outbound_queue, admission; the async server also scheduled) in the metrics
+        :param max_rooms: rooms besides the default room; joins to unknown rooms create them up to this limit
+        :param room_journal_factory: journal of a new room, called with its id (None: rooms keep no journal)
+        :param address_connect_rate: connections per second one source address may open after a burst of
+            ADMISSION_ADDRESS_CONNECT_BURST; 0 disables the limit
+        :param connect_rate: connections per second of all sources together after a burst of
+            ADMISSION_CONNECT_BURST; 0 disables the limit
+        :param address_rate_limit_msg_per_sec: messages per second of all sessions of one source address
+            after a burst of ADMISSION_ADDRESS_MSG_BURST; applies on top of rate_limit_msg_per_sec and only
+            where that limit is on; 0 disables it
+        """
+        super().__init__(chat_log, journal, metrics=metrics, lock_profiling=lock_profiling)
+        if max_clients <= 0 or max_clients > self._HARD_MAX_CLIENTS:
+            raise ValueError(f"max_clients must be in range 1..{self._HARD_MAX_CLIENTS}")
+        if outbound_max_messages <= 0 or outbound_max_bytes <= 0:
+            raise ValueError("outbound queue budget must be positive")
+        if send_cork_ms < 0:
+            raise ValueError("send cork window must not be negative")
+        if rate_limit_msg_per_sec < 0 or rate_limit_burst < 1:
+            raise ValueError("rate limit must not be negative and its burst at least 1")
+        if metrics_port is not None and (metrics_port < 0 or metrics_port > 65535):
+            raise ValueError("metrics port must be in range 0..65535")
+        if max_rooms < 0:
+            raise ValueError("max_rooms must not be negative")
         self._host = host
         self._port = port
         self._max_clients = max_clients
+        self._slow_consumer_policy = SlowConsumerPolicy(slow_consumer_policy)
+        self._outbound_max_messages = outbound_max_messages
+        self._outbound_max_bytes = outbound_max_bytes
+        self._send_cork_s = send_cork_ms / 1000.0
+        self._rate_limit_msg_per_sec = rate_limit_msg_per_sec
+        self._rate_limit_burst = rate_limit_burst
+        self._capabilities = tcp_protocol.SUPPORTED_CAPABILITIES
+        if not compression:
+            self._capabilities &= ~tcp_protocol.CAP_ZLIB
         self._password: str | None = None
         self._listener: socket | None = None
         self._accept_thread: Thread | None = None
         self._accept_running = False
-        self._sessions_lock = Lock()
+        self._sessions_lock = self._create_lock("sessions")
         self._sessions_by_user_id: dict[UUID, _Session] = {}
         self._sessions_without_user: list[_Session] = []
+        # Joined sessions per room id (a subset of _sessions_by_user_id), so fan-out only touches one room.
+        self._sessions_by_room: dict[str, dict[UUID, _Session]] = {}
+        # Guarded by _lock; the default room is the server itself and not listed here.
+        self._rooms: dict[str, ServerRoom] = {}
+        self._max_rooms = max_rooms
+        self._room_journal_factory = room_journal_factory
+        self._event_dispatcher: EventDispatcher | None = None
         self._discovery_responder = UdpBroadcastDiscoveryResponder(
             snapshot_provider=self._discovery_snapshot,
             bind_host=self._host,
         )
         self._command_dispatcher = ServerCommandDispatcher(self)
+        # v2 sender handles are server-wide, so one encoded payload serves every v2 session.
+        # Only members have one; a handle number is never given out twice.
+        self._handles_lock = self._create_lock("handles")
+        self._user_handles: dict[UUID, int] = {}
+        self._next_user_handle = 0
+        self._metrics_endpoint = MetricsHttpServer(self._metrics, metrics_port) if metrics_port is not None else None
+        self._closed_outbound_dropped = 0
+        # Outlives the sessions: rejected connections never get a session or a thread.
+        self._admission = AdmissionControl(
+            address_connect_per_sec=address_connect_rate,
+            address_connect_burst=ADMISSION_ADDRESS_CONNECT_BURST,
+            connect_per_sec=connect_rate,
+            connect_burst=ADMISSION_CONNECT_BURST,
+            address_msg_per_sec=address_rate_limit_msg_per_sec,
+            address_msg_burst=ADMISSION_ADDRESS_MSG_BURST,
+            lock=self._create_lock("admission") if self._lock_profiling else None,
+        )
+        # Set when this server is one worker of a multi-process server (see set_cluster_link()).
+        self._cluster: ClusterLink | None = None
+        self._init_metrics()
+        self._attach_room_events(self)
 
-        self.on_member_joined().add_listener(
-            _SendUserEventToClients(self, tcp_protocol.encode_server_user_joined)
+    def _attach_room_events(self, room: AbstractLogic):
+        """
+        Sends the member events of room to the sessions in that room.
+        """
+        room_id = room.get_room_id()
+        room.on_member_joined().add_listener(
+            _SendUserEventToClients(
+                self,
+                room_id,
+                tcp_protocol.encode_server_user_joined,
+                tcp_protocol.encode_server_user_joined_v2,
+            )
         )
-        self.on_member_left().add_listener(
-            _SendUserEventToClients(self, tcp_protocol.encode_server_user_left)
+        room.on_member_left().add_listener(
+            _SendUserEventToClients(
+                self,
+                room_id,
+                tcp_protocol.encode_server_user_left,
+                tcp_protocol.encode_server_user_left_v2,
+                releases_handle=True,
+            )
         )
-        self.on_member_role_changed().add_listener(
-            _SendUserEventToClients(self, tcp_protocol.encode_server_user_became_host)
+        room.on_member_role_changed().add_listener(
+            _SendUserEventToClients(
+                self,
+                room_id,
+                tcp_protocol.encode_server_user_became_host,
+                tcp_protocol.encode_server_user_became_host_v2,
+            )
         )
 
-    def _on_start_impl(self):
-        listener = socket(AF_INET, SOCK_STREAM)
-        listener.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
-        listener.bind((self._host, self._port))
-        listener.listen()
-        actual_port = int(listener.getsockname()[1])
+    def _init_metrics(self):
+        """
+        Creates the instruments used on the hot paths; the per-packet cost is a dict lookup,
+        a few counter increments and one histogram observation.
+        """
+        metrics = self._metrics
+        packets_in = "localchat_packets_received_total"
+        packets_in_help = "Packets received from clients, by packet type."
+        self._packets_in_metrics = {
+            packet_type: metrics.counter(packets_in, packets_in_help, {"type": name})
+            for packet_type, name in (
+                (tcp_protocol.PT_C_JOIN, "join"),
+                (tcp_protocol.PT_C_PUBLIC, "public"),
+                (tcp_protocol.PT_C_PRIVATE, "private"),
+                (tcp_protocol.PT_C_HISTORY, "history"),
+                (tcp_protocol.PT_C_LEAVE, "leave"),
+            )
+        }
+        self._packets_in_other_metric = metrics.counter(packets_in, packets_in_help, {"type": "other"})
+        self._bytes_in_metric = metrics.counter(
+            "localchat_received_bytes_total",
+            "Received packet payloads plus length headers (after decompression).",
+        )
+        self._packets_out_metric = metrics.counter("localchat_packets_sent_total", "Packets taken from the outbound queues for sending.")
+        self._bytes_out_metric = metrics.counter(
+            "localchat_sent_bytes_total",
+            "Bytes written to client sockets (after compression).",
+        )
+        self._packet_handle_seconds = metrics.histogram(
+            "localchat_packet_handle_seconds",
+            "Time to decode and handle one received packet, including the fan-out it triggers.",
+        )
+        self._broadcast_seconds = metrics.histogram(
+            "localchat_broadcast_seconds",
+            "Time to encode and enqueue one broadcast for every joined session.",
+        )
+        self._broadcast_recipients_metric = metrics.counter(
+            "localchat_broadcast_recipients_total",
+            "Sessions a broadcast packet was enqueued for.",
+        )
+        self._rate_limited_metric = metrics.counter(
+            "localchat_rate_limited_total",
+            "Messages rejected by the per-member or per-address rate limit.",
+        )
+        self._rate_limit_disconnects_metric = metrics.counter(
+            "localchat_rate_limit_disconnects_total",
+            "Sessions closed for exceeding the rate limit repeatedly.",
+        )
+        self._send_failures_metric = metrics.counter(
+            "localchat_send_failures_total",
+            "Sessions whose socket failed while sending.",
+        )
+        join_rejected = "localchat_join_rejected_total"
+        join_rejected_help = "Join attempts that were refused, by reason."
+        self._join_rejected_metrics = {
+            reason: metrics.counter(join_rejected, join_rejected_help, {"reason": reason})
+            for reason in ("server_full", "invalid_name", "invalid_room", "too_many_rooms", "name_in_use", "rejected")
+        }
+        connections_rejected = "localchat_connections_rejected_total"
+        connections_rejected_help = "Connections closed before becoming a session by the admission limits, by reason."
+        self._connections_rejected_metrics = {
+            reason: metrics.counter(connections_rejected, connections_rejected_help, {"reason": reason})
+            for reason in (REJECT_ADDRESS_RATE, REJECT_GLOBAL_RATE)
+        }
+        metrics.gauge(
+            "localchat_admission_tracked_addresses",
+            "Source addresses the admission limits currently remember.",
+            self._admission.tracked_addresses,
+        )
+        metrics.counter_from(
+            "localchat_admission_evicted_addresses_total",
+            "Source addresses forgotten because the admission table was full.",
+            self._admission.evicted_addresses,
+        )
+        self._sessions_opened_metric = metrics.counter("localchat_sessions_opened_total", "Connections admitted as sessions.")
+        self._sessions_closed_metric = metrics.counter("localchat_sessions_closed_total", "Sessions closed for any reason.")
+        metrics.gauge(
+            "localchat_sessions",
+            "Open sessions by state.",
+            lambda: len(self._sessions_by_user_id),
+            {"state": "joined"},
+        )
+        metrics.gauge(
+            "localchat_sessions",
+            "Open sessions by state.",
+            lambda: len(self._sessions_without_user),
+            {"state": "pending"},
+        )
+        metrics.gauge("localchat_rooms", "Rooms hosted, including the default room.", lambda: len(self._rooms) + 1)
+        metrics.gauge(
+            "localchat_outbound_queued_messages",
+            "Packets waiting in the outbound queues of all sessions.",
+            lambda: sum(stats.depth for stats in self._outbound_stats_snapshot()),
+        )
+        metrics.counter_from(
+            "localchat_outbound_dropped_total",
+            "Droppable packets discarded for slow consumers.",
+            lambda: self._closed_outbound_dropped + sum(stats.dropped for stats in self._outbound_stats_snapshot()),
+        )
+
+    def _outbound_stats_snapshot(self) -> list[OutboundQueueStats]:
+        with self._sessions_lock:
+            sessions = list(self._sessions_by_user_id.values()) + list(self._sessions_without_user)
+        return [session.outbound.stats() for session in sessions]
+
+    def _count_members(self) -> int:
+        with self._lock:
+            rooms = list(self._rooms.values())
+        return super()._count_members() + sum(room._count_members() for room in rooms)
 
-        self._listener = listener
+    def create_room(
+            self,
+            room_id: str,
+            rate_limit_msg_per_sec: float | None = None,
+            rate_limit_burst: float | None = None,
+    ) -> Logic:
+        """
+        Adds a room that clients join by sending its id in PT_C_JOIN. It runs while the server runs.
+        Joins to a room that does not exist yet create it with the server's rate limit.
+        :param rate_limit_msg_per_sec: None: the server's limit (also for rate_limit_burst)
+        :return: the room; moderate it and listen to its events like the server itself
+        :raises ValueError: if room_id is invalid or the room exists already
+        :raises LookupError: if max_rooms rooms exist already
+        :raises IOError: if the room's journal cannot be opened
+        """
+        room_id = normalize_room_id(room_id)
+        if room_id == "":
+            raise ValueError("the default room always exists")
+        return self._add_room(room_id, rate_limit_msg_per_sec, rate_limit_burst, exist_ok=False)
+
+    def get_room(self, room_id: str) -> Logic:
+        """
+        :return: the room, the server itself for the default room ("")
+        :raises KeyError: if there is no such room
+        """
+        try:
+            room_id = normalize_room_id(room_id)
+        except ValueError:
+            raise KeyError("unknown room")
+        if room_id == "":
+            return self
+        with self._lock:
+            room = self._rooms.get(room_id)
+        if room is None:
+            raise KeyError("unknown room")
+        return room
+
+    def list_rooms(self) -> dict[str, int]:
+        with self._lock:
+            rooms = list(self._rooms.values())
+        counts = {"": super()._count_members()}
+        for room in rooms:
+            counts[room.get_room_id()] = room._count_members()
+        return counts
+
+    def _admit_to_room(self, requested_room: str, user: User) -> tuple[AbstractLogic, Role | None]:
+        """
+        Finds (or creates) the room a joining user asked for and checks the name.
+        In a cluster the coordinator reserves the name for every worker and picks the role.
+        :return: the room and the role assigned by the cluster (None: not in a cluster)
+        :raises ValueError: if the room id is invalid
+        :raises LookupError: if the room does not exist and no more rooms may be created
+        :raises PermissionError: if another member of the room uses the name
+        :raises ConnectionRefusedError: if the cluster refuses the user (banned from the room, or the room is locked)
+        :raises IOError: if the journal of a new room cannot be opened or the cluster cannot be reached
+        """
+        if self._cluster is None:
+            room = self._room_for_join(requested_room)
+            if self._is_name_in_use(room, user.get_name()):
+                raise PermissionError("user name already in use")
+            return room, None
+        room_id = normalize_room_id(requested_room)
+        role = self._cluster.admit(room_id, user)
+        try:
+            return self._room_for_join(room_id), role
+        except (LookupError, IOError):
+            self._cluster.member_left(room_id, user.get_id())
+            raise
+
+    def _room_for_join(self, room_id: str) -> AbstractLogic:
+        """
+        :raises ValueError: if room_id is invalid
+        :raises LookupError: if the room does not exist and no more rooms may be created
+        :raises IOError: if the journal of a new room cannot be opened
+        """
+        room_id = normalize_room_id(room_id)
+        if room_id == "":
+            return self
+        with self._lock:
+            room = self._rooms.get(room_id)
+        if room is not None:
+            return room
+        return self._add_room(room_id, None, None, exist_ok=True)
+
+    def _add_room(
+            self,
+            room_id: str,
+            rate_limit_msg_per_sec: float | None,
+            rate_limit_burst: float | None,
+            exist_ok: bool,
+    ) -> ServerRoom:
+        with self._lock:
+            room = self._rooms.get(room_id)
+            if room is not None:
+                if exist_ok:
+                    return room
+                raise ValueError("room already exists")
+            if len(self._rooms) >= self._max_rooms:
+                raise LookupError("too many rooms")
+            room = ServerRoom(
+                self,
+                room_id,
+                journal=self._room_journal_factory(room_id) if self._room_journal_factory is not None else None,
+                rate_limit_msg_per_sec=(
+                    self._rate_limit_msg_per_sec if rate_limit_msg_per_sec is None else rate_limit_msg_per_sec
+                ),
+                rate_limit_burst=self._rate_limit_burst if rate_limit_burst is None else rate_limit_burst,
+                metrics=self._metrics,
+                lock_profiling=self._lock_profiling,
+            )
+            self._attach_room_events(room)
+            room.set_event_dispatcher(self._event_dispatcher)
+            if self.is_running():
+                # Under _lock, so no join sees the room before its journal is replayed.
+                room.start()
+            self._rooms[room_id] = room
+        return room
+
+    def start(self):
+        super().start()
+        with self._lock:
+            rooms = list(self._rooms.values())
+        for room in rooms:
+            try:
+                room.start()
+            except IOError:
+                # Already reported through on_error; the other rooms keep running.
+                pass
+
+    def stop(self):
+        with self._lock:
+            rooms = list(self._rooms.values())
+        for room in rooms:
+            if room.is_running():
+                room.stop()
+        super().stop()
+
+    def set_event_dispatcher(self, dispatcher: EventDispatcher | None):
+        super().set_event_dispatcher(dispatcher)
+        with self._lock:
+            self._event_dispatcher = dispatcher
+            rooms = list(self._rooms.values())
+        for room in rooms:
+            room.set_event_dispatcher(dispatcher)
+
+    def set_cluster_link(self, link: ClusterLink):
+        """
+        Makes this server one worker of a multi-process server (see ServerCluster): members,
+        host role and public messages of every room are shared with the other workers over link,
+        and joins are only admitted once the cluster's coordinator agreed to the name.
+        Only before start().
+        """
+        if self.is_running():
+            raise RuntimeError("the cluster link must be set before start()")
+        with self._lock:
+            self._server_info.set_id(link.get_server_id())
+        self._cluster = link
+        link.attach(self, self._emit_error)
+
+    def _on_start_impl(self):
+        self._listener = self._bind_listener()
         self._accept_running = True
+        self._accept_thread = Thread(target=self._accept_loop, name="localchat tcp accept loop", daemon=True)
+        self._accept_thread.start()
+        self._start_discovery()
+        self._start_metrics_endpoint()
+
+    def _bind_listener(self, backlog: int | None = None) -> socket:
+        if self._cluster is not None:
+            listener = self._cluster.open_listener(self._host, self._port, backlog)
+        else:
+            listener = socket(AF_INET, SOCK_STREAM)
+            listener.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+            listener.bind((self._host, self._port))
+            if backlog is None:
+                listener.listen()
+            else:
+                listener.listen(backlog)
+        actual_port = int(listener.getsockname()[1])
         with self._lock:
             self._port = actual_port
             self._server_info.set_port(actual_port)
-        self._accept_thread = Thread(target=self._accept_loop, name="localchat tcp accept loop", daemon=True)
-        self._accept_thread.start()
+        return listener
+
+    def _start_discovery(self):
+        if self._cluster is not None and not self._cluster.answers_discovery():
+            # One worker answers for the whole cluster.
+            return
         try:
             self._discovery_responder.start()
         except IOError as e:
             # Discovery is optional metadata transport; TCP chat should still run.
             self._emit_error(e)
 
+    def _start_metrics_endpoint(self):
+        if self._metrics_endpoint is None:
+            return
+        try:
+            self._metrics_endpoint.start()
+        except IOError as e:
+            # Like discovery: monitoring must not keep the chat from running.
+            self._emit_error(e)
+
+    def _stop_metrics_endpoint(self):
+        if self._metrics_endpoint is not None:
+            self._metrics_endpoint.stop()
+
+    def get_metrics_port(self) -> int | None:
+        """
+        :return: port of the Prometheus endpoint, None if it is disabled
+        """
+        if self._metrics_endpoint is None:
+            return None
+        return self._metrics_endpoint.get_port()
+
     def _on_stop_impl(self):
         self._discovery_responder.stop()
+        self._stop_metrics_endpoint()
         self._accept_running = False
         if self._listener is not None:
             try:
@@ -121,226 +587,499 @@ class TcpServerLogic(AbstractLogic):
                 client_sock, addr = listener.accept()
             except OSError:
                 return
-            with self._sessions_lock:
-                active_sessions = len(self._sessions_by_user_id) + len(self._sessions_without_user)
-            if active_sessions >= self._max_clients:
-                try:
-                    tcp_protocol.send_packet(
-                        client_sock,
-                        tcp_protocol.encode_server_join_nack(
-                            tcp_protocol.ERR_SERVER_FULL,
-                            "server is full",
-                        ),
-                    )
-                except Exception:
-                    pass
-                try:
-                    client_sock.close()
-                except OSError:
-                    pass
+            session = self._open_session(client_sock, addr)
+            if session is None:
                 continue
-            session = _Session(client_sock, addr, Lock())
-            session.rate_tokens = RATE_LIMIT_BURST
-            session.rate_last_refill = monotonic()
-            session.rate_limit_violations = 0
-            with self._sessions_lock:
-                self._sessions_without_user.append(session)
+            session.writer = Thread(
+                target=self._writer_loop,
+                args=(session,),
+                name=f"localchat tcp writer {addr}",
+                daemon=True,
+            )
+            session.writer.start()
             thread = Thread(target=self._client_loop, args=(session,), name=f"localchat tcp client {addr}", daemon=True)
             thread.start()
 
+    def _open_session(self, client_sock: socket, addr: tuple[str, int]) -> _Session | None:
+        """
+        Admits an accepted connection as a new (not yet joined) session.
+        Returns None if the connection was rejected and closed.
+        """
+        rejection = self._admission.admit_connection(addr[0])
+        if rejection is not None:
+            self._connections_rejected_metrics[rejection].inc()
+            self._reject_connection(client_sock, tcp_protocol.ERR_TOO_MANY_CONNECTIONS, "too many connection attempts")
+            return None
+        with self._sessions_lock:
+            active_sessions = len(self._sessions_by_user_id) + len(self._sessions_without_user)
+        if active_sessions >= self._max_clients:
+            self._join_rejected_metrics["server_full"].inc()
+            self._reject_connection(client_sock, tcp_protocol.ERR_SERVER_FULL, "server is full")
+            return None
+        tcp_protocol.set_no_delay(client_sock)
+        session = self._make_session(client_sock, addr)
+        session.rate_tokens = self._rate_limit_burst
+        session.rate_last_refill = monotonic()
+        session.rate_limit_violations = 0
+        with self._sessions_lock:
+            self._sessions_without_user.append(session)
+        self._sessions_opened_metric.inc()
+        return session
+
+    @staticmethod
+    def _reject_connection(client_sock: socket, code: str, reason: str):
+        try:
+            tcp_protocol.send_packet(client_sock, tcp_protocol.encode_server_join_nack(code, reason))
+        except Exception:
+            pass
+        try:
+            client_sock.close()
+        except OSError:
+            pass
+
+    def _make_session(self, client_sock: socket, addr: tuple[str, int]) -> _Session:
+        return _Session(
+            client_sock,
+            addr,
+            self._new_outbound_queue(),
+            tcp_protocol.PacketReceiver(client_sock),
+            tcp_protocol.PacketSender(client_sock),
+        )
+
+    def _new_outbound_queue(self) -> OutboundQueue:
+        return OutboundQueue(
+            max_messages=self._outbound_max_messages,
+            max_bytes=self._outbound_max_bytes,
+            policy=self._slow_consumer_policy,
+            coalesce_notice=self._encode_coalesce_notice,
+            lock=self._create_lock("outbound_queue") if self._lock_profiling else None,
+        )
+
+    @staticmethod
+    def _encode_coalesce_notice(skipped: int) -> bytes:
+        return tcp_protocol.encode_server_error(
+            tcp_protocol.ERR_MESSAGES_DROPPED,
+            f"{skipped} messages skipped, your connection is too slow",
+        )
+
     def _client_loop(self, session: _Session):
         try:
             session.sock.settimeout(JOIN_TIMEOUT_S)
-            joined = False
             while True:
-                payload = tcp_protocol.recv_packet(session.sock)
-                packet_type, body = tcp_protocol.decode_client_packet(payload)
-                if packet_type == tcp_protocol.PT_C_JOIN:
-                    joined = True
-                    session.sock.settimeout(None)
-                    if session.user_id is not None:
-                        self._send_to_session(
-                            session,
-                            tcp_protocol.encode_server_error(
-                                tcp_protocol.ERR_ALREADY_JOINED,
-                                "already joined",
-                            ),
-                        )
-                        continue
-                    requested_user = tcp_protocol.decode_join(body)
-                    requested_name = requested_user.get_name().strip()
-                    if len(requested_name) == 0:
-                        self._send_to_session(
-                            session,
-                            tcp_protocol.encode_server_join_nack(
-                                tcp_protocol.ERR_INVALID_USER_NAME,
-                                "invalid user name",
-                            ),
-                        )
-                        continue
-                    if self._is_name_in_use(requested_name):
-                        self._send_to_session(
-                            session,
-                            tcp_protocol.encode_server_join_nack(
-                                tcp_protocol.ERR_USER_NAME_IN_USE,
-                                "user name already in use",
-                            ),
-                        )
-                        continue
-                    user = self._new_session_user(requested_name)
-                    session_user_id = user.get_id()
-                    with self._sessions_lock:
-                        if session in self._sessions_without_user:
-                            self._sessions_without_user.remove(session)
-                        self._sessions_by_user_id[session_user_id] = session
-                    session.user_id = session_user_id
-                    try:
-                        self._register_member_auto_role(user)
-                        self._send_to_session(session, tcp_protocol.encode_server_join_ack(user))
-                    except PermissionError as e:
-                        reason = str(e) if len(str(e)) > 0 else "join rejected"
-                        self._reject_join(
-                            session,
-                            session_user_id,
-                            tcp_protocol.ERR_JOIN_REJECTED,
-                            reason,
-                        )
-                        continue
-                    except Exception:
-                        self._reject_join(
-                            session,
-                            session_user_id,
-                            tcp_protocol.ERR_JOIN_FAILED,
-                            "join failed",
-                        )
-                        continue
-                elif packet_type == tcp_protocol.PT_C_PUBLIC:
-                    if session.user_id is None:
-                        self._send_to_session(
-                            session,
-                            tcp_protocol.encode_server_error(
-                                tcp_protocol.ERR_JOIN_FIRST,
-                                "join first",
-                            ),
-                        )
-                        continue
-                    if not self._consume_rate_limit(session):
-                        if not self._handle_rate_limit_violation(session):
-                            return
-                        continue
-                    message = tcp_protocol.decode_public_message(body)
-                    sender = self._get_member_by_id(session.user_id)
-                    user_message = self._make_user_message(sender, message)
-                    self._record_public_message(user_message)
-                    self._broadcast_public_impl(user_message)
-                elif packet_type == tcp_protocol.PT_C_PRIVATE:
-                    if session.user_id is None:
-                        self._send_to_session(
-                            session,
-                            tcp_protocol.encode_server_error(
-                                tcp_protocol.ERR_JOIN_FIRST,
-                                "join first",
-                            ),
-                        )
-                        continue
-                    if not self._consume_rate_limit(session):
-                        if not self._handle_rate_limit_violation(session):
-                            return
-                        continue
-                    recipient, message = tcp_protocol.decode_private_message(body)
-                    try:
-                        sender = self._get_member_by_id(session.user_id)
-                    except KeyError:
-                        self._send_to_session(
-                            session,
-                            tcp_protocol.encode_server_error(
-                                tcp_protocol.ERR_JOIN_FIRST,
-                                "join first",
-                            ),
-                        )
-                        continue
-                    user_message = self._make_user_message(sender, message)
-                    if recipient.value == self._get_server_user_id():
-                        handled = self._command_dispatcher.try_execute(session.user_id, message)
-                        if not handled:
-                            self._send_to_session(
-                                session,
-                                tcp_protocol.encode_server_error(
-                                    tcp_protocol.ERR_UNKNOWN_COMMAND,
-                                    "server command expected, prefix with '/'",
-                                ),
-                            )
-                        continue
-                    try:
-                        self._send_private_impl(recipient.value, user_message)
-                    except KeyError:
-                        self._send_to_session(
-                            session,
-                            tcp_protocol.encode_server_error(
-                                tcp_protocol.ERR_UNKNOWN_RECIPIENT,
-                                "unknown recipient",
-                            ),
-                        )
-                        continue
-                    self._record_private_message(user_message)
-                elif packet_type == tcp_protocol.PT_C_LEAVE:
+                payload = session.receiver.recv_packet()
+                if not self._handle_client_payload(session, payload):
                     return
-                else:
-                    self._send_to_session(
-                        session,
-                        tcp_protocol.encode_server_error(
-                            tcp_protocol.ERR_UNKNOWN_PACKET_TYPE,
-                            "unknown packet type",
-                        ),
-                    )
+                if session.join_requested and session.sock.gettimeout() is not None:
+                    session.sock.settimeout(None)
         except TimeoutError:
-            if not joined:
-                try:
-                    self._send_to_session(
-                        session,
-                        tcp_protocol.encode_server_join_nack(
-                            tcp_protocol.ERR_JOIN_TIMEOUT,
-                            "join timeout",
-                        ),
-                    )
-                except Exception:
-                    pass
+            if not session.join_requested:
+                self._send_join_timeout(session)
         except IOError:
             pass
         finally:
             self._close_session(session)
+            self._release_socket(session)
 
-    def _get_member_by_id(self, user_id: UUID) -> User:
-        for user in self.list_members():
-            if user.get_id() == user_id:
-                return user
-        raise KeyError("unknown user")
+    def _writer_loop(self, session: _Session):
+        """
+        Drains the session's outbound queue. This is the only thread writing to the socket,
+        so a slow client never blocks broadcasts or other sessions.
+        Every batch is written with one vectored send (more if the kernel buffer is full).
+        """
+        sender = session.sender
+        try:
+            while True:
+                batch = session.outbound.wait_pop_batch(linger_s=self._send_cork_s)
+                if batch is None:
+                    return
+                for payload in batch:
+                    sender.queue(payload)
+                pending = sender.pending_bytes()
+                sender.flush()
+                self._packets_out_metric.inc(len(batch))
+                self._bytes_out_metric.inc(pending)
+        except (IOError, OSError) as e:
+            self._send_failures_metric.inc()
+            session.outbound.close(discard=True)
+            self._emit_error(e)
+        finally:
+            # Wakes the reader thread, which owns the final cleanup.
+            try:
+                session.sock.shutdown(SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _release_socket(self, session: _Session):
+        writer = session.writer
+        if writer is not None and writer is not current_thread():
+            writer.join(timeout=self._CLOSE_LINGER_S)
+            if writer.is_alive():
+                try:
+                    session.sock.shutdown(SHUT_RDWR)
+                except OSError:
+                    pass
+        try:
+            session.sock.close()
+        except OSError:
+            pass
+
+    @staticmethod
+    def _apply_capabilities(session: _Session, capabilities: int):
+        session.capabilities = capabilities
+        if capabilities & tcp_protocol.CAP_ZLIB:
+            # The client only compresses after the ACK, but may already inflate anything queued before it.
+            session.receiver.set_decompressor(tcp_protocol.PayloadDecompressor())
+            session.sender.set_compressor(tcp_protocol.PayloadCompressor())
+
+    def _send_join_timeout(self, session: _Session):
+        try:
+            self._send_to_session(
+                session,
+                tcp_protocol.encode_server_join_nack(
+                    tcp_protocol.ERR_JOIN_TIMEOUT,
+                    "join timeout",
+                ),
+            )
+        except Exception:
+            pass
+
+    def _handle_client_payload(self, session: _Session, payload: bytes | memoryview) -> bool:
+        """
+        Handles one received packet of a session.
+        Shared by all transports, so join, rate-limit and command semantics stay identical.
+        payload may be a view into the transport's receive buffer and must not be kept.
+        :return: False if the session should be closed
+        :raises IOError: if the packet body is malformed
+        """
+        started = perf_counter()
+        packet_type, body = tcp_protocol.decode_client_packet(payload)
+        self._packets_in_metrics.get(packet_type, self._packets_in_other_metric).inc()
+        self._bytes_in_metric.inc(len(payload) + 4)
+        try:
+            return self._dispatch_client_packet(session, packet_type, body)
+        finally:
+            self._packet_handle_seconds.observe(perf_counter() - started)
+
+    def _dispatch_client_packet(self, session: _Session, packet_type: int, body) -> bool:
+        if packet_type == tcp_protocol.PT_C_JOIN:
+            session.join_requested = True
+            if session.user_id is not None:
+                self._send_to_session(
+                    session,
+                    tcp_protocol.encode_server_error(
+                        tcp_protocol.ERR_ALREADY_JOINED,
+                        "already joined",
+                    ),
+                )
+                return True
+            requested_user, offered_version, offered_capabilities, requested_room = tcp_protocol.decode_join_request(body)
+            requested_name = requested_user.get_name().strip()
+            if len(requested_name) == 0:
+                self._join_rejected_metrics["invalid_name"].inc()
+                self._send_to_session(
+                    session,
+                    tcp_protocol.encode_server_join_nack(
+                        tcp_protocol.ERR_INVALID_USER_NAME,
+                        "invalid user name",
+                    ),
+                )
+                return True
+            if self._cluster is not None:
+                # The coordinator reserves the name; other sessions must not wait for its answer.
+                return self._run_cluster_round_trip(
+                    session,
+                    lambda: self._admit_join(session, requested_name, requested_room, offered_version, offered_capabilities),
+                )
+            return self._admit_join(session, requested_name, requested_room, offered_version, offered_capabilities)
+
+        if packet_type == tcp_protocol.PT_C_PUBLIC:
+            if session.user_id is None:
+                self._send_to_session(
+                    session,
+                    tcp_protocol.encode_server_error(
+                        tcp_protocol.ERR_JOIN_FIRST,
+                        "join first",
+                    ),
+                )
+                return True
+            if not self._consume_rate_limit(session):
+                return self._handle_rate_limit_violation(session)
+            if session.protocol_version >= tcp_protocol.PROTOCOL_V2:
+                message = tcp_protocol.decode_public_message_v2(body)
+            else:
+                message = tcp_protocol.decode_public_message(body)
+            room = session.room
+            sender = room.get_member(session.user_id)
+            user_message = room._make_user_message(sender, message)
+            room._record_public_message(user_message)
+            room._broadcast_public_impl(user_message)
+            return True
+
+        if packet_type == tcp_protocol.PT_C_PRIVATE:
+            if session.user_id is None:
+                self._send_to_session(
+                    session,
+                    tcp_protocol.encode_server_error(
+                        tcp_protocol.ERR_JOIN_FIRST,
+                        "join first",
+                    ),
+                )
+                return True
+            if not self._consume_rate_limit(session):
+                return self._handle_rate_limit_violation(session)
+            if session.protocol_version >= tcp_protocol.PROTOCOL_V2:
+                recipient, message = tcp_protocol.decode_private_message_v2(body)
+            else:
+                recipient, message = tcp_protocol.decode_private_message(body)
+            room = session.room
+            try:
+                sender = room.get_member(session.user_id)
+            except KeyError:
+                self._send_to_session(
+                    session,
+                    tcp_protocol.encode_server_error(
+                        tcp_protocol.ERR_JOIN_FIRST,
+                        "join first",
+                    ),
+                )
+                return True
+            user_message = room._make_user_message(sender, message)
+            if recipient.value == room._get_server_user_id():
+                if self._cluster is not None:
+                    # Commands like /newhost wait for the coordinator.
+                    return self._run_cluster_round_trip(session, lambda: self._execute_command(session, room, message))
+                return self._execute_command(session, room, message)
+            try:
+                room._send_private_impl(recipient.value, user_message)
+            except KeyError:
+                self._send_to_session(
+                    session,
+                    tcp_protocol.encode_server_error(
+                        tcp_protocol.ERR_UNKNOWN_RECIPIENT,
+                        "unknown recipient",
+                    ),
+                )
+                return True
+            room._record_private_message(user_message)
+            return True
+
+        if packet_type == tcp_protocol.PT_C_HISTORY:
+            if session.user_id is None:
+                self._send_to_session(
+                    session,
+                    tcp_protocol.encode_server_error(
+                        tcp_protocol.ERR_JOIN_FIRST,
+                        "join first",
+                    ),
+                )
+                return True
+            selector, anchor, limit = tcp_protocol.decode_history_request(body)
+            self._send_to_session(session, self._encode_history_page(session.room._chat_log, selector, anchor, limit))
+            return True
+
+        if packet_type == tcp_protocol.PT_C_LEAVE:
+            return False
+
+        self._send_to_session(
+            session,
+            tcp_protocol.encode_server_error(
+                tcp_protocol.ERR_UNKNOWN_PACKET_TYPE,
+                "unknown packet type",
+            ),
+        )
+        return True
+
+    def _admit_join(
+            self,
+            session: _Session,
+            requested_name: str,
+            requested_room: str,
+            offered_version: int,
+            offered_capabilities: int,
+    ) -> bool:
+        """
+        Second half of a JOIN: admits the validated name to the room and answers with ACK or NACK.
+        :return: True (the session stays open either way)
+        """
+        user = self._new_session_user(requested_name)
+        try:
+            room, cluster_role = self._admit_to_room(requested_room, user)
+        except ValueError:
+            self._join_rejected_metrics["invalid_room"].inc()
+            self._send_to_session(
+                session,
+                tcp_protocol.encode_server_join_nack(
+                    tcp_protocol.ERR_INVALID_ROOM,
+                    "invalid room",
+                ),
+            )
+            return True
+        except LookupError:
+            self._join_rejected_metrics["too_many_rooms"].inc()
+            self._send_to_session(
+                session,
+                tcp_protocol.encode_server_join_nack(
+                    tcp_protocol.ERR_TOO_MANY_ROOMS,
+                    "too many rooms",
+                ),
+            )
+            return True
+        except PermissionError:
+            self._join_rejected_metrics["name_in_use"].inc()
+            self._send_to_session(
+                session,
+                tcp_protocol.encode_server_join_nack(
+                    tcp_protocol.ERR_USER_NAME_IN_USE,
+                    "user name already in use",
+                ),
+            )
+            return True
+        except ConnectionRefusedError as e:
+            self._join_rejected_metrics["rejected"].inc()
+            self._send_to_session(
+                session,
+                tcp_protocol.encode_server_join_nack(tcp_protocol.ERR_JOIN_REJECTED, str(e)),
+            )
+            return True
+        except IOError:
+            self._send_to_session(
+                session,
+                tcp_protocol.encode_server_join_nack(
+                    tcp_protocol.ERR_JOIN_FAILED,
+                    "join failed",
+                ),
+            )
+            return True
+        session_user_id = user.get_id()
+        # Set before registering: the own USER_JOINED broadcast already uses this version.
+        session.protocol_version = min(offered_version, tcp_protocol.PROTOCOL_VERSION)
+        self._apply_capabilities(session, offered_capabilities & self._capabilities)
+        session.room = room
+        session.rate_tokens = room._rate_limit_burst
+        with self._sessions_lock:
+            if session in self._sessions_without_user:
+                self._sessions_without_user.remove(session)
+            self._sessions_by_user_id[session_user_id] = session
+            self._sessions_by_room.setdefault(room.get_room_id(), {})[session_user_id] = session
+        session.user_id = session_user_id
+        try:
+            if cluster_role is None:
+                room._register_member_auto_role(user)
+            else:
+                room._register_member(user, cluster_role)
+            self._send_to_session(
+                session,
+                tcp_protocol.encode_server_join_ack(user, session.protocol_version, session.capabilities),
+            )
+        except PermissionError as e:
+            reason = str(e) if len(str(e)) > 0 else "join rejected"
+            self._reject_join(
+                session,
+                session_user_id,
+                tcp_protocol.ERR_JOIN_REJECTED,
+                reason,
+            )
+        except Exception:
+            self._reject_join(
+                session,
+                session_user_id,
+                tcp_protocol.ERR_JOIN_FAILED,
+                "join failed",
+            )
+        return True
+
+    def _execute_command(self, session: _Session, room: AbstractLogic, message: str) -> bool:
+        handled = room._command_dispatcher.try_execute(session.user_id, message)
+        if not handled:
+            self._send_to_session(
+                session,
+                tcp_protocol.encode_server_error(
+                    tcp_protocol.ERR_UNKNOWN_COMMAND,
+                    "server command expected, prefix with '/'",
+                ),
+            )
+        return True
+
+    def _run_cluster_round_trip(self, session: _Session, work: Callable[[], bool]) -> bool:
+        """
+        Runs the part of a packet's handling that waits for the cluster coordinator.
+        Every session has its own thread here, so it simply blocks that session.
+        :return: what work returned (False: close the session)
+        """
+        return work()
+
+    @staticmethod
+    def _encode_history_page(chat_log: ChatLog, selector: int, anchor: int | float, limit: int) -> bytes:
+        """
+        Reads one page of a room's public chat log and encodes it for PT_S_HISTORY_PAGE.
+        Only the requested page is read from the chat log (lock-free), never the whole log.
+        Pages are capped at HISTORY_PAGE_MAX_MESSAGES and HISTORY_PAGE_MAX_BYTES, but hold at least one message.
+        """
+        if limit <= 0 or limit > HISTORY_PAGE_MAX_MESSAGES:
+            limit = HISTORY_PAGE_MAX_MESSAGES
+        backwards = selector in (
+            tcp_protocol.HISTORY_LAST,
+            tcp_protocol.HISTORY_BEFORE_SEQ,
+            tcp_protocol.HISTORY_BEFORE_TIME,
+        )
+        if selector == tcp_protocol.HISTORY_LAST:
+            start = None
+        elif selector in (tcp_protocol.HISTORY_BEFORE_TIME, tcp_protocol.HISTORY_FROM_TIME):
+            start = chat_log.seq_of_timestamp(anchor)
+        else:
+            start = anchor
+        first_seq, end_seq, encoded = chat_log.read_encoded_page(start, limit, backwards)
+        size = sum(len(item) for item in encoded)
+        while len(encoded) > 1 and size > HISTORY_PAGE_MAX_BYTES:
+            # Keep the end next to the anchor, so the client can continue from the other end.
+            if backwards:
+                size -= len(encoded.pop(0))
+                first_seq += 1
+            else:
+                size -= len(encoded.pop())
+        return tcp_protocol.encode_server_history_page(first_seq, end_seq, encoded)
 
     def _close_session(self, session: _Session):
         user_id = session.user_id
+        room = session.room
+        removed = False
         with self._sessions_lock:
             if session in self._sessions_without_user:
                 self._sessions_without_user.remove(session)
+                removed = True
             if user_id is not None and user_id in self._sessions_by_user_id:
                 self._sessions_by_user_id.pop(user_id, None)
+                self._sessions_by_room.get(room.get_room_id(), {}).pop(user_id, None)
+                removed = True
+            if removed:
+                # Keeps the dropped total monotonic once the session's queue is gone.
+                self._closed_outbound_dropped += session.outbound.stats().dropped
+        if removed:
+            self._sessions_closed_metric.inc()
 
-        try:
-            session.sock.close()
-        except OSError:
-            pass
+        self._close_socket(session)
 
         if user_id is not None:
             try:
-                self._unregister_member(user_id)
+                room._unregister_member(user_id)
             except Exception:
                 pass
+            if removed and self._cluster is not None:
+                self._cluster.member_left(room.get_room_id(), user_id)
 
     def _reject_join(self, session: _Session, session_user_id: UUID, code: str, reason: str):
+        self._join_rejected_metrics["rejected"].inc()
+        room_id = session.room.get_room_id()
         with self._sessions_lock:
             self._sessions_by_user_id.pop(session_user_id, None)
+            self._sessions_by_room.get(room_id, {}).pop(session_user_id, None)
             if session not in self._sessions_without_user:
                 self._sessions_without_user.append(session)
         session.user_id = None
+        session.room = None
+        if self._cluster is not None:
+            # The coordinator admitted the name already.
+            self._cluster.member_left(room_id, session_user_id)
         try:
             self._send_to_session(session, tcp_protocol.encode_server_join_nack(code, reason))
         except IOError:
@@ -348,10 +1087,19 @@ class TcpServerLogic(AbstractLogic):
             pass
 
     def _disconnect_member_impl(self, user_id: UUID, reason: str):
+        self._disconnect_room_member(self, user_id, reason)
+
+    def _disconnect_room_member(self, room: AbstractLogic, user_id: UUID, reason: str):
         with self._sessions_lock:
             session = self._sessions_by_user_id.get(user_id)
         if session is None:
+            # A member of another worker; not while stopping, when every replica drops its members itself.
+            if self._cluster is not None and room.is_running():
+                self._cluster.disconnect(user_id, reason)
             return
+        self._disconnect_session(session, reason)
+
+    def _disconnect_session(self, session: _Session, reason: str):
         try:
             self._send_to_session(
                 session,
@@ -362,53 +1110,276 @@ class TcpServerLogic(AbstractLogic):
             )
         except Exception:
             pass
-        try:
-            session.sock.close()
-        except OSError:
-            pass
+        self._close_socket(session)
+
+    def _close_socket(self, session: _Session):
+        """
+        Requests a graceful close: already queued packets are still delivered first.
+        """
+        session.outbound.close()
+        if session.writer is None:
+            try:
+                session.sock.shutdown(SHUT_RDWR)
+            except OSError:
+                pass
 
     def _broadcast_public_impl(self, user_message: UserMessage):
-        payload = tcp_protocol.encode_server_public_message(user_message)
-        self._broadcast_payload(payload)
+        self._broadcast_public_to("", user_message)
+
+    def _broadcast_public_to(self, room_id: str, user_message: UserMessage):
+        if self._cluster is not None:
+            self._cluster.publish_public(room_id, user_message)
+        self._broadcast_public_local(room_id, user_message)
+
+    def _broadcast_public_local(self, room_id: str, user_message: UserMessage):
+        self._broadcast_versioned(
+            lambda: tcp_protocol.encode_server_public_message(user_message),
+            lambda handle: tcp_protocol.encode_server_public_message_v2(handle, user_message),
+            user_message.sender(),
+            droppable=True,
+            room_id=room_id,
+        )
 
     def _send_private_impl(self, recipient_id: UUID, user_message: UserMessage):
+        self._send_private_to("", recipient_id, user_message)
+
+    def _send_private_to(self, room_id: str, recipient_id: UUID, user_message: UserMessage):
+        """
+        :raises KeyError: if the recipient is not in the room
+        """
         with self._sessions_lock:
-            recipient = self._sessions_by_user_id.get(recipient_id)
+            recipient = self._sessions_by_room.get(room_id, {}).get(recipient_id)
         if recipient is None:
+            if self._cluster is not None:
+                # Raises KeyError unless the recipient is a member of the room on another worker.
+                self.get_room(room_id).get_member(recipient_id)
+                self._cluster.send_private(room_id, recipient_id, user_message)
+                return
             raise KeyError("unknown user")
-        payload = tcp_protocol.encode_server_private_message(user_message)
+        if recipient.protocol_version >= tcp_protocol.PROTOCOL_V2:
+            sender = user_message.sender()
+            handle = self._user_handle(sender)
+            self._define_handle(recipient, handle, sender)
+            payload = tcp_protocol.encode_server_private_message_v2(handle, user_message)
+        else:
+            payload = tcp_protocol.encode_server_private_message(user_message)
         self._send_to_session(recipient, payload)
 
+    def transfer_host(self, new_host_id: UUID):
+        if self._cluster is None:
+            super().transfer_host(new_host_id)
+            return
+        self._transfer_host_in_cluster(self, new_host_id)
+
+    def _transfer_host_in_cluster(self, room: AbstractLogic, new_host_id: UUID):
+        """
+        Moves the host role through the coordinator, which applies it on every worker (this one
+        included) before it answers.
+        :raises KeyError: if new_host_id is not a member of the room
+        :raises IOError: if the coordinator cannot be reached
+        """
+        room.get_member(new_host_id)
+        self._cluster.transfer_host(room.get_room_id(), new_host_id)
+
+    def ban_member(self, user_id: UUID, reason: str = ""):
+        if self._cluster is None:
+            super().ban_member(user_id, reason)
+            return
+        self._ban_member_in_cluster(self, user_id, reason)
+
+    def unban_member(self, user_id: UUID):
+        if self._cluster is None:
+            super().unban_member(user_id)
+            return
+        self._cluster.set_banned(self.get_room_id(), user_id, False)
+
+    def set_locked(self, locked: bool):
+        if self._cluster is None:
+            super().set_locked(locked)
+            return
+        self._cluster.set_locked(self.get_room_id(), locked)
+
+    def _ban_member_in_cluster(self, room: AbstractLogic, user_id: UUID, reason: str):
+        """
+        Bans through the coordinator, which applies the ban on every worker (this one included)
+        before it answers and refuses the user's joins from then on; then disconnects the member.
+        :raises KeyError: if user_id is not a member of the room
+        :raises PermissionError: if user_id is the room's host
+        :raises IOError: if the coordinator cannot be reached
+        """
+        with room._lock:
+            room._check_bannable_locked(user_id)
+        self._cluster.set_banned(room.get_room_id(), user_id, True)
+        room._disconnect_member_impl(user_id, reason)
+        room._unregister_member(user_id)
+
+    # Changes made by other workers of the cluster, applied by the ClusterLink's reader thread.
+    # They must not raise: a member may have left (or a room may be full) locally in the meantime.
+
+    def _apply_cluster_member_joined(self, room_id: str, user: User, role: Role):
+        try:
+            self._room_for_join(room_id)._register_member(user, role)
+        except (LookupError, PermissionError, ValueError, IOError) as e:
+            self._emit_error(IOError(f"cannot replicate member of room '{room_id}': {e}"))
+
+    def _apply_cluster_member_left(self, room_id: str, user_id: UUID):
+        try:
+            self.get_room(room_id)._unregister_member(user_id)
+        except KeyError:
+            pass
+
+    def _apply_cluster_host_changed(self, room_id: str, user_id: UUID):
+        try:
+            AbstractLogic.transfer_host(self.get_room(room_id), user_id)
+        except KeyError:
+            pass
+
+    def _apply_cluster_banned(self, room_id: str, user_id: UUID, banned: bool):
+        try:
+            self.get_room(room_id)._set_banned(user_id, banned)
+        except KeyError:
+            pass
+
+    def _apply_cluster_locked(self, room_id: str, locked: bool):
+        try:
+            AbstractLogic.set_locked(self.get_room(room_id), locked)
+        except KeyError:
+            pass
+
+    def _apply_cluster_public(self, room_id: str, user_message: UserMessage):
+        try:
+            room = self.get_room(room_id)
+        except KeyError:
+            return
+        room._record_replicated_public_message(user_message)
+        self._broadcast_public_local(room_id, user_message)
+
+    def _apply_cluster_private(self, room_id: str, recipient_id: UUID, user_message: UserMessage):
+        with self._sessions_lock:
+            recipient = self._sessions_by_room.get(room_id, {}).get(recipient_id)
+        if recipient is not None:
+            self._send_private_to(room_id, recipient_id, user_message)
+
+    def _apply_cluster_disconnect(self, user_id: UUID, reason: str):
+        with self._sessions_lock:
+            session = self._sessions_by_user_id.get(user_id)
+        if session is not None:
+            self._disconnect_session(session, reason)
+
     def _set_server_password_impl(self, new_password: str | None):
         self._password = new_password
 
     def _discovery_snapshot(self) -> DiscoveredServer:
         info = self.get_server_info()
+        # The fullest rooms, if there are more than a datagram should list.
+        rooms = sorted(
+            ((room_id, count) for room_id, count in self.list_rooms().items() if room_id != ""),
+            key=lambda item: (-item[1], item[0]),
+        )
         return DiscoveredServer(
             server_id=info.get_id(),
             server_name=info.get_name(),
             host=self._host,
             port=self._port,
             requires_password=self._password is not None,
+            rooms=tuple(sorted(room_id for room_id, _ in rooms[:DISCOVERY_MAX_ROOMS])),
         )
 
-    def _broadcast_payload(self, payload: bytes):
+    def _broadcast_versioned(
+        self,
+        encode_v1: Callable[[], bytes],
+        encode_v2: Callable[[int], bytes],
+        sender: User,
+        droppable: bool = False,
+        defines_sender: bool = False,
+        room_id: str = "",
+    ):
+        """
+        Enqueues one packet for every session joined to the room, encoded at most once per protocol version.
+        With defines_sender the v2 payload itself tells the client the sender's handle.
+        """
+        started = perf_counter()
         with self._sessions_lock:
-            sessions = list(self._sessions_by_user_id.values())
-        failed_sessions: list[_Session] = []
+            sessions = list(self._sessions_by_room.get(room_id, {}).values())
+        self._broadcast_recipients_metric.inc(len(sessions))
+        payload_v1: bytes | None = None
+        payload_v2: bytes | None = None
+        handle = 0
         for session in sessions:
+            if session.protocol_version < tcp_protocol.PROTOCOL_V2:
+                if payload_v1 is None:
+                    payload_v1 = encode_v1()
+                self._send_to_session(session, payload_v1, droppable)
+                continue
+            if payload_v2 is None:
+                handle = self._user_handle(sender)
+                payload_v2 = encode_v2(handle)
+            if defines_sender:
+                with self._handles_lock:
+                    self._send_to_session(session, payload_v2, droppable)
+                    session.known_handles.add(handle)
+                continue
+            self._define_handle(session, handle, sender)
+            self._send_to_session(session, payload_v2, droppable)
+        self._broadcast_seconds.observe(perf_counter() - started)
+
+    def _user_handle(self, user: User) -> int:
+        user_id = user.get_id()
+        with self._handles_lock:
+            handle = self._user_handles.get(user_id)
+            if handle is None:
+                handle = self._next_user_handle
+                self._next_user_handle += 1
+                self._user_handles[user_id] = handle
+            return handle
+
+    def _release_user_handle(self, user_id: UUID):
+        """
+        Forgets the handle of a user that is no longer a member of any room, on the server and in every
+        session, so neither the handle table nor known_handles grows with every user ever seen.
+        Clients keep their binding; the number is not reused, so a late message with it still names the right user.
+        """
+        with self._lock:
+            rooms = [self] + list(self._rooms.values())
+        for room in rooms:
             try:
-                self._send_to_session(session, payload)
-            except (IOError, OSError) as e:
-                self._emit_error(e)
-                failed_sessions.append(session)
-        for session in failed_sessions:
-            self._close_session(session)
+                room.get_member(user_id)
+                return
+            except KeyError:
+                pass
+        with self._sessions_lock:
+            sessions = list(self._sessions_by_user_id.values())
+        with self._handles_lock:
+            handle = self._user_handles.pop(user_id, None)
+            if handle is None:
+                return
+            for session in sessions:
+                session.known_handles.discard(handle)
 
-    @staticmethod
-    def _send_to_session(session: _Session, payload: bytes):
-        with session.send_lock:
-            tcp_protocol.send_packet(session.sock, payload)
+    def _define_handle(self, session: _Session, handle: int, user: User):
+        # A hit without the lock is safe: the definition was enqueued before the handle was marked
+        # as known, and a handle released meanwhile still names the same user on the client.
+        if handle in session.known_handles:
+            return
+        with self._handles_lock:
+            if handle in session.known_handles:
+                return
+            self._send_to_session(session, tcp_protocol.encode_server_user_defined_v2(handle, user))
+            session.known_handles.add(handle)
+
+    def _send_to_session(self, session: _Session, payload: bytes, droppable: bool = False):
+        if len(payload) <= 0:
+            raise ValueError("payload must not be empty")
+        # A rejected push means the queue is closed or overflowed; the writer closes the session.
+        session.outbound.push(payload, droppable)
+
+    def list_outbound_queue_stats(self) -> dict[UUID, OutboundQueueStats]:
+        """
+        Returns queue depth and drop counters of every joined session.
+        """
+        with self._sessions_lock:
+            sessions = list(self._sessions_by_user_id.items())
+        return {user_id: session.outbound.stats() for user_id, session in sessions}
 
     def _new_session_user(self, name: str) -> SerializableUser:
         while True:
@@ -418,22 +1389,26 @@ class TcpServerLogic(AbstractLogic):
                     continue
             return SerializableUser(candidate_id, name)
 
-    @staticmethod
-    def _consume_rate_limit(session: _Session) -> bool:
+    def _consume_rate_limit(self, session: _Session) -> bool:
+        # The limit of the room the session joined, then the one of its source address.
+        room = session.room if session.room is not None else self
+        if room._rate_limit_msg_per_sec == 0:
+            return True
         now = monotonic()
         elapsed = now - session.rate_last_refill
         if elapsed > 0:
             session.rate_tokens = min(
-                RATE_LIMIT_BURST,
-                session.rate_tokens + (elapsed * RATE_LIMIT_MSG_PER_SEC),
+                room._rate_limit_burst,
+                session.rate_tokens + (elapsed * room._rate_limit_msg_per_sec),
             )
             session.rate_last_refill = now
-        if session.rate_tokens >= 1.0:
-            session.rate_tokens -= 1.0
-            return True
-        return False
+        if session.rate_tokens < 1.0 or not self._admission.consume_message(session.addr[0]):
+            return False
+        session.rate_tokens -= 1.0
+        return True
 
     def _handle_rate_limit_violation(self, session: _Session) -> bool:
+        self._rate_limited_metric.inc()
         session.rate_limit_violations += 1
         try:
             self._send_to_session(
@@ -446,34 +1421,23 @@ class TcpServerLogic(AbstractLogic):
         except Exception:
             pass
         if session.rate_limit_violations >= RATE_LIMIT_MAX_VIOLATIONS:
+            self._rate_limit_disconnects_metric.inc()
             if session.user_id is not None:
                 try:
                     self._disconnect_member_impl(session.user_id, "rate limit exceeded")
                 except Exception:
                     pass
                 try:
-                    self._unregister_member(session.user_id)
+                    session.room._unregister_member(session.user_id)
                 except Exception:
                     pass
             else:
-                try:
-                    session.sock.close()
-                except OSError:
-                    pass
+                self._close_socket(session)
             return False
         return True
 
-    def _is_name_in_use(self, name: str) -> bool:
-        normalized = name.strip().lower()
-        if len(normalized) == 0:
+    @staticmethod
+    def _is_name_in_use(room: AbstractLogic, name: str) -> bool:
+        if len(name.strip()) == 0:
             return False
-        with self._sessions_lock:
-            members = list(self._sessions_by_user_id.keys())
-        for user_id in members:
-            try:
-                user = self._get_member_by_id(user_id)
-            except KeyError:
-                continue
-            if user.get_name().strip().lower() == normalized:
-                return True
-        return False
+        return room.find_member_by_name(name) is not None
@@ -1,3 +1,10 @@
+from .ChatLog import ChatLog, ChatLogView
+from .MessageSearchIndex import MessageSearchIndex
+from .MessageJournal import JournalRecord, JournalStats, MessageJournal
+from .AdmissionControl import AdmissionControl
 from .AbstractLogic import AbstractLogic
 from .InMemoryLogic import InMemoryLogic
-from .TcpServerLogic import TcpServerLogic
\ No newline at end of file
+from .OutboundQueue import OutboundQueue, OutboundQueueStats, SlowConsumerPolicy
+from .ServerRoom import ServerRoom, normalize_room_id
+from .TcpServerLogic import TcpServerLogic
+from .AsyncTcpServerLogic import AsyncTcpServerLogic
@@ -91,6 +91,16 @@ class Chat(ABC):
         :raises NotImplementedError: if this function is not implemented
         """
 
+    @abstractmethod
+    def replay_history(self, limit: int = 0) -> int:
+        """
+        Hands the newest public messages of the chat to the on_user_posted_message listeners again.
+        :param limit: maximum number of messages; 0 means as many as the chat hands out at once
+        :return: the number of replayed messages
+        :raises IOError:
+        :raises NotImplementedError: if this chat keeps no history
+        """
+
     @abstractmethod
     def get_server_user(self) -> User:
         """
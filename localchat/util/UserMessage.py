@@ -2,6 +2,7 @@ from localchat.util import User
 from abc import ABC, abstractmethod
 
 class UserMessage(ABC):
+    __slots__ = ()
 
     @abstractmethod
     def sender(self) -> User: ...
@@ -1,4 +1,5 @@
 from . import event
+from . import metrics
 from .BinaryIOBase import BinaryIOBase
 from .User import User
 from .Chat import Chat
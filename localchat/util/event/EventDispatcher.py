@@ -0,0 +1,135 @@
+from collections import deque
+from threading import Condition, Thread, current_thread
+from time import monotonic
+from typing import Any, Callable
+
+
+class EventDispatcher:
+    """
+    Runs event deliveries on its own worker thread, in the order they were submitted.
+    An EventHandler with a dispatcher only enqueues in handle(), so the thread that fires
+    an event (e.g. a network receive loop) never waits for slow listeners. Handlers that
+    share one dispatcher keep their relative order; a handler with its own dispatcher
+    gets its own worker.
+    A delivery that raises is counted (see failed()) and handed to on_error; the worker goes on.
+    """
+
+    def __init__(self, name: str = "localchat-events", on_error: Callable[[Exception], None] | None = None):
+        """
+        :param on_error: called on the worker with the exception of every failed delivery, e.g. to pass it
+            on to the owner's error event (None: failures are only counted)
+        """
+        self._name = name
+        self._on_error = on_error
+        self._condition = Condition()
+        self._queue: deque[tuple[Callable[[Any], None], Any]] = deque()
+        self._worker: Thread | None = None
+        self._closed = False
+        self._busy = False
+        self._max_pending = 0
+        self._delivered = 0
+        self._failed = 0
+
+    def submit(self, deliver: Callable[[Any], None], value: Any) -> bool:
+        """
+        Queues deliver(value) for the worker.
+        :return: False if the dispatcher is closed (nothing was queued)
+        """
+        with self._condition:
+            if self._closed:
+                return False
+            self._queue.append((deliver, value))
+            if len(self._queue) > self._max_pending:
+                self._max_pending = len(self._queue)
+            if self._worker is None:
+                self._worker = Thread(target=self._run, name=self._name, daemon=True)
+                self._worker.start()
+            else:
+                # notify_all: wait_idle() callers wait on the same condition.
+                self._condition.notify_all()
+        return True
+
+    def pending(self) -> int:
+        """
+        Queued deliveries that have not started yet.
+        """
+        with self._condition:
+            return len(self._queue)
+
+    def max_pending(self) -> int:
+        """
+        Highest queue depth seen so far.
+        """
+        with self._condition:
+            return self._max_pending
+
+    def delivered(self) -> int:
+        with self._condition:
+            return self._delivered
+
+    def failed(self) -> int:
+        """
+        Deliveries that raised.
+        """
+        with self._condition:
+            return self._failed
+
+    def wait_idle(self, timeout: float | None = None) -> bool:
+        """
+        Waits until everything submitted so far has been delivered.
+        :return: False on timeout
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        with self._condition:
+            while len(self._queue) > 0 or self._busy:
+                remaining = None if deadline is None else deadline - monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            return True
+
+    def close(self, timeout: float | None = None):
+        """
+        Stops accepting events; the worker delivers what is queued and exits.
+        Does not wait when called from the worker itself.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+            worker = self._worker
+        if worker is not None and worker is not current_thread():
+            worker.join(timeout)
+
+    def _run(self):
+        failed: bool | None = None
+        while True:
+            with self._condition:
+                if failed is not None:
+                    self._delivered += 1
+                    if failed:
+                        self._failed += 1
+                self._busy = False
+                if len(self._queue) == 0:
+                    # Idle: wake wait_idle() callers.
+                    self._condition.notify_all()
+                while len(self._queue) == 0 and not self._closed:
+                    self._condition.wait()
+                if len(self._queue) == 0:
+                    return
+                deliver, value = self._queue.popleft()
+                self._busy = True
+            try:
+                deliver(value)
+                failed = False
+            except Exception as e:
+                failed = True
+                self._report(e)
+
+    def _report(self, error: Exception):
+        if self._on_error is None:
+            return
+        try:
+            self._on_error(error)
+        except Exception:
+            # Must not stop the worker; the failure is counted already.
+            pass
@@ -1,4 +1,4 @@
-from localchat.util.event import Event, EventListener
+from localchat.util.event import Event, EventDispatcher, EventListener
 from typing import TypeVar, Generic, final, Iterable
 from threading import Lock
 
@@ -7,29 +7,99 @@ _T = TypeVar('_T')
 
 @final
 class EventHandler(Generic[_T]):
-    def __init__(self):
-        self._listener : set[EventListener[_T]] = set()
+    """
+    Calls its listeners for every handled event.
+    By default that happens synchronously on the thread calling handle(). With a
+    dispatcher (opt-in) handle() only enqueues and the dispatcher's worker calls the
+    listeners, in the order the events were handled.
+    The listeners are kept in a tuple that is replaced (not changed) on updates, so
+    delivering an event needs no lock and no copy.
+    """
+
+    def __init__(self, dispatcher: EventDispatcher | None = None):
+        self._listeners: tuple[EventListener[_T], ...] = ()
+        # Serializes listener updates and guards the queue counter; delivery reads _listeners without it.
         self._lock = Lock()
+        self._dispatcher = dispatcher
+        self._queued = 0
 
     def add_listener(self, listener: EventListener[_T]):
         with self._lock:
-            self._listener.add(listener)
+            if listener not in self._listeners:
+                self._listeners = self._listeners + (listener,)
 
     def remove_listener(self, listener: EventListener[_T]):
         with self._lock:
-            if listener in self._listener:
-                self._listener.remove(listener)
+            if listener in self._listeners:
+                self._listeners = tuple(item for item in self._listeners if item != listener)
 
     def update_listeners(self, listeners: Iterable[EventListener[_T]]):
         with self._lock:
-            self._listener.update(listeners)
+            added = [listener for listener in dict.fromkeys(listeners) if listener not in self._listeners]
+            self._listeners = self._listeners + tuple(added)
 
     def clear_listeners(self):
         with self._lock:
-            self._listener.clear()
+            self._listeners = ()
+
+    def set_dispatcher(self, dispatcher: EventDispatcher | None):
+        """
+        None switches back to synchronous delivery; events already queued are still delivered.
+        """
+        with self._lock:
+            self._dispatcher = dispatcher
+
+    def get_dispatcher(self) -> EventDispatcher | None:
+        return self._dispatcher
+
+    def queue_depth(self) -> int:
+        """
+        Events of this handler that were queued but not yet delivered.
+        """
+        with self._lock:
+            return self._queued
 
     def handle(self, event: Event[_T]):
+        dispatcher = self._dispatcher
+        if dispatcher is None:
+            for listener in self._listeners:
+                listener.on_event(event)
+            return
+        with self._lock:
+            self._queued += 1
+        if not dispatcher.submit(self._deliver_queued, event):
+            # Closed dispatcher: deliver on the calling thread rather than losing the event.
+            self._deliver_queued(event)
+
+    def handle_all(self, events: list[Event[_T]]):
+        """
+        Hands a burst of events to every listener in one on_events call, oldest first.
+        """
+        if len(events) == 0:
+            return
+        dispatcher = self._dispatcher
+        if dispatcher is None:
+            for listener in self._listeners:
+                listener.on_events(events)
+            return
         with self._lock:
-            current_listeners = list(self._listener)
-        for listener in current_listeners:
-            listener.on_event(event)
+            self._queued += len(events)
+        if not dispatcher.submit(self._deliver_queued_batch, events):
+            self._deliver_queued_batch(events)
+
+    def _deliver_queued(self, event: Event[_T]):
+        # Listeners are taken at delivery time, so a removed listener gets no more events.
+        try:
+            for listener in self._listeners:
+                listener.on_event(event)
+        finally:
+            with self._lock:
+                self._queued -= 1
+
+    def _deliver_queued_batch(self, events: list[Event[_T]]):
+        try:
+            for listener in self._listeners:
+                listener.on_events(events)
+        finally:
+            with self._lock:
+                self._queued -= len(events)
@@ -10,3 +10,12 @@ class EventListener(ABC, Generic[_T]):
     @abstractmethod
     def on_event(self, event : Event[_T]):
         raise NotImplementedError()
+
+    def on_events(self, events : list[Event[_T]]):
+        """
+        Receives a burst of events (see EventHandler.handle_all), oldest first.
+        Listeners that can process a burst in one pass override this; by default
+        every event is passed to on_event.
+        """
+        for event in events:
+            self.on_event(event)
@@ -1,3 +1,4 @@
 from .Event import Event
 from .EventListener import EventListener
+from .EventDispatcher import EventDispatcher
 from .EventHandler import EventHandler
@@ -0,0 +1,18 @@
+class Counter:
+    """
+    Monotonically increasing value (packets, bytes, rejections).
+    inc() is a plain `+=` without a lock: under the GIL a thread switch between the read
+    and the write is rare, and a lost increment would only skew a statistic.
+    """
+    __slots__ = ("name", "labels", "_value")
+
+    def __init__(self, name: str, labels: tuple[tuple[str, str], ...] = ()):
+        self.name = name
+        self.labels = labels
+        self._value = 0
+
+    def inc(self, amount: int | float = 1):
+        self._value += amount
+
+    def value(self) -> int | float:
+        return self._value
@@ -0,0 +1,72 @@
+from bisect import bisect_left
+from math import inf
+
+from localchat.config.limits import METRICS_LATENCY_BUCKETS_S
+
+
+class Histogram:
+    """
+    Distribution of observed values (e.g. seconds) over fixed buckets.
+    observe() costs one bisect and two additions; like Counter it takes no lock.
+    """
+    __slots__ = ("name", "labels", "_bounds", "_counts", "_sum")
+
+    def __init__(
+            self,
+            name: str,
+            buckets: tuple[float, ...] = METRICS_LATENCY_BUCKETS_S,
+            labels: tuple[tuple[str, str], ...] = (),
+    ):
+        if len(buckets) == 0 or list(buckets) != sorted(set(buckets)):
+            raise ValueError("buckets must be strictly increasing")
+        self.name = name
+        self.labels = labels
+        self._bounds = tuple(buckets)
+        # One count per bucket plus the +Inf bucket; not cumulative.
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+
+    def observe(self, value: float):
+        self._counts[bisect_left(self._bounds, value)] += 1
+        self._sum += value
+
+    def bounds(self) -> tuple[float, ...]:
+        return self._bounds + (inf,)
+
+    def cumulative_counts(self) -> list[int]:
+        """
+        Observations <= each bound of bounds(), as Prometheus expects them.
+        """
+        result = []
+        total = 0
+        for count in list(self._counts):
+            total += count
+            result.append(total)
+        return result
+
+    def count(self) -> int:
+        return sum(self._counts)
+
+    def sum(self) -> float:
+        return self._sum
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimates the q-quantile (0..1) by interpolating inside the bucket it falls into,
+        like Prometheus' histogram_quantile. Values beyond the last bound report that bound.
+        :return: 0.0 without observations
+        """
+        cumulative = self.cumulative_counts()
+        total = cumulative[-1]
+        if total == 0:
+            return 0.0
+        rank = q * total
+        index = bisect_left(cumulative, rank)
+        if index >= len(self._bounds):
+            return self._bounds[-1]
+        lower = self._bounds[index - 1] if index > 0 else 0.0
+        below = cumulative[index - 1] if index > 0 else 0
+        in_bucket = cumulative[index] - below
+        if in_bucket == 0:
+            return self._bounds[index]
+        return lower + (self._bounds[index] - lower) * (rank - below) / in_bucket
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+from threading import Lock, RLock, get_ident
+from time import perf_counter
+
+from localchat.config.limits import LOCK_LATENCY_BUCKETS_S
+from localchat.util.metrics.MetricsRegistry import MetricsRegistry
+
+
+_ACQUISITIONS = "localchat_lock_acquisitions_total"
+_CONTENDED = "localchat_lock_contended_total"
+_WAIT_SECONDS = "localchat_lock_wait_seconds"
+_HOLD_SECONDS = "localchat_lock_hold_seconds"
+
+
+class InstrumentedLock:
+    """
+    Wraps a Lock or RLock and records, per lock name, how often it is acquired, how often
+    an acquisition had to wait, and histograms of the wait and hold times.
+    Locks created with the same name share their metrics (e.g. one per session).
+    Usable as a context manager and as the lock of a threading.Condition.
+    Costs two perf_counter() calls and two histogram observations per acquisition;
+    use create_lock() so that locks stay plain when profiling is off.
+    """
+    __slots__ = ("name", "_inner", "_acquisitions", "_contended", "_wait", "_hold", "_owner", "_depth", "_held_since")
+
+    def __init__(self, name: str, registry: MetricsRegistry, reentrant: bool = False):
+        labels = {"lock": name}
+        self.name = name
+        self._inner = RLock() if reentrant else Lock()
+        self._acquisitions = registry.counter(_ACQUISITIONS, "Acquisitions of profiled locks.", labels)
+        self._contended = registry.counter(_CONTENDED, "Acquisitions of profiled locks that had to wait.", labels)
+        self._wait = registry.histogram(
+            _WAIT_SECONDS,
+            "Time spent waiting for profiled locks.",
+            LOCK_LATENCY_BUCKETS_S,
+            labels,
+        )
+        self._hold = registry.histogram(
+            _HOLD_SECONDS,
+            "Time profiled locks were held (outermost acquisition to release).",
+            LOCK_LATENCY_BUCKETS_S,
+            labels,
+        )
+        self._owner: int | None = None
+        self._depth = 0
+        self._held_since = 0.0
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        inner = self._inner
+        if inner.acquire(False):
+            waited = 0.0
+        else:
+            if not blocking:
+                return False
+            started = perf_counter()
+            if not inner.acquire(True, timeout):
+                return False
+            waited = perf_counter() - started
+            self._contended.inc()
+        # From here on this thread holds the lock, so the owner fields are ours to change.
+        ident = get_ident()
+        if self._owner == ident:
+            self._depth += 1
+        else:
+            self._owner = ident
+            self._depth = 1
+            self._held_since = perf_counter()
+        self._acquisitions.inc()
+        self._wait.observe(waited)
+        return True
+
+    def release(self):
+        if self._depth > 1:
+            self._depth -= 1
+            self._inner.release()
+            return
+        held = perf_counter() - self._held_since
+        self._owner = None
+        self._depth = 0
+        self._inner.release()
+        self._hold.observe(held)
+
+    def locked(self) -> bool:
+        return self._owner is not None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+    # threading.Condition protocol: wait() releases every recursion level and restores them.
+    def _is_owned(self) -> bool:
+        return self._owner == get_ident()
+
+    def _release_save(self) -> int:
+        depth = self._depth
+        for _ in range(depth):
+            self.release()
+        return depth
+
+    def _acquire_restore(self, depth: int):
+        for _ in range(depth):
+            self.acquire()
+
+
+def create_lock(name: str, registry: MetricsRegistry, profiled: bool, reentrant: bool = False):
+    """
+    :return: an InstrumentedLock if profiled, otherwise a plain Lock/RLock (no overhead at all)
+    """
+    if profiled:
+        return InstrumentedLock(name, registry, reentrant)
+    return RLock() if reentrant else Lock()
+
+
+def lock_report(registry: MetricsRegistry) -> list[dict]:
+    """
+    One entry per profiled lock name, most waited-for first: acquisitions, contended
+    acquisitions, total wait and hold time and the p50/p99 wait and hold times (seconds).
+    """
+    report = []
+    for labels in registry.labels(_ACQUISITIONS):
+        wait = registry.get_histogram(_WAIT_SECONDS, labels)
+        hold = registry.get_histogram(_HOLD_SECONDS, labels)
+        report.append({
+            "lock": labels["lock"],
+            "acquisitions": int(registry.value(_ACQUISITIONS, labels)),
+            "contended": int(registry.value(_CONTENDED, labels)),
+            "wait_total_s": wait.sum(),
+            "wait_p50_s": wait.quantile(0.5),
+            "wait_p99_s": wait.quantile(0.99),
+            "hold_total_s": hold.sum(),
+            "hold_p50_s": hold.quantile(0.5),
+            "hold_p99_s": hold.quantile(0.99),
+        })
+    report.sort(key=lambda entry: entry["wait_total_s"], reverse=True)
+    return report
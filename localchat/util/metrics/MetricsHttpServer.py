@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from threading import Thread
+
+from localchat.util.metrics.MetricsRegistry import MetricsRegistry
+
+
+_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+_LOOPBACK_HOST = "127.0.0.1"
+
+
+class MetricsHttpServer:
+    """
+    Serves a MetricsRegistry in the Prometheus text format on GET /metrics.
+    Binds to loopback only: the metrics reveal traffic patterns of the chat and are
+    meant for a scraper on the same machine, not for the LAN.
+    """
+
+    def __init__(self, registry: MetricsRegistry, port: int = 0):
+        self._registry = registry
+        self._port = port
+        self._httpd = None
+        self._thread: Thread | None = None
+
+    def start(self):
+        if self._httpd is not None:
+            return
+        # http.server (with email, html, ...) costs tens of ms at import; only load it when serving.
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        registry = self._registry
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", _CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                return
+
+        try:
+            httpd = ThreadingHTTPServer((_LOOPBACK_HOST, self._port), _Handler)
+        except OSError as e:
+            raise IOError("failed to start metrics endpoint") from e
+        httpd.daemon_threads = True
+        self._httpd = httpd
+        self._thread = Thread(target=httpd.serve_forever, kwargs={"poll_interval": 0.1}, name="localchat metrics endpoint", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        httpd = self._httpd
+        if httpd is None:
+            return
+        httpd.shutdown()
+        httpd.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        self._httpd = None
+
+    def is_running(self) -> bool:
+        return self._httpd is not None
+
+    def get_port(self) -> int:
+        """
+        :return: the bound port (useful with port 0), or the configured port while stopped
+        """
+        if self._httpd is not None:
+            return self._httpd.server_address[1]
+        return self._port
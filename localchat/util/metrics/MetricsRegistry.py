@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import re
+from math import isinf, isnan
+from threading import Lock
+from typing import Callable
+
+from localchat.config.limits import METRICS_LATENCY_BUCKETS_S
+from localchat.util.metrics.Counter import Counter
+from localchat.util.metrics.Histogram import Histogram
+
+
+_NAME_PATTERN = re.compile(r"^[a-zA-Z_:][a-zA-Z0-9_:]*$")
+_Labels = tuple[tuple[str, str], ...]
+
+
+class _NullCounter(Counter):
+    __slots__ = ()
+
+    def inc(self, amount: int | float = 1):
+        return
+
+
+class _NullHistogram(Histogram):
+    __slots__ = ()
+
+    def observe(self, value: float):
+        return
+
+
+class _CallbackMetric:
+    """
+    Gauge or counter whose value is read when the registry is collected (e.g. session counts).
+    """
+    __slots__ = ("name", "labels", "_read")
+
+    def __init__(self, name: str, labels: _Labels, read: Callable[[], float]):
+        self.name = name
+        self.labels = labels
+        self._read = read
+
+    def value(self) -> float:
+        return self._read()
+
+
+class _Family:
+    __slots__ = ("kind", "help", "metrics")
+
+    def __init__(self, kind: str, help_text: str):
+        self.kind = kind
+        self.help = help_text
+        self.metrics: dict[_Labels, Counter | Histogram | _CallbackMetric] = {}
+
+
+class MetricsRegistry:
+    """
+    Named counters, gauges and histograms of one server, exported in the Prometheus text format.
+    Instruments are created once (usually in a constructor) and then updated on the hot
+    paths without any lookup or lock. A disabled registry hands out instruments that do
+    nothing, to measure what the instrumentation costs.
+    Registering the same name and labels again returns the existing instrument.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self._enabled = enabled
+        self._lock = Lock()
+        self._families: dict[str, _Family] = {}
+
+    def is_enabled(self) -> bool:
+        return self._enabled
+
+    def counter(self, name: str, help_text: str, labels: dict[str, str] | None = None) -> Counter:
+        key = _label_key(labels)
+        if not self._enabled:
+            return _NullCounter(name, key)
+        return self._register(name, "counter", help_text, key, lambda: Counter(name, key))
+
+    def histogram(
+            self,
+            name: str,
+            help_text: str,
+            buckets: tuple[float, ...] = METRICS_LATENCY_BUCKETS_S,
+            labels: dict[str, str] | None = None,
+    ) -> Histogram:
+        key = _label_key(labels)
+        if not self._enabled:
+            return _NullHistogram(name, buckets, key)
+        return self._register(name, "histogram", help_text, key, lambda: Histogram(name, buckets, key))
+
+    def gauge(self, name: str, help_text: str, read: Callable[[], float], labels: dict[str, str] | None = None):
+        """
+        A value that can go up and down; read is called on every collection.
+        """
+        if self._enabled:
+            key = _label_key(labels)
+            self._register(name, "gauge", help_text, key, lambda: _CallbackMetric(name, key, read))
+
+    def counter_from(self, name: str, help_text: str, read: Callable[[], float], labels: dict[str, str] | None = None):
+        """
+        A counter kept elsewhere (e.g. summed over sessions); read is called on every collection.
+        """
+        if self._enabled:
+            key = _label_key(labels)
+            self._register(name, "counter", help_text, key, lambda: _CallbackMetric(name, key, read))
+
+    def value(self, name: str, labels: dict[str, str] | None = None) -> float:
+        """
+        Current value of a counter or gauge, or the observation count of a histogram.
+        :raises KeyError: if no such metric is registered
+        """
+        metric = self._find(name, labels)
+        if isinstance(metric, Histogram):
+            return metric.count()
+        return metric.value()
+
+    def total(self, name: str) -> float:
+        """
+        Sum of a counter or gauge over all its labels (0 if it is not registered).
+        """
+        with self._lock:
+            family = self._families.get(name)
+            metrics = [] if family is None else list(family.metrics.values())
+        return sum(_safe_value(metric) for metric in metrics if not isinstance(metric, Histogram))
+
+    def labels(self, name: str) -> list[dict[str, str]]:
+        """
+        Label sets registered under name, in registration order (empty if there are none).
+        """
+        with self._lock:
+            family = self._families.get(name)
+            keys = [] if family is None else list(family.metrics)
+        return [dict(key) for key in keys]
+
+    def get_histogram(self, name: str, labels: dict[str, str] | None = None) -> Histogram:
+        """
+        :raises KeyError: if no such histogram is registered
+        """
+        metric = self._find(name, labels)
+        if not isinstance(metric, Histogram):
+            raise KeyError(name)
+        return metric
+
+    def render_prometheus(self) -> str:
+        """
+        All metrics in the Prometheus text exposition format (version 0.0.4).
+        """
+        with self._lock:
+            families = [(name, family.kind, family.help, list(family.metrics.values())) for name, family in self._families.items()]
+        lines: list[str] = []
+        for name, kind, help_text, metrics in families:
+            lines.append(f"# HELP {name} {_escape_help(help_text)}")
+            lines.append(f"# TYPE {name} {kind}")
+            for metric in metrics:
+                if isinstance(metric, Histogram):
+                    for bound, count in zip(metric.bounds(), metric.cumulative_counts()):
+                        labels = metric.labels + (("le", _format_value(bound)),)
+                        lines.append(f"{name}_bucket{_format_labels(labels)} {count}")
+                    lines.append(f"{name}_sum{_format_labels(metric.labels)} {_format_value(metric.sum())}")
+                    lines.append(f"{name}_count{_format_labels(metric.labels)} {metric.count()}")
+                    continue
+                value = _safe_value(metric)
+                lines.append(f"{name}{_format_labels(metric.labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n" if len(lines) > 0 else ""
+
+    def _register(self, name: str, kind: str, help_text: str, key: _Labels, create: Callable):
+        if _NAME_PATTERN.match(name) is None:
+            raise ValueError(f"invalid metric name: {name}")
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = _Family(kind, help_text)
+                self._families[name] = family
+            elif family.kind != kind:
+                raise ValueError(f"metric {name} is already registered as a {family.kind}")
+            metric = family.metrics.get(key)
+            if metric is None:
+                metric = create()
+                family.metrics[key] = metric
+            return metric
+
+    def _find(self, name: str, labels: dict[str, str] | None):
+        with self._lock:
+            family = self._families.get(name)
+            metric = None if family is None else family.metrics.get(_label_key(labels))
+        if metric is None:
+            raise KeyError(name)
+        return metric
+
+
+def _label_key(labels: dict[str, str] | None) -> _Labels:
+    if labels is None or len(labels) == 0:
+        return ()
+    for label in labels:
+        if _NAME_PATTERN.match(label) is None or ":" in label:
+            raise ValueError(f"invalid label name: {label}")
+    return tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+def _safe_value(metric) -> float:
+    try:
+        return metric.value()
+    except Exception:
+        # A failing callback must not break the whole scrape.
+        return float("nan")
+
+
+def _format_labels(labels: _Labels) -> str:
+    if len(labels) == 0:
+        return ""
+    parts = []
+    for label, value in labels:
+        escaped = value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        parts.append(f"{label}=\"{escaped}\"")
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value: float) -> str:
+    if not isinstance(value, float):
+        return str(value)
+    if isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if isnan(value):
+        return "NaN"
+    if value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
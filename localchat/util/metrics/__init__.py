@@ -0,0 +1,5 @@
+from .Counter import Counter
+from .Histogram import Histogram
+from .MetricsRegistry import MetricsRegistry
+from .MetricsHttpServer import MetricsHttpServer
+from .InstrumentedLock import InstrumentedLock, create_lock, lock_report
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import json
+import sys
+from selectors import DefaultSelector, EVENT_READ
+from socket import AF_INET, SOCK_STREAM, socket
+from time import perf_counter
+from uuid import uuid4
+
+from localchat.bench import percentile, rss_bytes
+from localchat.net import SerializableUser, tcp_protocol
+
+
+def raise_fd_limit():
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def emit(result: dict):
+    print(json.dumps(result, sort_keys=True))
+    sys.stdout.flush()
+
+
+class ClientPool:
+    """
+    Raw tcp_protocol clients driven from one selector, so the benchmark
+    itself does not need a thread per connection.
+    """
+
+    def __init__(self):
+        self._selector = DefaultSelector()
+        self.sockets: list[socket] = []
+        self._buffers: dict[int, bytearray] = {}
+
+    def join(self, host: str, port: int, name: str) -> socket:
+        sock = socket(AF_INET, SOCK_STREAM)
+        sock.settimeout(10.0)
+        sock.connect((host, port))
+        tcp_protocol.send_packet(sock, tcp_protocol.encode_join(SerializableUser(uuid4(), name)))
+        while True:
+            payload = tcp_protocol.recv_packet(sock)
+            if payload[0] == tcp_protocol.PT_S_JOIN_ACK:
+                break
+            if payload[0] == tcp_protocol.PT_S_JOIN_NACK:
+                raise IOError("join rejected")
+        sock.setblocking(False)
+        self._buffers[sock.fileno()] = bytearray()
+        self._selector.register(sock, EVENT_READ)
+        self.sockets.append(sock)
+        return sock
+
+    def drain(self, timeout_s: float = 0.2):
+        self.wait_for_type(tcp_protocol.PT_S_PUBLIC, 0, timeout_s)
+
+    def wait_for_type(self, packet_type: int, per_client: int, timeout_s: float = 10.0) -> bool:
+        """
+        Reads until every client received `per_client` packets of the given type.
+        With per_client=0 it only drains pending data until the pool is quiet.
+        """
+        remaining = {sock.fileno(): per_client for sock in self.sockets}
+        outstanding = len(self.sockets) if per_client > 0 else 0
+        deadline = perf_counter() + timeout_s
+        while perf_counter() < deadline:
+            events = self._selector.select(0.05)
+            if len(events) == 0 and outstanding == 0:
+                return True
+            for key, _ in events:
+                sock: socket = key.fileobj
+                fd = sock.fileno()
+                try:
+                    data = sock.recv(256 * 1024)
+                except BlockingIOError:
+                    continue
+                if len(data) == 0:
+                    raise IOError("server closed a benchmark connection")
+                buffer = self._buffers[fd]
+                buffer += data
+                while len(buffer) >= 4:
+                    frame_len = int.from_bytes(buffer[:4], "big")
+                    if len(buffer) < 4 + frame_len:
+                        break
+                    frame_type = buffer[4]
+                    del buffer[:4 + frame_len]
+                    if frame_type == packet_type and remaining.get(fd, 0) > 0:
+                        remaining[fd] -= 1
+                        if remaining[fd] == 0:
+                            outstanding -= 1
+            if per_client > 0 and outstanding == 0:
+                return True
+        return outstanding == 0
+
+    def close(self):
+        for sock in self.sockets:
+            try:
+                self._selector.unregister(sock)
+            except (KeyError, ValueError):
+                pass
+            sock.close()
+        self.sockets = []
+        self._selector.close()
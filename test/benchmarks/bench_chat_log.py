@@ -0,0 +1,132 @@
+"""
+Memory footprint and access cost of the columnar ChatLog.
+
+"objects" keeps every message as a SerializableUserMessage in a list (what the
+chat log held before it stored columns); "columns" appends the same messages to
+a ChatLog whose in-memory window holds all of them, so nothing is spilled.
+Messages are 20-120 characters from 200 senders.
+
+Reports per store and message count:
+- bytes_per_msg: tracemalloc-traced memory retained per message
+- append_us_per_msg: time to store one message
+- page_p50_us: reading and encoding a page of 256 messages (history request)
+- save_ms: SerializableUserMessageList output of the whole history (save_chat)
+
+Run: python -m test.benchmarks.bench_chat_log --messages 100000 1000000
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import random
+import tracemalloc
+from time import perf_counter
+from uuid import uuid4
+
+from localchat.net import SerializableUser, SerializableUserMessage, SerializableUserMessageList
+from localchat.server.logicImpl import ChatLog
+from test.benchmarks._support import emit, percentile
+
+
+_SENDERS = 200
+_PAGE = 256
+
+
+class _CountingSink:
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data) -> int:
+        self.size += len(data)
+        return len(data)
+
+
+def _make_texts(count: int, seed: int) -> list[bytes]:
+    rng = random.Random(seed)
+    alphabet = "abcdefghijklmnopqrstuvwxyz     "
+    lines = ["".join(rng.choices(alphabet, k=120)).encode() for _ in range(1000)]
+    return [lines[idx % 1000][:rng.randint(20, 120)] for idx in range(count)]
+
+
+def _fill(store: str, texts: list[bytes], senders: list[SerializableUser]) -> list | ChatLog:
+    # Every message is a fresh object with a fresh string, just like a decoded client packet.
+    if store == "objects":
+        log = []
+        for idx, text in enumerate(texts):
+            log.append(SerializableUserMessage(senders[idx % _SENDERS], text.decode(), float(idx)))
+    else:
+        log = ChatLog(max_messages=len(texts) + 1, max_bytes=1 << 40)
+        for idx, text in enumerate(texts):
+            log.append(SerializableUserMessage(senders[idx % _SENDERS], text.decode(), float(idx)))
+    return log
+
+
+def _measure(store: str, texts: list[bytes], pages: int, seed: int) -> dict:
+    senders = [SerializableUser(uuid4(), f"user{idx}") for idx in range(_SENDERS)]
+    count = len(texts)
+    # Timed without tracemalloc, which slows down allocations a lot.
+    gc.collect()
+    started = perf_counter()
+    log = _fill(store, texts, senders)
+    elapsed = perf_counter() - started
+    if store == "columns":
+        log.close()
+    del log
+    gc.collect()
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    log = _fill(store, texts, senders)
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    rng = random.Random(seed)
+    latencies_us: list[float] = []
+    for _ in range(pages):
+        start = rng.randrange(max(1, count - _PAGE))
+        begin = perf_counter()
+        if store == "objects":
+            page = [SerializableUserMessage.encode(message) for message in log[start:start + _PAGE]]
+        else:
+            page = log.read_encoded_page(start, _PAGE, False)[2]
+        latencies_us.append((perf_counter() - begin) * 1e6)
+        del page
+
+    sink = _CountingSink()
+    begin = perf_counter()
+    if store == "objects":
+        serial = SerializableUserMessageList()
+        serial.items = log
+        serial.serialize(sink)
+    else:
+        log.snapshot().write_to(sink)
+    save_s = perf_counter() - begin
+    if store == "columns":
+        log.close()
+    return {
+        "store": store,
+        "messages": count,
+        "bytes_per_msg": round((retained - base) / count, 1),
+        "append_us_per_msg": round(elapsed / count * 1e6, 2),
+        "page_p50_us": round(percentile(latencies_us, 0.50), 1),
+        "save_ms": round(save_s * 1000, 1),
+        "save_bytes": sink.size,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="columnar chat log")
+    parser.add_argument("--messages", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    for count in args.messages:
+        texts = _make_texts(count, args.seed)
+        for store in ("objects", "columns"):
+            emit(_measure(store, texts, args.pages, args.seed))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
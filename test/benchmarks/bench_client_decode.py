@@ -0,0 +1,115 @@
+"""
+Allocations on the client decode path for a burst of public messages.
+
+A burst of v1 PT_S_PUBLIC packets from a few senders is fed through
+TcpChat._handle_packet while a listener keeps every message (like a chat
+window does). "plain" decodes senders with SerializableUser.deserialize for
+every message (the previous behaviour), "interned" uses the UserInterner that
+TcpChat now decodes with.
+
+Reports per mode:
+- blocks_per_msg: memory blocks still allocated per kept message (sys.getallocatedblocks)
+- bytes_per_msg: tracemalloc-traced memory retained per kept message
+- peak_bytes: tracemalloc peak during the burst
+- us_per_msg: decode + dispatch time (measured without tracemalloc)
+
+Run: python -m test.benchmarks.bench_client_decode --messages 10000
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import sys
+import tracemalloc
+from time import perf_counter, time
+from uuid import uuid4
+
+from localchat.client.logicImpl import TcpChat
+from localchat.net import BufferReader, SerializableUser, SerializableUserMessage, tcp_protocol
+from localchat.util.event import Event, EventListener
+from test.benchmarks._support import emit
+
+
+class _Keep(EventListener):
+    def __init__(self):
+        self.items = []
+
+    def on_event(self, event: Event):
+        self.items.append(event.value())
+
+
+class _PlainUsers:
+    """
+    Stand-in for UserInterner that allocates a new user for every message.
+    """
+
+    @staticmethod
+    def decode(input_stream) -> SerializableUser:
+        return SerializableUser.deserialize(input_stream)
+
+    @staticmethod
+    def intern(user_id, name) -> SerializableUser:
+        return SerializableUser(user_id, name)
+
+
+def _make_burst(message_count: int, sender_count: int) -> list[bytes]:
+    senders = [SerializableUser(uuid4(), f"member-{idx}") for idx in range(sender_count)]
+    now = time()
+    return [
+        tcp_protocol.encode_server_public_message(
+            SerializableUserMessage(senders[idx % sender_count], f"message number {idx}", now + idx)
+        )
+        for idx in range(message_count)
+    ]
+
+
+def _run_burst(mode: str, burst: list[bytes]) -> _Keep:
+    chat = TcpChat(uuid4(), "bench", "127.0.0.1", 1)
+    if mode == "plain":
+        chat._users = _PlainUsers()
+    keep = _Keep()
+    chat.on_user_posted_message().add_listener(keep)
+    for payload in burst:
+        chat._handle_packet(payload[0], BufferReader(memoryview(payload)[1:]))
+    return keep
+
+
+def run(mode: str, burst: list[bytes]) -> dict:
+    gc.collect()
+    started = perf_counter()
+    _run_burst(mode, burst)
+    elapsed = perf_counter() - started
+
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    keep = _run_burst(mode, burst)
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sys.getallocatedblocks() - blocks_before
+    count = len(keep.items)
+    return {
+        "mode": mode,
+        "messages": count,
+        "blocks_per_msg": round(blocks / count, 2),
+        "bytes_per_msg": round(retained / count, 1),
+        "peak_bytes": peak,
+        "us_per_msg": round(elapsed / count * 1e6, 2),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="client decode allocations")
+    parser.add_argument("--messages", type=int, default=10_000)
+    parser.add_argument("--senders", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    burst = _make_burst(args.messages, args.senders)
+    for mode in ("plain", "interned"):
+        emit(run(mode, burst))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,132 @@
+"""
+CPU vs. bytes trade-off of the negotiated zlib compression.
+
+Workloads (server -> client payloads):
+- chat: short and medium public messages, mostly below the threshold
+- large: long messages that repeat phrases across messages
+- bulk: pages of chat history (SerializableUserMessageList, up to the packet limit)
+
+Per workload and setting the benchmark reports wire bytes relative to no
+compression and the compress + decompress time per payload. "stream" is
+the shipped PayloadCompressor (one deflate stream per connection);
+"per_message" starts a fresh stream for every payload, to show what the
+shared context buys.
+
+Run: python -m test.benchmarks.bench_compression --levels 1 6 9 --thresholds 256 512 1024
+"""
+from __future__ import annotations
+
+import argparse
+import random
+from io import BytesIO
+from time import perf_counter, time
+from uuid import uuid4
+
+from localchat.config.limits import MAX_TCP_PACKET_SIZE
+from localchat.net import SerializableUser, SerializableUserMessage, SerializableUserMessageList, tcp_protocol
+from test.benchmarks._support import emit
+
+
+_WORDS = (
+    "hallo", "ja", "nein", "morgen", "heute", "Mensa", "Vorlesung", "Folien", "Klausur",
+    "Treffen", "um", "Uhr", "wer", "kommt", "mit", "lol", "ok", "danke", "Bibliothek", "Aufgabe",
+)
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words))
+
+
+def _messages(rng: random.Random, count: int, min_words: int, max_words: int) -> list[SerializableUserMessage]:
+    senders = [SerializableUser(uuid4(), f"user-{idx}") for idx in range(8)]
+    return [
+        SerializableUserMessage(rng.choice(senders), _sentence(rng, rng.randint(min_words, max_words)), time())
+        for _ in range(count)
+    ]
+
+
+def _workload(name: str, count: int) -> list[bytes]:
+    rng = random.Random(11)
+    if name == "chat":
+        return [tcp_protocol.encode_server_public_message(m) for m in _messages(rng, count, 1, 40)]
+    if name == "large":
+        return [tcp_protocol.encode_server_public_message(m) for m in _messages(rng, count, 300, 1500)]
+    pages: list[bytes] = []
+    history = _messages(rng, count * 20, 1, 40)
+    page: list[SerializableUserMessage] = []
+    for message in history:
+        page.append(message)
+        if len(page) == 200:
+            serial = SerializableUserMessageList()
+            serial.items = page
+            buffer = BytesIO()
+            serial.serialize(buffer)
+            pages.append(bytes([tcp_protocol.PT_S_PUBLIC]) + buffer.getvalue()[:MAX_TCP_PACKET_SIZE - 1024])
+            page = []
+    return pages
+
+
+class _PerMessageCompressor:
+    def __init__(self, min_bytes: int, level: int):
+        self._min_bytes = min_bytes
+        self._level = level
+
+    def compress(self, payload: bytes) -> bytes:
+        if len(payload) < self._min_bytes:
+            return payload
+        return tcp_protocol.PayloadCompressor(self._min_bytes, self._level).compress(payload)
+
+
+def run_case(workload: str, payloads: list[bytes], mode: str, level: int, threshold: int) -> dict:
+    raw_bytes = sum(len(payload) for payload in payloads)
+    if mode == "stream":
+        compressor = tcp_protocol.PayloadCompressor(threshold, level)
+    else:
+        compressor = _PerMessageCompressor(threshold, level)
+    decompressor = tcp_protocol.PayloadDecompressor()
+
+    started = perf_counter()
+    compressed = [compressor.compress(payload) for payload in payloads]
+    compress_seconds = perf_counter() - started
+
+    started = perf_counter()
+    for idx, payload in enumerate(compressed):
+        if payload[0] & tcp_protocol.PT_FLAG_COMPRESSED:
+            if mode != "stream":
+                decompressor = tcp_protocol.PayloadDecompressor()
+            if decompressor.decompress(payload) != payloads[idx]:
+                raise IOError("round trip mismatch")
+    decompress_seconds = perf_counter() - started
+
+    wire_bytes = sum(len(payload) for payload in compressed)
+    return {
+        "workload": workload,
+        "mode": mode,
+        "level": level,
+        "threshold": threshold,
+        "payloads": len(payloads),
+        "raw_bytes_per_payload": round(raw_bytes / len(payloads)),
+        "wire_ratio": round(wire_bytes / raw_bytes, 3),
+        "compress_us_per_payload": round(compress_seconds * 1_000_000.0 / len(payloads), 2),
+        "decompress_us_per_payload": round(decompress_seconds * 1_000_000.0 / len(payloads), 2),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="zlib compression: CPU vs. bytes")
+    parser.add_argument("--payloads", type=int, default=2000)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 6, 9])
+    parser.add_argument("--thresholds", type=int, nargs="+", default=[256, 512, 1024])
+    args = parser.parse_args(argv)
+
+    for workload in ("chat", "large", "bulk"):
+        payloads = _workload(workload, args.payloads)
+        for threshold in args.thresholds:
+            for level in args.levels:
+                for mode in ("stream", "per_message"):
+                    emit(run_case(workload, payloads, mode, level, threshold))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
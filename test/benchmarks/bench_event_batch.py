@@ -0,0 +1,103 @@
+"""
+Per-event delivery (handle) vs burst delivery (handle_all) for a listener with
+a fixed cost per call.
+
+The listener stands for the CLI chat window: it formats every message and
+writes + flushes once per call (on_event per message, on_events per burst) to
+os.devnull. Events are fired in bursts of --burst, like a receive loop that
+finds several packets in one read, synchronously and through an
+EventDispatcher.
+
+Reports per mode and delivery:
+- us_per_event: time from the first handle until everything was delivered, per event
+- listener_calls: number of write + flush calls of the listener
+- max_pending: highest dispatcher queue depth (async only)
+
+Run: python -m test.benchmarks.bench_event_batch --events 20000 --burst 32
+"""
+from __future__ import annotations
+
+import argparse
+import os
+from time import perf_counter, time
+from uuid import uuid4
+
+from localchat.net import SerializableUser, SerializableUserMessage
+from localchat.util.event import Event, EventDispatcher, EventHandler, EventListener
+from test.benchmarks._support import emit
+
+
+class _TerminalListener(EventListener):
+    def __init__(self, sink):
+        self._sink = sink
+        self.calls = 0
+
+    @staticmethod
+    def _format(event: Event) -> str:
+        message = event.value()
+        return f"{message.sender().get_name()}: {message.message()}"
+
+    def _write(self, text: str):
+        self._sink.write(text + "\n")
+        self._sink.flush()
+        self.calls += 1
+
+    def on_event(self, event: Event):
+        self._write(self._format(event))
+
+    def on_events(self, events: list[Event]):
+        self._write("\n".join(self._format(event) for event in events))
+
+
+def run(mode: str, delivery: str, events: list[Event], burst: int) -> dict:
+    dispatcher = EventDispatcher() if mode == "async" else None
+    handler = EventHandler(dispatcher)
+    with open(os.devnull, "w") as sink:
+        listener = _TerminalListener(sink)
+        handler.add_listener(listener)
+        started = perf_counter()
+        for start in range(0, len(events), burst):
+            chunk = events[start:start + burst]
+            if delivery == "batch":
+                handler.handle_all(chunk)
+            else:
+                for event in chunk:
+                    handler.handle(event)
+        if dispatcher is not None:
+            dispatcher.wait_idle()
+        elapsed = perf_counter() - started
+    result = {
+        "mode": mode,
+        "delivery": delivery,
+        "events": len(events),
+        "burst": burst,
+        "us_per_event": round(elapsed / len(events) * 1e6, 3),
+        "listener_calls": listener.calls,
+    }
+    if dispatcher is not None:
+        result["max_pending"] = dispatcher.max_pending()
+        dispatcher.close()
+    return result
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="per-event vs burst event delivery")
+    parser.add_argument("--events", type=int, default=20_000)
+    parser.add_argument("--burst", type=int, default=32)
+    args = parser.parse_args(argv)
+
+    owner = uuid4()
+    sender = SerializableUser(uuid4(), "member")
+    now = time()
+    events = [
+        Event(owner, SerializableUserMessage(sender, f"message number {idx}", now + idx))
+        for idx in range(args.events)
+    ]
+    for mode in ("sync", "async"):
+        for delivery in ("single", "batch"):
+            emit(run(mode, delivery, events, args.burst))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
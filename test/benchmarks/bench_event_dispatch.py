@@ -0,0 +1,78 @@
+"""
+Cost of EventHandler.handle() for the thread that fires the event.
+
+A listener that takes --listener-us per event (e.g. terminal output) is
+attached once synchronously and once through an EventDispatcher. The firing
+thread stands for a network receive loop.
+
+Reports per mode:
+- handle_p50_us / handle_p99_us: time handle() blocks the firing thread
+- drain_ms: time until every event was delivered
+- max_pending: highest dispatcher queue depth (async only)
+
+Run: python -m test.benchmarks.bench_event_dispatch --events 5000 --listener-us 200
+"""
+from __future__ import annotations
+
+import argparse
+from time import perf_counter
+from uuid import uuid4
+
+from localchat.util.event import Event, EventDispatcher, EventHandler, EventListener
+from test.benchmarks._support import emit, percentile
+
+
+class _BusyListener(EventListener):
+    def __init__(self, busy_s: float):
+        self._busy_s = busy_s
+        self.count = 0
+
+    def on_event(self, event: Event):
+        end = perf_counter() + self._busy_s
+        while perf_counter() < end:
+            pass
+        self.count += 1
+
+
+def run(mode: str, events: int, listener_us: float) -> dict:
+    dispatcher = EventDispatcher() if mode == "async" else None
+    handler = EventHandler(dispatcher)
+    listener = _BusyListener(listener_us / 1e6)
+    handler.add_listener(listener)
+    owner = uuid4()
+    latencies_us: list[float] = []
+    started = perf_counter()
+    for idx in range(events):
+        begin = perf_counter()
+        handler.handle(Event(owner, idx))
+        latencies_us.append((perf_counter() - begin) * 1e6)
+    if dispatcher is not None:
+        dispatcher.wait_idle()
+    drained = perf_counter() - started
+    result = {
+        "mode": mode,
+        "events": events,
+        "handle_p50_us": round(percentile(latencies_us, 0.50), 2),
+        "handle_p99_us": round(percentile(latencies_us, 0.99), 2),
+        "drain_ms": round(drained * 1000, 1),
+        "delivered": listener.count,
+    }
+    if dispatcher is not None:
+        result["max_pending"] = dispatcher.max_pending()
+        dispatcher.close()
+    return result
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="synchronous vs dispatched event delivery")
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--listener-us", type=float, default=200.0)
+    args = parser.parse_args(argv)
+
+    for mode in ("sync", "async"):
+        emit(run(mode, args.events, args.listener_us))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,76 @@
+"""
+Cost of the write-ahead journal on the public message path.
+
+Modes:
+- off: no journal
+- group: MessageJournal with group commit (one fsync per flush interval)
+- sync: fsync after every message (journal.flush() per message), the naive alternative
+
+Reports messages/sec through post_system_message, fsync count and replay speed.
+
+Run: python -m test.benchmarks.bench_journal --messages 20000
+"""
+from __future__ import annotations
+
+import argparse
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from localchat.server.logicImpl import InMemoryLogic, MessageJournal
+from test.benchmarks._support import emit
+
+
+def run_case(mode: str, message_count: int, flush_interval_ms: float, directory: str | None) -> dict:
+    with TemporaryDirectory(dir=directory) as journal_dir:
+        journal = None if mode == "off" else MessageJournal(journal_dir, flush_interval_ms=flush_interval_ms)
+        logic = InMemoryLogic(journal=journal)
+        logic.start()
+        text = "benchmark message " * 4
+        started = perf_counter()
+        for _ in range(message_count):
+            logic.post_system_message(text)
+            if mode == "sync":
+                journal.flush()
+        if journal is not None:
+            journal.flush()
+        elapsed = perf_counter() - started
+        stats = journal.stats() if journal is not None else None
+        logic.stop()
+
+        result = {
+            "mode": mode,
+            "messages": message_count,
+            "messages_per_s": round(message_count / elapsed),
+        }
+        if stats is not None:
+            result["fsyncs"] = stats.commits
+            result["journal_bytes"] = stats.bytes_written
+            replay_started = perf_counter()
+            replayed = sum(1 for _ in MessageJournal(journal_dir).replay())
+            replay_s = perf_counter() - replay_started
+            result["replay_records_per_s"] = round(replayed / replay_s) if replay_s > 0 else None
+            restart_started = perf_counter()
+            restored = InMemoryLogic(journal=MessageJournal(journal_dir))
+            restored.start()
+            result["restart_ms"] = round((perf_counter() - restart_started) * 1000.0, 1)
+            restored.stop()
+        return result
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="journal on/off message throughput")
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--sync-messages", type=int, default=2_000,
+                        help="fsync per message is slow; use a smaller count for the sync mode")
+    parser.add_argument("--flush-interval-ms", type=float, default=5.0)
+    parser.add_argument("--dir", default=None, help="directory for the journal (default: system temp dir)")
+    args = parser.parse_args(argv)
+
+    emit(run_case("off", args.messages, args.flush_interval_ms, args.dir))
+    emit(run_case("group", args.messages, args.flush_interval_ms, args.dir))
+    emit(run_case("sync", args.sync_messages, args.flush_interval_ms, args.dir))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
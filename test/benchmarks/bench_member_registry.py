@@ -0,0 +1,103 @@
+"""
+Member lookups at server scale: linear scans over list_members() (the previous
+implementation) against the indexed registry in AbstractLogic.
+
+Reports per operation the mean lookup time in microseconds for
+- by_id: sender lookup on every public message
+- name_in_use: join-time name collision check
+- id_prefix: /kick and /newhost target resolution
+
+Run: python -m test.benchmarks.bench_member_registry --members 10000
+"""
+from __future__ import annotations
+
+import argparse
+from random import Random
+from time import perf_counter
+from uuid import UUID, uuid4
+
+from localchat.net import SerializableUser
+from localchat.server.logicImpl import InMemoryLogic
+from localchat.util import Role, User
+from test.benchmarks._support import emit
+
+
+def _scan_by_id(logic: InMemoryLogic, user_id: UUID) -> User:
+    for user in logic.list_members():
+        if user.get_id() == user_id:
+            return user
+    raise KeyError("unknown user")
+
+
+def _scan_name_in_use(logic: InMemoryLogic, name: str) -> bool:
+    normalized = name.strip().lower()
+    for member in logic.list_members():
+        if _scan_by_id(logic, member.get_id()).get_name().strip().lower() == normalized:
+            return True
+    return False
+
+
+def _scan_id_prefix(logic: InMemoryLogic, prefix: str) -> list[User]:
+    return [m for m in logic.list_members() if str(m.get_id()).lower().startswith(prefix)]
+
+
+def _mean_us(fn, args: list, repeat: int) -> float:
+    started = perf_counter()
+    for idx in range(repeat):
+        fn(args[idx % len(args)])
+    return (perf_counter() - started) * 1_000_000.0 / repeat
+
+
+def run(member_count: int, lookups: int, scan_lookups: int, name_scan_lookups: int) -> list[dict]:
+    logic = InMemoryLogic()
+    logic.start()
+    users = [SerializableUser(uuid4(), f"member-{idx}") for idx in range(member_count)]
+    started = perf_counter()
+    for user in users:
+        logic.register_member(user, Role.MEMBER)
+    register_us = (perf_counter() - started) * 1_000_000.0 / member_count
+
+    rng = Random(1)
+    sample = rng.sample(users, min(len(users), 256))
+    ids = [user.get_id() for user in sample]
+    names = [user.get_name().upper() for user in sample]
+    prefixes = [str(user.get_id())[:8] for user in sample]
+
+    results = [{"op": "register", "members": member_count, "indexed_us": round(register_us, 3)}]
+    cases = [
+        ("by_id", ids, lambda v: _scan_by_id(logic, v), logic.get_member, scan_lookups),
+        ("name_in_use", names, lambda v: _scan_name_in_use(logic, v),
+         lambda v: logic.find_member_by_name(v) is not None, name_scan_lookups),
+        ("id_prefix", prefixes, lambda v: _scan_id_prefix(logic, v), logic.find_members_by_id_prefix, scan_lookups),
+    ]
+    for op, args, scan, indexed, scan_repeat in cases:
+        scan_us = _mean_us(scan, args, scan_repeat)
+        indexed_us = _mean_us(indexed, args, lookups)
+        results.append({
+            "op": op,
+            "members": member_count,
+            "scan_us": round(scan_us, 3),
+            "indexed_us": round(indexed_us, 3),
+            "speedup": round(scan_us / indexed_us, 1) if indexed_us > 0 else None,
+        })
+    logic.stop()
+    return results
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="member registry lookups")
+    parser.add_argument("--members", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--lookups", type=int, default=100_000)
+    parser.add_argument("--scan-lookups", type=int, default=200)
+    parser.add_argument("--name-scan-lookups", type=int, default=3,
+                        help="the old name check is quadratic; keep this small for 10k members")
+    args = parser.parse_args(argv)
+
+    for member_count in args.members:
+        for result in run(member_count, args.lookups, args.scan_lookups, args.name_scan_lookups):
+            emit(result)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
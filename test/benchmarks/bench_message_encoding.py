@@ -0,0 +1,140 @@
+"""
+Encode-once user messages on the server hot path.
+
+One public message passes through: broadcast payload, fan-out into every
+session's outbound queue, journal record, chat log spill and finally
+save_chat. "plain" uses a UserMessage without cached encoding (the previous
+behaviour), "cached" uses the SerializableUserMessage that
+AbstractLogic._make_user_message now creates.
+
+Reports per message: CPU time and string serializations, plus the memory the
+message log retains and the transient tracemalloc peak on top of it.
+
+Run: python -m test.benchmarks.bench_message_encoding --fanout 1000 --messages 2000
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import tracemalloc
+from io import BytesIO
+from time import perf_counter, time
+from uuid import uuid4
+
+from localchat.net import SerializableString, SerializableUser, SerializableUserMessage, SerializableUserMessageList
+from localchat.net import tcp_protocol
+from localchat.server.logicImpl import OutboundQueue
+from localchat.server.logicImpl.MessageJournal import encode_public_message
+from localchat.util import User, UserMessage
+from test.benchmarks._support import emit
+
+
+class _PlainUserMessage(UserMessage):
+    def __init__(self, sender: User, message: str, timestamp: float):
+        self._sender = sender
+        self._message = message
+        self._timestamp = timestamp
+
+    def sender(self) -> User:
+        return self._sender
+
+    def message(self) -> str:
+        return self._message
+
+    def timestamp(self) -> float:
+        return self._timestamp
+
+
+def _make_cached(sender: User, text: str) -> UserMessage:
+    message = SerializableUserMessage(sender, text, time())
+    message.encoded()
+    return message
+
+
+def _make_plain(sender: User, text: str) -> UserMessage:
+    return _PlainUserMessage(sender, text, time())
+
+
+class _SerializationCounter:
+    def __init__(self):
+        self.count = 0
+        self._original = SerializableString.serialize_impl
+
+    def __enter__(self):
+        original = self._original
+        counter = self
+
+        def counting(serial_string, output_stream):
+            counter.count += 1
+            original(serial_string, output_stream)
+
+        SerializableString.serialize_impl = counting
+        return self
+
+    def __exit__(self, *exc):
+        SerializableString.serialize_impl = self._original
+
+
+def _run_pipeline(make, sender: User, queues: list[OutboundQueue], message_count: int) -> list[UserMessage]:
+    text = "a chat message of typical length, sent to many sessions " * 2
+    log: list[UserMessage] = []
+    for _ in range(message_count):
+        message = make(sender, text)
+        payload = tcp_protocol.encode_server_public_message(message)
+        for queue in queues:
+            queue.push(payload, droppable=True)
+            queue.pop_batch()
+        encode_public_message(message)
+        SerializableUserMessage.encode(message)
+        log.append(message)
+    serial = SerializableUserMessageList()
+    serial.items = log
+    serial.serialize(BytesIO())
+    return log
+
+
+def run_case(mode: str, fanout: int, message_count: int) -> dict:
+    make = _make_cached if mode == "cached" else _make_plain
+    sender = SerializableUser(uuid4(), "sender")
+    queues = [OutboundQueue(max_messages=4, max_bytes=1 << 20) for _ in range(fanout)]
+
+    gc.collect()
+    started = perf_counter()
+    _run_pipeline(make, sender, queues, message_count)
+    elapsed = perf_counter() - started
+
+    with _SerializationCounter() as counter:
+        _run_pipeline(make, sender, queues, message_count)
+
+    gc.collect()
+    tracemalloc.start()
+    log = _run_pipeline(make, sender, queues, message_count)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del log
+
+    return {
+        "mode": mode,
+        "fanout": fanout,
+        "messages": message_count,
+        "cpu_us_per_message": round(elapsed * 1_000_000.0 / message_count, 2),
+        "string_serializations_per_message": round(counter.count / message_count, 2),
+        "retained_bytes_per_message": round(current / message_count),
+        "transient_peak_bytes": peak - current,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="encode-once user messages")
+    parser.add_argument("--fanout", type=int, nargs="+", default=[1, 100, 1000])
+    parser.add_argument("--messages", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    for fanout in args.fanout:
+        for mode in ("plain", "cached"):
+            emit(run_case(mode, fanout, args.messages))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,145 @@
+"""
+Receive path: copying recv_packet vs. the zero-copy PacketReceiver.
+
+"copying" is the previous path: recv() chunks joined per packet, the body
+copied into a BytesIO and every field copied again by read_exact.
+"zero_copy" reads with recv_into into one reusable buffer and decodes the
+fields from memoryviews (PacketReceiver + BufferReader).
+
+Python cannot count allocations directly, so per packet the benchmark
+reports the tracemalloc peak while that packet is received and decoded
+(bytes that were allocated at the same time), next to the recv syscalls and
+the CPU time per packet.
+
+Run: python -m test.benchmarks.bench_receive_path --packets 20000 --message-size 40 2000
+"""
+from __future__ import annotations
+
+import argparse
+import tracemalloc
+from io import BytesIO
+from socket import socket, socketpair
+from threading import Thread
+from time import perf_counter, time
+from uuid import uuid4
+
+from localchat.net import SerializableUser, SerializableUserMessage, tcp_protocol
+from test.benchmarks._support import emit
+
+
+class _CountingSocket:
+    def __init__(self, sock: socket):
+        self._sock = sock
+        self.calls = 0
+
+    def recv(self, n: int) -> bytes:
+        self.calls += 1
+        return self._sock.recv(n)
+
+    def recv_into(self, buffer) -> int:
+        self.calls += 1
+        return self._sock.recv_into(buffer)
+
+
+def _legacy_recv_exact(sock, n: int) -> bytes:
+    chunks: list[bytes] = []
+    bytes_left = n
+    while bytes_left > 0:
+        chunk = sock.recv(bytes_left)
+        if chunk == b"":
+            raise IOError("unexpected EOF while reading packet")
+        chunks.append(chunk)
+        bytes_left -= len(chunk)
+    return b"".join(chunks)
+
+
+def _copying_packets(sock):
+    while True:
+        payload_len = int.from_bytes(_legacy_recv_exact(sock, 4), "big")
+        payload = _legacy_recv_exact(sock, payload_len)
+        yield payload[0], BytesIO(payload[1:])
+
+
+def _zero_copy_packets(sock):
+    receiver = tcp_protocol.PacketReceiver(sock)
+    while True:
+        yield tcp_protocol.decode_client_packet(receiver.recv_packet())
+
+
+_PATHS = {
+    "copying": _copying_packets,
+    "zero_copy": _zero_copy_packets,
+}
+
+
+def _make_stream(packet_count: int, message_size: int) -> bytes:
+    sender = SerializableUser(uuid4(), "sender")
+    text = "x" * message_size
+    frames = bytearray()
+    for idx in range(packet_count):
+        if idx % 2 == 0:
+            payload = tcp_protocol.encode_public_message(text)
+        else:
+            message = SerializableUserMessage(sender, text, time())
+            payload = tcp_protocol.encode_server_public_message(message)
+        frames += len(payload).to_bytes(4, "big") + payload
+    return bytes(frames)
+
+
+def _decode(packet_type: int, body):
+    if packet_type == tcp_protocol.PT_C_PUBLIC:
+        return tcp_protocol.decode_public_message(body)
+    return SerializableUserMessage.deserialize(body)
+
+
+def run_case(path: str, packet_count: int, message_size: int) -> dict:
+    stream = _make_stream(packet_count, message_size)
+    reader, writer = socketpair()
+    sender = Thread(target=writer.sendall, args=(stream,), daemon=True)
+    sender.start()
+    counting = _CountingSocket(reader)
+    packets = _PATHS[path](counting)
+    try:
+        half = packet_count // 2
+        started = perf_counter()
+        for _ in range(half):
+            _decode(*next(packets))
+        elapsed = perf_counter() - started
+
+        tracemalloc.start()
+        peak_total = 0
+        for _ in range(packet_count - half):
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            _decode(*next(packets))
+            peak_total += tracemalloc.get_traced_memory()[1] - current
+        tracemalloc.stop()
+    finally:
+        sender.join()
+        reader.close()
+        writer.close()
+
+    return {
+        "path": path,
+        "packets": packet_count,
+        "message_size": message_size,
+        "us_per_packet": round(elapsed * 1_000_000.0 / half, 2),
+        "recv_calls_per_packet": round(counting.calls / packet_count, 3),
+        "peak_bytes_per_packet": round(peak_total / (packet_count - half)),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="copying vs. zero-copy receive path")
+    parser.add_argument("--packets", type=int, default=20000)
+    parser.add_argument("--message-size", type=int, nargs="+", default=[40, 2000])
+    args = parser.parse_args(argv)
+
+    for message_size in args.message_size:
+        for path in sorted(_PATHS):
+            emit(run_case(path, args.packets, message_size))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,111 @@
+"""
+Indexing throughput and query latency of the /search inverted index (MessageSearchIndex).
+
+Messages are synthetic chat lines: 4-14 words drawn from a Zipf-like vocabulary, 200 senders.
+
+Reports:
+- index_msgs_per_s: MessageSearchIndex.add throughput
+- rss_delta_bytes, tokens, postings: memory held by the index
+- per query kind (rare word, common word, two words, sender filter, since filter):
+  p50_us / p99_us for one page of results, newest first
+
+Run: python -m test.benchmarks.bench_search_index --messages 1000000
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import random
+from time import perf_counter
+from uuid import uuid4
+
+from localchat.net import SerializableUser, SerializableUserMessage
+from localchat.server.logicImpl import MessageSearchIndex
+from test.benchmarks._support import emit, percentile, rss_bytes
+
+
+_VOCABULARY_SIZE = 20_000
+_SENDERS = 200
+
+
+def _make_corpus(message_count: int, seed: int) -> tuple[list[SerializableUserMessage], list[str]]:
+    rng = random.Random(seed)
+    vocabulary = [f"w{idx}" for idx in range(_VOCABULARY_SIZE)]
+    weights = [1.0 / (rank + 1) for rank in range(_VOCABULARY_SIZE)]
+    senders = [SerializableUser(uuid4(), f"user{idx}") for idx in range(_SENDERS)]
+    words = rng.choices(vocabulary, weights, k=message_count * 9)
+    messages: list[SerializableUserMessage] = []
+    position = 0
+    for idx in range(message_count):
+        length = rng.randint(4, 14)
+        text = " ".join(words[position:position + length])
+        position = (position + length) % (len(words) - 14)
+        messages.append(SerializableUserMessage(senders[idx % _SENDERS], text, float(idx)))
+    return messages, vocabulary
+
+
+def _time_queries(index: MessageSearchIndex, queries: list[dict], limit: int) -> dict:
+    latencies_us: list[float] = []
+    hits = 0
+    for query in queries:
+        started = perf_counter()
+        hits += len(index.search(limit=limit, **query))
+        latencies_us.append((perf_counter() - started) * 1e6)
+    return {
+        "p50_us": round(percentile(latencies_us, 0.50), 1),
+        "p99_us": round(percentile(latencies_us, 0.99), 1),
+        "avg_hits": round(hits / len(queries), 2),
+    }
+
+
+def run(message_count: int, query_count: int, limit: int, seed: int) -> list[dict]:
+    messages, vocabulary = _make_corpus(message_count, seed)
+    gc.collect()
+    rss_before = rss_bytes()
+    index = MessageSearchIndex(max_messages=max(message_count, 1))
+    started = perf_counter()
+    for seq, message in enumerate(messages):
+        index.add(seq, message)
+    elapsed = perf_counter() - started
+    gc.collect()
+    results = [{
+        "case": "index",
+        "messages": message_count,
+        "index_msgs_per_s": round(message_count / elapsed),
+        "rss_delta_bytes": rss_bytes() - rss_before,
+        "tokens": index.token_count(),
+        "postings": index.posting_count(),
+    }]
+
+    rng = random.Random(seed + 1)
+    common = vocabulary[:50]
+    rare = vocabulary[_VOCABULARY_SIZE // 2:]
+    kinds = {
+        "rare_word": lambda: {"terms": [rng.choice(rare)]},
+        "common_word": lambda: {"terms": [rng.choice(common)]},
+        "two_words": lambda: {"terms": [rng.choice(common), rng.choice(vocabulary[50:2000])]},
+        "sender_filter": lambda: {"terms": [rng.choice(common)], "sender": f"user{rng.randrange(_SENDERS)}"},
+        "since_filter": lambda: {"terms": [rng.choice(vocabulary[:2000])], "since_seq": message_count * 9 // 10},
+    }
+    for kind, make_query in kinds.items():
+        queries = [make_query() for _ in range(query_count)]
+        results.append({"case": kind, "messages": message_count, **_time_queries(index, queries, limit)})
+    return results
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="inverted index for /search")
+    parser.add_argument("--messages", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=11, help="hits per query (one page + 1)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    for message_count in args.messages:
+        for result in run(message_count, args.queries, args.limit, args.seed):
+            emit(result)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
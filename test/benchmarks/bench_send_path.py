@@ -0,0 +1,122 @@
+"""
+Broadcast throughput of the session writers at 100+ sessions.
+
+"sendall" is the previous writer: header and payload concatenated and one
+sendall per frame. "sendmsg" writes every popped batch with vectored
+sendmsg calls (PacketSender); "sendmsg_cork" additionally lets the writer
+wait up to --cork-ms for more frames before sending.
+
+Reports per mode and session count: delivered frames per second (sessions x
+messages / time until every client received every message) and send
+syscalls per delivered frame.
+
+Run: python -m test.benchmarks.bench_send_path --sessions 100 128 --messages 2000
+"""
+from __future__ import annotations
+
+import argparse
+from threading import Lock
+from time import perf_counter
+
+from localchat.config.defaults import HARD_MAX_CLIENTS
+from localchat.net import tcp_protocol
+from localchat.server.logicImpl import SlowConsumerPolicy, TcpServerLogic
+from test.benchmarks._support import ClientPool, emit, raise_fd_limit
+
+
+class _Counter:
+    def __init__(self):
+        self._lock = Lock()
+        self.calls = 0
+
+    def add(self):
+        with self._lock:
+            self.calls += 1
+
+
+class _SendallServer(TcpServerLogic):
+    counter: _Counter
+
+    def _writer_loop(self, session):
+        try:
+            while True:
+                batch = session.outbound.wait_pop_batch()
+                if batch is None:
+                    return
+                for payload in batch:
+                    session.sock.sendall(len(payload).to_bytes(4, "big") + payload)
+                    self.counter.add()
+        except OSError:
+            session.outbound.close(discard=True)
+
+
+class _CountingPacketSender(tcp_protocol.PacketSender):
+    counter: _Counter
+
+    def send_some(self) -> int:
+        _CountingPacketSender.counter.add()
+        return super().send_some()
+
+
+def run_case(mode: str, session_count: int, message_count: int, cork_ms: float) -> dict:
+    counter = _Counter()
+    _SendallServer.counter = counter
+    _CountingPacketSender.counter = counter
+    original_sender = tcp_protocol.PacketSender
+    server_type = _SendallServer if mode == "sendall" else TcpServerLogic
+    server = server_type(
+        host="127.0.0.1",
+        port=0,
+        max_clients=session_count,
+        slow_consumer_policy=SlowConsumerPolicy.DISCONNECT,
+        outbound_max_messages=message_count + 64,
+        outbound_max_bytes=64 * 1024 * 1024,
+        send_cork_ms=cork_ms if mode == "sendmsg_cork" else 0.0,
+    )
+    tcp_protocol.PacketSender = _CountingPacketSender
+    server.start()
+    port = server.get_server_info().get_port()
+    pool = ClientPool()
+    try:
+        for idx in range(session_count):
+            pool.join("127.0.0.1", port, f"bench-{idx}")
+        pool.drain()
+        counter.calls = 0
+
+        text = "a broadcast chat message of typical length " * 2
+        started = perf_counter()
+        for _ in range(message_count):
+            server.post_system_message(text)
+        if not pool.wait_for_type(tcp_protocol.PT_S_PUBLIC, message_count, timeout_s=120.0):
+            raise IOError("broadcast did not reach every client")
+        elapsed = perf_counter() - started
+        delivered = session_count * message_count
+        return {
+            "mode": mode,
+            "sessions": session_count,
+            "messages": message_count,
+            "frames_per_second": round(delivered / elapsed),
+            "send_calls_per_frame": round(counter.calls / delivered, 4),
+        }
+    finally:
+        pool.close()
+        server.stop()
+        tcp_protocol.PacketSender = original_sender
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="per-frame sendall vs. vectored coalesced sends")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[100, HARD_MAX_CLIENTS])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--cork-ms", type=float, default=2.0)
+    args = parser.parse_args(argv)
+
+    raise_fd_limit()
+    for session_count in args.sessions:
+        for mode in ("sendall", "sendmsg", "sendmsg_cork"):
+            emit(run_case(mode, session_count, args.messages, args.cork_ms))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
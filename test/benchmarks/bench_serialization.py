@@ -0,0 +1,317 @@
+"""
+Micro-benchmarks for the encode/decode paths of localchat.net, checked against a baseline.
+
+Covers the Serializable* types (string, float, user, user message, user
+message list) and every tcp_protocol encode_*/decode_* pair on
+representative payloads: short chat lines, maximum-length messages and
+message lists of 1000 and --list-size (default 1M) messages. Decoders read
+the payload the way the receive path does (decode_client_packet and a
+BufferReader over the body). Message encoders build a fresh message per
+operation, because a SerializableUserMessage caches its encoding.
+
+Reports per case (one JSON line each):
+- ops_per_s: best of --repeat runs of at least --min-time seconds
+- bytes_per_op: size of the encoded form the case writes or reads
+- baseline_ops_per_s / change: compared to the baseline file, if it has the case
+
+The last line summarizes the regressions. A case regresses if its ops/s
+drops by more than --threshold, or if its encoded size grows at all.
+Throughput is only compared when the baseline was recorded on the same
+kind of machine and Python (see "environment" in the file), unless --strict;
+sizes are always compared. On a regression the script prints it to stderr
+and exits with status 1.
+
+Run: python -m test.benchmarks.bench_serialization [--cases user_message] [--update-baseline]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import sys
+from fnmatch import fnmatch
+from io import BytesIO
+from pathlib import Path
+from time import perf_counter, time
+from typing import Callable
+from uuid import uuid4
+
+from localchat.config.limits import HISTORY_PAGE_MAX_MESSAGES, MAX_MESSAGE_LENGTH
+from localchat.net import (
+    BufferReader,
+    SerializableFloat,
+    SerializableString,
+    SerializableUser,
+    SerializableUserMessage,
+    SerializableUserMessageList,
+    UserInterner,
+    tcp_protocol,
+)
+from test.benchmarks._support import emit
+
+
+DEFAULT_BASELINE = Path(__file__).with_name("baselines") / "serialization.json"
+_SHORT_TEXT = "bin gleich da, hat jemand die Folien von heute?"
+# Mostly ASCII with a few umlauts, like a long German chat message; exactly MAX_MESSAGE_LENGTH characters.
+_MAX_TEXT = ("Grüße aus dem Hörsaal " * (MAX_MESSAGE_LENGTH // 22 + 1))[:MAX_MESSAGE_LENGTH]
+_SENDER_COUNT = 20
+
+
+class _Case:
+    def __init__(self, name: str, op: Callable[[], object], bytes_per_op: int):
+        self.name = name
+        self.op = op
+        self.bytes_per_op = bytes_per_op
+
+
+def _serialized(value) -> bytes:
+    buffer = BytesIO()
+    value.serialize(buffer)
+    return buffer.getvalue()
+
+
+def _body(payload: bytes) -> BufferReader:
+    return tcp_protocol.decode_client_packet(payload)[1]
+
+
+def _build_cases(list_size: int) -> list[_Case]:
+    now = time()
+    sender = SerializableUser(uuid4(), "Alice")
+    senders = [SerializableUser(uuid4(), f"member-{idx}") for idx in range(_SENDER_COUNT)]
+    cases: list[_Case] = []
+
+    def pair(name: str, encode: Callable[[], bytes], decode: Callable[[bytes], object]):
+        encoded = encode()
+        cases.append(_Case(f"{name}.encode", encode, len(encoded)))
+        cases.append(_Case(f"{name}.decode", lambda: decode(encoded), len(encoded)))
+
+    # Serializable types
+    for label, text in (("short", _SHORT_TEXT), ("max", _MAX_TEXT)):
+        pair(
+            f"string.{label}",
+            lambda text=text: _serialized(SerializableString(text)),
+            lambda data: SerializableString.deserialize(BufferReader(data), MAX_MESSAGE_LENGTH),
+        )
+    pair("float", lambda: _serialized(SerializableFloat(now)), lambda data: SerializableFloat.deserialize(BufferReader(data)))
+    pair("user", lambda: _serialized(SerializableUser(sender.get_id(), "Alice")), lambda data: SerializableUser.deserialize(BufferReader(data)))
+    interner = UserInterner()
+    for label, text in (("short", _SHORT_TEXT), ("max", _MAX_TEXT)):
+        pair(
+            f"user_message.{label}",
+            lambda text=text: SerializableUserMessage(sender, text, now).encoded(),
+            lambda data: SerializableUserMessage.deserialize(BufferReader(data)),
+        )
+    short_message = SerializableUserMessage(sender, _SHORT_TEXT, now).encoded()
+    cases.append(_Case(
+        "user_message.short.decode_interned",
+        lambda: SerializableUserMessage.deserialize(BufferReader(short_message), interner),
+        len(short_message),
+    ))
+    for label, count in (("1k", 1000), (_count_label(list_size), list_size)):
+        message_list = SerializableUserMessageList()
+        message_list.items = [
+            SerializableUserMessage(senders[idx % _SENDER_COUNT], f"{_SHORT_TEXT} {idx}", now + idx)
+            for idx in range(count)
+        ]
+        pair(
+            f"user_message_list.{label}",
+            lambda message_list=message_list: _serialized(message_list),
+            lambda data, count=count: SerializableUserMessageList.deserialize(BytesIO(data), _SENDER_COUNT, count),
+        )
+
+    # tcp_protocol, client -> server
+    pair("tcp.join", lambda: tcp_protocol.encode_join(sender, tcp_protocol.PROTOCOL_VERSION, tcp_protocol.SUPPORTED_CAPABILITIES),
+         lambda data: tcp_protocol.decode_join_negotiation(_body(data)))
+    for label, text in (("short", _SHORT_TEXT), ("max", _MAX_TEXT)):
+        pair(f"tcp.public.{label}", lambda text=text: tcp_protocol.encode_public_message(text),
+             lambda data: tcp_protocol.decode_public_message(_body(data)))
+        pair(f"tcp.public_v2.{label}", lambda text=text: tcp_protocol.encode_public_message_v2(text),
+             lambda data: tcp_protocol.decode_public_message_v2(_body(data)))
+    pair("tcp.private", lambda: tcp_protocol.encode_private_message(sender.get_id(), _SHORT_TEXT),
+         lambda data: tcp_protocol.decode_private_message(_body(data)))
+    pair("tcp.private_v2", lambda: tcp_protocol.encode_private_message_v2(sender.get_id(), _SHORT_TEXT),
+         lambda data: tcp_protocol.decode_private_message_v2(_body(data)))
+    pair("tcp.leave", tcp_protocol.encode_leave, tcp_protocol.decode_client_packet)
+    pair("tcp.history_request", lambda: tcp_protocol.encode_history_request(tcp_protocol.HISTORY_BEFORE_SEQ, 123_456, 50),
+         lambda data: tcp_protocol.decode_history_request(_body(data)))
+
+    # tcp_protocol, server -> client (v1)
+    for label, text in (("short", _SHORT_TEXT), ("max", _MAX_TEXT)):
+        pair(f"tcp.server_public.{label}",
+             lambda text=text: tcp_protocol.encode_server_public_message(SerializableUserMessage(sender, text, now)),
+             lambda data: SerializableUserMessage.deserialize(_body(data)))
+    pair("tcp.server_private",
+         lambda: tcp_protocol.encode_server_private_message(SerializableUserMessage(sender, _SHORT_TEXT, now)),
+         lambda data: SerializableUserMessage.deserialize(_body(data)))
+    pair("tcp.server_join_ack",
+         lambda: tcp_protocol.encode_server_join_ack(sender, tcp_protocol.PROTOCOL_VERSION, tcp_protocol.SUPPORTED_CAPABILITIES),
+         lambda data: tcp_protocol.decode_server_join_ack_negotiation(_body(data)))
+    pair("tcp.server_join_nack", lambda: tcp_protocol.encode_server_join_nack(tcp_protocol.ERR_RATE_LIMITED, "try again later"),
+         lambda data: tcp_protocol.decode_server_join_nack(_body(data)))
+    pair("tcp.server_error", lambda: tcp_protocol.encode_server_error(tcp_protocol.ERR_RATE_LIMITED, "Please do not spam."),
+         lambda data: tcp_protocol.decode_server_error(_body(data)))
+    for name, encode in (
+        ("user_joined", tcp_protocol.encode_server_user_joined),
+        ("user_left", tcp_protocol.encode_server_user_left),
+        ("user_became_host", tcp_protocol.encode_server_user_became_host),
+    ):
+        pair(f"tcp.server_{name}", lambda encode=encode: encode(sender), lambda data: SerializableUser.deserialize(_body(data)))
+
+    # tcp_protocol, server -> client (v2)
+    users_by_handle = {7: sender}
+    for name, encode in (
+        ("user_defined", tcp_protocol.encode_server_user_defined_v2),
+        ("user_joined", tcp_protocol.encode_server_user_joined_v2),
+        ("user_left", tcp_protocol.encode_server_user_left_v2),
+        ("user_became_host", tcp_protocol.encode_server_user_became_host_v2),
+    ):
+        pair(f"tcp.server_{name}_v2", lambda encode=encode: encode(7, sender),
+             lambda data: tcp_protocol.decode_user_record_v2(_body(data), interner))
+    for label, text in (("short", _SHORT_TEXT), ("max", _MAX_TEXT)):
+        pair(f"tcp.server_public_v2.{label}",
+             lambda text=text: tcp_protocol.encode_server_public_message_v2(7, SerializableUserMessage(sender, text, now)),
+             lambda data: tcp_protocol.decode_user_message_v2(_body(data), users_by_handle))
+    pair("tcp.server_private_v2",
+         lambda: tcp_protocol.encode_server_private_message_v2(7, SerializableUserMessage(sender, _SHORT_TEXT, now)),
+         lambda data: tcp_protocol.decode_user_message_v2(_body(data), users_by_handle))
+    page = [
+        SerializableUserMessage(senders[idx % _SENDER_COUNT], f"{_SHORT_TEXT} {idx}", now + idx).encoded()
+        for idx in range(HISTORY_PAGE_MAX_MESSAGES)
+    ]
+    pair("tcp.server_history_page", lambda: tcp_protocol.encode_server_history_page(1000, 5000, page),
+         lambda data: tcp_protocol.decode_server_history_page(_body(data), interner))
+    pair("tcp.varint", lambda: tcp_protocol.encode_varint(123_456_789),
+         lambda data: tcp_protocol.decode_varint(BufferReader(data)))
+    return cases
+
+
+def _count_label(count: int) -> str:
+    if count % 1_000_000 == 0:
+        return f"{count // 1_000_000}m"
+    if count % 1000 == 0:
+        return f"{count // 1000}k"
+    return str(count)
+
+
+def measure(op: Callable[[], object], min_time_s: float, repeat: int) -> float:
+    """
+    :return: operations per second, best of `repeat` runs of at least min_time_s each
+    """
+    loops = 1
+    while True:
+        started = perf_counter()
+        for _ in range(loops):
+            op()
+        elapsed = perf_counter() - started
+        if elapsed >= min_time_s:
+            break
+        loops = max(loops * 2, int(loops * min_time_s / max(elapsed, 1e-9) * 1.2))
+    best = loops / elapsed
+    # A single operation that already takes seconds (1M lists) is not repeated.
+    runs = repeat - 1 if elapsed < 1.0 else 0
+    for _ in range(runs):
+        started = perf_counter()
+        for _ in range(loops):
+            op()
+        best = max(best, loops / (perf_counter() - started))
+    return best
+
+
+def environment() -> dict:
+    return {
+        "python": f"{platform.python_implementation()} {platform.python_version()}",
+        "machine": platform.machine(),
+        "system": platform.system(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def load_baseline(path: Path) -> dict | None:
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def compare(result: dict, baseline_case: dict | None, threshold: float, compare_speed: bool) -> list[str]:
+    """
+    Adds the baseline numbers to result.
+    :return: the regressions of this case (empty if none)
+    """
+    if baseline_case is None:
+        result["baseline"] = "missing"
+        return []
+    regressions = []
+    baseline_ops = baseline_case["ops_per_s"]
+    result["baseline_ops_per_s"] = baseline_ops
+    result["change"] = round(result["ops_per_s"] / baseline_ops - 1.0, 3)
+    if compare_speed and result["change"] < -threshold:
+        regressions.append(f"{result['case']}: {result['change']:+.1%} ops/s ({baseline_ops:.0f} -> {result['ops_per_s']:.0f})")
+    if result["bytes_per_op"] > baseline_case["bytes_per_op"]:
+        regressions.append(f"{result['case']}: encoded size grew ({baseline_case['bytes_per_op']} -> {result['bytes_per_op']} bytes)")
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="localchat.net serialization micro-benchmarks")
+    parser.add_argument("--cases", nargs="+", default=["*"], help="case name patterns (fnmatch, substring if no wildcard)")
+    parser.add_argument("--list-size", type=int, default=1_000_000, help="messages in the large user message list")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per measured run")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.25, help="tolerated ops/s drop (0.25 = 25%%)")
+    parser.add_argument("--strict", action="store_true", help="compare ops/s even if the baseline environment differs")
+    parser.add_argument("--update-baseline", action="store_true", help="write the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    patterns = [pattern if any(char in pattern for char in "*?[") else f"*{pattern}*" for pattern in args.cases]
+    cases = [case for case in _build_cases(args.list_size) if any(fnmatch(case.name, pattern) for pattern in patterns)]
+    baseline = load_baseline(args.baseline)
+    baseline_cases = {} if baseline is None else baseline.get("cases", {})
+    same_environment = baseline is not None and baseline.get("environment") == environment()
+    compare_speed = same_environment or args.strict
+    if baseline is not None and not compare_speed:
+        print(
+            f"note: baseline was recorded on {baseline.get('environment')}, this is {environment()}; "
+            "only encoded sizes are compared (use --strict to compare ops/s anyway)",
+            file=sys.stderr,
+        )
+
+    measured: dict[str, dict] = {}
+    regressions: list[str] = []
+    for case in cases:
+        result = {
+            "case": case.name,
+            "ops_per_s": round(measure(case.op, args.min_time, args.repeat), 1),
+            "bytes_per_op": case.bytes_per_op,
+        }
+        if not args.update_baseline and baseline is not None:
+            regressions.extend(compare(result, baseline_cases.get(case.name), args.threshold, compare_speed))
+        measured[case.name] = {"ops_per_s": result["ops_per_s"], "bytes_per_op": result["bytes_per_op"]}
+        emit(result)
+
+    if args.update_baseline:
+        # Cases that were not selected this time keep their old numbers.
+        merged = dict(baseline_cases) if baseline is not None and same_environment else {}
+        merged.update(measured)
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump({"environment": environment(), "cases": dict(sorted(merged.items()))}, file, indent=2, sort_keys=True)
+            file.write("\n")
+        emit({"baseline_written": str(args.baseline), "cases": len(measured)})
+        return 0
+
+    emit({"cases": len(measured), "regressions": len(regressions), "speed_compared": compare_speed and baseline is not None})
+    if len(regressions) > 0:
+        print("", file=sys.stderr)
+        print(f"REGRESSION: {len(regressions)} serialization case(s) got worse than {args.baseline}:", file=sys.stderr)
+        for regression in regressions:
+            print(f"  {regression}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,93 @@
+"""
+Compares the thread-per-client TcpServerLogic with the event-loop AsyncTcpServerLogic.
+
+Reports per implementation and client count:
+- connected: clients that completed the join handshake
+- server_threads: threads alive while all clients are connected
+- rss_delta_bytes: RSS growth caused by the connected sessions
+- broadcast_p50_ms / broadcast_p99_ms: time until every client received one system broadcast
+
+Run: python -m test.benchmarks.bench_server_core --clients 100 1000
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+from threading import active_count
+from time import perf_counter, sleep
+
+from localchat.config.defaults import HARD_MAX_CLIENTS
+from localchat.net import tcp_protocol
+from localchat.server.logicImpl import AsyncTcpServerLogic, TcpServerLogic
+from test.benchmarks._support import ClientPool, emit, percentile, raise_fd_limit, rss_bytes
+
+
+_IMPLEMENTATIONS = {
+    "threaded": (TcpServerLogic, HARD_MAX_CLIENTS),
+    "async": (AsyncTcpServerLogic, None),
+}
+
+
+def run_case(name: str, client_count: int, rounds: int) -> dict:
+    server_type, hard_limit = _IMPLEMENTATIONS[name]
+    if hard_limit is not None and client_count > hard_limit:
+        return {"impl": name, "clients": client_count, "skipped": f"hard limit is {hard_limit}"}
+
+    gc.collect()
+    threads_before = active_count()
+    server = server_type(host="127.0.0.1", port=0, max_clients=client_count)
+    server.start()
+    port = server.get_server_info().get_port()
+    pool = ClientPool()
+    try:
+        rss_before = rss_bytes()
+        join_started = perf_counter()
+        for idx in range(client_count):
+            pool.join("127.0.0.1", port, f"bench-{idx}")
+            if idx % 64 == 63:
+                pool.drain(0.0)
+        join_seconds = perf_counter() - join_started
+        pool.drain()
+        sleep(0.1)
+        rss_after = rss_bytes()
+        server_threads = active_count() - threads_before
+
+        latencies_ms: list[float] = []
+        for round_idx in range(rounds):
+            started = perf_counter()
+            server.post_system_message(f"round {round_idx}")
+            if not pool.wait_for_type(tcp_protocol.PT_S_PUBLIC, 1):
+                raise IOError("broadcast did not reach every client")
+            latencies_ms.append((perf_counter() - started) * 1000.0)
+
+        return {
+            "impl": name,
+            "clients": client_count,
+            "connected": len(server.list_members()),
+            "join_seconds": round(join_seconds, 3),
+            "server_threads": server_threads,
+            "rss_delta_bytes": rss_after - rss_before,
+            "broadcast_p50_ms": round(percentile(latencies_ms, 0.50), 3),
+            "broadcast_p99_ms": round(percentile(latencies_ms, 0.99), 3),
+        }
+    finally:
+        pool.close()
+        server.stop()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="threaded vs. event-loop server core")
+    parser.add_argument("--clients", type=int, nargs="+", default=[50, 120, 1000])
+    parser.add_argument("--rounds", type=int, default=30)
+    parser.add_argument("--impl", choices=sorted(_IMPLEMENTATIONS), nargs="+", default=sorted(_IMPLEMENTATIONS))
+    args = parser.parse_args(argv)
+
+    raise_fd_limit()
+    for client_count in args.clients:
+        for name in args.impl:
+            emit(run_case(name, client_count, args.rounds))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
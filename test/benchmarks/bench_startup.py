@@ -0,0 +1,214 @@
+"""
+Start-up cost of the localchat entry points, checked against a baseline.
+
+Every case runs in a fresh interpreter with -X importtime:
+- package: `import localchat`
+- server: `python -m localchat serve --port 0` until it prints that it is serving
+- client: the imports of `python -m localchat start` (CLI menu, tcp client logic, settings),
+  without running the interactive UI
+
+Reports per case (one JSON line each, best of --repeat runs):
+- ready_ms: wall time from spawning the interpreter until the case is ready
+- import_ms: sum of all module import times reported by -X importtime
+- modules / localchat_modules: modules imported by then (all / localchat.*)
+- rss_bytes: resident set size once ready (Linux only, 0 elsewhere)
+- forbidden: modules the case must not import (server: client, settings and test code;
+  client: server and test code; package: client, server and settings)
+
+A case regresses if it imports a forbidden module, or if ready_ms, import_ms or rss_bytes
+grow by more than --threshold over the baseline. Times and RSS are only compared when the
+baseline was recorded in the same environment, unless --strict. On a regression the script
+prints it to stderr and exits with status 1.
+
+Run: python -m test.benchmarks.bench_startup [--repeat 5] [--update-baseline]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import signal
+import subprocess
+import sys
+from pathlib import Path
+from time import perf_counter
+
+from test.benchmarks._support import emit
+from test.benchmarks.bench_serialization import environment, load_baseline
+
+
+DEFAULT_BASELINE = Path(__file__).with_name("baselines") / "startup.json"
+_READY_TIMEOUT_S = 30.0
+_ROOT = Path(__file__).resolve().parents[2]
+_REPORT_RSS = (
+    "try:\n"
+    "    rss = int(open('/proc/self/statm').read().split()[1]) * __import__('os').sysconf('SC_PAGE_SIZE')\n"
+    "except OSError:\n"
+    "    rss = 0\n"
+    "print('ready', rss, flush=True)\n"
+)
+_CLIENT_IMPORTS = (
+    "import localchat.__main__\n"
+    "from localchat.client.UIImpl.CLI import CLIMenuUI\n"
+    "from localchat.client.logicImpl import TcpClientLogic\n"
+    "from localchat.settings import SettingsStore\n"
+)
+_TEST_CODE = ("localchat.client.logicImpl.testing", "localchat.net.TestSerializable")
+_CASES = {
+    "package": (
+        ["-c", "import localchat\n" + _REPORT_RSS],
+        ("localchat.client", "localchat.server", "localchat.settings"),
+    ),
+    "server": (
+        ["-m", "localchat", "serve", "--host", "127.0.0.1", "--port", "0"],
+        ("localchat.client", "localchat.settings") + _TEST_CODE,
+    ),
+    "client": (
+        ["-c", _CLIENT_IMPORTS + _REPORT_RSS],
+        ("localchat.server",) + _TEST_CODE,
+    ),
+}
+
+
+def _proc_rss(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status", "r") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def run_once(args: list[str]) -> dict:
+    started = perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=_ROOT,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        line = process.stdout.readline()
+        ready_ms = (perf_counter() - started) * 1000
+        if line.startswith("ready "):
+            rss = int(line.split()[1])
+        elif line.startswith("serving "):
+            rss = _proc_rss(process.pid)
+            process.send_signal(signal.SIGTERM)
+        else:
+            process.kill()
+            _, stderr = process.communicate(timeout=_READY_TIMEOUT_S)
+            raise RuntimeError(f"{' '.join(args)} did not become ready: {line!r} {stderr[-2000:]}")
+        _, stderr = process.communicate(timeout=_READY_TIMEOUT_S)
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+    import_us = 0
+    modules: list[str] = []
+    for entry in stderr.splitlines():
+        if not entry.startswith("import time:") or "[us]" in entry:
+            continue
+        self_us, _cumulative, name = entry[len("import time:"):].split("|")
+        import_us += int(self_us)
+        modules.append(name.strip())
+    return {
+        "ready_ms": round(ready_ms, 1),
+        "import_ms": round(import_us / 1000, 1),
+        "modules": len(modules),
+        "localchat_modules": sum(1 for name in modules if name == "localchat" or name.startswith("localchat.")),
+        "rss_bytes": rss,
+        "imported": modules,
+    }
+
+
+def measure(args: list[str], repeat: int) -> dict:
+    runs = [run_once(args) for _ in range(repeat)]
+    best = min(runs, key=lambda run: run["ready_ms"])
+    best["import_ms"] = min(run["import_ms"] for run in runs)
+    best["rss_bytes"] = min(run["rss_bytes"] for run in runs)
+    return best
+
+
+def compare(result: dict, baseline_case: dict | None, threshold: float, compare_resources: bool) -> list[str]:
+    """
+    Adds the baseline numbers to result.
+    :return: the regressions of this case (empty if none)
+    """
+    regressions = [f"{result['case']}: imports {name}" for name in result["forbidden"]]
+    if baseline_case is None:
+        result["baseline"] = "missing"
+        return regressions
+    for key in ("ready_ms", "import_ms", "rss_bytes"):
+        before = baseline_case[key]
+        result[f"baseline_{key}"] = before
+        if not compare_resources or before <= 0:
+            continue
+        change = result[key] / before - 1.0
+        if change > threshold:
+            regressions.append(f"{result['case']}: {key} {change:+.1%} ({before} -> {result[key]})")
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="localchat start-up time and RSS")
+    parser.add_argument("--cases", nargs="+", choices=sorted(_CASES), default=list(_CASES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.25, help="tolerated growth (0.25 = 25%%)")
+    parser.add_argument("--strict", action="store_true", help="compare times and RSS even if the baseline environment differs")
+    parser.add_argument("--update-baseline", action="store_true", help="write the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    baseline = load_baseline(args.baseline)
+    baseline_cases = {} if baseline is None else baseline.get("cases", {})
+    same_environment = baseline is not None and baseline.get("environment") == environment()
+    compare_resources = same_environment or args.strict
+    if baseline is not None and not compare_resources:
+        print(
+            f"note: baseline was recorded on {baseline.get('environment')}, this is {environment()}; "
+            "only forbidden imports are checked (use --strict to compare times and RSS anyway)",
+            file=sys.stderr,
+        )
+
+    measured: dict[str, dict] = {}
+    regressions: list[str] = []
+    for name in args.cases:
+        case_args, forbidden_prefixes = _CASES[name]
+        run = measure(case_args, args.repeat)
+        imported = run.pop("imported")
+        result = {"case": name, **run}
+        result["forbidden"] = sorted(
+            module for module in imported
+            if any(module == prefix or module.startswith(prefix + ".") for prefix in forbidden_prefixes)
+        )
+        if not args.update_baseline:
+            regressions.extend(compare(result, baseline_cases.get(name), args.threshold, compare_resources))
+        measured[name] = {key: run[key] for key in ("ready_ms", "import_ms", "modules", "localchat_modules", "rss_bytes")}
+        emit(result)
+
+    if args.update_baseline:
+        merged = dict(baseline_cases) if baseline is not None and same_environment else {}
+        merged.update(measured)
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump({"environment": environment(), "cases": dict(sorted(merged.items()))}, file, indent=2, sort_keys=True)
+            file.write("\n")
+        emit({"baseline_written": str(args.baseline), "cases": len(measured)})
+        return 0
+
+    emit({"cases": len(measured), "regressions": len(regressions), "resources_compared": compare_resources and baseline is not None})
+    if len(regressions) > 0:
+        print("", file=sys.stderr)
+        print(f"REGRESSION: {len(regressions)} start-up case(s) got worse than {args.baseline}:", file=sys.stderr)
+        for regression in regressions:
+            print(f"  {regression}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
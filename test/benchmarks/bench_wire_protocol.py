@@ -0,0 +1,128 @@
+"""
+Wire protocol v1 vs. v2 on realistic chat traffic.
+
+The traffic is a mix of short and medium public messages from a handful of
+senders, as a server broadcasts them. v2 sends each sender's record once
+(PT_S_USER_DEFINED) and afterwards only its handle; that one-off cost is
+included in the byte count.
+
+Reports per version: bytes per message on the wire (including the 4 byte
+frame), encode and decode time per message.
+
+Run: python -m test.benchmarks.bench_wire_protocol --messages 20000
+"""
+from __future__ import annotations
+
+import argparse
+import random
+from io import BytesIO
+from time import perf_counter, time
+from uuid import uuid4
+
+from localchat.net import SerializableUser, SerializableUserMessage, tcp_protocol
+from test.benchmarks._support import emit
+
+
+_TEXTS = (
+    "ok",
+    "bin gleich da",
+    "hat jemand die Folien von heute?",
+    "lol",
+    "Treffen wir uns um 14 Uhr in der Mensa oder lieber danach in der Bibliothek?",
+    "👍",
+)
+
+
+def _make_traffic(message_count: int, sender_count: int) -> list[SerializableUserMessage]:
+    rng = random.Random(7)
+    senders = [SerializableUser(uuid4(), f"user-{idx}") for idx in range(sender_count)]
+    return [
+        SerializableUserMessage(rng.choice(senders), rng.choice(_TEXTS), time())
+        for _ in range(message_count)
+    ]
+
+
+def _encode_v1(messages: list[SerializableUserMessage]) -> list[bytes]:
+    return [tcp_protocol.encode_server_public_message(message) for message in messages]
+
+
+def _encode_v2(messages: list[SerializableUserMessage]) -> list[bytes]:
+    handles: dict = {}
+    payloads: list[bytes] = []
+    for message in messages:
+        sender = message.sender()
+        handle = handles.get(sender.get_id())
+        if handle is None:
+            handle = len(handles)
+            handles[sender.get_id()] = handle
+            payloads.append(tcp_protocol.encode_server_user_defined_v2(handle, sender))
+        payloads.append(tcp_protocol.encode_server_public_message_v2(handle, message))
+    return payloads
+
+
+def _decode_v1(payloads: list[bytes]) -> int:
+    for payload in payloads:
+        SerializableUserMessage.deserialize(BytesIO(payload[1:]))
+    return len(payloads)
+
+
+def _decode_v2(payloads: list[bytes]) -> int:
+    users_by_handle = {}
+    decoded = 0
+    for payload in payloads:
+        if payload[0] == tcp_protocol.PT_S_USER_DEFINED:
+            handle, user = tcp_protocol.decode_user_record_v2(BytesIO(payload[1:]))
+            users_by_handle[handle] = user
+        else:
+            tcp_protocol.decode_user_message_v2(BytesIO(payload[1:]), users_by_handle)
+            decoded += 1
+    return decoded
+
+
+_CODECS = {
+    "v1": (_encode_v1, _decode_v1),
+    "v2": (_encode_v2, _decode_v2),
+}
+
+
+def run_case(version: str, message_count: int, sender_count: int) -> dict:
+    encode, decode = _CODECS[version]
+    messages = _make_traffic(message_count, sender_count)
+    for message in messages:
+        # Encode-once: the v1 payload reuses this cache, so warm it outside the timing for both versions.
+        message.encoded()
+
+    started = perf_counter()
+    payloads = encode(messages)
+    encode_seconds = perf_counter() - started
+
+    started = perf_counter()
+    decoded = decode(payloads)
+    decode_seconds = perf_counter() - started
+    if decoded != message_count:
+        raise IOError("decoded message count does not match")
+
+    wire_bytes = sum(4 + len(payload) for payload in payloads)
+    return {
+        "version": version,
+        "messages": message_count,
+        "senders": sender_count,
+        "bytes_per_message": round(wire_bytes / message_count, 2),
+        "encode_us_per_message": round(encode_seconds * 1_000_000.0 / message_count, 2),
+        "decode_us_per_message": round(decode_seconds * 1_000_000.0 / message_count, 2),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="wire protocol v1 vs. v2")
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--senders", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    for version in sorted(_CODECS):
+        emit(run_case(version, args.messages, args.senders))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,3 +1,5 @@
+from . import bench
 from . import client
 from . import net
-from . import server
\ No newline at end of file
+from . import server
+from . import util
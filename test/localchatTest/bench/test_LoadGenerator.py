@@ -0,0 +1,84 @@
+from contextlib import redirect_stderr
+from io import StringIO
+from socket import AF_INET, SOCK_STREAM, socket
+from unittest import TestCase
+
+from localchat.__main__ import main
+from localchat.bench import LoadProfile, run_load
+
+
+def _loopback_available() -> bool:
+    probe = socket(AF_INET, SOCK_STREAM)
+    try:
+        probe.bind(("127.0.0.1", 0))
+    except PermissionError:
+        return False
+    finally:
+        probe.close()
+    return True
+
+
+_SHORT = dict(duration_s=0.5, warmup_s=0.1, drain_s=0.5, processes=1)
+
+
+class TestLoadGenerator(TestCase):
+    def test_invalid_profiles_are_rejected(self):
+        for profile in (
+            LoadProfile(clients=0),
+            LoadProfile(server="threaded", clients=1000),
+            LoadProfile(size=4),
+            LoadProfile(private_ratio=1.5),
+            LoadProfile(rate=0),
+            LoadProfile(protocol_version=3),
+            LoadProfile(server_workers=0),
+            LoadProfile(server_workers=2, lock_profiling=True),
+        ):
+            with self.assertRaises(ValueError):
+                profile.validate()
+
+    def test_cli_reports_usage_errors(self):
+        with redirect_stderr(StringIO()) as errors, self.assertRaises(SystemExit):
+            main(["bench", "--size", "3"])
+        self.assertIn("size must be in range", errors.getvalue())
+
+    def test_every_message_is_delivered_and_measured(self):
+        if not _loopback_available():
+            self.skipTest("local tcp sockets are not available in this environment")
+        for server, protocol_version in (("async", 2), ("threaded", 1)):
+            with self.subTest(server=server):
+                result = run_load(LoadProfile(
+                    clients=4,
+                    rate=20.0,
+                    private_ratio=0.5,
+                    server=server,
+                    protocol_version=protocol_version,
+                    **_SHORT,
+                ))
+                self.assertGreater(result["sent_public"], 0)
+                self.assertGreater(result["sent_private"], 0)
+                self.assertEqual(result["delivery_ratio"], 1.0)
+                self.assertEqual(
+                    result["received_public"] + result["received_private"],
+                    result["sent_public"] * 4 + result["sent_private"],
+                )
+                self.assertEqual((result["errors"], result["disconnected"]), (0, 0))
+                self.assertGreater(result["latency_p999_ms"], 0.0)
+                self.assertGreaterEqual(result["latency_p999_ms"], result["latency_p50_ms"])
+                self.assertGreater(result["server_rss_bytes"], 0)
+
+    def test_server_workers_deliver_across_processes(self):
+        if not _loopback_available():
+            self.skipTest("local tcp sockets are not available in this environment")
+        result = run_load(LoadProfile(clients=6, rate=20.0, private_ratio=0.5, rooms=2, server_workers=2, **_SHORT))
+        self.assertGreater(result["sent_private"], 0)
+        self.assertEqual(result["delivery_ratio"], 1.0)
+        self.assertEqual((result["errors"], result["disconnected"]), (0, 0))
+        self.assertGreater(result["server_cpu_s"], 0.0)
+        self.assertGreater(result["server_rss_bytes"], 0)
+
+    def test_server_rate_limit_applies_when_set(self):
+        if not _loopback_available():
+            self.skipTest("local tcp sockets are not available in this environment")
+        result = run_load(LoadProfile(clients=2, rate=50.0, server_rate_limit=0.5, **_SHORT))
+        self.assertGreater(result["errors"], 0)
+        self.assertLess(result["delivery_ratio"], 1.0)
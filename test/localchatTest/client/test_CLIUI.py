@@ -161,6 +161,9 @@ class _DummyChat(Chat):
     def download_chat(self, output_stream: BinaryIOBase):
         raise NotImplementedError()
 
+    def replay_history(self, limit: int = 0) -> int:
+        raise NotImplementedError()
+
     def get_server_user(self) -> User:
         return self._server_user
 
@@ -336,6 +339,42 @@ class TestCLIUI(TestCase):
         self.assertEqual(recipient.get_id(), chat.get_server_user().get_id())
         self.assertEqual(message, "/kick Bob")
 
+    def test_cli_chat_history_writes_a_replayed_burst_at_once(self):
+        output = _Output()
+        reader = _Reader(["/history 2", "/history x", "/leave"])
+
+        class _ChatWithHistory(_DummyChat):
+            def __init__(self):
+                super().__init__("demo")
+                self.replay_limits: list[int] = []
+
+            def replay_history(self, limit: int = 0) -> int:
+                self.replay_limits.append(limit)
+                sender = _DummyUser(uuid4(), "Alice")
+                events = [Event(self.get_chat_info().get_id(), _DummyUserMessage(sender, text)) for text in ("one", "two")]
+                self.on_user_posted_message().handle_all(events)
+                return len(events)
+
+        chat = _ChatWithHistory()
+        settings = AppSettings.default()
+        settings.show_timestamps = False
+        ui = CLIChatUI(chat, _DummyUser(uuid4(), "tester"), settings, input_reader=reader, output_writer=output)
+        ui.run()
+
+        self.assertEqual(chat.replay_limits, [2])
+        self.assertIn("Alice: one\nAlice: two", output.items)
+        self.assertIn("Usage: /history [count]", output.items)
+        self.assertEqual(chat.private_messages, [])
+
+    def test_cli_chat_history_without_a_chat_history_is_not_forwarded(self):
+        output = _Output()
+        chat = _DummyChat("demo")
+        ui = CLIChatUI(chat, _DummyUser(uuid4(), "tester"), AppSettings.default(), input_reader=_Reader(["/history", "/leave"]), output_writer=output)
+        ui.run()
+
+        self.assertIn("This chat keeps no history.", output.items)
+        self.assertEqual(chat.private_messages, [])
+
     def test_cli_chat_displays_host_change_metadata(self):
         output = _Output()
         chat = _DummyChat("demo")
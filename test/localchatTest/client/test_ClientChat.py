@@ -107,6 +107,9 @@ class _DummyChat(AbstractChat):
     def download_chat(self, output_stream: BinaryIOBase):
         raise NotImplementedError()
 
+    def replay_history(self, limit: int = 0) -> int:
+        raise NotImplementedError()
+
     def get_server_user(self) -> User:
         return self._server_user
 
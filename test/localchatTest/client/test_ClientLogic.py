@@ -39,6 +39,9 @@ class _DummyLogicChat(AbstractChat):
     def download_chat(self, output_stream: BinaryIOBase):
         raise NotImplementedError()
 
+    def replay_history(self, limit: int = 0) -> int:
+        raise NotImplementedError()
+
     def get_server_user(self) -> User:
         return SerializableUser(uuid4(), "server")
 
@@ -1,12 +1,13 @@
-from socket import AF_INET, SOCK_STREAM, SOL_SOCKET, SO_REUSEADDR, socket
+from io import BytesIO
+from socket import AF_INET, SOCK_STREAM, SOL_SOCKET, SO_REUSEADDR, socket, socketpair
 from threading import Event as ThreadEvent, Thread
 from time import sleep, time
 from unittest import TestCase
 from uuid import uuid4
 
 from localchat.client.logicImpl import TcpChat
-from localchat.net import SerializableUser, tcp_protocol
-from localchat.server.logicImpl import TcpServerLogic
+from localchat.net import BufferReader, SerializableUser, SerializableUserMessage, SerializableUserMessageList, tcp_protocol
+from localchat.server.logicImpl import ChatLog, TcpServerLogic
 from localchat.util.event import Event, EventListener
 
 
@@ -30,6 +31,17 @@ class _Collector(EventListener):
         self.items.append(event.value())
 
 
+class _BatchCollector(EventListener):
+    def __init__(self):
+        self.batches = []
+
+    def on_event(self, event: Event):
+        self.on_events([event])
+
+    def on_events(self, events: list[Event]):
+        self.batches.append([event.value().message() for event in events])
+
+
 class TestTcpChat(TestCase):
     @staticmethod
     def _wait_for(predicate, timeout_s: float = 2.0):
@@ -40,6 +52,43 @@ class TestTcpChat(TestCase):
             sleep(0.01)
         return False
 
+    def test_decoded_senders_are_shared_and_members_only_change_on_rename(self):
+        chat = TcpChat(uuid4(), "chat", "127.0.0.1", 6553)
+        user_id = uuid4()
+        members = chat._members_by_id
+        senders = []
+        for name in ("Alice", "Alice", "Alicia"):
+            message = SerializableUserMessage(SerializableUser(user_id, name), "hi", time())
+            payload = tcp_protocol.encode_server_public_message(message)
+            chat._handle_packet(payload[0], BufferReader(payload[1:]))
+            senders.append(members[user_id])
+        self.assertIs(senders[0], senders[1])
+        self.assertIsNot(senders[1], senders[2])
+        self.assertEqual(senders[2].get_name(), "Alicia")
+
+    def test_buffered_public_messages_reach_listeners_as_one_burst(self):
+        chat = TcpChat(uuid4(), "chat", "127.0.0.1", 6553)
+        local, remote = socketpair()
+        batches = _BatchCollector()
+        joined = _Collector()
+        chat.on_user_posted_message().add_listener(batches)
+        chat.on_user_joined().add_listener(joined)
+        chat._socket = local
+        chat._receiver = tcp_protocol.PacketReceiver(local)
+        sender = SerializableUser(uuid4(), "Alice")
+        payloads = [
+            tcp_protocol.encode_server_public_message(SerializableUserMessage(sender, f"m{idx}", time()))
+            for idx in range(3)
+        ]
+        payloads.append(tcp_protocol.encode_server_user_joined(SerializableUser(uuid4(), "Bob")))
+        payloads.append(tcp_protocol.encode_server_public_message(SerializableUserMessage(sender, "m3", time())))
+        remote.sendall(b"".join(len(payload).to_bytes(4, "big") + payload for payload in payloads))
+        remote.close()
+        chat._recv_loop()
+        # The join event splits the burst, so the order of events is kept.
+        self.assertEqual(batches.batches, [["m0", "m1", "m2"], ["m3"]])
+        self.assertEqual([user.get_name() for user in joined.items], ["Bob"])
+
     def test_post_before_join_raises(self):
         chat = TcpChat(uuid4(), "chat", "127.0.0.1", 6553)
         with self.assertRaises(RuntimeError):
@@ -89,6 +138,97 @@ class TestTcpChat(TestCase):
             c2.leave()
             server.stop()
 
+    def test_large_messages_with_and_without_compression(self):
+        port = _find_free_port()
+        if port is None:
+            self.skipTest("local tcp sockets are not available in this environment")
+
+        server = TcpServerLogic(host="127.0.0.1", port=port)
+        server.start()
+        sleep(0.05)
+
+        chat_id = uuid4()
+        zipped = TcpChat(chat_id, "chat", "127.0.0.1", port)
+        plain = TcpChat(chat_id, "chat", "127.0.0.1", port, compression=False)
+        a1 = SerializableUser(uuid4(), "Alice")
+        a2 = SerializableUser(uuid4(), "Bob")
+        zipped_public = _Collector()
+        plain_public = _Collector()
+        plain_private = _Collector()
+        zipped.on_user_posted_message().add_listener(zipped_public)
+        plain.on_user_posted_message().add_listener(plain_public)
+        plain.on_user_send_private_message().add_listener(plain_private)
+
+        texts = [f"{idx}: " + "ein langer, sich wiederholender Chattext " * 200 for idx in range(3)]
+        try:
+            zipped.join(a1)
+            plain.join(a2)
+            sleep(0.05)
+            for text in texts:
+                zipped.post_message(text)
+            zipped.send_private_message(a2, texts[0])
+            plain.post_message(texts[1])
+
+            def by_sender(collector: _Collector, user: SerializableUser) -> list[str]:
+                return [m.message() for m in collector.items if m.sender().get_id() == user.get_id()]
+
+            for collector in (plain_public, zipped_public):
+                self.assertTrue(self._wait_for(lambda: len(collector.items) >= 4))
+                self.assertEqual(by_sender(collector, a1), texts)
+                self.assertEqual(by_sender(collector, a2), [texts[1]])
+            self.assertTrue(self._wait_for(lambda: len(plain_private.items) >= 1))
+            self.assertEqual(plain_private.items[-1].message(), texts[0])
+        finally:
+            zipped.leave()
+            plain.leave()
+            server.stop()
+
+    def test_late_joiner_pages_through_history_and_downloads_it(self):
+        port = _find_free_port()
+        if port is None:
+            self.skipTest("local tcp sockets are not available in this environment")
+
+        chat_log = ChatLog(max_messages=16)
+        server = TcpServerLogic(host="127.0.0.1", port=port, chat_log=chat_log)
+        server.start()
+        sleep(0.05)
+        # Every tenth message is large, so pages are also cut by the byte cap.
+        texts = [f"{idx} " + ("x" * 20_000 if idx % 10 == 0 else "hallo") for idx in range(300)]
+        for text in texts:
+            server.post_system_message(text)
+
+        late = TcpChat(uuid4(), "chat", "127.0.0.1", port, compression=False)
+        try:
+            late.join(SerializableUser(uuid4(), "Late"))
+            first_seq, log_length, page = late.fetch_history(tcp_protocol.HISTORY_LAST, limit=5)
+            self.assertEqual((first_seq, log_length), (295, 300))
+            self.assertEqual([m.message() for m in page], texts[295:])
+
+            first_seq, _, page = late.fetch_history(tcp_protocol.HISTORY_BEFORE_SEQ, 100)
+            self.assertEqual(first_seq + len(page), 100)
+            self.assertLess(len(page), 100)
+            self.assertEqual([m.message() for m in page], texts[first_seq:100])
+
+            timestamp = page[-1].timestamp()
+            first_seq, _, page = late.fetch_history(tcp_protocol.HISTORY_FROM_TIME, timestamp, 1)
+            self.assertLessEqual(first_seq, 99)
+            self.assertEqual(page[0].timestamp(), timestamp)
+
+            replayed = _BatchCollector()
+            late.on_user_posted_message().add_listener(replayed)
+            self.assertEqual(late.replay_history(3), 3)
+            self.assertEqual(replayed.batches, [texts[297:]])
+
+            output = BytesIO()
+            late.download_chat(output)
+            output.seek(0)
+            restored = SerializableUserMessageList.deserialize(output, 100, 100_000)
+            self.assertEqual([m.message() for m in restored.items], texts)
+        finally:
+            late.leave()
+            server.stop()
+            chat_log.close()
+
     def test_unknown_packets_warn_and_disconnect_after_threshold(self):
         port = _find_free_port()
         if port is None:
@@ -5,6 +5,7 @@ from localchat.client import UI
 from localchat.client.logicImpl import TcpClientLogic, TcpChat, TcpChatInformation
 from localchat.net.discovery import DiscoveredServer
 from localchat.util import Chat
+from localchat.util.event import Event, EventListener
 
 
 class _DummyUI(UI):
@@ -26,6 +27,14 @@ class _DummyUI(UI):
         self.stopped = True
 
 
+class _ValueListener(EventListener):
+    def __init__(self, callback):
+        self._callback = callback
+
+    def on_event(self, event: Event):
+        self._callback(event.value())
+
+
 class _LeaveSpyChat(Chat):
     def __init__(self):
         super().__init__()
@@ -55,6 +64,9 @@ class _LeaveSpyChat(Chat):
     def download_chat(self, output_stream):
         raise NotImplementedError()
 
+    def replay_history(self, limit=0):
+        raise NotImplementedError()
+
     def get_server_user(self):
         raise NotImplementedError()
 
@@ -158,6 +170,31 @@ class TestTcpClientLogic(TestCase):
         self.assertEqual(chat.get_chat_info().get_port(), 51121)
         self.assertEqual(str(chat.get_chat_info().get_ip_address()), "127.0.0.1")
 
+    def test_chats_share_one_event_dispatcher_unless_disabled(self):
+        logic = TcpClientLogic(discovery_scanner=_DummyScanner())
+        first = logic.connect_direct("127.0.0.1", 51125)
+        second = logic.connect_direct("127.0.0.1", 51126)
+        dispatcher = first.on_user_posted_message().get_dispatcher()
+        self.assertIsNotNone(dispatcher)
+        self.assertIs(first.on_user_joined().get_dispatcher(), dispatcher)
+        self.assertIs(second.on_connection_failure().get_dispatcher(), dispatcher)
+
+        sync_logic = TcpClientLogic(discovery_scanner=_DummyScanner(), async_events=False)
+        self.assertIsNone(sync_logic.connect_direct("127.0.0.1", 51127).on_user_posted_message().get_dispatcher())
+
+    def test_failing_event_listeners_reach_on_error(self):
+        logic = TcpClientLogic(discovery_scanner=_DummyScanner())
+        chat = logic.connect_direct("127.0.0.1", 51128)
+        errors = []
+        logic.on_error().add_listener(_ValueListener(errors.append))
+        chat.on_user_joined().add_listener(_ValueListener(lambda user: 1 / 0))
+        chat.on_user_joined().handle(Event(uuid4(), None))
+        dispatcher = chat.on_user_joined().get_dispatcher()
+        self.assertTrue(dispatcher.wait_idle(5.0))
+        self.assertEqual(dispatcher.failed(), 1)
+        self.assertEqual([type(error) for error in errors], [ZeroDivisionError])
+        logic.shutdown_impl()
+
     def test_connect_direct_validates_host_and_port(self):
         logic = TcpClientLogic(discovery_scanner=_DummyScanner())
         with self.assertRaises(ValueError):
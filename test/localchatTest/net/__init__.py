@@ -5,4 +5,7 @@ from . import test_SerializableValidation
 from . import test_TcpChatErrors
 from . import test_TcpChatPath
 from . import test_TcpProtocolCodec
+from . import test_PacketReceiver
+from . import test_PacketSender
+from . import test_UserInterner
 from . import discovery
\ No newline at end of file
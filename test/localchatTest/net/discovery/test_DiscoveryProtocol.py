@@ -34,6 +34,23 @@ class TestDiscoveryProtocol(TestCase):
         decoded = decode_discovery_response(payload)
         self.assertEqual(decoded, res)
 
+    def test_response_rooms_are_optional(self):
+        res = DiscoveryResponse(
+            nonce=uuid4(),
+            server=DiscoveredServer(uuid4(), "my-server", "127.0.0.1", 51121, rooms=("lobby", "team-a")),
+        )
+        self.assertEqual(decode_discovery_response(encode_discovery_response(res)), res)
+
+        legacy = (
+            '{"v":1,"kind":"discover_response","nonce":"%s","server_id":"%s",'
+            '"server_name":"old","host":"127.0.0.1","port":51121}' % (uuid4(), uuid4())
+        )
+        self.assertEqual(decode_discovery_response(legacy.encode("utf-8")).server.rooms, ())
+        with self.assertRaises(IOError):
+            decode_discovery_response(legacy[:-1].encode("utf-8") + b',"rooms":[""]}')
+        with self.assertRaises(IOError):
+            decode_discovery_response(legacy[:-1].encode("utf-8") + b',"rooms":"lobby"}')
+
     def test_request_validation(self):
         with self.assertRaises(IOError):
             decode_discovery_request(b"{}")
@@ -0,0 +1,99 @@
+from socket import socketpair
+from threading import Thread
+from unittest import TestCase
+from uuid import uuid4
+
+from localchat.net import BufferReader, SerializableUser, SerializableUserMessage, tcp_protocol
+
+
+def _frame(payload: bytes) -> bytes:
+    return len(payload).to_bytes(4, "big") + payload
+
+
+class TestBufferReader(TestCase):
+    def test_views_do_not_copy_and_respect_bounds(self):
+        data = bytearray(b"abcdef")
+        reader = BufferReader(data)
+        view = reader.read_view(3)
+        data[0] = ord("x")
+        self.assertEqual(bytes(view), b"xbc")
+        self.assertEqual(reader.read_byte(), ord("d"))
+        self.assertEqual((reader.tell(), reader.remaining()), (4, 2))
+        with self.assertRaises(IOError):
+            reader.read_view(3)
+        self.assertEqual(reader.read(), b"ef")
+        self.assertEqual(reader.read_byte(), -1)
+
+    def test_serializables_decode_from_reader(self):
+        sender = SerializableUser(uuid4(), "Zoë")
+        message = SerializableUserMessage(sender, "grüße", 1700000000.5)
+        decoded = SerializableUserMessage.deserialize(BufferReader(message.encoded()))
+        self.assertEqual(decoded.sender().get_id(), sender.get_id())
+        self.assertEqual(decoded.sender().get_name(), "Zoë")
+        self.assertEqual((decoded.message(), decoded.timestamp()), ("grüße", 1700000000.5))
+
+
+class TestPacketReceiver(TestCase):
+    def setUp(self):
+        self.left, self.right = socketpair()
+        self.left.settimeout(2.0)
+        self.right.settimeout(2.0)
+
+    def tearDown(self):
+        self.left.close()
+        self.right.close()
+
+    def test_parses_several_frames_from_one_read(self):
+        self.right.sendall(_frame(b"\x01one") + _frame(b"\x02two") + _frame(b"\x03three"))
+        receiver = tcp_protocol.PacketReceiver(self.left)
+        self.assertEqual(bytes(receiver.recv_packet()), b"\x01one")
+        self.assertEqual(receiver.buffered_bytes(), len(_frame(b"\x02two") + _frame(b"\x03three")))
+        self.assertEqual(bytes(receiver.recv_packet()), b"\x02two")
+        self.assertEqual(bytes(receiver.recv_packet()), b"\x03three")
+
+    def test_frames_split_across_reads_and_larger_than_buffer(self):
+        receiver = tcp_protocol.PacketReceiver(self.left, buffer_size=8)
+        big = b"\x05" + bytes(range(256)) * 40
+        data = _frame(b"\x01small") + _frame(big) + _frame(b"\x02after")
+
+        def send_in_pieces():
+            for offset in range(0, len(data), 7):
+                self.right.sendall(data[offset:offset + 7])
+
+        sender = Thread(target=send_in_pieces)
+        sender.start()
+        self.assertEqual(bytes(receiver.recv_packet()), b"\x01small")
+        self.assertEqual(bytes(receiver.recv_packet()), big)
+        self.assertEqual(bytes(receiver.recv_packet()), b"\x02after")
+        sender.join(timeout=2.0)
+
+    def test_invalid_size_and_eof_raise_ioerror(self):
+        receiver = tcp_protocol.PacketReceiver(self.left, max_payload_size=16)
+        self.right.sendall((17).to_bytes(4, "big") + b"x" * 17)
+        with self.assertRaises(IOError):
+            receiver.recv_packet()
+
+        other_left, other_right = socketpair()
+        try:
+            receiver = tcp_protocol.PacketReceiver(other_left)
+            other_right.sendall((10).to_bytes(4, "big") + b"abc")
+            other_right.close()
+            with self.assertRaises(IOError):
+                receiver.recv_packet()
+        finally:
+            other_left.close()
+
+    def test_non_blocking_fill_and_next_packet(self):
+        self.left.setblocking(False)
+        receiver = tcp_protocol.PacketReceiver(self.left)
+        with self.assertRaises(BlockingIOError):
+            receiver.fill()
+        frame = _frame(b"\x01hello")
+        self.right.sendall(frame[:6])
+        self.assertEqual(receiver.fill(), 6)
+        self.assertIsNone(receiver.next_packet())
+        self.right.sendall(frame[6:])
+        receiver.fill()
+        packet_type, body = tcp_protocol.decode_client_packet(receiver.next_packet())
+        self.assertEqual((packet_type, body.read()), (1, b"hello"))
+        self.assertIsNone(receiver.next_packet())
@@ -0,0 +1,50 @@
+from socket import SOL_SOCKET, SO_SNDBUF, socketpair
+from unittest import TestCase
+
+from localchat.net import tcp_protocol
+
+
+class TestPacketSender(TestCase):
+    def setUp(self):
+        self.left, self.right = socketpair()
+        self.left.settimeout(2.0)
+        self.right.settimeout(2.0)
+
+    def tearDown(self):
+        self.left.close()
+        self.right.close()
+
+    def test_flush_sends_all_queued_frames_in_order(self):
+        sender = tcp_protocol.PacketSender(self.left)
+        payloads = [bytes([1]) + str(idx).encode() * (idx + 1) for idx in range(20)]
+        for payload in payloads:
+            sender.queue(payload)
+        self.assertEqual(sender.pending_bytes(), sum(4 + len(payload) for payload in payloads))
+        sender.flush()
+        self.assertEqual(sender.pending_bytes(), 0)
+        receiver = tcp_protocol.PacketReceiver(self.right)
+        self.assertEqual([bytes(receiver.recv_packet()) for _ in payloads], payloads)
+
+    def test_partial_non_blocking_sends_resume_where_they_stopped(self):
+        self.left.setblocking(False)
+        self.left.setsockopt(SOL_SOCKET, SO_SNDBUF, 4096)
+        sender = tcp_protocol.PacketSender(self.left)
+        payloads = [bytes([2]) + bytes([idx % 251]) * 3000 for idx in range(200)]
+        for payload in payloads:
+            sender.queue(payload)
+        receiver = tcp_protocol.PacketReceiver(self.right)
+        received = []
+        while len(received) < len(payloads):
+            try:
+                sender.send_some()
+            except BlockingIOError:
+                pass
+            received.append(bytes(receiver.recv_packet()))
+        self.assertEqual(received, payloads)
+        self.assertEqual(sender.pending_bytes(), 0)
+
+    def test_rejects_empty_payload(self):
+        with self.assertRaises(ValueError):
+            tcp_protocol.PacketSender(self.left).queue(b"")
+        with self.assertRaises(ValueError):
+            tcp_protocol.send_packet(self.left, b"")
@@ -50,6 +50,19 @@ class TestSerializableRoundtrip(TestCase):
         self.assertEqual(result.message(), "hello")
         self.assertEqual(result.timestamp(), 123.456)
 
+    def test_user_message_encoding_is_cached_and_reusable(self):
+        sender = SerializableUser(uuid4(), "Bob")
+        message = SerializableUserMessage(sender, "hello", 1.5)
+        encoded = message.encoded()
+        self.assertIs(message.encoded(), encoded)
+        self.assertIs(SerializableUserMessage.encode(message), encoded)
+
+        decoded = SerializableUserMessage.from_encoded(encoded)
+        self.assertEqual((decoded.sender(), decoded.message(), decoded.timestamp()), (sender, "hello", 1.5))
+        self.assertEqual(bytes(decoded.encoded_content()), bytes(message.encoded_content()))
+        with self.assertRaises(IOError):
+            SerializableUserMessage.from_encoded(encoded + b"\x00")
+
     def test_serializable_list_roundtrip(self):
         user1 = SerializableUser(uuid4(), "A")
         user2 = SerializableUser(uuid4(), "B")
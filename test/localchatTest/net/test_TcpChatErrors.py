@@ -1,5 +1,5 @@
 from io import BytesIO
-from socket import AF_INET, SOCK_STREAM, socket
+from socket import AF_INET, SHUT_WR, SOCK_STREAM, socket
 from time import sleep, time
 from unittest import TestCase
 from uuid import uuid4
@@ -356,8 +356,15 @@ class TestTcpChatErrors(TestCase):
 
             self.assertGreaterEqual(rate_limited, RATE_LIMIT_MAX_VIOLATIONS)
             if not disconnected:
-                with self.assertRaises(IOError):
-                    _ = tcp_protocol.recv_packet(client)
+                # Queued packets are delivered before the close, so the disconnect notice may precede EOF.
+                try:
+                    payload = tcp_protocol.recv_packet(client)
+                except IOError:
+                    payload = None
+                if payload is not None:
+                    self.assertEqual(self._decode_error(payload)[0], tcp_protocol.ERR_DISCONNECTED)
+                    with self.assertRaises(IOError):
+                        _ = tcp_protocol.recv_packet(client)
         finally:
             client.close()
             server.stop()
@@ -405,17 +412,13 @@ class TestTcpChatErrors(TestCase):
             target_session = server._sessions_by_user_id.get(joined2.get_id())
             self.assertIsNotNone(target_session)
 
-            orig_send = TcpServerLogic._send_to_session
-
-            def failing_send(session, payload):
-                if session is target_session:
-                    raise IOError("simulated send failure")
-                return orig_send(session, payload)
-
-            server._send_to_session = failing_send
+            # Sends happen in the session's writer thread; a broken socket makes its next send fail.
+            target_session.sock.shutdown(SHUT_WR)
 
             server.post_system_message("broadcast")
-            sleep(0.05)
+            deadline = time() + 2.0
+            while time() < deadline and joined2.get_id() in {u.get_id() for u in server.list_members()}:
+                sleep(0.01)
 
             remaining_ids = {u.get_id() for u in server.list_members()}
             self.assertIn(joined1.get_id(), remaining_ids)
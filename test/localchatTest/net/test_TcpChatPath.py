@@ -77,3 +77,150 @@ class TestTcpChatPath(TestCase):
         c1.close()
         c2.close()
         server.stop()
+
+    def test_v1_and_v2_clients_share_a_server(self):
+        port = _find_free_port()
+        if port is None:
+            self.skipTest("local tcp sockets are not available in this environment")
+        server = TcpServerLogic(host="127.0.0.1", port=port)
+        server.start()
+        sleep(0.05)
+
+        legacy = self._connect_client(port)
+        compact = self._connect_client(port)
+        try:
+            tcp_protocol.send_packet(legacy, tcp_protocol.encode_join(SerializableUser(uuid4(), "Legacy")))
+            ack = self._recv_until_type(legacy, tcp_protocol.PT_S_JOIN_ACK)
+            legacy_user, version, _ = tcp_protocol.decode_server_join_ack_negotiation(BytesIO(ack[1:]))
+            self.assertEqual(version, tcp_protocol.PROTOCOL_V1)
+
+            compact_join = tcp_protocol.encode_join(SerializableUser(uuid4(), "Compact"), tcp_protocol.PROTOCOL_V2)
+            tcp_protocol.send_packet(compact, compact_join)
+            users_by_handle = {}
+            while True:
+                payload = tcp_protocol.recv_packet(compact)
+                if payload[0] == tcp_protocol.PT_S_USER_JOINED:
+                    handle, user = tcp_protocol.decode_user_record_v2(BytesIO(payload[1:]))
+                    users_by_handle[handle] = user
+                if payload[0] == tcp_protocol.PT_S_JOIN_ACK:
+                    _, version, _ = tcp_protocol.decode_server_join_ack_negotiation(BytesIO(payload[1:]))
+                    break
+            self.assertEqual(version, tcp_protocol.PROTOCOL_V2)
+
+            tcp_protocol.send_packet(legacy, tcp_protocol.encode_public_message("from v1"))
+            tcp_protocol.send_packet(compact, tcp_protocol.encode_public_message_v2("from v2"))
+
+            received_v2 = []
+            while len(received_v2) < 2:
+                payload = tcp_protocol.recv_packet(compact)
+                if payload[0] == tcp_protocol.PT_S_USER_DEFINED:
+                    handle, user = tcp_protocol.decode_user_record_v2(BytesIO(payload[1:]))
+                    users_by_handle[handle] = user
+                elif payload[0] == tcp_protocol.PT_S_PUBLIC:
+                    received_v2.append(tcp_protocol.decode_user_message_v2(BytesIO(payload[1:]), users_by_handle))
+            self.assertEqual(
+                sorted((m.sender().get_name(), m.message()) for m in received_v2),
+                [("Compact", "from v2"), ("Legacy", "from v1")],
+            )
+
+            received_v1 = []
+            while len(received_v1) < 2:
+                payload = self._recv_until_type(legacy, tcp_protocol.PT_S_PUBLIC)
+                received_v1.append(SerializableUserMessage.deserialize(BytesIO(payload[1:])).message())
+            self.assertEqual(sorted(received_v1), ["from v1", "from v2"])
+            self.assertIn(legacy_user.get_id(), {m.sender().get_id() for m in received_v2})
+        finally:
+            legacy.close()
+            compact.close()
+            server.stop()
+
+    def test_compression_is_negotiated_per_connection(self):
+        port = _find_free_port()
+        if port is None:
+            self.skipTest("local tcp sockets are not available in this environment")
+        server = TcpServerLogic(host="127.0.0.1", port=port)
+        server.start()
+        sleep(0.05)
+
+        plain = self._connect_client(port)
+        compact = self._connect_client(port)
+        try:
+            tcp_protocol.send_packet(plain, tcp_protocol.encode_join(SerializableUser(uuid4(), "Plain")))
+            self._recv_until_type(plain, tcp_protocol.PT_S_JOIN_ACK)
+
+            tcp_protocol.send_packet(
+                compact,
+                tcp_protocol.encode_join(SerializableUser(uuid4(), "Zipped"), tcp_protocol.PROTOCOL_V1, tcp_protocol.CAP_ZLIB),
+            )
+            # No decompressor: the test looks at the payloads as they are on the wire.
+            receiver = tcp_protocol.PacketReceiver(compact)
+            while True:
+                payload = receiver.recv_packet()
+                if payload[0] == tcp_protocol.PT_S_JOIN_ACK:
+                    _, version, capabilities = tcp_protocol.decode_server_join_ack_negotiation(BytesIO(payload[1:]))
+                    break
+            self.assertEqual((version, capabilities), (tcp_protocol.PROTOCOL_V1, tcp_protocol.CAP_ZLIB))
+
+            text = "the same sentence over and over. " * 100
+            compressor = tcp_protocol.PayloadCompressor()
+            compressed = compressor.compress(tcp_protocol.encode_public_message(text))
+            self.assertTrue(compressed[0] & tcp_protocol.PT_FLAG_COMPRESSED)
+            self.assertLess(len(compressed), len(text) // 4)
+            tcp_protocol.send_packet(compact, compressed)
+
+            # The non-negotiating client gets the message uncompressed ...
+            payload = self._recv_until_type(plain, tcp_protocol.PT_S_PUBLIC)
+            self.assertEqual(SerializableUserMessage.deserialize(BytesIO(payload[1:])).message(), text)
+
+            # ... the negotiating one gets it compressed (earlier packets were below the threshold).
+            compact.settimeout(2.0)
+            raw = bytes(receiver.recv_packet())
+            while raw[0] & ~tcp_protocol.PT_FLAG_COMPRESSED != tcp_protocol.PT_S_PUBLIC:
+                raw = bytes(receiver.recv_packet())
+            self.assertTrue(raw[0] & tcp_protocol.PT_FLAG_COMPRESSED)
+            self.assertLess(len(raw), len(text) // 4)
+            inflated = tcp_protocol.PayloadDecompressor().decompress(raw)
+            self.assertEqual(inflated[0], tcp_protocol.PT_S_PUBLIC)
+            self.assertEqual(SerializableUserMessage.deserialize(BytesIO(inflated[1:])).message(), text)
+        finally:
+            plain.close()
+            compact.close()
+            server.stop()
+
+    def test_handles_of_departed_users_are_released(self):
+        port = _find_free_port()
+        if port is None:
+            self.skipTest("local tcp sockets are not available in this environment")
+        server = TcpServerLogic(host="127.0.0.1", port=port)
+        server.start()
+        sleep(0.05)
+
+        compact = self._connect_client(port)
+        try:
+            tcp_protocol.send_packet(compact, tcp_protocol.encode_join(SerializableUser(uuid4(), "Compact"), tcp_protocol.PROTOCOL_V2))
+            ack = self._recv_until_type(compact, tcp_protocol.PT_S_JOIN_ACK)
+            compact_user = tcp_protocol.decode_server_join_ack_negotiation(BytesIO(ack[1:]))[0]
+
+            handles = []
+            for name in ("First", "Second"):
+                visitor = self._connect_client(port)
+                tcp_protocol.send_packet(visitor, tcp_protocol.encode_join(SerializableUser(uuid4(), name)))
+                self._recv_until_type(visitor, tcp_protocol.PT_S_JOIN_ACK)
+                joined = self._recv_until_type(compact, tcp_protocol.PT_S_USER_JOINED)
+                handle, user = tcp_protocol.decode_user_record_v2(BytesIO(joined[1:]))
+                handles.append(handle)
+                visitor.close()
+                left = self._recv_until_type(compact, tcp_protocol.PT_S_USER_LEFT)
+                self.assertEqual(tcp_protocol.decode_user_record_v2(BytesIO(left[1:])), (handle, user))
+
+            # Released handles are forgotten everywhere but never handed out again.
+            self.assertLess(handles[0], handles[1])
+            end = time() + 2.0
+            while len(server._user_handles) > 1 and time() < end:
+                sleep(0.01)
+            self.assertEqual(set(server._user_handles), {compact_user.get_id()})
+            known = server._sessions_by_user_id[compact_user.get_id()].known_handles
+            self.assertEqual(known, {server._user_handles[compact_user.get_id()]})
+        finally:
+            compact.close()
+            server.stop()
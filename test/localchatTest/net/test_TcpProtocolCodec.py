@@ -98,3 +98,168 @@ class TestTcpProtocolCodec(TestCase):
             tcp_protocol._build_payload(-1, b"a")
         with self.assertRaises(ValueError):
             tcp_protocol._build_payload(256, b"a")
+
+
+class TestTcpProtocolV2Codec(TestCase):
+    def test_varint_roundtrip(self):
+        for value in (0, 1, 127, 128, 300, 2**32, 2**63):
+            encoded = tcp_protocol.encode_varint(value)
+            self.assertEqual(tcp_protocol.decode_varint(BytesIO(encoded)), value)
+        self.assertEqual(len(tcp_protocol.encode_varint(127)), 1)
+        with self.assertRaises(IOError):
+            tcp_protocol.decode_varint(BytesIO(b"\x80"))
+        with self.assertRaises(IOError):
+            tcp_protocol.decode_varint(BytesIO(b"\xff" * 11))
+
+    def test_join_version_negotiation_is_backwards_compatible(self):
+        user = SerializableUser(uuid4(), "Alice")
+        _, v1_body = tcp_protocol.decode_client_packet(tcp_protocol.encode_join(user))
+        self.assertEqual(tcp_protocol.decode_join_request(v1_body)[1], tcp_protocol.PROTOCOL_V1)
+
+        payload = tcp_protocol.encode_join(user, tcp_protocol.PROTOCOL_V2)
+        _, v2_body = tcp_protocol.decode_client_packet(payload)
+        decoded, version, _, _ = tcp_protocol.decode_join_request(v2_body)
+        self.assertEqual((decoded.get_id(), version), (user.get_id(), tcp_protocol.PROTOCOL_V2))
+        # A v1 server only reads the user and ignores the offered version.
+        _, v2_body = tcp_protocol.decode_client_packet(payload)
+        self.assertEqual(tcp_protocol.decode_join(v2_body).get_name(), "Alice")
+
+        ack = tcp_protocol.encode_server_join_ack(user, tcp_protocol.PROTOCOL_V2)
+        acked, version, _ = tcp_protocol.decode_server_join_ack_negotiation(BytesIO(ack[1:]))
+        self.assertEqual((acked.get_id(), version), (user.get_id(), tcp_protocol.PROTOCOL_V2))
+        self.assertEqual(tcp_protocol.decode_server_join_ack(BytesIO(ack[1:])).get_id(), user.get_id())
+
+    def test_join_room_follows_version_and_capabilities(self):
+        user = SerializableUser(uuid4(), "Alice")
+        _, body = tcp_protocol.decode_client_packet(tcp_protocol.encode_join(user, tcp_protocol.PROTOCOL_V2))
+        self.assertEqual(tcp_protocol.decode_join_request(body)[3], "")
+
+        payload = tcp_protocol.encode_join(user, tcp_protocol.PROTOCOL_V1, 0, "room1")
+        _, body = tcp_protocol.decode_client_packet(payload)
+        decoded, version, capabilities, room = tcp_protocol.decode_join_request(body)
+        self.assertEqual(
+            (decoded.get_name(), version, capabilities, room),
+            ("Alice", tcp_protocol.PROTOCOL_V1, 0, "room1"),
+        )
+        # Servers without rooms stop after the capabilities.
+        _, body = tcp_protocol.decode_client_packet(payload)
+        self.assertEqual(tcp_protocol.decode_join_negotiation(body)[1:], (tcp_protocol.PROTOCOL_V1, 0))
+        self.assertEqual(tcp_protocol.encode_join(user, room=""), tcp_protocol.encode_join(user))
+
+    def test_v2_user_message_roundtrip_with_handles(self):
+        sender = SerializableUser(uuid4(), "Bob")
+        message = SerializableUserMessage(sender, "hallo äöü", 1700000000.123456)
+        define = tcp_protocol.encode_server_user_defined_v2(7, sender)
+        self.assertEqual(define[0], tcp_protocol.PT_S_USER_DEFINED)
+        handle, user = tcp_protocol.decode_user_record_v2(BytesIO(define[1:]))
+        self.assertEqual((handle, user.get_id(), user.get_name()), (7, sender.get_id(), "Bob"))
+
+        payload = tcp_protocol.encode_server_public_message_v2(7, message)
+        self.assertLess(len(payload), len(tcp_protocol.encode_server_public_message(message)))
+        decoded = tcp_protocol.decode_user_message_v2(BytesIO(payload[1:]), {7: user})
+        self.assertEqual(decoded.sender().get_id(), sender.get_id())
+        self.assertEqual(decoded.message(), "hallo äöü")
+        self.assertEqual(decoded.timestamp(), 1700000000.123456)
+        with self.assertRaises(IOError):
+            tcp_protocol.decode_user_message_v2(BytesIO(payload[1:]), {})
+
+    def test_v2_client_messages_roundtrip_and_limits(self):
+        _, body = tcp_protocol.decode_client_packet(tcp_protocol.encode_public_message_v2("hello"))
+        self.assertEqual(tcp_protocol.decode_public_message_v2(body), "hello")
+
+        recipient_id = uuid4()
+        _, body = tcp_protocol.decode_client_packet(tcp_protocol.encode_private_message_v2(recipient_id, "psst"))
+        recipient, message = tcp_protocol.decode_private_message_v2(body)
+        self.assertEqual((recipient.value, message), (recipient_id, "psst"))
+
+        _, body = tcp_protocol.decode_client_packet(
+            tcp_protocol.encode_public_message_v2("x" * (MAX_MESSAGE_LENGTH + 1))
+        )
+        with self.assertRaises(IOError):
+            tcp_protocol.decode_public_message_v2(body)
+
+
+class TestTcpProtocolCompression(TestCase):
+    def test_shared_stream_compresses_repeated_text_better(self):
+        compressor = tcp_protocol.PayloadCompressor(min_bytes=64)
+        decompressor = tcp_protocol.PayloadDecompressor()
+        payload = tcp_protocol.encode_public_message("Treffen wir uns morgen um 14 Uhr in der Mensa? " * 3)
+        first = compressor.compress(payload)
+        second = compressor.compress(payload)
+        self.assertEqual(first[0], tcp_protocol.PT_C_PUBLIC | tcp_protocol.PT_FLAG_COMPRESSED)
+        self.assertLess(len(second), len(first))
+        self.assertEqual(decompressor.decompress(first), payload)
+        self.assertEqual(decompressor.decompress(memoryview(second)), payload)
+
+    def test_small_payloads_pass_through(self):
+        compressor = tcp_protocol.PayloadCompressor(min_bytes=512)
+        payload = tcp_protocol.encode_public_message("hi")
+        self.assertIs(compressor.compress(payload), payload)
+
+    def test_decompressor_rejects_garbage_and_oversized_payloads(self):
+        with self.assertRaises(IOError):
+            tcp_protocol.PayloadDecompressor().decompress(bytes([tcp_protocol.PT_S_PUBLIC | 0x80]) + b"\xff\xfe\xfd")
+        compressor = tcp_protocol.PayloadCompressor(min_bytes=1)
+        bomb = compressor.compress(bytes([tcp_protocol.PT_S_PUBLIC]) + b"\x00" * 40000)
+        with self.assertRaises(IOError):
+            tcp_protocol.PayloadDecompressor(max_payload_size=1024).decompress(bomb)
+
+    def test_capabilities_are_negotiated_after_the_version(self):
+        user = SerializableUser(uuid4(), "Alice")
+        payload = tcp_protocol.encode_join(user, tcp_protocol.PROTOCOL_V1, tcp_protocol.CAP_ZLIB)
+        _, body = tcp_protocol.decode_client_packet(payload)
+        _, version, capabilities = tcp_protocol.decode_join_negotiation(body)
+        self.assertEqual((version, capabilities), (tcp_protocol.PROTOCOL_V1, tcp_protocol.CAP_ZLIB))
+        _, body = tcp_protocol.decode_client_packet(tcp_protocol.encode_join(user, tcp_protocol.PROTOCOL_V2))
+        self.assertEqual(tcp_protocol.decode_join_negotiation(body)[1:], (tcp_protocol.PROTOCOL_V2, 0))
+
+        ack = tcp_protocol.encode_server_join_ack(user, tcp_protocol.PROTOCOL_V2, tcp_protocol.CAP_ZLIB)
+        self.assertEqual(
+            tcp_protocol.decode_server_join_ack_negotiation(BytesIO(ack[1:]))[1:],
+            (tcp_protocol.PROTOCOL_V2, tcp_protocol.CAP_ZLIB),
+        )
+        # v1 peers only read the user.
+        self.assertEqual(tcp_protocol.decode_server_join_ack(BytesIO(ack[1:])).get_id(), user.get_id())
+
+
+class TestTcpProtocolHistoryCodec(TestCase):
+    def test_history_request_roundtrip(self):
+        cases = [
+            (tcp_protocol.HISTORY_LAST, 0, 50),
+            (tcp_protocol.HISTORY_BEFORE_SEQ, 1000, 0),
+            (tcp_protocol.HISTORY_FROM_SEQ, 300, 256),
+            (tcp_protocol.HISTORY_BEFORE_TIME, 1700000000.25, 10),
+            (tcp_protocol.HISTORY_FROM_TIME, 1700000000.5, 10),
+        ]
+        for selector, anchor, limit in cases:
+            packet_type, body = tcp_protocol.decode_client_packet(
+                tcp_protocol.encode_history_request(selector, anchor, limit)
+            )
+            self.assertEqual(packet_type, tcp_protocol.PT_C_HISTORY)
+            self.assertEqual(tcp_protocol.decode_history_request(body), (selector, anchor, limit))
+
+    def test_history_request_rejects_unknown_selector(self):
+        with self.assertRaises(ValueError):
+            tcp_protocol.encode_history_request(9)
+        _, body = tcp_protocol.decode_client_packet(bytes([tcp_protocol.PT_C_HISTORY, 9, 0]))
+        with self.assertRaises(IOError):
+            tcp_protocol.decode_history_request(body)
+
+    def test_history_page_roundtrip(self):
+        sender = SerializableUser(uuid4(), "Alice")
+        messages = [SerializableUserMessage(sender, f"m{idx}", float(idx)) for idx in range(3)]
+        payload = tcp_protocol.encode_server_history_page(7, 20, [m.encoded() for m in messages])
+        packet_type, body = tcp_protocol.decode_client_packet(payload)
+        self.assertEqual(packet_type, tcp_protocol.PT_S_HISTORY_PAGE)
+        first_seq, log_length, decoded = tcp_protocol.decode_server_history_page(body)
+        self.assertEqual((first_seq, log_length), (7, 20))
+        self.assertEqual([(m.sender().get_id(), m.message(), m.timestamp()) for m in decoded],
+                         [(sender.get_id(), f"m{idx}", float(idx)) for idx in range(3)])
+
+    def test_history_page_must_fit_into_the_log(self):
+        payload = tcp_protocol.encode_server_history_page(19, 20, [
+            SerializableUserMessage(SerializableUser(uuid4(), "Alice"), "m", 0.0).encoded()
+        ] * 2)
+        _, body = tcp_protocol.decode_client_packet(payload)
+        with self.assertRaises(IOError):
+            tcp_protocol.decode_server_history_page(body)
@@ -0,0 +1,60 @@
+from io import BytesIO
+from unittest import TestCase
+from uuid import uuid4
+
+from localchat.config.limits import MAX_USER_NAME_LENGTH
+from localchat.net import BufferReader, SerializableUser, SerializableUserMessage, UserInterner, tcp_protocol
+
+
+def _encoded(user: SerializableUser) -> bytes:
+    buffer = BytesIO()
+    user.serialize(buffer)
+    return buffer.getvalue()
+
+
+class TestUserInterner(TestCase):
+    def test_same_id_and_name_decode_to_one_object(self):
+        users = UserInterner()
+        alice = SerializableUser(uuid4(), "Alice")
+        first = users.decode(BufferReader(_encoded(alice)))
+        second = users.decode(BytesIO(_encoded(alice)))
+        self.assertIs(first, second)
+        self.assertEqual((first.get_id(), first.get_name()), (alice.get_id(), "Alice"))
+        self.assertIs(users.intern(alice.get_id(), "Alice"), first)
+        self.assertEqual(len(users), 1)
+
+    def test_a_new_name_is_a_new_user(self):
+        users = UserInterner()
+        user_id = uuid4()
+        before = users.decode(BufferReader(_encoded(SerializableUser(user_id, "Alice"))))
+        after = users.decode(BufferReader(_encoded(SerializableUser(user_id, "Alicia"))))
+        self.assertIsNot(before, after)
+        self.assertEqual((before.get_name(), after.get_name()), ("Alice", "Alicia"))
+
+    def test_oldest_user_is_forgotten_beyond_the_limit(self):
+        users = UserInterner(max_users=2)
+        first = users.intern(uuid4(), "a")
+        users.intern(uuid4(), "b")
+        users.intern(uuid4(), "c")
+        self.assertEqual(len(users), 2)
+        self.assertIsNot(users.intern(first.get_id(), "a"), first)
+
+    def test_invalid_names_are_rejected(self):
+        users = UserInterner()
+        user_id = uuid4()
+        bad_utf8 = user_id.bytes + (2).to_bytes(8, "big") + b"\xff\xfe"
+        too_long = user_id.bytes + (MAX_USER_NAME_LENGTH * 4 + 1).to_bytes(8, "big")
+        for data in (bad_utf8, too_long, user_id.bytes[:10]):
+            with self.assertRaises(IOError):
+                users.decode(BufferReader(data))
+        self.assertEqual(len(users), 0)
+
+    def test_messages_and_history_pages_share_senders(self):
+        users = UserInterner()
+        bob = SerializableUser(uuid4(), "Bob")
+        messages = [SerializableUserMessage(bob, f"m{idx}", float(idx)) for idx in range(3)]
+        decoded = SerializableUserMessage.deserialize(BufferReader(messages[0].encoded()), users)
+        payload = tcp_protocol.encode_server_history_page(0, 3, [m.encoded() for m in messages])
+        _, _, page = tcp_protocol.decode_server_history_page(BufferReader(payload[1:]), users)
+        self.assertEqual([m.message() for m in page], ["m0", "m1", "m2"])
+        self.assertTrue(all(m.sender() is decoded.sender() for m in page))
@@ -1,3 +1,12 @@
 from . import test_ServerLogic
 from . import test_ServerLogicEdgeCases
-from . import test_ServerStateValidation
\ No newline at end of file
+from . import test_ServerStateValidation
+from . import test_AsyncTcpServerLogic
+from . import test_OutboundQueue
+from . import test_AdmissionControl
+from . import test_ChatLog
+from . import test_MessageJournal
+from . import test_MessageSearchIndex
+from . import test_Serve
+from . import test_ServerRooms
+from . import test_ServerCluster
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+from io import BytesIO
+from socket import AF_INET, SOCK_STREAM, socket
+from time import sleep, time
+from unittest import TestCase
+from uuid import uuid4
+
+from localchat.net import SerializableUser, tcp_protocol
+from localchat.server.logicImpl import TcpServerLogic
+
+
+def tcp_available() -> bool:
+    probe = socket(AF_INET, SOCK_STREAM)
+    try:
+        probe.bind(("127.0.0.1", 0))
+        return True
+    except PermissionError:
+        return False
+    finally:
+        probe.close()
+
+
+def wait_for(condition, timeout_s: float = 2.0) -> bool:
+    end = time() + timeout_s
+    while time() < end:
+        if condition():
+            return True
+        sleep(0.01)
+    return condition()
+
+
+def recv_until_type(client: socket, packet_type: int, max_reads: int = 64) -> bytes:
+    for _ in range(max_reads):
+        payload = tcp_protocol.recv_packet(client)
+        if payload[0] == packet_type:
+            return payload
+    raise TimeoutError(f"packet type {packet_type} not received")
+
+
+class TcpServerTestCase(TestCase):
+    """
+    Servers on an ephemeral local port and raw tcp_protocol clients; both are closed after the test.
+    """
+
+    server_type: type[TcpServerLogic] = TcpServerLogic
+
+    def _start_server(self, server_type: type[TcpServerLogic] | None = None, **kwargs) -> TcpServerLogic:
+        if not tcp_available():
+            self.skipTest("local tcp sockets are not available in this environment")
+        server = (server_type or self.server_type)(host="127.0.0.1", port=0, **kwargs)
+        server.start()
+        self.addCleanup(lambda: server.stop() if server.is_running() else None)
+        return server
+
+    def _connect(self, server: TcpServerLogic) -> socket:
+        client = socket(AF_INET, SOCK_STREAM)
+        client.settimeout(2.0)
+        client.connect(("127.0.0.1", server.get_server_info().get_port()))
+        self.addCleanup(client.close)
+        return client
+
+    def _join(self, server: TcpServerLogic, name: str, room: str | None = None) -> tuple[socket, SerializableUser]:
+        client = self._connect(server)
+        tcp_protocol.send_packet(client, tcp_protocol.encode_join(SerializableUser(uuid4(), name), room=room))
+        ack = recv_until_type(client, tcp_protocol.PT_S_JOIN_ACK)
+        return client, tcp_protocol.decode_server_join_ack(BytesIO(ack[1:]))
+
+    def _join_nack_code(self, server: TcpServerLogic, name: str, room: str | None = None) -> str:
+        client = self._connect(server)
+        tcp_protocol.send_packet(client, tcp_protocol.encode_join(SerializableUser(uuid4(), name), room=room))
+        nack = recv_until_type(client, tcp_protocol.PT_S_JOIN_NACK)
+        return tcp_protocol.decode_server_join_nack(BytesIO(nack[1:]))[0]
@@ -0,0 +1,124 @@
+from io import BytesIO
+from time import sleep
+from unittest import TestCase
+
+from localchat.config.limits import ADMISSION_ADDRESS_CONNECT_BURST, ADMISSION_ADDRESS_MSG_BURST
+from localchat.net import tcp_protocol
+from localchat.server.logicImpl import AdmissionControl, AsyncTcpServerLogic
+from localchat.server.logicImpl.AdmissionControl import REJECT_ADDRESS_RATE, REJECT_GLOBAL_RATE
+from test.localchatTest.server._tcp_helpers import TcpServerTestCase, recv_until_type, wait_for
+
+
+class TestAdmissionControl(TestCase):
+    @staticmethod
+    def _connect_only(
+            address_connect_per_sec: float = 0.001,
+            address_connect_burst: float = 2,
+            connect_per_sec: float = 0,
+            connect_burst: float = 1,
+            max_addresses: int = 16,
+    ) -> AdmissionControl:
+        return AdmissionControl(
+            address_connect_per_sec=address_connect_per_sec,
+            address_connect_burst=address_connect_burst,
+            connect_per_sec=connect_per_sec,
+            connect_burst=connect_burst,
+            address_msg_per_sec=0,
+            max_addresses=max_addresses,
+        )
+
+    def test_connection_burst_is_per_address(self):
+        admission = self._connect_only()
+        self.assertIsNone(admission.admit_connection("10.0.0.1"))
+        self.assertIsNone(admission.admit_connection("10.0.0.1"))
+        self.assertEqual(admission.admit_connection("10.0.0.1"), REJECT_ADDRESS_RATE)
+        self.assertIsNone(admission.admit_connection("10.0.0.2"))
+
+    def test_connection_tokens_refill_over_time(self):
+        admission = self._connect_only(address_connect_per_sec=50, address_connect_burst=1)
+        self.assertIsNone(admission.admit_connection("10.0.0.1"))
+        self.assertEqual(admission.admit_connection("10.0.0.1"), REJECT_ADDRESS_RATE)
+        sleep(0.05)
+        self.assertIsNone(admission.admit_connection("10.0.0.1"))
+
+    def test_global_limit_spans_addresses_and_rejections_are_free(self):
+        admission = self._connect_only(address_connect_burst=1, connect_per_sec=0.001, connect_burst=2)
+        self.assertIsNone(admission.admit_connection("10.0.0.1"))
+        # Rejected by its own bucket: the global token stays available.
+        self.assertEqual(admission.admit_connection("10.0.0.1"), REJECT_ADDRESS_RATE)
+        self.assertIsNone(admission.admit_connection("10.0.0.2"))
+        self.assertEqual(admission.admit_connection("10.0.0.3"), REJECT_GLOBAL_RATE)
+
+    def test_least_recently_seen_address_is_forgotten(self):
+        admission = self._connect_only(address_connect_burst=1, max_addresses=2)
+        admission.admit_connection("10.0.0.1")
+        admission.admit_connection("10.0.0.2")
+        # Seeing 10.0.0.1 again makes 10.0.0.2 the oldest entry.
+        self.assertEqual(admission.admit_connection("10.0.0.1"), REJECT_ADDRESS_RATE)
+        admission.admit_connection("10.0.0.3")
+        self.assertEqual((admission.tracked_addresses(), admission.evicted_addresses()), (2, 1))
+        self.assertEqual(admission.admit_connection("10.0.0.1"), REJECT_ADDRESS_RATE)
+        self.assertIsNone(admission.admit_connection("10.0.0.2"))
+
+    def test_message_bucket_is_shared_by_an_address(self):
+        admission = AdmissionControl(address_connect_per_sec=0, connect_per_sec=0, address_msg_per_sec=0.001, address_msg_burst=3)
+        self.assertEqual([admission.consume_message("10.0.0.1") for _ in range(4)], [True, True, True, False])
+        self.assertTrue(admission.consume_message("10.0.0.2"))
+        unlimited = AdmissionControl(address_msg_per_sec=0)
+        self.assertTrue(all(unlimited.consume_message("10.0.0.1") for _ in range(1000)))
+        self.assertEqual(unlimited.tracked_addresses(), 0)
+
+    def test_invalid_limits_are_rejected(self):
+        for kwargs in (
+            dict(address_connect_per_sec=-1),
+            dict(connect_per_sec=-1),
+            dict(address_msg_per_sec=-1),
+            dict(address_connect_burst=0.5),
+            dict(max_addresses=0),
+        ):
+            with self.assertRaises(ValueError):
+                AdmissionControl(**kwargs)
+
+
+class TestServerAdmission(TcpServerTestCase):
+    server_type = AsyncTcpServerLogic
+
+    def test_connections_beyond_the_address_burst_never_become_sessions(self):
+        server = self._start_server(max_clients=64, address_connect_rate=0.001)
+        metrics = server.get_metrics()
+        for _ in range(int(ADMISSION_ADDRESS_CONNECT_BURST)):
+            self._connect(server)
+        self.assertTrue(wait_for(lambda: metrics.value("localchat_sessions_opened_total") == ADMISSION_ADDRESS_CONNECT_BURST))
+
+        rejected = self._connect(server)
+        nack = tcp_protocol.recv_packet(rejected)
+        self.assertEqual(nack[0], tcp_protocol.PT_S_JOIN_NACK)
+        self.assertEqual(
+            tcp_protocol.decode_server_join_nack(BytesIO(nack[1:]))[0],
+            tcp_protocol.ERR_TOO_MANY_CONNECTIONS,
+        )
+        self.assertEqual(metrics.value("localchat_connections_rejected_total", {"reason": REJECT_ADDRESS_RATE}), 1)
+        self.assertEqual(metrics.value("localchat_sessions_opened_total"), ADMISSION_ADDRESS_CONNECT_BURST)
+        self.assertEqual(metrics.value("localchat_admission_tracked_addresses"), 1)
+
+    def test_reconnecting_does_not_refill_the_address_message_bucket(self):
+        server = self._start_server(
+            rate_limit_msg_per_sec=1000,
+            rate_limit_burst=1000,
+            address_rate_limit_msg_per_sec=0.001,
+        )
+        first, _ = self._join(server, "Alice")
+        for index in range(int(ADMISSION_ADDRESS_MSG_BURST)):
+            tcp_protocol.send_packet(first, tcp_protocol.encode_public_message(f"message {index}"))
+        metrics = server.get_metrics()
+        self.assertTrue(wait_for(
+            lambda: metrics.value("localchat_messages_total", {"kind": "public"}) == ADMISSION_ADDRESS_MSG_BURST
+        ))
+        first.close()
+        self.assertTrue(wait_for(lambda: len(server.list_members()) == 0))
+
+        second, _ = self._join(server, "Alice")
+        tcp_protocol.send_packet(second, tcp_protocol.encode_public_message("one more"))
+        error = recv_until_type(second, tcp_protocol.PT_S_ERROR)
+        self.assertEqual(tcp_protocol.decode_server_error(BytesIO(error[1:]))[0], tcp_protocol.ERR_RATE_LIMITED)
+        self.assertEqual(metrics.value("localchat_rate_limited_total"), 1)
@@ -0,0 +1,199 @@
+from io import BytesIO
+from socket import socket
+from time import sleep, time
+from urllib.request import urlopen
+from uuid import uuid4
+
+from localchat.config.defaults import HARD_MAX_CLIENTS
+from localchat.net import SerializableUser, SerializableUserMessage, tcp_protocol
+from localchat.server.logicImpl import AsyncTcpServerLogic
+from localchat.util.event import Event, EventListener
+from localchat.util.metrics import lock_report
+from test.localchatTest.server._tcp_helpers import TcpServerTestCase, recv_until_type
+
+
+class _ErrorCollector(EventListener[IOError]):
+    def __init__(self):
+        self.errors: list[IOError] = []
+
+    def on_event(self, event: Event[IOError]):
+        self.errors.append(event.value())
+
+
+class TestAsyncTcpServerLogic(TcpServerTestCase):
+    server_type = AsyncTcpServerLogic
+
+    def test_rejects_max_clients_above_async_hard_limit(self):
+        with self.assertRaises(ValueError):
+            AsyncTcpServerLogic(max_clients=0)
+        AsyncTcpServerLogic(max_clients=HARD_MAX_CLIENTS * 4)
+
+    def test_join_and_public_broadcast(self):
+        server = self._start_server()
+        alice, alice_user = self._join(server, "Alice")
+        bob, _ = self._join(server, "Bob")
+        try:
+            tcp_protocol.send_packet(alice, tcp_protocol.encode_public_message("hello"))
+            payload = recv_until_type(bob, tcp_protocol.PT_S_PUBLIC)
+            message = SerializableUserMessage.deserialize(BytesIO(payload[1:]))
+            self.assertEqual(message.message(), "hello")
+            self.assertEqual(message.sender().get_id(), alice_user.get_id())
+            self.assertEqual(len(server.list_members()), 2)
+        finally:
+            alice.close()
+            bob.close()
+            server.stop()
+
+    def test_duplicate_name_and_server_command(self):
+        server = self._start_server()
+        alice, _ = self._join(server, "Alice")
+        other = self._connect(server)
+        try:
+            tcp_protocol.send_packet(other, tcp_protocol.encode_join(SerializableUser(uuid4(), "alice")))
+            nack = recv_until_type(other, tcp_protocol.PT_S_JOIN_NACK)
+            code, _ = tcp_protocol.decode_server_join_nack(BytesIO(nack[1:]))
+            self.assertEqual(code, tcp_protocol.ERR_USER_NAME_IN_USE)
+
+            server_id = server._get_server_user_id()
+            tcp_protocol.send_packet(alice, tcp_protocol.encode_private_message(server_id, "/whoami"))
+            payload = recv_until_type(alice, tcp_protocol.PT_S_PRIVATE)
+            reply = SerializableUserMessage.deserialize(BytesIO(payload[1:]))
+            self.assertIn("you are 'Alice'", reply.message())
+        finally:
+            alice.close()
+            other.close()
+            server.stop()
+
+    def test_leave_unregisters_member(self):
+        server = self._start_server()
+        alice, _ = self._join(server, "Alice")
+        try:
+            tcp_protocol.send_packet(alice, tcp_protocol.encode_leave())
+            end = time() + 2.0
+            while time() < end and len(server.list_members()) > 0:
+                sleep(0.01)
+            self.assertEqual(server.list_members(), [])
+        finally:
+            alice.close()
+            server.stop()
+
+    def test_server_full_is_rejected_without_blocking_loop(self):
+        server = self._start_server(max_clients=1)
+        alice, _ = self._join(server, "Alice")
+        other = self._connect(server)
+        try:
+            nack = tcp_protocol.recv_packet(other)
+            self.assertEqual(nack[0], tcp_protocol.PT_S_JOIN_NACK)
+            code, _ = tcp_protocol.decode_server_join_nack(BytesIO(nack[1:]))
+            self.assertEqual(code, tcp_protocol.ERR_SERVER_FULL)
+        finally:
+            alice.close()
+            other.close()
+            server.stop()
+
+    def test_handler_bug_is_reported_and_only_drops_its_session(self):
+        server = self._start_server()
+        collector = _ErrorCollector()
+        server.on_error().add_listener(collector)
+        alice, _ = self._join(server, "Alice")
+        bob, _ = self._join(server, "Bob")
+        handle = server._handle_client_payload
+
+        def buggy_handle(session, payload):
+            if session.user_id is not None and payload[0] == tcp_protocol.PT_C_PRIVATE:
+                raise RuntimeError("bug")
+            return handle(session, payload)
+
+        server._handle_client_payload = buggy_handle
+        try:
+            tcp_protocol.send_packet(bob, tcp_protocol.encode_private_message(uuid4(), "boom"))
+            with self.assertRaises(IOError):
+                for _ in range(16):
+                    tcp_protocol.recv_packet(bob)
+            self.assertEqual(len(collector.errors), 1)
+            self.assertIsInstance(collector.errors[0].__cause__, RuntimeError)
+            # The loop keeps serving everyone else.
+            tcp_protocol.send_packet(alice, tcp_protocol.encode_public_message("still here"))
+            payload = recv_until_type(alice, tcp_protocol.PT_S_PUBLIC)
+            self.assertEqual(SerializableUserMessage.deserialize(BytesIO(payload[1:])).message(), "still here")
+        finally:
+            alice.close()
+            bob.close()
+            server.stop()
+
+    def test_kick_delivers_error_before_close(self):
+        server = self._start_server()
+        host, _ = self._join(server, "Host")
+        member, member_user = self._join(server, "Member")
+        try:
+            server.kick_member(member_user.get_id(), "bye")
+            payload = recv_until_type(member, tcp_protocol.PT_S_ERROR)
+            code, message = tcp_protocol.decode_server_error(BytesIO(payload[1:]))
+            self.assertEqual((code, message), (tcp_protocol.ERR_DISCONNECTED, "bye"))
+            with self.assertRaises(IOError):
+                for _ in range(16):
+                    tcp_protocol.recv_packet(member)
+        finally:
+            host.close()
+            member.close()
+            server.stop()
+
+    def test_more_clients_than_thread_server_limit(self):
+        client_count = HARD_MAX_CLIENTS + 32
+        # All clients connect from 127.0.0.1.
+        server = self._start_server(max_clients=client_count, address_connect_rate=0)
+        clients: list[socket] = []
+        try:
+            for idx in range(client_count):
+                client, _ = self._join(server, f"user-{idx}")
+                clients.append(client)
+            self.assertEqual(len(server.list_members()), client_count)
+            server.post_system_message("to everyone")
+            last = clients[-1]
+            payload = recv_until_type(last, tcp_protocol.PT_S_PUBLIC, max_reads=client_count * 2)
+            self.assertEqual(SerializableUserMessage.deserialize(BytesIO(payload[1:])).message(), "to everyone")
+        finally:
+            for client in clients:
+                client.close()
+            server.stop()
+
+    def test_metrics_count_traffic_and_are_served_on_loopback(self):
+        server = self._start_server(metrics_port=0)
+        alice, _ = self._join(server, "Alice")
+        bob, _ = self._join(server, "Bob")
+        try:
+            tcp_protocol.send_packet(alice, tcp_protocol.encode_public_message("hello"))
+            recv_until_type(bob, tcp_protocol.PT_S_PUBLIC)
+            metrics = server.get_metrics()
+            self.assertEqual(metrics.value("localchat_packets_received_total", {"type": "join"}), 2)
+            self.assertEqual(metrics.value("localchat_packets_received_total", {"type": "public"}), 1)
+            self.assertEqual(metrics.value("localchat_messages_total", {"kind": "public"}), 1)
+            self.assertEqual(metrics.value("localchat_sessions", {"state": "joined"}), 2)
+            self.assertEqual(metrics.get_histogram("localchat_broadcast_seconds").count(), 3)
+            self.assertGreater(metrics.total("localchat_sent_bytes_total"), 0)
+
+            with urlopen(f"http://127.0.0.1:{server.get_metrics_port()}/metrics", timeout=2.0) as response:
+                self.assertTrue(response.headers["Content-Type"].startswith("text/plain; version=0.0.4"))
+                text = response.read().decode("utf-8")
+            self.assertIn('localchat_packets_received_total{type="public"} 1', text)
+            self.assertIn('localchat_packet_handle_seconds_bucket{le="+Inf"}', text)
+        finally:
+            alice.close()
+            bob.close()
+            server.stop()
+
+    def test_lock_profiling_reports_server_locks(self):
+        server = self._start_server(lock_profiling=True)
+        alice, _ = self._join(server, "Alice")
+        bob, _ = self._join(server, "Bob")
+        try:
+            tcp_protocol.send_packet(alice, tcp_protocol.encode_public_message("hello"))
+            recv_until_type(bob, tcp_protocol.PT_S_PUBLIC)
+            report = {entry["lock"]: entry for entry in lock_report(server.get_metrics())}
+            self.assertEqual(set(report), {"logic", "sessions", "handles", "outbound_queue", "admission", "scheduled"})
+            self.assertGreater(report["outbound_queue"]["acquisitions"], 0)
+            self.assertGreater(report["logic"]["hold_total_s"], 0.0)
+        finally:
+            alice.close()
+            bob.close()
+            server.stop()
@@ -0,0 +1,243 @@
+import gc
+import tracemalloc
+from io import BytesIO
+from threading import Event, Thread
+from unittest import TestCase
+from uuid import uuid4
+
+from localchat.net import SerializableUser, SerializableUserMessage, SerializableUserMessageList
+from localchat.server.logicImpl import ChatLog, InMemoryLogic
+
+
+_SENDER = SerializableUser(uuid4(), "Carol")
+
+
+def _messages(count: int, sender: SerializableUser | None = None) -> list[SerializableUserMessage]:
+    sender = sender if sender is not None else SerializableUser(uuid4(), "Alice")
+    return [SerializableUserMessage(sender, f"message {idx}", float(idx)) for idx in range(count)]
+
+
+class TestChatLog(TestCase):
+    def test_window_spills_oldest_messages_by_count(self):
+        log = ChatLog(max_messages=10)
+        log.extend(_messages(205))
+        self.assertEqual(len(log), 205)
+        self.assertEqual(log.spilled_count(), 195)
+        self.assertEqual([m.message() for m in log.read(0, 2)], ["message 0", "message 1"])
+        self.assertEqual([m.message() for m in log.read(130, 133)], ["message 130", "message 131", "message 132"])
+        self.assertEqual([m.timestamp() for m in log.read(193, 197)], [193.0, 194.0, 195.0, 196.0])
+        self.assertEqual(log.read(204)[0].message(), "message 204")
+        self.assertEqual(log.read(300), [])
+        log.close()
+
+    def test_window_spills_by_bytes(self):
+        log = ChatLog(max_messages=1000, max_bytes=4096)
+        sender = SerializableUser(uuid4(), "Bob")
+        log.extend(SerializableUserMessage(sender, "x" * 1000, 0.0) for _ in range(50))
+        self.assertLessEqual(log.memory_bytes(), 4096)
+        self.assertGreater(log.spilled_count(), 40)
+        self.assertEqual([m.sender() for m in log.read(0)], [sender] * 50)
+        log.close()
+
+    def test_memory_stays_flat_while_the_history_grows(self):
+        log = ChatLog(max_messages=100)
+
+        def append(first: int, stop: int):
+            # A new sender per message: the interned sender table must not grow with the history either.
+            log.extend(
+                SerializableUserMessage(SerializableUser(uuid4(), f"user {idx}"), f"message {idx}", float(idx))
+                for idx in range(first, stop)
+            )
+            gc.collect()
+
+        tracemalloc.start()
+        self.addCleanup(tracemalloc.stop)
+        append(0, 1000)
+        before = tracemalloc.get_traced_memory()[0]
+        append(1000, 21000)
+        growth = tracemalloc.get_traced_memory()[0] - before
+        # 200 windows later: only the sparse spill index grows, far below a column entry per message.
+        self.assertLess(growth, 20000 * 8)
+        self.assertLess(log.memory_bytes(), 100 * 512)
+        self.assertEqual(log.read(20999)[0].message(), "message 20999")
+        log.close()
+
+    def test_snapshot_has_fixed_length_and_complete_order(self):
+        log = ChatLog(max_messages=3)
+        log.extend(_messages(600))
+        view = log.snapshot()
+        log.extend(_messages(5))
+        self.assertEqual(len(view), 600)
+        self.assertEqual([m.timestamp() for m in view], [float(idx) for idx in range(600)])
+
+        log.clear()
+        with self.assertRaises(IOError):
+            list(view)
+        self.assertEqual(len(log), 0)
+
+    def test_read_page_in_both_directions(self):
+        log = ChatLog(max_messages=10)
+        log.extend(_messages(200))
+        first, total, page = log.read_page(None, 5, backwards=True)
+        self.assertEqual((first, total), (195, 200))
+        self.assertEqual([m.timestamp() for m in page], [195.0, 196.0, 197.0, 198.0, 199.0])
+        first, _, page = log.read_page(3, 5, backwards=True)
+        self.assertEqual((first, [m.timestamp() for m in page]), (0, [0.0, 1.0, 2.0]))
+        first, _, page = log.read_page(120, 3, backwards=False)
+        self.assertEqual((first, [m.timestamp() for m in page]), (120, [120.0, 121.0, 122.0]))
+        self.assertEqual(log.read_page(500, 3, backwards=False), (200, 200, []))
+        first, total, encoded = log.read_encoded_page(188, 20, backwards=False)
+        self.assertEqual((first, total), (188, 200))
+        self.assertEqual(encoded, [SerializableUserMessage.encode(m) for m in log.read_page(188, 20, False)[2]])
+        log.close()
+
+    def test_seq_of_timestamp(self):
+        log = ChatLog(max_messages=10)
+        log.extend(_messages(200))
+        self.assertEqual(log.seq_of_timestamp(-1.0), 0)
+        self.assertEqual(log.seq_of_timestamp(57.0), 57)
+        self.assertEqual(log.seq_of_timestamp(57.5), 58)
+        self.assertEqual(log.seq_of_timestamp(1000.0), 200)
+        self.assertEqual(ChatLog().seq_of_timestamp(1.0), 0)
+        log.close()
+
+    def test_out_of_order_timestamps_keep_time_lookups_sorted(self):
+        log = ChatLog()
+        sender = SerializableUser(uuid4(), "Alice")
+        # A message relayed from another worker may be older than the one appended before it.
+        for timestamp in (1.0, 5.0, 3.0, 6.0):
+            log.append(SerializableUserMessage(sender, f"at {timestamp}", timestamp))
+        self.assertEqual([message.timestamp() for message in log.snapshot()], [1.0, 5.0, 3.0, 6.0])
+        self.assertEqual(log.seq_of_timestamp(4.0), 1)
+        self.assertEqual(log.seq_of_timestamp(5.5), 3)
+        self.assertEqual([message.message() for message in log.snapshot().since(4.0)], ["at 5.0", "at 3.0", "at 6.0"])
+        log.close()
+
+    def test_time_lookups_reach_into_the_spilled_blocks(self):
+        log = ChatLog(max_messages=50)
+        sender = SerializableUser(uuid4(), "Alice")
+        timestamps = [float(idx // 3 * 2 - (idx % 5 == 0) * 7) for idx in range(2000)]
+        log.extend(SerializableUserMessage(sender, str(idx), timestamp) for idx, timestamp in enumerate(timestamps))
+        self.assertGreater(log.spilled_count(), 1900)
+        self.assertEqual([message.timestamp() for message in log.read(0)], timestamps)
+
+        def expected(timestamp: float, lo: int, hi: int) -> int:
+            running = max(timestamps[:lo], default=timestamp - 1)
+            for index in range(lo, hi):
+                running = max(running, timestamps[index])
+                if running >= timestamp:
+                    return index
+            return hi
+
+        view = log.snapshot()[300:1700]
+        for timestamp in (-10.0, 0.0, 1.0, 170.5, 171.0, 999.0, 1200.0, 1400.0, 5000.0):
+            self.assertEqual(log.seq_of_timestamp(timestamp), expected(timestamp, 0, 2000))
+            self.assertEqual(view.since(timestamp).first_seq(), expected(timestamp, 300, 1700))
+        log.close()
+
+    def test_sequence_numbers_continue_after_clear(self):
+        log = ChatLog(max_messages=4)
+        self.assertEqual(log.append(_messages(1)[0]), 0)
+        log.extend(_messages(9))
+        log.clear()
+        self.assertEqual((log.first_seq(), log.next_seq()), (10, 10))
+        log.extend(_messages(30))
+        self.assertEqual(log.append(_messages(1)[0]), 40)
+        first, end, page = log.read_page(12, 3, backwards=False)
+        self.assertEqual((first, end, [m.timestamp() for m in page]), (12, 41, [2.0, 3.0, 4.0]))
+        self.assertEqual(log.read_page(0, 2, backwards=False)[0], 10)
+        self.assertEqual(log.seq_of_timestamp(5.0), 15)
+        log.close()
+
+    def test_views_slice_without_copying(self):
+        log = ChatLog(max_messages=8)
+        log.extend(_messages(100))
+        view = log.snapshot()
+        tail = view.since(90.0)
+        self.assertEqual((len(tail), tail.first_seq()), (10, 90))
+        self.assertEqual([m.timestamp() for m in tail[2:4]], [92.0, 93.0])
+        self.assertEqual(view[5].timestamp(), 5.0)
+        self.assertEqual(view[-1].timestamp(), 99.0)
+        with self.assertRaises(IndexError):
+            _ = view[100]
+        log.close()
+
+    def test_senders_are_interned_with_the_name_they_had(self):
+        log = ChatLog(max_messages=3)
+        user_id = uuid4()
+        log.append(SerializableUserMessage(SerializableUser(user_id, "Dave"), "before", 1.0))
+        log.append(SerializableUserMessage(SerializableUser(user_id, "Dave"), "again", 2.0))
+        log.append(SerializableUserMessage(SerializableUser(user_id, "David"), "after", 3.0))
+        log.extend(_messages(10))
+        first, second, third = log.read(0, 3)
+        self.assertEqual([m.sender().get_name() for m in (first, second, third)], ["Dave", "Dave", "David"])
+        self.assertIs(first.sender(), second.sender())
+        self.assertEqual(third.sender().get_id(), user_id)
+        self.assertFalse(hasattr(first, "__dict__"))
+        log.close()
+
+    def test_write_to_matches_the_list_format(self):
+        log = ChatLog(max_messages=16, max_bytes=512)
+        alice, bob = SerializableUser(uuid4(), "Alice"), SerializableUser(uuid4(), "Bob")
+        messages = [
+            SerializableUserMessage(bob if idx % 3 == 0 else alice, f"nachricht {idx} \u00e4\u20ac\U0001f600", idx / 3)
+            for idx in range(300)
+        ]
+        log.extend(messages)
+        self.assertGreater(log.spilled_count(), 250)
+        for view, expected in ((log.snapshot(), messages), (log.snapshot()[100:290], messages[100:290])):
+            written = BytesIO()
+            view.write_to(written)
+            serial = SerializableUserMessageList()
+            serial.items = expected
+            reference = BytesIO()
+            serial.serialize(reference)
+            self.assertEqual(written.getvalue(), reference.getvalue())
+        log.close()
+
+    def test_readers_run_while_messages_are_appended_and_spilled(self):
+        log = ChatLog(max_messages=16)
+        log.extend(_messages(50))
+        errors: list[BaseException] = []
+        done = Event()
+
+        def writer():
+            for idx in range(50, 5000):
+                log.append(SerializableUserMessage(_SENDER, f"message {idx}", float(idx)))
+            done.set()
+
+        def reader():
+            try:
+                while not done.is_set():
+                    view = log.snapshot()
+                    tail = view[max(0, len(view) - 40):]
+                    timestamps = [m.timestamp() for m in tail]
+                    expected = [float(idx) for idx in range(max(0, len(view) - 40), len(view))]
+                    if timestamps != expected or [m.message() for m in tail] != [f"message {int(t)}" for t in expected]:
+                        raise AssertionError("inconsistent snapshot")
+            except BaseException as e:
+                errors.append(e)
+                done.set()
+
+        threads = [Thread(target=writer), Thread(target=reader), Thread(target=reader)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=30.0)
+        self.assertEqual(errors, [])
+        self.assertEqual([m.timestamp() for m in log.snapshot()], [float(idx) for idx in range(5000)])
+        log.close()
+
+    def test_save_chat_contains_spilled_history(self):
+        chat_log = ChatLog(max_messages=4)
+        logic = InMemoryLogic(chat_log=chat_log)
+        logic.start()
+        for idx in range(50):
+            logic.post_system_message(f"system {idx}")
+        output = BytesIO()
+        logic.save_chat(output)
+        output.seek(0)
+        restored = SerializableUserMessageList.deserialize(output, 100, 100_000)
+        self.assertEqual([m.message() for m in restored.items], [f"system {idx}" for idx in range(50)])
+        logic.stop()
+        chat_log.close()
@@ -0,0 +1,233 @@
+import os
+from io import BytesIO
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from uuid import uuid4
+
+from localchat.net import SerializableUser, SerializableUserMessageList
+from localchat.server.logicImpl import InMemoryLogic, MessageJournal
+from localchat.server.logicImpl.MessageJournal import JR_BAN, JR_PUBLIC_MESSAGE, decode_user_id
+from localchat.util import Role
+
+
+class TestMessageJournal(TestCase):
+    def test_records_survive_reopen_across_segments(self):
+        with TemporaryDirectory() as directory:
+            journal = MessageJournal(directory, flush_interval_ms=1, segment_max_bytes=256)
+            list(journal.replay())
+            journal.open()
+            ids = [uuid4() for _ in range(40)]
+            for user_id in ids:
+                journal.append_ban(user_id)
+                self.assertTrue(journal.flush(timeout=2.0))
+            journal.close()
+            self.assertGreater(journal.stats().segments, 1)
+
+            reopened = MessageJournal(directory)
+            records = list(reopened.replay())
+            self.assertEqual([r.record_type for r in records], [JR_BAN] * 40)
+            self.assertEqual([decode_user_id(r.payload) for r in records], ids)
+
+    def test_torn_tail_is_cut_off(self):
+        with TemporaryDirectory() as directory:
+            journal = MessageJournal(directory)
+            journal.open()
+            journal.append_ban(uuid4())
+            journal.flush()
+            journal.close()
+            segment = os.path.join(directory, sorted(os.listdir(directory))[-1])
+            with open(segment, "ab") as output:
+                output.write(b"\x00\x00\x00\x40\x01garbage")
+
+            reopened = MessageJournal(directory)
+            self.assertEqual(len(list(reopened.replay())), 1)
+            reopened.open()
+            reopened.append_unban(uuid4())
+            reopened.flush()
+            reopened.close()
+            self.assertEqual(len(list(MessageJournal(directory).replay())), 2)
+
+    def test_segment_torn_inside_its_magic_is_repaired(self):
+        with TemporaryDirectory() as directory:
+            journal = MessageJournal(directory)
+            journal.open()
+            journal.append_ban(uuid4())
+            journal.flush()
+            journal.close()
+            segment = os.path.join(directory, sorted(os.listdir(directory))[-1])
+            # A crash right after the segment was created: only part of its magic made it to disk.
+            os.truncate(segment, 3)
+
+            reopened = MessageJournal(directory)
+            self.assertEqual(list(reopened.replay()), [])
+            reopened.open()
+            reopened.append_unban(uuid4())
+            reopened.flush()
+            reopened.close()
+            self.assertEqual(len(list(MessageJournal(directory).replay())), 1)
+
+            # open() without a replay scans the newest segment itself.
+            os.truncate(segment, 3)
+            restarted = MessageJournal(directory)
+            restarted.open()
+            restarted.append_unban(uuid4())
+            restarted.flush()
+            restarted.close()
+            self.assertEqual(len(list(MessageJournal(directory).replay())), 1)
+
+    def test_group_commit_batches_fsyncs(self):
+        with TemporaryDirectory() as directory:
+            journal = MessageJournal(directory, flush_interval_ms=50)
+            journal.open()
+            for _ in range(500):
+                journal.append(JR_PUBLIC_MESSAGE, b"x" * 32)
+            self.assertTrue(journal.flush(timeout=5.0))
+            stats = journal.stats()
+            journal.close()
+            self.assertEqual(stats.committed, 500)
+            self.assertLess(stats.commits, 10)
+            self.assertEqual(stats.failed_commits, 0)
+
+    def test_records_after_a_failed_write_survive_replay(self):
+        with TemporaryDirectory() as directory:
+            errors = []
+            journal = MessageJournal(directory, flush_interval_ms=1, on_error=errors.append)
+            journal.open()
+            before = uuid4()
+            journal.append_ban(before)
+            self.assertTrue(journal.flush(timeout=2.0))
+
+            segment = journal._segment
+            write = segment.write
+
+            def write_half_then_fail(data):
+                write(data[:len(data) // 2])
+                segment.flush()
+                raise OSError(28, "No space left on device")
+
+            segment.write = write_half_then_fail
+            journal.append_ban(uuid4())
+            self.assertFalse(journal.flush(timeout=2.0))
+            after = uuid4()
+            journal.append_ban(after)
+            self.assertTrue(journal.flush(timeout=2.0))
+            journal.close()
+
+            self.assertEqual(len(errors), 1)
+            records = list(MessageJournal(directory).replay())
+            self.assertEqual([decode_user_id(r.payload) for r in records], [before, after])
+
+    def test_failed_rollover_moves_on_to_a_new_segment(self):
+        with TemporaryDirectory() as directory:
+            errors = []
+            journal = MessageJournal(directory, flush_interval_ms=1, segment_max_bytes=60, on_error=errors.append)
+            journal.open()
+            ids = [uuid4() for _ in range(3)]
+            journal.append_ban(ids[0])
+            self.assertTrue(journal.flush(timeout=2.0))
+            open_segment = journal._open_segment
+            failures = [OSError("cannot create segment")]
+
+            def open_segment_once_failing(number):
+                if failures:
+                    raise failures.pop()
+                open_segment(number)
+
+            journal._open_segment = open_segment_once_failing
+            # Too big for the rest of the segment; each later record alone would still fit.
+            journal.append_ban(uuid4())
+            journal.append_ban(uuid4())
+            self.assertFalse(journal.flush(timeout=2.0))
+            for user_id in ids[1:]:
+                journal.append_ban(user_id)
+                self.assertTrue(journal.flush(timeout=2.0))
+            journal.close()
+
+            self.assertEqual(len(errors), 1)
+            records = list(MessageJournal(directory).replay())
+            self.assertEqual([decode_user_id(r.payload) for r in records], ids)
+
+    def test_unexpected_writer_error_fails_the_journal(self):
+        with TemporaryDirectory() as directory:
+            errors = []
+            journal = MessageJournal(directory, flush_interval_ms=1, on_error=errors.append)
+            journal.open()
+
+            def broken_write(data):
+                raise ValueError("bug")
+
+            journal._write_and_sync = broken_write
+            journal.append_ban(uuid4())
+            self.assertFalse(journal.flush(timeout=2.0))
+            self.assertFalse(journal.is_open())
+            self.assertEqual(len(errors), 1)
+            self.assertIsInstance(errors[0].__cause__, ValueError)
+            with self.assertRaises(IOError):
+                journal.append_ban(uuid4())
+            journal.close()
+
+    def test_append_requires_open_journal(self):
+        with TemporaryDirectory() as directory:
+            with self.assertRaises(RuntimeError):
+                MessageJournal(directory).append_reset()
+
+
+class TestJournaledLogic(TestCase):
+    def test_restart_restores_chat_log_and_bans(self):
+        with TemporaryDirectory() as directory:
+            logic = InMemoryLogic(journal=MessageJournal(directory))
+            logic.start()
+            host = SerializableUser(uuid4(), "Host")
+            banned = SerializableUser(uuid4(), "Banned")
+            unbanned = SerializableUser(uuid4(), "Unbanned")
+            for user in (host, banned, unbanned):
+                logic.register_member(user, Role.HOST if user is host else Role.MEMBER)
+            for idx in range(20):
+                logic.post_system_message(f"message {idx}")
+            logic.ban_member(banned.get_id())
+            logic.ban_member(unbanned.get_id())
+            logic.unban_member(unbanned.get_id())
+            logic.stop()
+
+            restored = InMemoryLogic(journal=MessageJournal(directory))
+            restored.start()
+            self.assertEqual(restored.list_banned_users(), {banned.get_id()})
+            output = BytesIO()
+            restored.save_chat(output)
+            output.seek(0)
+            messages = SerializableUserMessageList.deserialize(output, 100, 1000).items
+            self.assertEqual([m.message() for m in messages], [f"message {idx}" for idx in range(20)])
+            restored.stop()
+
+            # Restarting the same instance must not replay twice.
+            restored.start()
+            output = BytesIO()
+            restored.save_chat(output)
+            output.seek(0)
+            self.assertEqual(len(SerializableUserMessageList.deserialize(output, 100, 1000).items), 20)
+            restored.stop()
+
+    def test_import_without_merge_resets_journal(self):
+        with TemporaryDirectory() as directory:
+            source = InMemoryLogic()
+            source.start()
+            source.post_system_message("imported")
+            state = BytesIO()
+            source.export_state(state)
+            source.stop()
+
+            logic = InMemoryLogic(journal=MessageJournal(directory))
+            logic.start()
+            logic.post_system_message("replaced")
+            state.seek(0)
+            logic.import_state(state)
+            logic.stop()
+
+            restored = InMemoryLogic(journal=MessageJournal(directory))
+            restored.start()
+            output = BytesIO()
+            restored.save_chat(output)
+            output.seek(0)
+            messages = SerializableUserMessageList.deserialize(output, 100, 1000).items
+            self.assertEqual([m.message() for m in messages], ["imported"])
+            restored.stop()
@@ -0,0 +1,103 @@
+from unittest import TestCase
+from uuid import uuid4
+
+from localchat.net import SerializableUser, SerializableUserMessage
+from localchat.server.commands import ServerCommandDispatcher
+from localchat.server.logicImpl import InMemoryLogic, MessageSearchIndex
+from localchat.server.logicImpl.MessageSearchIndex import tokenize
+from localchat.util import Role
+from localchat.util.event import Event, EventListener
+
+
+_ALICE = SerializableUser(uuid4(), "Alice")
+_BOB = SerializableUser(uuid4(), "Bob")
+
+
+def _message(sender: SerializableUser, text: str, timestamp: float = 0.0) -> SerializableUserMessage:
+    return SerializableUserMessage(sender, text, timestamp)
+
+
+class _Collector(EventListener):
+    def __init__(self):
+        self.items = []
+
+    def on_event(self, event: Event):
+        self.items.append(event.value())
+
+
+class TestMessageSearchIndex(TestCase):
+    def test_tokenize_splits_links_and_folds_case(self):
+        self.assertEqual(tokenize("Siehe HTTPS://Example.com/Straße!"), ["siehe", "https", "example", "com", "strasse"])
+
+    def test_all_terms_must_match_newest_first(self):
+        index = MessageSearchIndex()
+        texts = ["link example.com", "nothing here", "example without", "another example.com link"]
+        for seq, text in enumerate(texts):
+            index.add(seq, _message(_ALICE, text))
+        self.assertEqual(index.search(["example.com"]), [3, 0])
+        self.assertEqual(index.search(["EXAMPLE"]), [3, 2, 0])
+        self.assertEqual(index.search(["example", "missing"]), [])
+        self.assertEqual(index.search(["example"], offset=1, limit=1), [2])
+        self.assertEqual(index.search([" "]), [])
+
+    def test_sender_and_since_filters(self):
+        index = MessageSearchIndex()
+        for seq in range(20):
+            index.add(seq, _message(_ALICE if seq % 2 == 0 else _BOB, f"status {seq}"))
+        self.assertEqual(index.search(["status"], sender="bob", limit=3), [19, 17, 15])
+        self.assertEqual(index.search(["status"], sender=str(_ALICE.get_id())[:8], limit=2), [18, 16])
+        self.assertEqual(index.search(["status"], since_seq=17), [19, 18, 17])
+        self.assertEqual(index.search(["status"], sender="carol"), [])
+
+    def test_window_bounds_memory(self):
+        index = MessageSearchIndex(max_messages=100)
+        for seq in range(1000):
+            index.add(seq, _message(_ALICE, f"common unique{seq}"))
+        self.assertEqual(len(index), 100)
+        self.assertLessEqual(index.token_count(), 1 + 125)
+        self.assertEqual(index.search(["unique5"]), [])
+        self.assertEqual(index.search(["unique999"]), [999])
+        self.assertEqual(index.search(["common"], limit=200)[-1], 900)
+
+    def test_clear_and_gaps(self):
+        index = MessageSearchIndex()
+        index.add(0, _message(_ALICE, "before"))
+        index.clear()
+        self.assertEqual(index.search(["before"]), [])
+        index.add(5, _message(_BOB, "after"))
+        index.add(9, _message(_ALICE, "after"))
+        self.assertEqual(index.search(["after"], sender="bob"), [5])
+        with self.assertRaises(ValueError):
+            index.add(3, _message(_ALICE, "late"))
+
+
+class TestSearchCommand(TestCase):
+    def test_search_command_pages_through_history(self):
+        logic = InMemoryLogic()
+        logic.start()
+        replies = _Collector()
+        logic.on_private_message().add_listener(replies)
+        member = SerializableUser(uuid4(), "Member")
+        logic.register_member(member, Role.HOST)
+        for idx in range(25):
+            logic.post_system_message(f"deploy {idx} done" if idx % 2 == 0 else f"chatter {idx}")
+        dispatcher = ServerCommandDispatcher(logic)
+
+        self.assertTrue(dispatcher.try_execute(member.get_id(), "/search deploy"))
+        first_page = replies.items[-1].message().split("\n")
+        self.assertEqual(first_page[0], "search 'deploy', page 1:")
+        self.assertIn("deploy 24 done", first_page[1])
+        self.assertEqual(first_page[-1], "more results: add --page 2")
+
+        dispatcher.try_execute(member.get_id(), "/search deploy --from server --since 1h --page 2")
+        second_page = replies.items[-1].message().split("\n")
+        self.assertIn("deploy 4 done", second_page[1])
+        self.assertIn("deploy 0 done", second_page[-1])
+
+        dispatcher.try_execute(member.get_id(), "/search deploy --since soon")
+        self.assertIn("invalid time", replies.items[-1].message())
+        dispatcher.try_execute(member.get_id(), "/search")
+        self.assertIn("usage: /search", replies.items[-1].message())
+        dispatcher.try_execute(member.get_id(), "/search deploy --since 2099-01-01")
+        self.assertIn("no messages found", replies.items[-1].message())
+        logic.stop()
@@ -0,0 +1,210 @@
+from io import BytesIO
+from socket import AF_INET, SOCK_STREAM, SOL_SOCKET, SO_RCVBUF, socket
+from threading import Thread
+from time import sleep, time
+from unittest import TestCase
+from uuid import uuid4
+
+from localchat.net import SerializableUser, tcp_protocol
+from localchat.server.logicImpl import OutboundQueue, SlowConsumerPolicy, TcpServerLogic
+
+
+def _notice(count: int) -> bytes:
+    return b"skipped:" + str(count).encode()
+
+
+class TestOutboundQueue(TestCase):
+    def test_fifo_order_and_stats(self):
+        queue = OutboundQueue(max_messages=8, max_bytes=1024)
+        for payload in (b"a", b"bb", b"ccc"):
+            self.assertTrue(queue.push(payload))
+        self.assertEqual(queue.stats().depth, 3)
+        self.assertEqual(queue.stats().queued_bytes, 6)
+        self.assertEqual(queue.pop_batch(), [b"a", b"bb", b"ccc"])
+        stats = queue.stats()
+        self.assertEqual((stats.depth, stats.queued_bytes, stats.sent, stats.max_depth), (0, 0, 3, 3))
+
+    def test_pop_batch_respects_byte_limit_but_returns_at_least_one(self):
+        queue = OutboundQueue()
+        queue.push(b"x" * 10)
+        queue.push(b"y" * 10)
+        self.assertEqual(queue.pop_batch(max_bytes=5), [b"x" * 10])
+        self.assertEqual(queue.pop_batch(max_bytes=5), [b"y" * 10])
+
+    def test_disconnect_policy_overflows(self):
+        queue = OutboundQueue(max_messages=2, max_bytes=1024, policy=SlowConsumerPolicy.DISCONNECT)
+        self.assertTrue(queue.push(b"1", droppable=True))
+        self.assertTrue(queue.push(b"2", droppable=True))
+        self.assertFalse(queue.push(b"3", droppable=True))
+        stats = queue.stats()
+        self.assertTrue(stats.overflowed)
+        self.assertTrue(queue.is_closed())
+        self.assertEqual(stats.depth, 0)
+        self.assertIsNone(queue.wait_pop_batch())
+
+    def test_drop_policy_drops_new_droppable_frames(self):
+        queue = OutboundQueue(max_messages=2, max_bytes=1024, policy=SlowConsumerPolicy.DROP)
+        queue.push(b"1", droppable=True)
+        queue.push(b"2", droppable=True)
+        self.assertTrue(queue.push(b"3", droppable=True))
+        self.assertEqual(queue.stats().dropped, 1)
+        self.assertEqual(queue.pop_batch(), [b"1", b"2"])
+
+    def test_drop_policy_evicts_oldest_droppable_for_essential_frames(self):
+        queue = OutboundQueue(max_messages=2, max_bytes=1024, policy=SlowConsumerPolicy.DROP)
+        queue.push(b"1", droppable=True)
+        queue.push(b"2", droppable=True)
+        self.assertTrue(queue.push(b"joined", droppable=False))
+        self.assertEqual(queue.pop_batch(), [b"2", b"joined"])
+        self.assertEqual(queue.stats().dropped, 1)
+
+    def test_drop_policy_disconnects_when_only_essential_frames_are_queued(self):
+        queue = OutboundQueue(max_messages=1, max_bytes=1024, policy=SlowConsumerPolicy.DROP)
+        queue.push(b"essential")
+        self.assertFalse(queue.push(b"essential-2"))
+        self.assertTrue(queue.stats().overflowed)
+
+    def test_coalesce_policy_replaces_backlog_with_notice(self):
+        queue = OutboundQueue(
+            max_messages=3,
+            max_bytes=1024,
+            policy=SlowConsumerPolicy.COALESCE,
+            coalesce_notice=_notice,
+        )
+        queue.push(b"essential")
+        queue.push(b"m1", droppable=True)
+        queue.push(b"m2", droppable=True)
+        self.assertTrue(queue.push(b"m3", droppable=True))
+        self.assertEqual(queue.pop_batch(), [b"essential", b"skipped:2", b"m3"])
+        self.assertEqual(queue.stats().coalesced, 2)
+
+    def test_coalesce_notices_merge(self):
+        queue = OutboundQueue(
+            max_messages=2,
+            max_bytes=1024,
+            policy=SlowConsumerPolicy.COALESCE,
+            coalesce_notice=_notice,
+        )
+        for idx in range(6):
+            queue.push(f"m{idx}".encode(), droppable=True)
+        batch = queue.pop_batch()
+        self.assertEqual(batch, [b"skipped:5", b"m5"])
+
+    def test_coalesce_requires_notice_encoder(self):
+        with self.assertRaises(ValueError):
+            OutboundQueue(policy=SlowConsumerPolicy.COALESCE)
+
+    def test_linger_collects_frames_into_one_batch(self):
+        queue = OutboundQueue()
+        batches: list[list[bytes]] = []
+        queue.push(b"a")
+        thread = Thread(target=lambda: batches.append(queue.wait_pop_batch(linger_s=0.5)))
+        thread.start()
+        sleep(0.05)
+        queue.push(b"b")
+        queue.push(b"c")
+        thread.join(timeout=2.0)
+        self.assertEqual(batches, [[b"a", b"b", b"c"]])
+
+    def test_linger_ends_early_once_the_batch_is_full(self):
+        queue = OutboundQueue()
+        queue.push(b"a")
+        queue.push(b"b")
+        started = time()
+        self.assertEqual(queue.wait_pop_batch(max_frames=2, linger_s=5.0), [b"a", b"b"])
+        self.assertLess(time() - started, 1.0)
+
+    def test_close_lets_writer_drain_remaining_frames(self):
+        queue = OutboundQueue()
+        received: list[bytes] = []
+
+        def writer():
+            while True:
+                batch = queue.wait_pop_batch()
+                if batch is None:
+                    return
+                received.extend(batch)
+
+        thread = Thread(target=writer)
+        thread.start()
+        queue.push(b"a")
+        queue.push(b"b")
+        queue.close()
+        thread.join(timeout=2.0)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(received, [b"a", b"b"])
+        self.assertFalse(queue.push(b"late"))
+
+
+class TestSlowConsumer(TestCase):
+    def test_slow_client_does_not_stall_other_sessions(self):
+        probe = socket(AF_INET, SOCK_STREAM)
+        try:
+            probe.bind(("127.0.0.1", 0))
+        except PermissionError:
+            self.skipTest("local tcp sockets are not available in this environment")
+        finally:
+            probe.close()
+
+        server = TcpServerLogic(
+            host="127.0.0.1",
+            port=0,
+            slow_consumer_policy=SlowConsumerPolicy.COALESCE,
+            outbound_max_messages=32,
+        )
+        server.start()
+        port = server.get_server_info().get_port()
+        clients: list[socket] = []
+        user_ids = []
+        try:
+            for name in ("Fast", "Slow"):
+                client = socket(AF_INET, SOCK_STREAM)
+                if name == "Slow":
+                    # A tiny receive window makes the server-side writer block quickly.
+                    client.setsockopt(SOL_SOCKET, SO_RCVBUF, 4096)
+                client.settimeout(2.0)
+                client.connect(("127.0.0.1", port))
+                tcp_protocol.send_packet(client, tcp_protocol.encode_join(SerializableUser(uuid4(), name)))
+                while True:
+                    payload = tcp_protocol.recv_packet(client)
+                    if payload[0] == tcp_protocol.PT_S_JOIN_ACK:
+                        user_ids.append(tcp_protocol.decode_server_join_ack(BytesIO(payload[1:])).get_id())
+                        break
+                clients.append(client)
+            fast, _slow = clients
+            fast_id, slow_id = user_ids
+
+            received = []
+
+            def read_fast():
+                try:
+                    while len(received) < 200:
+                        if tcp_protocol.recv_packet(fast)[0] == tcp_protocol.PT_S_PUBLIC:
+                            received.append(True)
+                except IOError:
+                    pass
+
+            reader = Thread(target=read_fast, daemon=True)
+            reader.start()
+
+            big = "x" * 30_000
+            started = time()
+            for _ in range(200):
+                server.post_system_message(big)
+                sleep(0.001)
+            self.assertLess(time() - started, 3.0)
+
+            reader.join(timeout=5.0)
+            self.assertEqual(len(received), 200)
+
+            deadline = time() + 2.0
+            while time() < deadline and server.list_outbound_queue_stats()[slow_id].coalesced == 0:
+                sleep(0.01)
+            stats = server.list_outbound_queue_stats()
+            self.assertGreater(stats[slow_id].coalesced, 0)
+            self.assertEqual(stats[fast_id].coalesced, 0)
+            self.assertEqual(len(server.list_members()), 2)
+        finally:
+            for client in clients:
+                client.close()
+            server.stop()
@@ -0,0 +1,131 @@
+import subprocess
+import sys
+from pathlib import Path
+from signal import SIGTERM
+from socket import AF_INET, SOCK_STREAM, socket
+from unittest import TestCase
+from uuid import uuid4
+
+from localchat.net import SerializableUser, tcp_protocol
+
+
+_ROOT = Path(__file__).resolve().parents[3]
+
+
+def _tcp_available() -> bool:
+    probe = socket(AF_INET, SOCK_STREAM)
+    try:
+        probe.bind(("127.0.0.1", 0))
+        return True
+    except PermissionError:
+        return False
+    finally:
+        probe.close()
+
+
+class TestServe(TestCase):
+    def _python(self, *args: str, **kwargs) -> subprocess.Popen:
+        return subprocess.Popen(
+            [sys.executable, *args],
+            cwd=_ROOT,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            **kwargs,
+        )
+
+    def test_server_entry_point_does_not_import_client_code(self):
+        process = self._python(
+            "-c",
+            "import sys\n"
+            "import localchat.__main__\n"
+            "from localchat.server.logicImpl import AsyncTcpServerLogic, TcpServerLogic\n"
+            "print(' '.join(sorted(name for name in sys.modules if name.startswith('localchat.'))))\n",
+        )
+        stdout, stderr = process.communicate(timeout=30)
+        self.assertEqual(process.returncode, 0, stderr)
+        modules = stdout.split()
+        self.assertIn("localchat.server.logicImpl.AsyncTcpServerLogic", modules)
+        for module in modules:
+            self.assertFalse(module.startswith(("localchat.client", "localchat.settings")), module)
+        self.assertNotIn("localchat.net.TestSerializable", modules)
+
+    def test_serve_accepts_clients_and_stops_on_sigterm(self):
+        if not _tcp_available():
+            self.skipTest("local tcp sockets are not available in this environment")
+        process = self._python(
+            "-m", "localchat", "serve", "--host", "127.0.0.1", "--port", "0", "--name", "headless", "--rate-limit", "0",
+        )
+        try:
+            ready = process.stdout.readline()
+            self.assertTrue(ready.startswith("serving 'headless' on 127.0.0.1:"), ready)
+            port = int(ready.strip().rsplit(":", 1)[1])
+            client = socket(AF_INET, SOCK_STREAM)
+            client.settimeout(5.0)
+            try:
+                client.connect(("127.0.0.1", port))
+                tcp_protocol.send_packet(client, tcp_protocol.encode_join(SerializableUser(uuid4(), "Alice")))
+                packet_types = [tcp_protocol.recv_packet(client)[0] for _ in range(2)]
+                self.assertIn(tcp_protocol.PT_S_JOIN_ACK, packet_types)
+            finally:
+                client.close()
+            process.send_signal(SIGTERM)
+            process.communicate(timeout=10)
+            self.assertEqual(process.returncode, 0)
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.communicate()
+
+    @staticmethod
+    def _join_answer(client: socket) -> int:
+        while True:
+            packet_type = tcp_protocol.recv_packet(client)[0]
+            if packet_type in (tcp_protocol.PT_S_JOIN_ACK, tcp_protocol.PT_S_JOIN_NACK):
+                return packet_type
+
+    def test_serve_with_workers_shares_one_port(self):
+        if not _tcp_available():
+            self.skipTest("local tcp sockets are not available in this environment")
+        process = self._python(
+            "-m", "localchat", "serve", "--host", "127.0.0.1", "--port", "0", "--workers", "2", "--rate-limit", "0",
+        )
+        try:
+            ready = process.stdout.readline()
+            self.assertTrue(ready.startswith("serving 'localchat-server' on 127.0.0.1:"), ready)
+            self.assertTrue(ready.strip().endswith(" with 2 workers"), ready)
+            port = int(ready.split(":", 1)[1].split(" ", 1)[0])
+            clients = []
+            try:
+                answers = []
+                for name in ("Alice", "alice"):
+                    client = socket(AF_INET, SOCK_STREAM)
+                    client.settimeout(5.0)
+                    clients.append(client)
+                    client.connect(("127.0.0.1", port))
+                    tcp_protocol.send_packet(client, tcp_protocol.encode_join(SerializableUser(uuid4(), name)))
+                    answers.append(self._join_answer(client))
+                # Wherever the kernel put the second connection, the name is taken.
+                self.assertEqual(answers, [tcp_protocol.PT_S_JOIN_ACK, tcp_protocol.PT_S_JOIN_NACK])
+            finally:
+                for client in clients:
+                    client.close()
+            process.send_signal(SIGTERM)
+            process.communicate(timeout=20)
+            self.assertEqual(process.returncode, 0)
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.communicate()
+
+    def test_serve_rejects_a_journal_with_workers(self):
+        process = self._python("-m", "localchat", "serve", "--workers", "2", "--journal", "unused")
+        _, stderr = process.communicate(timeout=30)
+        self.assertEqual(process.returncode, 2)
+        self.assertIn("--journal cannot be combined with --workers", stderr)
+
+    def test_serve_rejects_negative_admission_rates(self):
+        process = self._python("-m", "localchat", "serve", "--port", "0", "--connect-rate", "-1")
+        _, stderr = process.communicate(timeout=30)
+        self.assertEqual(process.returncode, 2)
+        self.assertIn("admission rates must not be negative", stderr)
@@ -0,0 +1,260 @@
+from io import BytesIO
+from socket import AF_INET, SOCK_STREAM, socket, socketpair
+from uuid import uuid4
+
+from localchat.config.limits import MAX_ROOMS
+from localchat.net import SerializableUser, SerializableUserMessage, tcp_protocol
+from localchat.server.cluster import ClusterCoordinator, ClusterLink, ServerCluster, protocol
+from localchat.server.logicImpl import AsyncTcpServerLogic, TcpServerLogic
+from localchat.util import Role
+from test.localchatTest.server._tcp_helpers import TcpServerTestCase, recv_until_type, tcp_available, wait_for
+
+
+class TestServerCluster(TcpServerTestCase):
+    """
+    Workers as servers in this process: every server has its own port, so each client picks
+    the worker it connects to.
+    """
+
+    def _start_cluster(
+            self,
+            workers: int = 2,
+            server_type=AsyncTcpServerLogic,
+            max_rooms: int = MAX_ROOMS,
+    ) -> tuple[ClusterCoordinator, list[TcpServerLogic], list[ClusterLink]]:
+        if not tcp_available():
+            self.skipTest("local tcp sockets are not available in this environment")
+        coordinator = ClusterCoordinator(max_rooms)
+        self.errors = []
+        coordinator.set_error_handler(self.errors.append)
+        self.addCleanup(coordinator.close)
+        server_id = uuid4()
+        servers = []
+        links = []
+        for index in range(workers):
+            coordinator_end, worker_end = socketpair()
+            coordinator.add_worker(index, coordinator_end)
+            server = server_type(host="127.0.0.1", port=0, max_rooms=max_rooms, rate_limit_msg_per_sec=0)
+            link = ClusterLink(worker_end, index, server_id, answers_discovery=False)
+            server.set_cluster_link(link)
+            servers.append(server)
+            links.append(link)
+        coordinator.start()
+        for server, link in zip(servers, links):
+            server.start()
+            self.addCleanup(self._stop_worker, server, link)
+        return coordinator, servers, links
+
+    @staticmethod
+    def _stop_worker(server: TcpServerLogic, link: ClusterLink):
+        if server.is_running():
+            server.stop()
+        link.close()
+
+    def test_names_and_the_host_are_shared_by_all_workers(self):
+        coordinator, (first, second), _ = self._start_cluster(server_type=TcpServerLogic)
+        _, alice = self._join(first, "Alice")
+        self.assertEqual(self._join_nack_code(second, " alice"), tcp_protocol.ERR_USER_NAME_IN_USE)
+        _, bob = self._join(second, "Bob")
+
+        self.assertTrue(wait_for(lambda: len(first.list_members()) == 2))
+        self.assertEqual(sorted(member.get_name() for member in second.list_members()), ["Alice", "Bob"])
+        for server in (first, second):
+            self.assertEqual(server.get_user_role(alice.get_id()), Role.HOST)
+            self.assertEqual(server.get_user_role(bob.get_id()), Role.MEMBER)
+        self.assertEqual(coordinator.list_members(), {alice.get_id(): Role.HOST, bob.get_id(): Role.MEMBER})
+        self.assertEqual(first.get_server_info().get_id(), second.get_server_info().get_id())
+
+    def test_messages_reach_members_of_other_workers(self):
+        _, (first, second), _ = self._start_cluster()
+        alice, alice_user = self._join(first, "Alice")
+        bob, _ = self._join(second, "Bob")
+
+        tcp_protocol.send_packet(alice, tcp_protocol.encode_public_message("hello everyone"))
+        payload = recv_until_type(bob, tcp_protocol.PT_S_PUBLIC)
+        self.assertEqual(SerializableUserMessage.deserialize(BytesIO(payload[1:])).message(), "hello everyone")
+        self.assertTrue(wait_for(lambda: len(second.search_messages(["everyone"])) == 1))
+        # Counted once, by the worker that accepted it.
+        self.assertEqual(first.get_metrics().value("localchat_messages_total", {"kind": "public"}), 1)
+        self.assertEqual(second.get_metrics().value("localchat_messages_total", {"kind": "public"}), 0)
+
+        tcp_protocol.send_packet(bob, tcp_protocol.encode_private_message(alice_user.get_id(), "just for you"))
+        payload = recv_until_type(alice, tcp_protocol.PT_S_PRIVATE)
+        self.assertEqual(SerializableUserMessage.deserialize(BytesIO(payload[1:])).message(), "just for you")
+
+    def test_kick_and_host_change_reach_the_owning_worker(self):
+        coordinator, (first, second), _ = self._start_cluster()
+        self._join(first, "Alice")
+        bob, bob_user = self._join(second, "Bob")
+        _, carol = self._join(second, "Carol")
+        self.assertTrue(wait_for(lambda: len(first.list_members()) == 3))
+
+        first.transfer_host(carol.get_id())
+        self.assertEqual(first.get_user_role(carol.get_id()), Role.HOST)
+        self.assertTrue(wait_for(lambda: second.get_user_role(carol.get_id()) == Role.HOST))
+        self.assertEqual(coordinator.list_members()[carol.get_id()], Role.HOST)
+
+        first.kick_member(bob_user.get_id(), "bye")
+        error = recv_until_type(bob, tcp_protocol.PT_S_ERROR)
+        self.assertEqual(tcp_protocol.decode_server_error(BytesIO(error[1:])), (tcp_protocol.ERR_DISCONNECTED, "bye"))
+        self.assertTrue(wait_for(lambda: bob_user.get_id() not in coordinator.list_members()))
+        self.assertTrue(wait_for(lambda: len(second.list_members()) == 2))
+        self.assertEqual(len(first.list_members()), 2)
+
+    def test_bans_and_locks_apply_on_every_worker(self):
+        coordinator, (first, second), links = self._start_cluster()
+        self._join(first, "Alice")
+        bob, bob_user = self._join(second, "Bob")
+        self.assertTrue(wait_for(lambda: len(first.list_members()) == 2))
+
+        first.ban_member(bob_user.get_id(), "banned")
+        error = recv_until_type(bob, tcp_protocol.PT_S_ERROR)
+        self.assertEqual(tcp_protocol.decode_server_error(BytesIO(error[1:])), (tcp_protocol.ERR_DISCONNECTED, "banned"))
+        self.assertTrue(wait_for(lambda: second.list_banned_users() == {bob_user.get_id()}))
+        self.assertTrue(wait_for(lambda: bob_user.get_id() not in coordinator.list_members()))
+        # The coordinator refuses the banned id whichever worker asks.
+        with self.assertRaises(ConnectionRefusedError):
+            links[0].admit("", bob_user)
+        second.unban_member(bob_user.get_id())
+        self.assertTrue(wait_for(lambda: first.list_banned_users() == set()))
+
+        first.set_locked(True)
+        self.assertTrue(wait_for(second.is_locked))
+        self.assertEqual(self._join_nack_code(second, "Carol"), tcp_protocol.ERR_JOIN_REJECTED)
+        second.set_locked(False)
+        self.assertTrue(wait_for(lambda: not first.is_locked()))
+        self._join(second, "Carol")
+
+        self._join(first, "Dave", "red")
+        second.get_room("red").set_locked(True)
+        self.assertTrue(wait_for(first.get_room("red").is_locked))
+        self.assertEqual(self._join_nack_code(second, "Erin", "red"), tcp_protocol.ERR_JOIN_REJECTED)
+        self.assertEqual(self._join_nack_code(first, "Erin", "red"), tcp_protocol.ERR_JOIN_REJECTED)
+
+    def test_rooms_and_the_room_limit_span_the_workers(self):
+        _, (first, second), _ = self._start_cluster(max_rooms=1)
+        red, _ = self._join(first, "Alice", "red")
+        self.assertEqual(self._join_nack_code(second, "Bob", "blue"), tcp_protocol.ERR_TOO_MANY_ROOMS)
+        bob, _ = self._join(second, "Bob", "RED")
+        dave, _ = self._join(second, "Dave")
+
+        tcp_protocol.send_packet(red, tcp_protocol.encode_public_message("for red"))
+        payload = recv_until_type(bob, tcp_protocol.PT_S_PUBLIC)
+        self.assertEqual(SerializableUserMessage.deserialize(BytesIO(payload[1:])).message(), "for red")
+        # Dave's own message is the first public one he gets: the red one never arrived.
+        tcp_protocol.send_packet(dave, tcp_protocol.encode_public_message("for default"))
+        payload = recv_until_type(dave, tcp_protocol.PT_S_PUBLIC)
+        self.assertEqual(SerializableUserMessage.deserialize(BytesIO(payload[1:])).message(), "for default")
+        self.assertEqual(first.list_rooms(), {"": 1, "red": 2})
+
+    def test_members_of_a_lost_worker_leave_everywhere(self):
+        coordinator, (first, second), links = self._start_cluster()
+        self._join(first, "Alice")
+        self._join(second, "Bob")
+        self.assertTrue(wait_for(lambda: len(first.list_members()) == 2))
+
+        links[1].close()
+        self.assertTrue(wait_for(lambda: [member.get_name() for member in first.list_members()] == ["Alice"]))
+        self.assertEqual(len(coordinator.list_members()), 1)
+        self.assertEqual(len(self.errors), 1)
+        # Bob's name is free again.
+        self._join(first, "Bob")
+
+    def test_a_join_waiting_for_the_coordinator_does_not_stall_other_sessions(self):
+        if not tcp_available():
+            self.skipTest("local tcp sockets are not available in this environment")
+        # A coordinator played by the test, so it can hold back its answer.
+        coordinator_end, worker_end = socketpair()
+        coordinator_end.settimeout(2.0)
+        self.addCleanup(coordinator_end.close)
+        bus = tcp_protocol.PacketReceiver(coordinator_end)
+        server = AsyncTcpServerLogic(host="127.0.0.1", port=0, rate_limit_msg_per_sec=0)
+        link = ClusterLink(worker_end, 0, uuid4(), answers_discovery=False)
+        server.set_cluster_link(link)
+        server.start()
+        self.addCleanup(self._stop_worker, server, link)
+
+        def next_admit() -> int:
+            while True:
+                frame_type, body = protocol.decode_frame(bus.recv_packet())
+                if frame_type == protocol.BUS_ADMIT:
+                    return protocol.decode_admit(body)[0]
+
+        alice = self._connect(server)
+        tcp_protocol.send_packet(alice, tcp_protocol.encode_join(SerializableUser(uuid4(), "Alice")))
+        tcp_protocol.send_packet(coordinator_end, protocol.encode_reply(next_admit(), role=Role.HOST))
+        recv_until_type(alice, tcp_protocol.PT_S_JOIN_ACK)
+
+        bob = self._connect(server)
+        tcp_protocol.send_packet(bob, tcp_protocol.encode_join(SerializableUser(uuid4(), "Bob")))
+        bob_request = next_admit()
+        tcp_protocol.send_packet(alice, tcp_protocol.encode_public_message("while Bob waits"))
+        payload = recv_until_type(alice, tcp_protocol.PT_S_PUBLIC)
+        self.assertEqual(SerializableUserMessage.deserialize(BytesIO(payload[1:])).message(), "while Bob waits")
+
+        tcp_protocol.send_packet(coordinator_end, protocol.encode_reply(bob_request))
+        recv_until_type(bob, tcp_protocol.PT_S_JOIN_ACK)
+        self.assertEqual(server.get_user_role(server.list_members()[0].get_id()), Role.HOST)
+        self.assertEqual(len(server.list_members()), 2)
+
+    def test_every_parked_join_resumes_its_own_session(self):
+        if not tcp_available():
+            self.skipTest("local tcp sockets are not available in this environment")
+        coordinator_end, worker_end = socketpair()
+        coordinator_end.settimeout(2.0)
+        self.addCleanup(coordinator_end.close)
+        bus = tcp_protocol.PacketReceiver(coordinator_end)
+        server = AsyncTcpServerLogic(host="127.0.0.1", port=0, rate_limit_msg_per_sec=0)
+        link = ClusterLink(worker_end, 0, uuid4(), answers_discovery=False)
+        server.set_cluster_link(link)
+        server.start()
+        self.addCleanup(self._stop_worker, server, link)
+
+        clients = [self._connect(server) for _ in range(8)]
+        for index, client in enumerate(clients):
+            tcp_protocol.send_packet(client, tcp_protocol.encode_join(SerializableUser(uuid4(), f"user{index}")))
+        answered = 0
+        while answered < len(clients):
+            frame_type, body = protocol.decode_frame(bus.recv_packet())
+            if frame_type == protocol.BUS_ADMIT:
+                role = Role.HOST if answered == 0 else Role.MEMBER
+                tcp_protocol.send_packet(coordinator_end, protocol.encode_reply(protocol.decode_admit(body)[0], role=role))
+                answered += 1
+        for client in clients:
+            recv_until_type(client, tcp_protocol.PT_S_JOIN_ACK)
+
+        # A session that was never resumed would not read its message, so nobody would get it.
+        for index, client in enumerate(clients):
+            tcp_protocol.send_packet(client, tcp_protocol.encode_public_message(f"from user{index}"))
+        expected = sorted(f"from user{index}" for index in range(len(clients)))
+        for client in clients:
+            received = [
+                SerializableUserMessage.deserialize(BytesIO(recv_until_type(client, tcp_protocol.PT_S_PUBLIC)[1:])).message()
+                for _ in range(len(clients))
+            ]
+            self.assertEqual(sorted(received), expected)
+
+    def test_server_cluster_runs_workers_on_one_port(self):
+        if not tcp_available():
+            self.skipTest("local tcp sockets are not available in this environment")
+        cluster = ServerCluster(2, host="127.0.0.1", port=0, metrics=False, server_options={"rate_limit_msg_per_sec": 0})
+        cluster.start()
+        self.addCleanup(cluster.stop)
+        self.assertEqual(len(cluster.get_worker_pids()), 2)
+        clients = []
+        for index in range(4):
+            client = socket(AF_INET, SOCK_STREAM)
+            client.settimeout(5.0)
+            client.connect(("127.0.0.1", cluster.get_port()))
+            self.addCleanup(client.close)
+            tcp_protocol.send_packet(client, tcp_protocol.encode_join(SerializableUser(uuid4(), f"user{index}")))
+            recv_until_type(client, tcp_protocol.PT_S_JOIN_ACK)
+            clients.append(client)
+        self.assertEqual(len(cluster.get_coordinator().list_members()), 4)
+
+        tcp_protocol.send_packet(clients[0], tcp_protocol.encode_public_message("to all workers"))
+        for client in clients:
+            payload = recv_until_type(client, tcp_protocol.PT_S_PUBLIC)
+            self.assertEqual(SerializableUserMessage.deserialize(BytesIO(payload[1:])).message(), "to all workers")
+        cluster.stop()
+        self.assertFalse(cluster.is_running())
@@ -6,6 +6,7 @@ from localchat.server.commands import ServerCommandDispatcher
 from localchat.server.logicImpl import InMemoryLogic
 from localchat.util import Role
 from localchat.util.event import Event, EventListener
+from localchat.util.metrics import MetricsRegistry
 
 
 class _Collector(EventListener):
@@ -108,3 +109,55 @@ class TestServerCommandDispatcher(TestCase):
         self.assertTrue(any("server '" in p and "members=" in p for p in payloads))
         self.assertTrue(any("you are" in p and "role=member" in p for p in payloads))
         logic.stop()
+
+    def test_kick_resolves_id_prefix_and_name(self):
+        logic = InMemoryLogic()
+        logic.start()
+
+        host = self._mk_user("Host")
+        by_prefix = self._mk_user("Target")
+        by_name = self._mk_user("Other")
+        logic.register_member(host, Role.HOST)
+        logic.register_member(by_prefix, Role.MEMBER)
+        logic.register_member(by_name, Role.MEMBER)
+
+        dispatcher = ServerCommandDispatcher(logic)
+        self.assertTrue(dispatcher.try_execute(host.get_id(), f"/kick {str(by_prefix.get_id())[:12]}"))
+        self.assertTrue(dispatcher.try_execute(host.get_id(), "/kick OTHER"))
+        self.assertEqual([u.get_id() for u in logic.list_members()], [host.get_id()])
+        logic.stop()
+
+    def test_stats_reports_counters_to_host_only(self):
+        logic = InMemoryLogic()
+        logic.start()
+        private_events = _Collector()
+        logic.on_private_message().add_listener(private_events)
+
+        host = self._mk_user("Host")
+        member = self._mk_user("Member")
+        logic.register_member(host, Role.HOST)
+        logic.register_member(member, Role.MEMBER)
+        logic.post_system_message("hello")
+
+        dispatcher = ServerCommandDispatcher(logic)
+        self.assertTrue(dispatcher.try_execute(member.get_id(), "/stats"))
+        self.assertIn("permission denied", private_events.items[-1].message())
+        self.assertTrue(dispatcher.try_execute(host.get_id(), "/stats"))
+        report = private_events.items[-1].message()
+        self.assertTrue(report.startswith("stats after "))
+        self.assertIn("messages: 1 public", report)
+        logic.stop()
+
+    def test_stats_without_metrics(self):
+        logic = InMemoryLogic(metrics=MetricsRegistry(enabled=False))
+        logic.start()
+        private_events = _Collector()
+        logic.on_private_message().add_listener(private_events)
+
+        host = self._mk_user("Host")
+        logic.register_member(host, Role.HOST)
+
+        dispatcher = ServerCommandDispatcher(logic)
+        self.assertTrue(dispatcher.try_execute(host.get_id(), "/stats"))
+        self.assertEqual(private_events.items[-1].message(), "metrics are not available")
+        logic.stop()
@@ -110,6 +110,32 @@ class TestServerLogic(TestCase):
             logic.get_user_role(member.get_id())
         logic.stop()
 
+    def test_member_index_lookups(self):
+        logic = InMemoryLogic()
+        logic.start()
+
+        alice = self._mk_user("Alice")
+        bob = self._mk_user("Bob")
+        logic.register_member(alice, Role.HOST)
+        logic.register_member(bob, Role.MEMBER)
+
+        self.assertIs(logic.get_member(bob.get_id()), bob)
+        self.assertIs(logic.find_member_by_name("  aLICE "), alice)
+        self.assertIsNone(logic.find_member_by_name("Carol"))
+        self.assertEqual(logic.find_members_by_id_prefix(str(bob.get_id())[:8].upper()), [bob])
+        self.assertEqual(len(logic.find_members_by_id_prefix("", limit=5)), 0)
+        with self.assertRaises(PermissionError):
+            logic.register_member(self._mk_user("ALICE"), Role.MEMBER)
+
+        logic.kick_member(bob.get_id(), "bye")
+        with self.assertRaises(KeyError):
+            logic.get_member(bob.get_id())
+        self.assertIsNone(logic.find_member_by_name("bob"))
+        self.assertEqual(logic.find_members_by_id_prefix(str(bob.get_id())), [])
+        logic.register_member(self._mk_user("bob"), Role.MEMBER)
+        self.assertEqual(logic.find_member_by_name("BOB").get_name(), "bob")
+        logic.stop()
+
     def test_system_messages_and_save_chat(self):
         logic = InMemoryLogic()
         pub = _Collector()
@@ -0,0 +1,158 @@
+import shutil
+import tempfile
+from io import BytesIO
+from socket import socket
+from time import sleep, time
+from uuid import uuid4
+
+from localchat.client.logicImpl import TcpClientLogic
+from localchat.net import SerializableUser, SerializableUserMessage, tcp_protocol
+from localchat.server.logicImpl import AsyncTcpServerLogic, MessageJournal, TcpServerLogic, normalize_room_id
+from localchat.util import Role
+from test.localchatTest.server._tcp_helpers import TcpServerTestCase, recv_until_type
+
+
+class TestServerRooms(TcpServerTestCase):
+    def _next_public(self, client: socket) -> SerializableUserMessage:
+        payload = recv_until_type(client, tcp_protocol.PT_S_PUBLIC)
+        return SerializableUserMessage.deserialize(BytesIO(payload[1:]))
+
+    def _command(self, server: TcpServerLogic, room: str, client: socket, command: str) -> str:
+        server_user_id = server.get_room(room)._get_server_user_id()
+        tcp_protocol.send_packet(client, tcp_protocol.encode_private_message(server_user_id, command))
+        payload = recv_until_type(client, tcp_protocol.PT_S_PRIVATE)
+        return SerializableUserMessage.deserialize(BytesIO(payload[1:])).message()
+
+    def test_room_ids_are_normalized_and_validated(self):
+        self.assertEqual(normalize_room_id("  Team-A "), "team-a")
+        self.assertEqual(normalize_room_id(""), "")
+        for invalid in ("../etc", ".hidden", "a/b", "ä", "x" * 65):
+            with self.assertRaises(ValueError):
+                normalize_room_id(invalid)
+
+    def test_broadcasts_only_reach_the_room(self):
+        server = self._start_server(AsyncTcpServerLogic)
+        alice, _ = self._join(server, "Alice", "red")
+        bob, _ = self._join(server, "Bob", "RED")
+        carol, _ = self._join(server, "Carol", "blue")
+        dave, _ = self._join(server, "Dave")
+
+        tcp_protocol.send_packet(alice, tcp_protocol.encode_public_message("for red"))
+        self.assertEqual(self._next_public(bob).message(), "for red")
+        # Each receives its own message first: the red one never arrived.
+        tcp_protocol.send_packet(carol, tcp_protocol.encode_public_message("for blue"))
+        self.assertEqual(self._next_public(carol).message(), "for blue")
+        tcp_protocol.send_packet(dave, tcp_protocol.encode_public_message("for default"))
+        self.assertEqual(self._next_public(dave).message(), "for default")
+
+        self.assertEqual([hit.message() for _, hit in server.get_room("red").search_messages(["red"])], ["for red"])
+        self.assertEqual(server.get_room("blue").search_messages(["red"]), [])
+        self.assertEqual([hit.message() for _, hit in server.search_messages(["default"])], ["for default"])
+        self.assertEqual(server.list_rooms(), {"": 1, "red": 2, "blue": 1})
+        self.assertEqual(server.get_metrics().value("localchat_members"), 4)
+        self.assertEqual(server.get_metrics().value("localchat_rooms"), 3)
+
+    def test_rooms_have_their_own_members_hosts_and_names(self):
+        server = self._start_server()
+        self._join(server, "Alice", "red")
+        self._join(server, "Bob", "red")
+        _, carol = self._join(server, "Alice", "blue")
+        _, host = self._join(server, "Host")
+
+        red = server.get_room("red")
+        self.assertEqual(sorted(member.get_name() for member in red.list_members()), ["Alice", "Bob"])
+        self.assertEqual(red.get_host_user().get_name(), "Alice")
+        self.assertEqual(server.get_room("blue").get_host_user().get_id(), carol.get_id())
+        self.assertEqual(server.get_user_role(host.get_id()), Role.HOST)
+        self.assertEqual([member.get_name() for member in server.list_members()], ["Host"])
+        self.assertEqual(self._join_nack_code(server, "bob", "red"), tcp_protocol.ERR_USER_NAME_IN_USE)
+
+    def test_commands_and_private_messages_stay_in_the_room(self):
+        server = self._start_server()
+        alice, _ = self._join(server, "Alice", "red")
+        self._join(server, "Bob", "red")
+        carol, carol_user = self._join(server, "Carol", "blue")
+
+        listing = self._command(server, "red", alice, "/list")
+        self.assertTrue(listing.startswith("members of room 'red': "))
+        self.assertIn("Bob", listing)
+        self.assertNotIn("Carol", listing)
+        info = self._command(server, "red", alice, "/serverinfo")
+        self.assertIn("room='red', rooms=3 (3 members in total)", info)
+        self.assertIn("in room 'red'", self._command(server, "red", alice, "/whoami"))
+
+        tcp_protocol.send_packet(alice, tcp_protocol.encode_private_message(carol_user.get_id(), "psst"))
+        error = recv_until_type(alice, tcp_protocol.PT_S_ERROR)
+        self.assertEqual(tcp_protocol.decode_server_error(BytesIO(error[1:]))[0], tcp_protocol.ERR_UNKNOWN_RECIPIENT)
+        with self.assertRaises(KeyError):
+            server.get_room("red").kick_member(carol_user.get_id())
+
+    def test_rate_limit_is_per_room(self):
+        server = self._start_server(rate_limit_msg_per_sec=0)
+        server.create_room("slow", rate_limit_msg_per_sec=0.001, rate_limit_burst=1)
+        slow, _ = self._join(server, "Alice", "slow")
+        fast, _ = self._join(server, "Bob")
+
+        for text in ("one", "two"):
+            tcp_protocol.send_packet(slow, tcp_protocol.encode_public_message(text))
+        self.assertEqual(self._next_public(slow).message(), "one")
+        error = recv_until_type(slow, tcp_protocol.PT_S_ERROR)
+        self.assertEqual(tcp_protocol.decode_server_error(BytesIO(error[1:]))[0], tcp_protocol.ERR_RATE_LIMITED)
+
+        for index in range(10):
+            tcp_protocol.send_packet(fast, tcp_protocol.encode_public_message(f"fast {index}"))
+        for index in range(10):
+            self.assertEqual(self._next_public(fast).message(), f"fast {index}")
+
+    def test_invalid_rooms_and_room_limit_are_rejected(self):
+        server = self._start_server(max_rooms=1)
+        self.assertEqual(self._join_nack_code(server, "Alice", "no/slashes"), tcp_protocol.ERR_INVALID_ROOM)
+        self._join(server, "Alice", "first")
+        self.assertEqual(self._join_nack_code(server, "Bob", "second"), tcp_protocol.ERR_TOO_MANY_ROOMS)
+        with self.assertRaises(LookupError):
+            server.create_room("third")
+        with self.assertRaises(ValueError):
+            server.create_room("first")
+        self.assertEqual(server.get_metrics().value("localchat_join_rejected_total", {"reason": "invalid_room"}), 1)
+
+    def test_discovery_lists_the_rooms(self):
+        server = self._start_server()
+        server.create_room("lobby")
+        self._join(server, "Alice", "team")
+        self.assertEqual(server._discovery_snapshot().rooms, ("lobby", "team"))
+
+    def test_tcp_chat_joins_the_room_of_a_join_target(self):
+        server = self._start_server()
+        self._join(server, "Alice", "red")
+        logic = TcpClientLogic(async_events=False)
+        chat = logic.connect_direct("127.0.0.1", server.get_server_info().get_port(), room="red")
+        chat.join(SerializableUser(uuid4(), "Bob"))
+        try:
+            end = time() + 2.0
+            while time() < end and len(server.get_room("red").list_members()) < 2:
+                sleep(0.01)
+            self.assertEqual(len(server.get_room("red").list_members()), 2)
+            self.assertEqual(server.list_members(), [])
+        finally:
+            chat.leave()
+
+    def test_room_history_survives_a_restart_with_room_journals(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+
+        def create_server() -> TcpServerLogic:
+            return self._start_server(
+                journal=MessageJournal(f"{directory}/default"),
+                room_journal_factory=lambda room_id: MessageJournal(f"{directory}/rooms/{room_id}"),
+            )
+
+        server = create_server()
+        alice, _ = self._join(server, "Alice", "red")
+        tcp_protocol.send_packet(alice, tcp_protocol.encode_public_message("remember me"))
+        self._next_public(alice)
+        server.stop()
+
+        restarted = create_server()
+        self._join(restarted, "Bob", "red")
+        self.assertEqual(len(restarted.get_room("red").search_messages(["remember"])), 1)
+        self.assertEqual(restarted.search_messages(["remember"]), [])
@@ -0,0 +1,2 @@
+from . import test_EventHandler
+from . import test_Metrics
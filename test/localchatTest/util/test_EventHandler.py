@@ -0,0 +1,192 @@
+from contextlib import redirect_stderr
+from io import StringIO
+from threading import Event as ThreadEvent, current_thread
+from time import perf_counter
+from unittest import TestCase
+from uuid import uuid4
+
+from localchat.util.event import Event, EventDispatcher, EventHandler, EventListener
+
+
+class _Recorder(EventListener):
+    def __init__(self, gate: ThreadEvent | None = None):
+        self.values = []
+        self.threads = set()
+        self._gate = gate
+
+    def on_event(self, event: Event):
+        if self._gate is not None:
+            self._gate.wait(5.0)
+        self.threads.add(current_thread())
+        self.values.append(event.value())
+
+
+class _BatchRecorder(EventListener):
+    def __init__(self, gate: ThreadEvent | None = None):
+        self.batches = []
+        self._gate = gate
+
+    def on_event(self, event: Event):
+        self.on_events([event])
+
+    def on_events(self, events: list[Event]):
+        if self._gate is not None:
+            self._gate.wait(5.0)
+        self.batches.append([event.value() for event in events])
+
+
+class _Failing(EventListener):
+    def on_event(self, event: Event):
+        if event.value() == 1:
+            raise ValueError("listener failed")
+
+
+_OWNER = uuid4()
+
+
+class TestEventHandler(TestCase):
+    def test_listeners_run_synchronously_by_default(self):
+        handler = EventHandler()
+        recorder = _Recorder()
+        handler.add_listener(recorder)
+        handler.handle(Event(_OWNER, "a"))
+        self.assertEqual(recorder.values, ["a"])
+        self.assertEqual(recorder.threads, {current_thread()})
+        self.assertEqual(handler.queue_depth(), 0)
+
+    def test_dispatcher_delivers_in_order_off_the_calling_thread(self):
+        dispatcher = EventDispatcher()
+        handler = EventHandler(dispatcher)
+        recorder = _Recorder()
+        handler.add_listener(recorder)
+        for idx in range(1000):
+            handler.handle(Event(_OWNER, idx))
+        self.assertTrue(dispatcher.wait_idle(5.0))
+        self.assertEqual(recorder.values, list(range(1000)))
+        self.assertNotIn(current_thread(), recorder.threads)
+        self.assertEqual((handler.queue_depth(), dispatcher.delivered()), (0, 1000))
+        dispatcher.close()
+
+    def test_slow_listener_does_not_block_handle(self):
+        dispatcher = EventDispatcher()
+        handler = EventHandler(dispatcher)
+        gate = ThreadEvent()
+        recorder = _Recorder(gate)
+        handler.add_listener(recorder)
+        started = perf_counter()
+        for idx in range(50):
+            handler.handle(Event(_OWNER, idx))
+        self.assertLess(perf_counter() - started, 1.0)
+        self.assertEqual(handler.queue_depth(), 50)
+        self.assertGreaterEqual(dispatcher.max_pending(), 49)
+        gate.set()
+        self.assertTrue(dispatcher.wait_idle(5.0))
+        self.assertEqual(recorder.values, list(range(50)))
+        self.assertEqual(handler.queue_depth(), 0)
+        dispatcher.close()
+
+    def test_shared_dispatcher_keeps_order_across_handlers(self):
+        dispatcher = EventDispatcher()
+        joined, posted = EventHandler(dispatcher), EventHandler(dispatcher)
+        recorder = _Recorder()
+        joined.add_listener(recorder)
+        posted.add_listener(recorder)
+        for idx in range(100):
+            (joined if idx % 2 == 0 else posted).handle(Event(_OWNER, idx))
+        self.assertTrue(dispatcher.wait_idle(5.0))
+        self.assertEqual(recorder.values, list(range(100)))
+        dispatcher.close()
+
+    def test_failing_listener_does_not_stop_the_worker(self):
+        dispatcher = EventDispatcher()
+        handler = EventHandler(dispatcher)
+        recorder = _Recorder()
+        handler.add_listener(_Failing())
+        handler.add_listener(recorder)
+        with redirect_stderr(StringIO()) as errors:
+            for idx in range(3):
+                handler.handle(Event(_OWNER, idx))
+            self.assertTrue(dispatcher.wait_idle(5.0))
+        # Without an error callback a failure is only counted: nothing lands on the (CLI) screen.
+        self.assertEqual(errors.getvalue(), "")
+        self.assertEqual(dispatcher.failed(), 1)
+        self.assertEqual(handler.queue_depth(), 0)
+        self.assertIn(2, recorder.values)
+        dispatcher.close()
+
+    def test_failures_go_to_the_error_callback(self):
+        failures = []
+
+        def failing_callback(error: Exception):
+            failures.append(error)
+            raise RuntimeError("callback failed")
+
+        dispatcher = EventDispatcher(on_error=failing_callback)
+        handler = EventHandler(dispatcher)
+        recorder = _Recorder()
+        handler.add_listener(_Failing())
+        handler.add_listener(recorder)
+        for idx in range(3):
+            handler.handle(Event(_OWNER, idx))
+        self.assertTrue(dispatcher.wait_idle(5.0))
+        self.assertEqual([str(error) for error in failures], ["listener failed"])
+        self.assertEqual(dispatcher.failed(), 1)
+        self.assertIn(2, recorder.values)
+        dispatcher.close()
+
+    def test_closed_dispatcher_falls_back_to_synchronous_delivery(self):
+        dispatcher = EventDispatcher()
+        handler = EventHandler(dispatcher)
+        recorder = _Recorder()
+        handler.add_listener(recorder)
+        handler.handle(Event(_OWNER, "queued"))
+        dispatcher.close()
+        handler.handle(Event(_OWNER, "late"))
+        self.assertEqual(recorder.values, ["queued", "late"])
+        self.assertEqual(handler.queue_depth(), 0)
+
+    def test_handle_all_uses_on_events_and_falls_back_to_on_event(self):
+        handler = EventHandler()
+        batches = _BatchRecorder()
+        recorder = _Recorder()
+        handler.add_listener(batches)
+        handler.add_listener(recorder)
+        handler.handle_all([Event(_OWNER, idx) for idx in range(3)])
+        handler.handle_all([])
+        self.assertEqual(batches.batches, [[0, 1, 2]])
+        self.assertEqual(recorder.values, [0, 1, 2])
+
+    def test_handle_all_with_dispatcher_counts_every_event(self):
+        dispatcher = EventDispatcher()
+        handler = EventHandler(dispatcher)
+        gate = ThreadEvent()
+        batches = _BatchRecorder(gate)
+        handler.add_listener(batches)
+        handler.handle(Event(_OWNER, "single"))
+        handler.handle_all([Event(_OWNER, idx) for idx in range(10)])
+        self.assertEqual(handler.queue_depth(), 11)
+        gate.set()
+        self.assertTrue(dispatcher.wait_idle(5.0))
+        self.assertEqual(batches.batches, [["single"], list(range(10))])
+        self.assertEqual((handler.queue_depth(), dispatcher.delivered()), (0, 2))
+        dispatcher.close()
+
+    def test_listener_changes_during_delivery_apply_to_the_next_event(self):
+        handler = EventHandler()
+        recorder = _Recorder()
+
+        class _RemovesItself(EventListener):
+            def __init__(self):
+                self.calls = 0
+
+            def on_event(self, event: Event):
+                self.calls += 1
+                handler.remove_listener(self)
+                handler.add_listener(recorder)
+
+        once = _RemovesItself()
+        handler.add_listener(once)
+        handler.handle(Event(_OWNER, "first"))
+        handler.handle(Event(_OWNER, "second"))
+        self.assertEqual(once.calls, 1)
+        self.assertEqual(recorder.values, ["second"])
@@ -0,0 +1,153 @@
+from threading import Condition, Event as ThreadEvent, Thread
+from time import sleep
+from unittest import TestCase
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+from localchat.util.metrics import (
+    Counter,
+    Histogram,
+    InstrumentedLock,
+    MetricsHttpServer,
+    MetricsRegistry,
+    create_lock,
+    lock_report,
+)
+
+
+class TestMetrics(TestCase):
+    def test_counter_increments(self):
+        counter = Counter("requests_total")
+        counter.inc()
+        counter.inc(4)
+        self.assertEqual(counter.value(), 5)
+
+    def test_histogram_buckets_and_quantile(self):
+        histogram = Histogram("latency_seconds", (0.1, 0.2, 0.4))
+        for value in (0.05, 0.15, 0.15, 0.3, 1.0):
+            histogram.observe(value)
+        self.assertEqual(histogram.cumulative_counts(), [1, 3, 4, 5])
+        self.assertEqual(histogram.count(), 5)
+        self.assertAlmostEqual(histogram.sum(), 1.65)
+        self.assertAlmostEqual(histogram.quantile(0.5), 0.175)
+        # Beyond the last bound the estimate is capped at that bound.
+        self.assertEqual(histogram.quantile(1.0), 0.4)
+        self.assertEqual(Histogram("empty").quantile(0.99), 0.0)
+        with self.assertRaises(ValueError):
+            Histogram("unsorted", (0.2, 0.1))
+
+    def test_registry_reuses_instruments_and_checks_kinds(self):
+        registry = MetricsRegistry()
+        first = registry.counter("packets_total", "Packets.", {"type": "join"})
+        self.assertIs(registry.counter("packets_total", "Packets.", {"type": "join"}), first)
+        registry.counter("packets_total", "Packets.", {"type": "leave"}).inc(2)
+        first.inc()
+        self.assertEqual(registry.value("packets_total", {"type": "join"}), 1)
+        self.assertEqual(registry.total("packets_total"), 3)
+        with self.assertRaises(ValueError):
+            registry.histogram("packets_total", "Packets.")
+        with self.assertRaises(ValueError):
+            registry.counter("invalid-name", "Invalid.")
+        with self.assertRaises(KeyError):
+            registry.value("missing_total")
+
+    def test_render_prometheus_text_format(self):
+        registry = MetricsRegistry()
+        registry.counter("messages_total", "Chat messages.", {"kind": "public"}).inc(3)
+        registry.gauge("members", "Joined members.", lambda: 2)
+        registry.histogram("handle_seconds", "Handling time.", (0.001, 0.01)).observe(0.005)
+        lines = registry.render_prometheus().splitlines()
+        self.assertEqual(lines[:3], [
+            "# HELP messages_total Chat messages.",
+            "# TYPE messages_total counter",
+            'messages_total{kind="public"} 3',
+        ])
+        self.assertIn("# TYPE members gauge", lines)
+        self.assertIn("members 2", lines)
+        self.assertIn('handle_seconds_bucket{le="0.001"} 0', lines)
+        self.assertIn('handle_seconds_bucket{le="0.01"} 1', lines)
+        self.assertIn('handle_seconds_bucket{le="+Inf"} 1', lines)
+        self.assertIn("handle_seconds_count 1", lines)
+
+    def test_disabled_registry_records_nothing(self):
+        registry = MetricsRegistry(enabled=False)
+        counter = registry.counter("messages_total", "Chat messages.")
+        counter.inc()
+        registry.histogram("handle_seconds", "Handling time.").observe(0.1)
+        registry.gauge("members", "Joined members.", lambda: 2)
+        self.assertEqual(counter.value(), 0)
+        self.assertEqual(registry.render_prometheus(), "")
+        self.assertEqual(registry.total("messages_total"), 0)
+
+    def test_http_endpoint_serves_metrics(self):
+        registry = MetricsRegistry()
+        registry.counter("scrapes_total", "Scrapes.").inc()
+        endpoint = MetricsHttpServer(registry, port=0)
+        try:
+            endpoint.start()
+        except IOError:
+            self.skipTest("local tcp sockets are not available in this environment")
+        try:
+            url = f"http://127.0.0.1:{endpoint.get_port()}"
+            with urlopen(url + "/metrics", timeout=2.0) as response:
+                self.assertEqual(response.status, 200)
+                self.assertIn("scrapes_total 1", response.read().decode("utf-8"))
+            with self.assertRaises(HTTPError) as raised:
+                urlopen(url + "/other", timeout=2.0)
+            self.assertEqual(raised.exception.code, 404)
+            raised.exception.close()
+        finally:
+            endpoint.stop()
+        self.assertFalse(endpoint.is_running())
+
+    def test_instrumented_lock_records_contention(self):
+        registry = MetricsRegistry()
+        lock = InstrumentedLock("shared", registry)
+        holding = ThreadEvent()
+
+        def hold():
+            with lock:
+                holding.set()
+                sleep(0.05)
+
+        holder = Thread(target=hold)
+        holder.start()
+        holding.wait(2.0)
+        with lock:
+            self.assertTrue(lock.locked())
+        holder.join(2.0)
+        self.assertFalse(lock.locked())
+
+        entry = lock_report(registry)[0]
+        self.assertEqual(entry["lock"], "shared")
+        self.assertEqual(entry["acquisitions"], 2)
+        self.assertEqual(entry["contended"], 1)
+        self.assertGreater(entry["wait_total_s"], 0.01)
+        self.assertGreater(entry["hold_total_s"], 0.04)
+
+    def test_instrumented_rlock_works_with_condition(self):
+        registry = MetricsRegistry()
+        lock = InstrumentedLock("queue", registry, reentrant=True)
+        cond = Condition(lock)
+        items = []
+
+        def produce():
+            with cond:
+                items.append(1)
+                cond.notify()
+
+        with cond:
+            with lock:
+                Thread(target=produce).start()
+                self.assertTrue(cond.wait_for(lambda: len(items) == 1, timeout=2.0))
+        self.assertFalse(lock.locked())
+        # wait() released and re-acquired both recursion levels; holds only count the outermost level:
+        # before wait(), the producer, after wait().
+        self.assertEqual(registry.value("localchat_lock_acquisitions_total", {"lock": "queue"}), 5)
+        self.assertEqual(registry.get_histogram("localchat_lock_hold_seconds", {"lock": "queue"}).count(), 3)
+
+    def test_create_lock_is_plain_without_profiling(self):
+        registry = MetricsRegistry()
+        self.assertNotIsInstance(create_lock("plain", registry, profiled=False), InstrumentedLock)
+        self.assertIsInstance(create_lock("profiled", registry, profiled=True), InstrumentedLock)
+        self.assertEqual(registry.labels("localchat_lock_acquisitions_total"), [{"lock": "profiled"}])